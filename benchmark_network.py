@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DHCP Finder 效能測試腳本
+用於比較各資料收集方式的耗時
+"""
+
+import sys
+import time
+import socket
+import struct
+import subprocess
+import statistics
+
+
+def _measure(func, repeat):
+    """執行 func repeat 次，回傳每次耗時（毫秒）"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def _report(name, durations):
+    print(f"  {name:28s} 中位數 {statistics.median(durations):8.3f} ms  "
+          f"最小 {min(durations):8.3f} ms  最大 {max(durations):8.3f} ms")
+
+
+def _create_veth_pairs(count):
+    """建立測試用 veth 介面（需要 root 權限），回傳已建立的名稱"""
+    created = []
+    for i in range(count):
+        name = f"bnv{i}"
+        result = subprocess.run(
+            ['ip', 'link', 'add', name, 'type', 'veth', 'peer', 'name', f"bnp{i}"],
+            capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"建立 veth 失敗: {result.stderr.strip()}")
+            break
+        created.append(name)
+    return created
+
+
+def _delete_veth_pairs(names):
+    for name in names:
+        subprocess.run(['ip', 'link', 'del', name], capture_output=True)
+
+
+def bench_interface_collection(repeat=20):
+    """比較 netifaces/psutil 與 rtnetlink 的介面收集耗時"""
+    import psutil
+    import netifaces
+    from modules import rtnetlink
+
+    print("=" * 50)
+    print(f"介面收集（目前共 {len(psutil.net_if_addrs())} 個介面）")
+
+    def legacy_per_interface():
+        # 舊版做法：每個介面各自讀取一次系統表
+        netifaces.gateways()
+        for name in netifaces.interfaces():
+            psutil.net_if_stats()
+            psutil.net_io_counters(pernic=True)
+            netifaces.ifaddresses(name)
+
+    def psutil_snapshot():
+        psutil.net_if_stats()
+        psutil.net_io_counters(pernic=True)
+        psutil.net_if_addrs()
+        netifaces.gateways()
+
+    _report("舊版逐介面查詢", _measure(legacy_per_interface, max(1, repeat // 5)))
+    _report("psutil 單次快照", _measure(psutil_snapshot, repeat))
+
+    if rtnetlink.is_supported():
+        provider = rtnetlink.RtnetlinkProvider()
+        _report("rtnetlink 快照", _measure(provider.collect, repeat))
+    else:
+        print("  此系統不支援 rtnetlink，略過")
+
+
+def bench_driver_statistics(repeat=20):
+    """比較逐檔讀取 sysfs 統計與 rtnetlink 單次 dump 的耗時"""
+    import os
+    from modules import rtnetlink
+    from modules.nic_stats import NicStatsCollector, read_sysfs_statistics, SYS_CLASS_NET
+
+    print("=" * 50)
+    print("驅動統計收集")
+
+    def sysfs_all():
+        for name in os.listdir(SYS_CLASS_NET):
+            read_sysfs_statistics(name)
+
+    _report("sysfs 逐檔讀取", _measure(sysfs_all, repeat))
+    if rtnetlink.is_supported():
+        client = rtnetlink.RtnetlinkClient()
+        _report("rtnetlink 完整統計", _measure(client.dump_link_stats, repeat))
+        collector = NicStatsCollector(client)
+        _report("含 ethtool 計數", _measure(lambda: collector.snapshot(include_config=False), repeat))
+
+
+def bench_rtnetlink_parse(link_count=5000, repeat=20):
+    """以合成的 RTM_NEWLINK 訊息測試解析速度"""
+    from modules import rtnetlink
+
+    print("=" * 50)
+    print(f"rtnetlink 解析（合成 {link_count} 個介面訊息）")
+
+    def attr(rta_type, payload):
+        length = 4 + len(payload)
+        return struct.pack('=HH', length, rta_type) + payload + b'\0' * ((4 - length % 4) % 4)
+
+    messages = []
+    for i in range(link_count):
+        body = struct.pack('=BxHiII', socket.AF_UNSPEC, 1, i + 1, rtnetlink.IFF_UP, 0)
+        body += attr(rtnetlink.IFLA_IFNAME, f"veth{i}\0".encode())
+        body += attr(rtnetlink.IFLA_MTU, struct.pack('=I', 1500))
+        body += attr(rtnetlink.IFLA_ADDRESS,
+                     bytes([2, 0, 0, i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF]))
+        body += attr(rtnetlink.IFLA_OPERSTATE, b'\x06')
+        body += attr(rtnetlink.IFLA_STATS64, struct.pack('=24Q', *range(24)))
+        header = struct.pack('=IHHII', 16 + len(body), rtnetlink.RTM_NEWLINK, 2, 1, 0)
+        messages.append(header + body)
+    data = b''.join(messages)
+
+    def parse_all():
+        offset = 0
+        while offset < len(data):
+            length = struct.unpack_from('=I', data, offset)[0]
+            rtnetlink.parse_link(data, offset + 16, offset + length)
+            offset += (length + 3) & ~3
+
+    _report("parse_link", _measure(parse_all, repeat))
+
+
+def bench_route_lookup(prefix_count=900000, lookup_count=200000):
+    """以 BGP 規模的合成路由表測試最長前綴比對的建立與查詢"""
+    import random
+    from modules.route_lookup import RouteTable
+
+    print("=" * 50)
+    print(f"路由查詢（{prefix_count} 筆前綴，{lookup_count} 次查詢）")
+
+    rng = random.Random(42)
+    # 近似實際 BGP 表的前綴長度分布：約六成為 /24
+    lengths = ([24] * 60 + [23] * 8 + [22] * 10 + [21] * 5 + [20] * 5 + [19] * 4 + [16] * 4
+               + [18, 17, 15, 14])
+    prefixes = []
+    for i in range(prefix_count):
+        prefix_len = rng.choice(lengths)
+        network = rng.getrandbits(32) & (((1 << prefix_len) - 1) << (32 - prefix_len))
+        prefixes.append((network, prefix_len, i))
+    addresses = [rng.getrandbits(32) for _ in range(lookup_count)]
+    address_strings = [socket.inet_ntoa(struct.pack('!I', a))
+                       for a in addresses[:lookup_count // 10]]
+
+    table = RouteTable()
+    start = time.perf_counter()
+    for network, prefix_len, route in prefixes:
+        table.add_int(4, network, prefix_len, route)
+    table.add_int(4, 0, 0, 'default')
+    print(f"  {'建立索引':28s} {time.perf_counter() - start:8.3f} s  ({len(table)} 筆)")
+
+    lookup_int = table.lookup_int
+    start = time.perf_counter()
+    for address in addresses:
+        lookup_int(4, address)
+    elapsed = time.perf_counter() - start
+    print(f"  {'整數查詢':28s} {elapsed / lookup_count * 1e6:8.3f} µs/次")
+
+    start = time.perf_counter()
+    for address in address_strings:
+        table.lookup(address)
+    elapsed = time.perf_counter() - start
+    print(f"  {'字串查詢':28s} {elapsed / len(address_strings) * 1e6:8.3f} µs/次")
+
+
+def main():
+    """主效能測試函數"""
+    print("DHCP Finder 效能測試")
+
+    veth_count = 0
+    if len(sys.argv) > 1:
+        try:
+            veth_count = int(sys.argv[1])
+        except ValueError:
+            print("用法: python benchmark_network.py [veth數量]")
+            return 1
+
+    created = _create_veth_pairs(veth_count) if veth_count else []
+    try:
+        bench_interface_collection()
+        bench_driver_statistics()
+        bench_rtnetlink_parse()
+        bench_route_lookup()
+    finally:
+        _delete_veth_pairs(created)
+
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\n效能測試被用戶中斷")
+        sys.exit(1)
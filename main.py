@@ -17,8 +17,10 @@ import os
 # 導入功能模組
 from modules.dhcp_scanner import DHCPScanner
 from modules.network_info import NetworkInfo
+from modules import network_view
 from modules.internet_test import InternetTest
 from modules.api_tester import APITester
+from modules.latency_histogram import LatencyRecorder
 from modules.json_formatter import JSONFormatter, JSONSyntaxHighlighter
 
 
@@ -34,8 +36,12 @@ class DHCPFinderGUI:
         # 初始化功能模組
         self.dhcp_scanner = DHCPScanner()
         self.network_info = NetworkInfo()
-        self.internet_test = InternetTest()
-        self.api_tester = APITester()
+        # 連線測試與API測試共用延遲記錄，可依目標查看百分位數
+        self.latency_recorder = LatencyRecorder()
+        self.internet_test = InternetTest(self.latency_recorder)
+        # 預設路由或地址變更時讓公網IP快取失效
+        self.internet_test.public_ip.watch(self.network_info)
+        self.api_tester = APITester(self.latency_recorder)
         self.json_formatter = JSONFormatter()
 
         # 使用 Notebook 管理頁面，無需手動頁面狀態
@@ -384,30 +390,8 @@ class DHCPFinderGUI:
                 interfaces = self.network_info.get_network_interfaces()
 
                 for interface in interfaces:
-                    self.append_result(f"介面名稱: {interface['name']}")
-                    self.append_result(f"狀態: {interface['status']}")
-                    self.append_result(f"IP地址: {interface.get('ip', 'N/A')}")
-                    self.append_result(f"子網路遮罩: {interface.get('netmask', 'N/A')}")
-                    self.append_result(f"MAC地址: {interface.get('mac', 'N/A')}")
-
-                    # 顯示更多詳細資訊
-                    if interface.get('speed', 'Unknown') != 'Unknown':
-                        self.append_result(f"速度: {interface['speed']} Mbps")
-                    if interface.get('mtu'):
-                        self.append_result(f"MTU: {interface['mtu']}")
-                    if interface.get('gateway'):
-                        self.append_result(f"預設閘道: {interface['gateway']}")
-
-                    # 顯示統計資訊
-                    if 'statistics' in interface:
-                        stats = interface['statistics']
-                        sent_info = f"已傳送: {stats['bytes_sent']} ({stats['packets_sent']} 封包)"
-                        recv_info = f"已接收: {stats['bytes_recv']} ({stats['packets_recv']} 封包)"
-                        self.append_result(sent_info)
-                        self.append_result(recv_info)
-                        if stats['errors_in'] > 0 or stats['errors_out'] > 0:
-                            error_info = f"錯誤: 輸入 {stats['errors_in']}, 輸出 {stats['errors_out']}"
-                            self.append_result(error_info)
+                    for line in network_view.interface_lines(interface):
+                        self.append_result(line)
 
                     self.append_result("-" * 50)
 
@@ -426,15 +410,29 @@ class DHCPFinderGUI:
                 self.update_status("正在測試外網連線...")
                 self.append_result("=== 外網連線測試 ===")
 
+                def show_detail(detail):
+                    # 各項測試完成時立即顯示
+                    if detail['success']:
+                        phases = ''.join(f"，{phase} {detail[phase]:.1f}"
+                                         for phase in ('connect', 'tls', 'ttfb')
+                                         if phase in detail)
+                        self.append_result(f"  ✓ {detail['test']}: {detail['time']:.1f} ms{phases}")
+                    else:
+                        self.append_result(f"  ✗ {detail['test']}: {detail.get('error', '失敗')}")
+
                 # 測試連線
-                result = self.internet_test.test_connectivity()
+                result = self.internet_test.test_connectivity(on_result=show_detail)
 
                 connected_status = "正常" if result['connected'] else "異常"
-                self.append_result(f"外網連線狀態: {connected_status}")
+                self.append_result(f"外網連線狀態: {connected_status}（耗時 {result['elapsed']:.1f} 秒）")
                 if result['connected']:
                     self.append_result(f"延遲: {result.get('ping', 'N/A')} ms")
                     dns_status = "正常" if result.get('dns', False) else "異常"
                     self.append_result(f"DNS解析: {dns_status}")
+                    for target, stats in result.get('latency', {}).items():
+                        self.append_result(f"  {target}: p50 {stats['p50']:.1f} / "
+                                           f"p99 {stats['p99']:.1f} / "
+                                           f"最大 {stats['max']:.1f} ms（{stats['count']} 次）")
                 else:
                     self.append_result(f"錯誤: {result.get('error', '未知錯誤')}")
 
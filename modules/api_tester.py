@@ -10,14 +10,18 @@ import time
 from urllib.parse import urlparse
 from typing import Dict, Any, Optional, Tuple
 
+from modules.latency_histogram import LatencyRecorder
+
 
 class APITester:
     """API測試器"""
     
-    def __init__(self):
+    def __init__(self, latency_recorder: Optional[LatencyRecorder] = None):
         self.session = requests.Session()
         self.timeout = 30
         self.max_redirects = 5
+        # 各端點的回應時間分布，可與 InternetTest 共用
+        self.latency = latency_recorder or LatencyRecorder()
         
     def validate_url(self, url: str) -> Tuple[bool, str]:
         """驗證URL格式"""
@@ -111,6 +115,9 @@ class APITester:
             # 發送請求
             response = self.session.request(method.upper(), url, **request_kwargs)
             end_time = time.time()
+            parsed_url = urlparse(url)
+            self.latency.record(f"{method.upper()} {parsed_url.netloc}{parsed_url.path}",
+                                (end_time - start_time) * 1000)
             
             # 處理響應
             try:
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+負載延遲（Bufferbloat）測試模組
+功能：在閒置、下載滿載、上傳滿載三個階段持續量測延遲，比較各階段的延遲百分位數並給出等級
+"""
+
+import sys
+import time
+import socket
+import threading
+
+from modules.latency_histogram import LatencyHistogram
+from modules.throughput_engine import ThroughputEngine
+
+
+# 負載下延遲增加量（毫秒，取中位數差值）對應的等級，與常見 bufferbloat 測試的分級相同
+GRADES = ((5, 'A+'), (30, 'A'), (60, 'B'), (200, 'C'), (400, 'D'))
+
+# 負載階段的 GIL 切換間隔：讓延遲探測執行緒最多等待 1 毫秒就能取得 GIL
+LOADED_SWITCH_INTERVAL = 0.001
+
+
+def grade_for(increase):
+    """依延遲增加量（毫秒）回傳等級"""
+    for limit, grade in GRADES:
+        if increase < limit:
+            return grade
+    return 'F'
+
+
+class BufferbloatTest:
+    """負載延遲測試
+
+    延遲探測優先使用 InternetTest 的 ICMP 引擎：送出排程與接收都在引擎自己的 select 迴圈中，
+    回應時間取自核心接收時間戳記（SO_TIMESTAMPNS），不受負載執行緒佔用 GIL 的影響；
+    ICMP 無法使用時改以 TCP 連線時間量測。負載由 ThroughputEngine 產生，
+    暖機（ramp_up）結束、連線已達滿載後才開始探測
+    """
+
+    def __init__(self, internet_test, target=None, port=None, probe_interval=0.1, probe_timeout=1.0,
+                 idle_duration=5.0, load_duration=10.0, ramp_up=2.0, streams=4):
+        self.internet_test = internet_test
+        default_host, default_port = internet_test.test_hosts[0]
+        self.target = target or default_host
+        self.port = port or default_port
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.idle_duration = idle_duration
+        self.load_duration = load_duration
+        self.ramp_up = ramp_up
+        self.streams = streams
+
+    def run(self, download_url=None, upload_url=None):
+        """依序執行閒置、下載、上傳三個階段；URL 預設使用 InternetTest 的吞吐量測試設定
+
+        回傳 {'success', 'target', 'method', 'idle', 'download', 'upload', 'grade', 'worst_increase'}，
+        各負載階段包含 latency（百分位數）、loss（%）、increase（中位數增加量）、mbps 與 grade；
+        負載產生失敗的階段 grade 與 increase 為 None 並附 load_error，不列入整體等級
+        """
+        download_url = download_url or self.internet_test.throughput_download_url
+        upload_url = upload_url or self.internet_test.throughput_upload_url
+        method = 'icmp' if self.internet_test.icmp_engine.is_available() else 'tcp'
+
+        result = {'success': False, 'target': self.target, 'method': method}
+        with self.internet_test._track('bufferbloat'):
+            idle = self._probe(method, self.idle_duration)
+            result['idle'] = idle
+            if not idle['latency']['count']:
+                result['error'] = f'無法量測 {self.target} 的延遲'
+                return result
+            baseline = idle['latency']['p50']
+
+            grades = []
+            for direction, url in (('download', download_url), ('upload', upload_url)):
+                if not url:
+                    continue
+                phase = self._loaded_phase(method, direction, url)
+                if phase.get('load_error') or not phase['mbps']:
+                    # 負載沒有產生：延遲未在滿載下量測，不評等級
+                    phase['increase'] = None
+                    phase['grade'] = None
+                    result[direction] = phase
+                    continue
+                if phase['latency']['count']:
+                    phase['increase'] = max(phase['latency']['p50'] - baseline, 0.0)
+                    phase['grade'] = grade_for(phase['increase'])
+                else:
+                    # 滿載時完全沒有回應
+                    phase['increase'] = None
+                    phase['grade'] = 'F'
+                grades.append(phase['grade'])
+                result[direction] = phase
+
+        if grades:
+            order = [grade for _, grade in GRADES] + ['F']
+            result['grade'] = max(grades, key=order.index)
+            increases = [result[direction]['increase'] for direction in ('download', 'upload')
+                         if result.get(direction, {}).get('increase') is not None]
+            result['worst_increase'] = max(increases) if increases else None
+            result['success'] = True
+        else:
+            errors = [f"{direction}: {result[direction]['load_error']}"
+                      for direction in ('download', 'upload')
+                      if result.get(direction, {}).get('load_error')]
+            result['error'] = '沒有可用的負載階段' + (f"（{'；'.join(errors)}）" if errors else '')
+        return result
+
+    def _loaded_phase(self, method, direction, url):
+        engine = ThroughputEngine(streams=self.streams, duration=self.ramp_up + self.load_duration,
+                                  ramp_up=self.ramp_up)
+        load = {}
+
+        def generate():
+            try:
+                if direction == 'download':
+                    load['result'] = engine.download(url)
+                else:
+                    load['result'] = engine.upload(url)
+            except Exception as e:
+                load['result'] = {'success': False, 'error': str(e), 'mbps': 0.0}
+
+        thread = threading.Thread(target=generate, daemon=True)
+        previous = sys.getswitchinterval()
+        sys.setswitchinterval(LOADED_SWITCH_INTERVAL)
+        try:
+            thread.start()
+            time.sleep(self.ramp_up)
+            phase = self._probe(method, self.load_duration)
+            thread.join()
+        finally:
+            sys.setswitchinterval(previous)
+
+        throughput = load.get('result', {})
+        phase['mbps'] = throughput.get('mbps', 0.0)
+        if not throughput.get('success'):
+            phase['load_error'] = throughput.get('error')
+        return phase
+
+    def _probe(self, method, duration):
+        """以固定間隔量測 duration 秒，回傳 {'latency': 百分位數, 'sent', 'received', 'loss'}"""
+        count = max(int(duration / self.probe_interval), 1)
+        if method == 'icmp':
+            stats = self.internet_test.icmp_engine.ping([self.target], count=count,
+                                                        interval=self.probe_interval,
+                                                        timeout=self.probe_timeout)[self.target]
+            rtts, sent = stats['rtts'], stats['sent']
+        else:
+            rtts, sent = self._tcp_probes(count)
+
+        histogram = LatencyHistogram()
+        histogram.record_many(rtts)
+        return {
+            'latency': histogram.summary(),
+            'sent': sent,
+            'received': len(rtts),
+            'loss': (sent - len(rtts)) / sent * 100 if sent else 0.0
+        }
+
+    def _tcp_probes(self, count):
+        """以 TCP 連線時間量測；依絕對時間排程，探測逾時錯過的時段直接略過"""
+        rtts = []
+        sent = 0
+        start = time.perf_counter()
+        for index in range(count):
+            delay = start + index * self.probe_interval - time.perf_counter()
+            if delay < 0 and index:
+                continue
+            if delay > 0:
+                time.sleep(delay)
+            sent += 1
+            begin = time.perf_counter()
+            try:
+                with socket.create_connection((self.target, self.port), timeout=self.probe_timeout):
+                    rtts.append((time.perf_counter() - begin) * 1000)
+            except OSError:
+                pass
+        return rtts, sent
+
+
+if __name__ == "__main__":
+    # 測試代碼：python -m modules.bufferbloat [目標] [下載URL] [上傳URL]
+    from modules.internet_test import InternetTest
+
+    internet_test = InternetTest()
+    arguments = sys.argv[1:]
+    test = BufferbloatTest(internet_test, target=arguments[0] if arguments else None)
+    result = test.run(*(arguments[1:3]))
+    if not result['success']:
+        print(f"測試失敗: {result['error']}")
+        sys.exit(1)
+
+    print(f"目標: {result['target']}（{result['method']}）")
+    for phase in ('idle', 'download', 'upload'):
+        if phase not in result:
+            continue
+        stats = result[phase]
+        latency = stats['latency']
+        line = (f"{phase:8s}: p50 {latency['p50']:.1f} / p90 {latency['p90']:.1f} / "
+                f"p99 {latency['p99']:.1f} ms，遺失 {stats['loss']:.1f}%")
+        if stats.get('increase') is not None:
+            line += f"，增加 {stats['increase']:.1f} ms（{stats['grade']}），{stats['mbps']:.1f} Mbps"
+        elif stats.get('load_error'):
+            line += f"，負載產生失敗: {stats['load_error']}"
+        print(line)
+    print(f"等級: {result['grade']}")
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+介面計數長期保存模組
+功能：將介面累計計數寫入分層的固定大小時間序列檔案，供長期容量規劃查詢
+"""
+
+import os
+import mmap
+import time
+import struct
+import threading
+from urllib.parse import quote, unquote
+
+from modules.network_model import COUNTER_FIELDS
+
+
+# 預設分層：1秒保留1小時、1分鐘保留1週、1小時保留1年
+DEFAULT_TIERS = (
+    (1, 3600),
+    (60, 7 * 24 * 60),
+    (3600, 365 * 24),
+)
+
+_MAGIC = b'DHCPTSDB'
+_VERSION = 1
+_HEADER = struct.Struct('<8sII')
+_TIER = struct.Struct('<II')
+# 一筆紀錄：時間戳記 + 八個累計計數
+_RECORD = struct.Struct('<d8Q')
+
+# 介面消失（不在取樣中）超過此秒數時關閉其檔案與 mmap；每隔 PRUNE_INTERVAL 秒檢查一次
+IDLE_CLOSE = 300
+PRUNE_INTERVAL = 60
+
+
+class CounterSeries:
+    """單一介面的分層時間序列檔案
+
+    每個分層是固定槽數的環形區段，槽位由 時間 // 間隔 決定。
+    累計計數的降採樣只需保留每個區間的最後一筆，因此每次寫入
+    直接覆寫各分層對應的槽位，檔案大小固定不會成長
+    """
+
+    def __init__(self, path, tiers=DEFAULT_TIERS):
+        self.path = path
+        self.tiers = tuple((int(step), int(slots)) for step, slots in tiers)
+        self._offsets = []
+        offset = _HEADER.size + _TIER.size * len(self.tiers)
+        for _, slots in self.tiers:
+            self._offsets.append(offset)
+            offset += slots * _RECORD.size
+        self.size = offset
+
+        self._file = self._open_file()
+        self._map = mmap.mmap(self._file.fileno(), self.size)
+
+    def _open_file(self):
+        header = _HEADER.pack(_MAGIC, _VERSION, len(self.tiers))
+        header += b''.join(_TIER.pack(step, slots) for step, slots in self.tiers)
+
+        if os.path.exists(self.path):
+            f = open(self.path, 'r+b')
+            existing = f.read(len(header))
+            if existing == header and os.path.getsize(self.path) == self.size:
+                return f
+            # 分層設定不同或檔案損壞時重新建立
+            print(f"時間序列檔案格式不符，重新建立: {self.path}")
+            f.close()
+
+        f = open(self.path, 'w+b')
+        f.truncate(self.size)
+        f.write(header)
+        f.flush()
+        return f
+
+    def append(self, timestamp, counters):
+        """寫入一筆樣本到所有分層"""
+        for (step, slots), offset in zip(self.tiers, self._offsets):
+            slot = int(timestamp // step) % slots
+            _RECORD.pack_into(self._map, offset + slot * _RECORD.size, timestamp, *counters)
+
+    def query(self, start, end, tier_index):
+        """讀取指定分層中 [start, end] 範圍的樣本，回傳 [(時間戳記, 計數tuple)]"""
+        step, slots = self.tiers[tier_index]
+        offset = self._offsets[tier_index]
+        first_bucket = int(start // step)
+        last_bucket = int(end // step)
+        # 超出保留範圍的部分已被覆寫，不可能存在
+        first_bucket = max(first_bucket, last_bucket - slots + 1)
+        if first_bucket > last_bucket:
+            return []
+
+        first_slot = first_bucket % slots
+        count = last_bucket - first_bucket + 1
+        # 範圍可能跨越環形區段的尾端，分成最多兩段連續讀取
+        spans = [(first_slot, min(count, slots - first_slot))]
+        if spans[0][1] < count:
+            spans.append((0, count - spans[0][1]))
+
+        points = []
+        bucket = first_bucket
+        for slot, length in spans:
+            begin = offset + slot * _RECORD.size
+            region = self._map[begin:begin + length * _RECORD.size]
+            for record in _RECORD.iter_unpack(region):
+                timestamp = record[0]
+                # 槽位中的紀錄必須屬於預期的區間，否則是過期資料或空槽
+                if int(timestamp // step) == bucket and start <= timestamp <= end:
+                    points.append((timestamp, record[1:]))
+                bucket += 1
+        return points
+
+    def last_timestamp(self):
+        """最後一筆樣本的時間戳記，沒有樣本時回傳 0
+
+        每次寫入都會寫到所有分層，最細分層的最大時間戳記即為最後寫入時間
+        """
+        _, slots = self.tiers[0]
+        offset = self._offsets[0]
+        region = self._map[offset:offset + slots * _RECORD.size]
+        return max((record[0] for record in _RECORD.iter_unpack(region)), default=0.0)
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class CounterStore:
+    """所有介面的長期計數儲存區
+
+    每個開啟的介面序列佔用一個檔案描述元與 mmap；介面消失超過 idle_close 秒時關閉，
+    最後一筆樣本已超出最長分層保留範圍的檔案直接刪除，避免暫時性介面（veth、tun）無限累積
+    """
+
+    def __init__(self, directory, tiers=DEFAULT_TIERS, idle_close=IDLE_CLOSE):
+        self.directory = directory
+        self.tiers = tuple(tiers)
+        self.idle_close = idle_close
+        self.retention = max(step * slots for step, slots in self.tiers)
+        self._series = {}
+        # 介面 -> 最後一次出現在取樣中的時間
+        self._last_seen = {}
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, interface_name):
+        return os.path.join(self.directory, quote(interface_name, safe='') + '.tsdb')
+
+    def _get_series(self, interface_name, create):
+        series = self._series.get(interface_name)
+        if series is None:
+            path = self._path(interface_name)
+            if not create and not os.path.exists(path):
+                return None
+            series = self._series[interface_name] = CounterSeries(path, self.tiers)
+        return series
+
+    def interfaces(self):
+        """列出已有紀錄的介面名稱"""
+        return sorted(unquote(name[:-5]) for name in os.listdir(self.directory)
+                      if name.endswith('.tsdb'))
+
+    def record(self, counters, timestamp=None):
+        """寫入一次取樣，counters 為 {介面: 計數}（如 NetworkInfo.get_io_counters()）"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self._lock:
+            for name, counter in counters.items():
+                self._last_seen[name] = timestamp
+                try:
+                    self._get_series(name, create=True).append(timestamp, counter)
+                except Exception as e:
+                    print(f"寫入計數紀錄錯誤 {name}: {e}")
+            if timestamp >= self._next_prune:
+                self._next_prune = timestamp + PRUNE_INTERVAL
+                self._prune(timestamp, counters)
+
+    def _prune(self, now, active):
+        """關閉已消失介面的序列，刪除資料已全部超出保留範圍的檔案（需持有 _lock）"""
+        for name, series in list(self._series.items()):
+            if name in active:
+                continue
+            last_seen = self._last_seen.get(name)
+            if last_seen is None:
+                # 只因查詢而開啟的序列
+                last_seen = self._last_seen[name] = series.last_timestamp()
+            if now - last_seen >= self.idle_close:
+                series.close()
+                del self._series[name]
+
+        for name in os.listdir(self.directory):
+            if not name.endswith('.tsdb'):
+                continue
+            interface_name = unquote(name[:-5])
+            if interface_name in active or interface_name in self._series:
+                continue
+            last_seen = self._last_seen.get(interface_name)
+            try:
+                if last_seen is None:
+                    series = CounterSeries(os.path.join(self.directory, name), self.tiers)
+                    try:
+                        last_seen = self._last_seen[interface_name] = series.last_timestamp()
+                    finally:
+                        series.close()
+                if now - last_seen > self.retention:
+                    os.remove(os.path.join(self.directory, name))
+                    self._last_seen.pop(interface_name, None)
+            except OSError as e:
+                print(f"清除過期計數紀錄錯誤 {interface_name}: {e}")
+
+    def select_tier(self, start, now=None):
+        """選出仍保留 start 時間點資料的最細分層"""
+        if now is None:
+            now = time.time()
+        for index, (step, slots) in enumerate(self.tiers):
+            if now - start <= step * slots:
+                return index
+        return len(self.tiers) - 1
+
+    def query(self, interface_name, start, end=None, tier=None):
+        """查詢介面在時間範圍內的累計計數樣本
+
+        未指定 tier 時自動選擇能涵蓋整個範圍的最細分層
+        """
+        if end is None:
+            end = time.time()
+        if tier is None:
+            tier = self.select_tier(start)
+        with self._lock:
+            series = self._get_series(interface_name, create=False)
+            if series is None:
+                return []
+            return series.query(start, end, tier)
+
+    def query_rates(self, interface_name, start, end=None, tier=None):
+        """查詢時間範圍內相鄰樣本間的平均速率"""
+        points = self.query(interface_name, start, end, tier)
+        rates = []
+        for (t0, c0), (t1, c1) in zip(points, points[1:]):
+            elapsed = t1 - t0
+            if elapsed <= 0:
+                continue
+            rate = {'timestamp': t1, 'interval': elapsed}
+            for field, old, new in zip(COUNTER_FIELDS, c0, c1):
+                rate[f'{field}_per_sec'] = (new - old) / elapsed if new >= old else 0.0
+            rates.append(rate)
+        return rates
+
+    def flush(self):
+        with self._lock:
+            for series in self._series.values():
+                series.flush()
+
+    def close(self):
+        with self._lock:
+            for series in self._series.values():
+                series.close()
+            self._series.clear()
+            self._last_seen.clear()
+
+
+if __name__ == "__main__":
+    # 測試代碼：寫入目前計數並查詢最近一小時
+    import tempfile
+    from modules.network_info import NetworkInfo
+
+    network_info = NetworkInfo()
+    store = CounterStore(os.path.join(tempfile.gettempdir(), 'dhcp_finder_counters'))
+    for _ in range(3):
+        store.record(network_info.get_io_counters())
+        time.sleep(1)
+
+    for name in store.interfaces():
+        points = store.query(name, time.time() - 3600)
+        print(f"{name}: {len(points)} 筆樣本")
+    store.close()
@@ -132,7 +132,8 @@ class DHCPScanner:
                                         'ip': addr[0],
                                         'mac': 'Unknown',
                                         'vendor': 'Unknown',
-                                        'interface': interface
+                                        'interface': interface,
+                                        'response_time': (time.time() - start_time) * 1000
                                     }
                                     
                                     # 避免重複
@@ -198,7 +199,8 @@ class DHCPScanner:
                                 'ip': server_ip,
                                 'mac': server_mac,
                                 'vendor': self.get_mac_vendor(server_mac),
-                                'interface': interface
+                                'interface': interface,
+                                'response_time': float(received.time - sent.sent_time) * 1000
                             }
                             
                             # 避免重複
@@ -0,0 +1,590 @@
+# -*- coding: utf-8 -*-
+"""
+DNS效能測試模組
+功能：直接以 UDP/TCP 對每個DNS伺服器送出查詢（不經過系統解析器快取），
+統計延遲百分位數、逾時率與各伺服器回答的一致性
+"""
+
+import time
+import errno
+import random
+import select
+import socket
+import string
+import struct
+import threading
+
+from modules.latency_histogram import LatencyHistogram
+
+
+DNS_PORT = 53
+QTYPE_A = 1
+QTYPE_AAAA = 28
+QCLASS_IN = 1
+
+RCODE_NAMES = {0: 'NOERROR', 1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+
+# 常見網域（預期已在伺服器快取中）與用來產生隨機子網域（必定未快取）的基底網域
+DEFAULT_CACHED_NAMES = ('google.com', 'cloudflare.com', 'microsoft.com', 'github.com',
+                        'wikipedia.org')
+DEFAULT_UNCACHED_BASES = ('google.com', 'cloudflare.com', 'microsoft.com')
+
+_HEADER = struct.Struct('!HHHHHH')
+_QUESTION_TAIL = struct.Struct('!HH')
+_RR_FIXED = struct.Struct('!HHIH')
+_LENGTH = struct.Struct('!H')
+
+# 標準遞迴查詢旗標（RD）
+_FLAGS_RD = 0x0100
+_FLAG_QR = 0x8000
+_FLAG_TC = 0x0200
+
+
+def encode_name(name):
+    """網域名稱轉為 DNS 標籤格式"""
+    encoded = b''
+    for label in name.rstrip('.').split('.'):
+        raw = label.encode('idna') if label else b''
+        if not raw or len(raw) > 63:
+            raise ValueError(f"無效的網域標籤: {label!r}")
+        encoded += bytes([len(raw)]) + raw
+    return encoded + b'\0'
+
+
+def build_query(query_id, name, qtype=QTYPE_A):
+    """建立查詢封包，回傳 (封包, question 區段)"""
+    question = encode_name(name) + _QUESTION_TAIL.pack(qtype, QCLASS_IN)
+    return _HEADER.pack(query_id, _FLAGS_RD, 1, 0, 0, 0) + question, question
+
+
+def _skip_name(data, offset):
+    """略過（可能壓縮的）網域名稱，回傳其後的位移"""
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += 1 + length
+
+
+def parse_response(data):
+    """解析回應，回傳 {'id', 'rcode', 'truncated', 'question', 'answers'}
+
+    answers 為 A/AAAA 記錄的地址串列（CNAME 只追蹤最終地址）；格式錯誤時回傳 None
+    """
+    try:
+        query_id, flags, qdcount, ancount, _, _ = _HEADER.unpack_from(data)
+        if not flags & _FLAG_QR:
+            return None
+        offset = _HEADER.size
+        question_start = offset
+        for _ in range(qdcount):
+            offset = _skip_name(data, offset) + _QUESTION_TAIL.size
+        question = bytes(data[question_start:offset])
+
+        answers = []
+        for _ in range(ancount):
+            offset = _skip_name(data, offset)
+            rtype, rclass, _, rdlength = _RR_FIXED.unpack_from(data, offset)
+            offset += _RR_FIXED.size
+            rdata = bytes(data[offset:offset + rdlength])
+            if rclass == QCLASS_IN and rtype == QTYPE_A and rdlength == 4:
+                answers.append(socket.inet_ntop(socket.AF_INET, rdata))
+            elif rclass == QCLASS_IN and rtype == QTYPE_AAAA and rdlength == 16:
+                answers.append(socket.inet_ntop(socket.AF_INET6, rdata))
+            offset += rdlength
+    except (struct.error, IndexError, ValueError):
+        return None
+    return {
+        'id': query_id,
+        'rcode': flags & 0x000F,
+        'truncated': bool(flags & _FLAG_TC),
+        'question': question,
+        'answers': answers
+    }
+
+
+def _random_label(rng, length=12):
+    return ''.join(rng.choice(string.ascii_lowercase + string.digits) for _ in range(length))
+
+
+def _server_label(server):
+    """(地址, 埠) 轉為 '地址:埠'（IPv6 為 '[地址]:埠'），字串維持不變"""
+    if isinstance(server, tuple):
+        host, port = server
+        return f"[{host}]:{port}" if ':' in host else f"{host}:{port}"
+    return server
+
+
+def _split_server(label, default_port):
+    if label.startswith('['):
+        host, _, port = label[1:].partition(']:')
+        return host, int(port)
+    if label.count(':') == 1:
+        host, _, port = label.partition(':')
+        return host, int(port)
+    return label, default_port
+
+
+class _Query:
+    __slots__ = ('name', 'kind', 'rtt', 'rcode', 'answers', 'error', 'truncated')
+
+    def __init__(self, name, kind):
+        self.name = name
+        # 'cached' 或 'uncached'
+        self.kind = kind
+        self.rtt = None
+        self.rcode = None
+        self.answers = None
+        self.error = None
+        self.truncated = False
+
+
+class DNSBenchmark:
+    """DNS伺服器效能測試
+
+    每個伺服器各以單一 socket 同時保持最多 concurrency 個查詢（UDP 直接並行，
+    TCP 以同一連線 pipeline），以 select 收取回應；以查詢 ID 與 question 區段比對回應。
+    常見網域重複查詢以測量快取命中延遲，隨機子網域則必定需要遞迴查詢
+    """
+
+    def __init__(self, timeout=2.0, concurrency=20, port=DNS_PORT, qtype=QTYPE_A, seed=None):
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.port = port
+        self.qtype = qtype
+        self._rng = random.Random(seed)
+
+    def build_workload(self, cached_names=DEFAULT_CACHED_NAMES,
+                       uncached_bases=DEFAULT_UNCACHED_BASES, queries=100, uncached_ratio=0.3):
+        """產生 (網域, 類型) 查詢串列，cached 與 uncached 依比例交錯"""
+        workload = []
+        for index in range(queries):
+            if uncached_bases and self._rng.random() < uncached_ratio:
+                base = uncached_bases[index % len(uncached_bases)]
+                workload.append((f"{_random_label(self._rng)}.{base}", 'uncached'))
+            else:
+                workload.append((cached_names[index % len(cached_names)], 'cached'))
+        return workload
+
+    def run(self, servers, workload=None, protocols=('udp', 'tcp'), warmup=True):
+        """對每個伺服器、每種協定執行同一組查詢
+
+        servers 為地址字串或 (地址, 埠) 串列；各伺服器同時測試，
+        回傳 {'results': {伺服器: {協定: 統計}}, 'consistency': {...}}
+        """
+        if workload is None:
+            workload = self.build_workload()
+        cached_names = sorted({name for name, kind in workload if kind == 'cached'})
+
+        servers = [_server_label(server) for server in servers]
+        results = {server: {} for server in servers}
+        lock = threading.Lock()
+
+        def benchmark(server, protocol):
+            if warmup and cached_names:
+                # 先查詢一次常見網域，讓「快取」查詢真的命中伺服器快取
+                self._execute(server, protocol, [_Query(name, 'cached') for name in cached_names])
+            queries = [_Query(name, kind) for name, kind in workload]
+            started = time.perf_counter()
+            error = self._execute(server, protocol, queries)
+            stats = self._summarize(queries, time.perf_counter() - started)
+            if error:
+                stats['error'] = error
+            with lock:
+                results[server][protocol] = (stats, queries)
+
+        threads = [threading.Thread(target=benchmark, args=(server, protocol), daemon=True)
+                   for server in servers for protocol in protocols]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        consistency = self._consistency(results)
+        return {
+            'results': {server: {protocol: stats for protocol, (stats, _) in entries.items()}
+                        for server, entries in results.items()},
+            'consistency': consistency
+        }
+
+    # 查詢執行
+
+    def _execute(self, server, protocol, queries):
+        """執行查詢並填入各 _Query 的結果，發生連線層級錯誤時回傳錯誤訊息"""
+        try:
+            host, port = _split_server(server, self.port)
+            family = socket.AF_INET6 if ':' in host else socket.AF_INET
+            address = socket.getaddrinfo(host, port, family, socket.SOCK_DGRAM)[0][4]
+            if protocol == 'udp':
+                self._run_udp(family, address, queries)
+            else:
+                self._run_tcp(family, address, queries)
+            return None
+        except OSError as e:
+            for query in queries:
+                if query.rtt is None and query.error is None:
+                    query.error = str(e)
+            return str(e)
+
+    def _next_ids(self, count):
+        return self._rng.sample(range(0x10000), min(count, 0x10000))
+
+    def _run_udp(self, family, address, queries):
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.connect(address)
+            self._pump(sock, queries, udp=True)
+
+    def _run_tcp(self, family, address, queries):
+        remaining = list(queries)
+        attempts = 0
+        while remaining and attempts < 3:
+            attempts += 1
+            with socket.socket(family, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                try:
+                    sock.connect(address)
+                except socket.timeout:
+                    raise OSError(errno.ETIMEDOUT, 'TCP 連線逾時')
+                sock.setblocking(False)
+                self._pump(sock, remaining, udp=False)
+            # 伺服器中途關閉連線時，尚未送出的查詢改用新連線
+            remaining = [query for query in remaining if query.error == 'not sent']
+            for query in remaining:
+                query.error = None
+
+    def _pump(self, sock, queries, udp):
+        """送出與接收的主迴圈：保持最多 concurrency 個未回應查詢"""
+        ids = self._next_ids(len(queries))
+        pending = {}
+        next_index = 0
+        buffer = bytearray(65535)
+        stream = bytearray()
+        closed = False
+
+        while next_index < len(queries) or pending:
+            while next_index < len(queries) and len(pending) < self.concurrency and not closed:
+                query = queries[next_index]
+                query_id = ids[next_index % len(ids)]
+                if query_id in pending:
+                    break
+                packet, question = build_query(query_id, query.name, self.qtype)
+                try:
+                    sock.send(packet if udp else _LENGTH.pack(len(packet)) + packet)
+                except (BlockingIOError, InterruptedError):
+                    break
+                pending[query_id] = (query, question, time.perf_counter())
+                next_index += 1
+
+            if closed and not pending:
+                break
+
+            now = time.perf_counter()
+            if pending:
+                oldest = next(iter(pending.values()))[2]
+                wait = max(oldest + self.timeout - now, 0)
+            else:
+                wait = 0
+            readable, _, _ = select.select([sock], [], [], wait)
+
+            if readable:
+                messages, closed_now = self._read(sock, buffer, stream, udp)
+                received_at = time.perf_counter()
+                closed = closed or closed_now
+                for message in messages:
+                    response = parse_response(message)
+                    if response is None:
+                        continue
+                    entry = pending.get(response['id'])
+                    if entry is None or entry[1] != response['question']:
+                        continue
+                    query, _, sent_at = entry
+                    del pending[response['id']]
+                    query.rtt = (received_at - sent_at) * 1000
+                    query.rcode = response['rcode']
+                    query.answers = tuple(sorted(response['answers']))
+                    query.truncated = response['truncated']
+
+            # 逾時處理（pending 依送出順序排列）
+            now = time.perf_counter()
+            for query_id in list(pending):
+                query, _, sent_at = pending[query_id]
+                if now - sent_at < self.timeout and not closed:
+                    break
+                query.error = 'timeout' if now - sent_at >= self.timeout else 'connection closed'
+                del pending[query_id]
+
+        if closed:
+            for query in queries[next_index:]:
+                query.error = 'not sent'
+
+    def _read(self, sock, buffer, stream, udp):
+        """讀取所有可用資料，回傳 (完整訊息串列, 連線是否已關閉)"""
+        messages = []
+        while True:
+            try:
+                received = sock.recv_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionRefusedError:
+                # UDP：伺服器回傳 ICMP port unreachable，對應的查詢會以逾時計算
+                break
+            except OSError:
+                return messages, True
+            if udp:
+                messages.append(bytes(buffer[:received]))
+                continue
+            if received == 0:
+                return self._split_stream(stream, messages), True
+            stream.extend(buffer[:received])
+        if not udp:
+            self._split_stream(stream, messages)
+        return messages, False
+
+    def _split_stream(self, stream, messages):
+        # TCP 訊息前有 2 位元組長度
+        while len(stream) >= 2:
+            length = _LENGTH.unpack_from(stream)[0]
+            if len(stream) < 2 + length:
+                break
+            messages.append(bytes(stream[2:2 + length]))
+            del stream[:2 + length]
+        return messages
+
+    # 統計
+
+    def _summarize(self, queries, elapsed):
+        histograms = {'all': LatencyHistogram(), 'cached': LatencyHistogram(),
+                      'uncached': LatencyHistogram()}
+        rcodes = {}
+        timeouts = 0
+        errors = 0
+        truncated = 0
+        for query in queries:
+            if query.rtt is not None:
+                histograms['all'].record(query.rtt)
+                histograms[query.kind].record(query.rtt)
+                rcode = RCODE_NAMES.get(query.rcode, str(query.rcode))
+                rcodes[rcode] = rcodes.get(rcode, 0) + 1
+                truncated += query.truncated
+            elif query.error == 'timeout':
+                timeouts += 1
+            else:
+                errors += 1
+
+        sent = len(queries)
+        answered = histograms['all'].total
+        return {
+            'sent': sent,
+            'answered': answered,
+            'timeouts': timeouts,
+            'timeout_rate': timeouts / sent if sent else 0.0,
+            'errors': errors,
+            'truncated': truncated,
+            'rcodes': rcodes,
+            'queries_per_sec': answered / elapsed if elapsed > 0 else 0.0,
+            'latency': {kind: histogram.summary() for kind, histogram in histograms.items()}
+        }
+
+    def _consistency(self, results):
+        """比較各伺服器對常見網域的回答
+
+        CDN 網域可能因地區或輪替而回傳不同地址，因此與另一伺服器的地址有交集即視為相符；
+        某伺服器的回答與過半數伺服器（含自己）相符時計入該伺服器的 agreement，
+        每個伺服器都如此相符時該網域的 consistent 為 True。
+        回傳 {'names': {網域: {'answers': {伺服器: 地址}, 'consistent': bool}}, 'agreement': {伺服器: 比例}}
+        """
+        names = {}
+        for server, entries in results.items():
+            for _, queries in entries.values():
+                for query in queries:
+                    if query.kind != 'cached' or query.rtt is None:
+                        continue
+                    if query.rcode == 0:
+                        answer = query.answers
+                    else:
+                        answer = (RCODE_NAMES.get(query.rcode, 'ERROR'),)
+                    names.setdefault(query.name, {}).setdefault(server, answer)
+
+        agreement = {server: [0, 0] for server in results}
+        report = {}
+        for name, answers in names.items():
+            consistent = True
+            for server, answer in answers.items():
+                matches = sum(1 for other in answers.values()
+                              if other == answer or set(other) & set(answer))
+                agreement[server][1] += 1
+                if matches * 2 > len(answers):
+                    agreement[server][0] += 1
+                else:
+                    consistent = False
+            report[name] = {'answers': {server: list(answer) for server, answer in answers.items()},
+                            'consistent': consistent}
+
+        return {
+            'names': report,
+            'agreement': {server: matched / total if total else None
+                          for server, (matched, total) in agreement.items()}
+        }
+
+
+class LocalDNSResponder:
+    """測試用的本機DNS回應器（UDP 與 TCP）
+
+    records 為 {網域: [IPv4 地址]}，未列出的網域回應 NXDOMAIN；
+    delay 為每次回應前的延遲秒數，drop_names 中的網域不回應（用於測試逾時）
+    """
+
+    def __init__(self, records=None, host='127.0.0.1', delay=0.0, drop_names=()):
+        self.records = {name.lower().rstrip('.'): addresses
+                        for name, addresses in (records or {}).items()}
+        self.delay = delay
+        self.drop_names = {name.lower().rstrip('.') for name in drop_names}
+        self.queries = 0
+        self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._udp.bind((host, 0))
+        self.port = self._udp.getsockname()[1]
+        self._tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._tcp.bind((host, self.port))
+        self._tcp.listen(16)
+        # 以短逾時輪詢停止旗標（關閉 socket 無法喚醒阻塞中的 accept/recvfrom）
+        for sock in (self._udp, self._tcp):
+            sock.settimeout(0.1)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for target in (self._serve_udp, self._serve_tcp):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._udp.close()
+        self._tcp.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def answer(self, data):
+        """依查詢產生回應封包，不回應時回傳 None"""
+        query_id, flags, qdcount, _, _, _ = _HEADER.unpack_from(data)
+        if qdcount != 1:
+            return None
+        labels = []
+        offset = _HEADER.size
+        while data[offset]:
+            length = data[offset]
+            labels.append(bytes(data[offset + 1:offset + 1 + length]).decode('ascii', 'replace'))
+            offset += 1 + length
+        offset += 1
+        qtype, _ = _QUESTION_TAIL.unpack_from(data, offset)
+        question = bytes(data[_HEADER.size:offset + _QUESTION_TAIL.size])
+        name = '.'.join(labels).lower()
+        self.queries += 1
+        if name in self.drop_names:
+            return None
+
+        addresses = self.records.get(name)
+        answers = b''
+        count = 0
+        if addresses is not None and qtype == QTYPE_A:
+            for address in addresses:
+                # 0xC00C：指向 question 中的名稱
+                answers += (b'\xc0\x0c' + _RR_FIXED.pack(QTYPE_A, QCLASS_IN, 300, 4)
+                            + socket.inet_aton(address))
+                count += 1
+        rcode = 0 if addresses is not None else 3
+        response_flags = _FLAG_QR | (flags & _FLAGS_RD) | 0x0080 | rcode
+        return _HEADER.pack(query_id, response_flags, 1, count, 0, 0) + question + answers
+
+    def _serve_udp(self):
+        while not self._stop.is_set():
+            try:
+                data, address = self._udp.recvfrom(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            response = self.answer(data)
+            if response is None:
+                continue
+            if self.delay:
+                threading.Timer(self.delay, self._send_udp, (response, address)).start()
+            else:
+                self._send_udp(response, address)
+
+    def _send_udp(self, response, address):
+        try:
+            self._udp.sendto(response, address)
+        except OSError:
+            pass
+
+    def _serve_tcp(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._tcp.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            conn.settimeout(None)
+            threading.Thread(target=self._handle_tcp, args=(conn,), daemon=True).start()
+
+    def _handle_tcp(self, conn):
+        stream = bytearray()
+        with conn:
+            while not self._stop.is_set():
+                try:
+                    chunk = conn.recv(4096)
+                except OSError:
+                    return
+                if not chunk:
+                    return
+                stream.extend(chunk)
+                while len(stream) >= 2 and len(stream) >= 2 + _LENGTH.unpack_from(stream)[0]:
+                    length = _LENGTH.unpack_from(stream)[0]
+                    response = self.answer(bytes(stream[2:2 + length]))
+                    del stream[:2 + length]
+                    if response is None:
+                        continue
+                    if self.delay:
+                        time.sleep(self.delay)
+                    try:
+                        conn.sendall(_LENGTH.pack(len(response)) + response)
+                    except OSError:
+                        return
+
+
+if __name__ == "__main__":
+    # 測試代碼：對系統設定的DNS伺服器執行效能測試
+    from modules.network_info import NetworkInfo
+
+    servers = NetworkInfo().get_dns_servers()
+    print(f"DNS伺服器: {servers}")
+    benchmark = DNSBenchmark()
+    report = benchmark.run(servers, benchmark.build_workload(queries=200))
+
+    for server, protocols in report['results'].items():
+        for protocol, stats in protocols.items():
+            latency = stats['latency']['all']
+            if latency['count']:
+                print(f"{server} {protocol.upper()}: p50 {latency['p50']:.2f} ms, "
+                      f"p99 {latency['p99']:.2f} ms, 逾時 {stats['timeout_rate']:.1%}, "
+                      f"{stats['queries_per_sec']:.0f} qps")
+            else:
+                print(f"{server} {protocol.upper()}: 無回應 {stats.get('error', '')}")
+    for server, ratio in report['consistency']['agreement'].items():
+        if ratio is not None:
+            print(f"{server} 回答一致性: {ratio:.0%}")
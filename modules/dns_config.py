@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+DNS設定讀取模組
+功能：不送出任何網路查詢，從系統設定檔讀取DNS伺服器並快取，設定變更時才重新讀取
+"""
+
+import os
+import time
+import socket
+import platform
+import threading
+
+
+# systemd-resolved 本機 stub 位址，實際上游伺服器需另外讀取
+SYSTEMD_STUB_ADDRESSES = ('127.0.0.53', '127.0.0.54')
+
+RESOLV_CONF = '/etc/resolv.conf'
+SYSTEMD_RESOLV_CONF = '/run/systemd/resolve/resolv.conf'
+SYSTEMD_RESOLVE_NETIF_DIR = '/run/systemd/resolve/netif'
+SYSTEMD_NETWORKD_LINKS_DIR = '/run/systemd/netif/links'
+
+WINDOWS_INTERFACES_KEYS = (
+    r'SYSTEM\CurrentControlSet\Services\Tcpip\Parameters\Interfaces',
+    r'SYSTEM\CurrentControlSet\Services\Tcpip6\Parameters\Interfaces',
+)
+# 網路介面類別：{介面 GUID}\Connection 的 Name 為 psutil 使用的介面名稱（FriendlyName）
+WINDOWS_NETWORK_CLASS_KEY = (r'SYSTEM\CurrentControlSet\Control\Network'
+                             r'\{4D36E972-E325-11CE-BFC1-08002BE10318}')
+
+
+def _unique(items):
+    """去除重複並保留順序"""
+    seen = set()
+    result = []
+    for item in items:
+        if item and item not in seen:
+            seen.add(item)
+            result.append(item)
+    return result
+
+
+def parse_resolv_conf(path):
+    """解析 resolv.conf，回傳 (nameserver 串列, search 網域串列)"""
+    servers = []
+    search = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                parts = line.split('#', 1)[0].split(';', 1)[0].split()
+                if len(parts) < 2:
+                    continue
+                if parts[0] == 'nameserver':
+                    servers.append(parts[1])
+                elif parts[0] in ('search', 'domain'):
+                    search.extend(parts[1:])
+    except OSError:
+        pass
+    return servers, search
+
+
+def parse_systemd_link_state(path):
+    """解析 systemd-resolved / networkd 的介面狀態檔，回傳 (伺服器, 網域)"""
+    servers = []
+    domains = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                key, sep, value = line.strip().partition('=')
+                if not sep:
+                    continue
+                if key in ('SERVERS', 'DNS'):
+                    # 可能帶有 %介面 或 #伺服器名稱 後綴（DNS over TLS）
+                    servers.extend(item.split('#', 1)[0] for item in value.split())
+                elif key in ('DOMAINS', 'ROUTE_DOMAINS'):
+                    domains.extend(value.split())
+    except OSError:
+        pass
+    return servers, domains
+
+
+class DNSConfigProvider:
+    """DNS設定提供者
+
+    只讀取本機設定（resolv.conf、systemd-resolved 狀態、Windows 登錄檔），
+    結果快取至相關檔案的修改時間改變為止；為避免頻繁 stat，
+    兩次檢查之間至少間隔 check_interval 秒
+    """
+
+    def __init__(self, check_interval=1.0):
+        self.system = platform.system()
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._config = None
+        self._signature = None
+        self._last_check = 0.0
+
+    def get_config(self):
+        """回傳 {'servers': [...], 'search': [...], 'links': {介面: {'servers', 'domains'}}}"""
+        with self._lock:
+            now = time.monotonic()
+            if self._config is not None and now - self._last_check < self.check_interval:
+                return self._config
+            self._last_check = now
+
+            signature = self._current_signature()
+            if self._config is None or signature != self._signature:
+                try:
+                    self._config = self._read_config()
+                except Exception as e:
+                    print(f"讀取DNS設定錯誤: {e}")
+                    if self._config is None:
+                        self._config = {'servers': [], 'search': [], 'links': {}}
+                self._signature = signature
+            return self._config
+
+    def get_servers(self):
+        """回傳DNS伺服器串列（全域設定在前，各介面設定在後，已去除重複）"""
+        config = self.get_config()
+        servers = list(config['servers'])
+        for link in config['links'].values():
+            servers.extend(link['servers'])
+        return _unique(servers)
+
+    def invalidate(self):
+        """強制下次呼叫重新讀取"""
+        with self._lock:
+            self._config = None
+
+    # 變更偵測
+
+    def _current_signature(self):
+        if self.system == 'Windows':
+            return self._windows_signature()
+
+        signature = []
+        for path in (RESOLV_CONF, SYSTEMD_RESOLV_CONF, SYSTEMD_RESOLVE_NETIF_DIR,
+                     SYSTEMD_NETWORKD_LINKS_DIR):
+            signature.append(self._stat_signature(path))
+        for directory in (SYSTEMD_RESOLVE_NETIF_DIR, SYSTEMD_NETWORKD_LINKS_DIR):
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        stat = entry.stat()
+                        signature.append((entry.path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                continue
+        return tuple(signature)
+
+    def _stat_signature(self, path):
+        try:
+            # 跟隨符號連結（resolv.conf 常指向 systemd 管理的檔案）
+            stat = os.stat(path)
+            return (path, stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            return (path, None)
+
+    def _windows_signature(self):
+        try:
+            import winreg
+        except ImportError:
+            return None
+        signature = []
+        for key_path in WINDOWS_INTERFACES_KEYS:
+            try:
+                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key_path) as key:
+                    subkey_count, _, modified = winreg.QueryInfoKey(key)
+                    signature.append((key_path, subkey_count, modified))
+                    for i in range(subkey_count):
+                        name = winreg.EnumKey(key, i)
+                        with winreg.OpenKey(key, name) as subkey:
+                            signature.append((name, winreg.QueryInfoKey(subkey)[2]))
+            except OSError:
+                continue
+        return tuple(signature)
+
+    # 設定讀取
+
+    def _read_config(self):
+        if self.system == 'Windows':
+            return self._read_windows_config()
+        return self._read_unix_config()
+
+    def _read_unix_config(self):
+        servers, search = parse_resolv_conf(RESOLV_CONF)
+
+        # 指向 systemd-resolved stub 時，改用其上游伺服器
+        if servers and all(server in SYSTEMD_STUB_ADDRESSES for server in servers):
+            upstream, upstream_search = parse_resolv_conf(SYSTEMD_RESOLV_CONF)
+            if upstream:
+                servers = upstream
+                search = search or upstream_search
+
+        links = {}
+        names = self._interface_names()
+        for directory in (SYSTEMD_RESOLVE_NETIF_DIR, SYSTEMD_NETWORKD_LINKS_DIR):
+            try:
+                entries = os.listdir(directory)
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.isdigit():
+                    continue
+                path = os.path.join(directory, entry)
+                link_servers, link_domains = parse_systemd_link_state(path)
+                if not link_servers and not link_domains:
+                    continue
+                name = names.get(int(entry), entry)
+                link = links.setdefault(name, {'servers': [], 'domains': []})
+                link['servers'] = _unique(link['servers'] + link_servers)
+                link['domains'] = _unique(link['domains'] + link_domains)
+
+        return {'servers': _unique(servers), 'search': _unique(search), 'links': links}
+
+    def _interface_names(self):
+        try:
+            return dict(socket.if_nameindex())
+        except OSError:
+            return {}
+
+    def _windows_interface_names(self, winreg):
+        """回傳 {大寫的介面 GUID: 介面名稱}"""
+        names = {}
+        try:
+            key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, WINDOWS_NETWORK_CLASS_KEY)
+        except OSError:
+            return names
+        with key:
+            for i in range(winreg.QueryInfoKey(key)[0]):
+                guid = winreg.EnumKey(key, i)
+                try:
+                    with winreg.OpenKey(key, guid + r'\Connection') as subkey:
+                        names[guid.upper()] = winreg.QueryValueEx(subkey, 'Name')[0]
+                except OSError:
+                    continue
+        return names
+
+    def _read_windows_config(self):
+        import winreg
+
+        servers = []
+        links = {}
+        # 登錄檔以介面 GUID 區分，轉為介面名稱才能與 psutil 的介面對應；找不到名稱時保留 GUID
+        names = self._windows_interface_names(winreg)
+        for key_path in WINDOWS_INTERFACES_KEYS:
+            try:
+                key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key_path)
+            except OSError:
+                continue
+            with key:
+                for i in range(winreg.QueryInfoKey(key)[0]):
+                    guid = winreg.EnumKey(key, i)
+                    link_servers = []
+                    try:
+                        with winreg.OpenKey(key, guid) as subkey:
+                            # 靜態設定優先於 DHCP 取得的伺服器
+                            for value_name in ('NameServer', 'DhcpNameServer'):
+                                try:
+                                    value = winreg.QueryValueEx(subkey, value_name)[0]
+                                except OSError:
+                                    continue
+                                if value:
+                                    link_servers.extend(value.replace(',', ' ').split())
+                                    break
+                    except OSError:
+                        continue
+                    if link_servers:
+                        name = names.get(guid.upper(), guid)
+                        link = links.setdefault(name, {'servers': [], 'domains': []})
+                        link['servers'] = _unique(link['servers'] + link_servers)
+                        servers.extend(link_servers)
+
+        servers = [server for server in _unique(servers) if server != '127.0.0.1']
+        return {'servers': servers, 'search': [], 'links': links}
+
+
+if __name__ == "__main__":
+    # 測試代碼
+    provider = DNSConfigProvider()
+    config = provider.get_config()
+    print(f"DNS伺服器: {provider.get_servers()}")
+    print(f"搜尋網域: {config['search']}")
+    for name, link in config['links'].items():
+        print(f"  {name}: {link['servers']} {link['domains']}")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        provider.get_servers()
+    print(f"快取讀取: {(time.perf_counter() - start) * 1000:.3f} ms / 1000 次")
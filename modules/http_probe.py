@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 輕量探測模組
+功能：以 HEAD 或 1 位元組 Range 請求檢查 HTTP(S) 可達性，只讀取回應標頭，
+分別量測 DNS、TCP 連線、TLS 交握與首位元組時間（TTFB），並重用 keep-alive 連線
+"""
+
+import ssl
+import time
+import select
+import socket
+import threading
+from urllib.parse import urlsplit
+
+from modules.net_utils import bind_socket, address_family
+
+
+USER_AGENT = 'dhcp-finder-probe/1.0'
+
+# 回應標頭上限，超過視為異常回應
+MAX_HEADER_BYTES = 65536
+# 回應本文不超過此大小時讀完並保留連線，否則讀完標頭即關閉連線
+MAX_DRAIN_BYTES = 4096
+
+# 不支援 HEAD 時改用 Range GET 的狀態碼
+_HEAD_UNSUPPORTED = (405, 501)
+
+
+class _Connection:
+    __slots__ = ('key', 'sock', 'idle_since', 'requests')
+
+    def __init__(self, key, sock):
+        self.key = key
+        self.sock = sock
+        self.idle_since = None
+        self.requests = 0
+
+
+def _is_stale(sock):
+    """閒置連線可讀表示伺服器已關閉（EOF）或送出非預期資料，不可重用"""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+def split_url(url):
+    """拆解 http/https URL，回傳 (scheme, host, port, 請求路徑, Host 標頭)"""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError(f'不支援的 URL: {url}')
+    host = parts.hostname
+    port = parts.port or (443 if scheme == 'https' else 80)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    host_header = host if ':' not in host else f'[{host}]'
+    if parts.port:
+        host_header += f':{parts.port}'
+    return scheme, host, port, path, host_header
+
+
+def parse_head(data):
+    """解析回應狀態列與標頭，回傳 (狀態碼, {小寫標頭: 值})"""
+    lines = data.decode('iso-8859-1').split('\r\n')
+    parts = lines[0].split(' ', 2)
+    if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+        raise ValueError(f"無效的回應狀態列: {lines[0][:80]!r}")
+    headers = {}
+    for line in lines[1:]:
+        name, separator, value = line.partition(':')
+        if separator:
+            headers[name.strip().lower()] = value.strip()
+    return int(parts[1]), headers
+
+
+class HttpProbe:
+    """HTTP 輕量探測器
+
+    每個 (scheme, host, port) 保留最多 max_idle 條閒置連線供下次探測重用（執行緒安全）；
+    重用連線時不需 DNS、TCP 與 TLS，只量測 TTFB。預設先送 HEAD，伺服器不支援時改送
+    `Range: bytes=0-0` 的 GET；伺服器忽略 Range 而回傳完整內容時，讀完標頭即關閉連線
+    """
+
+    def __init__(self, max_idle=2, idle_timeout=30.0, verify=True, interface=None, source=None):
+        """interface / source 指定連線使用的介面與來源地址（見 net_utils.bind_socket）"""
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.interface = interface
+        self.source = source
+        self._context = ssl.create_default_context()
+        if not verify:
+            self._context.check_hostname = False
+            self._context.verify_mode = ssl.CERT_NONE
+        self._pool = {}
+        self._lock = threading.Lock()
+
+    def probe(self, url, timeout=5.0, method='auto'):
+        """探測 URL
+
+        method: 'auto'（HEAD，不支援時改 Range GET）、'HEAD' 或 'GET'。
+        回傳 {'success', 'status_code', 'response_time', 'dns', 'connect', 'tls', 'ttfb',
+        'reused', 'bytes_received'}（時間為毫秒；重用連線時 dns/connect/tls 為 None）；
+        2xx 與 3xx（不跟隨轉址）皆視為可達
+        """
+        try:
+            scheme, host, port, path, host_header = split_url(url)
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
+        key = (scheme, host, port)
+
+        start = time.perf_counter()
+        try:
+            methods = ('HEAD', 'GET') if method == 'auto' else (method.upper(),)
+            for current in methods:
+                result = self._request(key, host_header, path, current, timeout)
+                if (current == 'HEAD' and result['status_code'] in _HEAD_UNSUPPORTED
+                        and len(methods) > 1):
+                    continue
+                break
+        except (OSError, ValueError) as e:
+            return {'success': False, 'error': str(e) or e.__class__.__name__,
+                    'response_time': (time.perf_counter() - start) * 1000}
+
+        result['response_time'] = (time.perf_counter() - start) * 1000
+        result['success'] = 200 <= result['status_code'] < 400
+        if not result['success']:
+            result['error'] = f"HTTP {result['status_code']}"
+        return result
+
+    def _request(self, key, host_header, path, method, timeout):
+        """送出一次請求；重用的連線已失效時以新連線重試一次"""
+        connection, timings = self._checkout(key, timeout)
+        request = (f'{method} {path} HTTP/1.1\r\nHost: {host_header}\r\n'
+                   f'User-Agent: {USER_AGENT}\r\nAccept: */*\r\nAccept-Encoding: identity\r\n'
+                   f'Connection: keep-alive\r\n')
+        if method == 'GET':
+            request += 'Range: bytes=0-0\r\n'
+        request = (request + '\r\n').encode('ascii')
+
+        try:
+            result = self._exchange(connection, request, method, timeout)
+        except (OSError, ValueError):
+            connection.sock.close()
+            if not timings['reused']:
+                raise
+            connection, timings = self._connect(key, timeout)
+            result = self._exchange(connection, request, method, timeout)
+        result.update(timings)
+        return result
+
+    def _exchange(self, connection, request, method, timeout):
+        sock = connection.sock
+        sock.settimeout(timeout)
+        sent = time.perf_counter()
+        sock.sendall(request)
+
+        buffer = bytearray()
+        ttfb = None
+        while True:
+            chunk = sock.recv(8192)
+            if not chunk:
+                raise ConnectionError('連線在回應標頭前關閉')
+            if ttfb is None:
+                ttfb = (time.perf_counter() - sent) * 1000
+            buffer += chunk
+            end = buffer.find(b'\r\n\r\n')
+            if end >= 0:
+                break
+            if len(buffer) > MAX_HEADER_BYTES:
+                raise ValueError('回應標頭過大')
+
+        status, headers = parse_head(bytes(buffer[:end]))
+        received = len(buffer)
+        body = len(buffer) - end - 4
+        remaining = self._body_length(method, status, headers)
+        connection_header = headers.get('connection', '').lower()
+        if buffer.startswith(b'HTTP/1.0'):
+            # HTTP/1.0 預設不保留連線
+            reusable = connection_header == 'keep-alive'
+        else:
+            reusable = connection_header != 'close'
+        reusable = reusable and remaining is not None
+        if reusable and remaining - body > MAX_DRAIN_BYTES:
+            reusable = False
+        while reusable and body < remaining:
+            chunk = sock.recv(min(remaining - body, 8192))
+            if not chunk:
+                reusable = False
+                break
+            body += len(chunk)
+            received += len(chunk)
+
+        connection.requests += 1
+        if reusable and body == remaining:
+            self._checkin(connection)
+        else:
+            sock.close()
+
+        result = {'status_code': status, 'ttfb': ttfb, 'bytes_received': received, 'method': method}
+        if 'location' in headers:
+            result['location'] = headers['location']
+        return result
+
+    @staticmethod
+    def _body_length(method, status, headers):
+        """回應本文長度；無法得知（chunked 或讀到連線關閉）時回傳 None"""
+        if method == 'HEAD' or 100 <= status < 200 or status in (204, 304):
+            return 0
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            return None
+        try:
+            return int(headers['content-length'])
+        except (KeyError, ValueError):
+            return None
+
+    # 連線池
+
+    def _checkout(self, key, timeout):
+        now = time.monotonic()
+        with self._lock:
+            idle = self._pool.get(key, [])
+            while idle:
+                connection = idle.pop()
+                if (now - connection.idle_since <= self.idle_timeout
+                        and not _is_stale(connection.sock)):
+                    return connection, {'reused': True, 'dns': None, 'connect': None, 'tls': None}
+                connection.sock.close()
+        return self._connect(key, timeout)
+
+    def _checkin(self, connection):
+        connection.idle_since = time.monotonic()
+        with self._lock:
+            idle = self._pool.setdefault(connection.key, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.sock.close()
+
+    def _connect(self, key, timeout):
+        scheme, host, port = key
+        deadline = time.perf_counter() + timeout
+
+        family = address_family(self.source) if self.source else 0
+        start = time.perf_counter()
+        addresses = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+        dns = (time.perf_counter() - start) * 1000
+
+        last_error = None
+        sock = None
+        start = time.perf_counter()
+        for family, sock_type, proto, _, address in addresses:
+            candidate = socket.socket(family, sock_type, proto)
+            candidate.settimeout(max(deadline - time.perf_counter(), 0.001))
+            try:
+                bind_socket(candidate, self.interface, self.source)
+                candidate.connect(address)
+            except OSError as e:
+                candidate.close()
+                last_error = e
+                continue
+            sock = candidate
+            break
+        if sock is None:
+            raise last_error or OSError(f'無法連線 {host}:{port}')
+        connect = (time.perf_counter() - start) * 1000
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        tls = None
+        if scheme == 'https':
+            start = time.perf_counter()
+            try:
+                sock = self._context.wrap_socket(sock, server_hostname=host)
+            except (OSError, ValueError):
+                sock.close()
+                raise
+            tls = (time.perf_counter() - start) * 1000
+
+        return _Connection(key, sock), {'reused': False, 'dns': dns, 'connect': connect, 'tls': tls}
+
+    def close(self):
+        """關閉所有閒置連線"""
+        with self._lock:
+            for idle in self._pool.values():
+                for connection in idle:
+                    connection.sock.close()
+            self._pool.clear()
+
+
+if __name__ == "__main__":
+    # 測試代碼：python -m modules.http_probe [URL ...]，每個 URL 探測兩次以比較新連線與重用連線
+    import sys
+
+    urls = sys.argv[1:] or ['http://www.google.com', 'https://www.cloudflare.com']
+    prober = HttpProbe()
+    for url in urls:
+        for _ in range(2):
+            result = prober.probe(url)
+            if 'status_code' not in result:
+                print(f"{url}: 失敗 {result['error']}")
+                continue
+            stages = ', '.join(f"{name} {result[name]:.1f} ms"
+                               for name in ('dns', 'connect', 'tls', 'ttfb')
+                               if result.get(name) is not None)
+            connection = '重用' if result['reused'] else '新連線'
+            print(f"{url}: {result['method']} {result['status_code']}（{connection}）"
+                  f" {stages}, 接收 {result['bytes_received']} 位元組")
+    prober.close()
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+ICMP Echo 引擎模組
+功能：不呼叫系統 ping 指令，直接以 ICMP socket 同時對多個目標送出 Echo 並統計延遲與遺失率
+"""
+
+import os
+import math
+import time
+import errno
+import random
+import select
+import socket
+import struct
+import threading
+import platform
+
+from modules.net_utils import bind_socket
+
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+# Linux 的 SO_TIMESTAMPNS（Python socket 模組未提供此常數）
+SO_TIMESTAMPNS = 35
+
+_ICMP_HEADER = struct.Struct('!BBHHH')
+_SEND_STAMP = struct.Struct('!Q')
+_TIMESPEC = struct.Struct('@ll')
+
+_seq_lock = threading.Lock()
+_seq_counter = random.randrange(0x10000)
+
+
+def _checksum(data):
+    """網際網路校驗和（RFC 1071）"""
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(family, identifier, sequence, payload):
+    """建立 Echo Request；ICMPv6 的校驗和由核心計算"""
+    icmp_type = ICMP_ECHO_REQUEST if family == socket.AF_INET else ICMPV6_ECHO_REQUEST
+    header = _ICMP_HEADER.pack(icmp_type, 0, 0, identifier, sequence)
+    if family == socket.AF_INET:
+        header = _ICMP_HEADER.pack(icmp_type, 0, _checksum(header + payload), identifier, sequence)
+    return header + payload
+
+
+def parse_echo_reply(family, data, raw):
+    """解析 Echo Reply，回傳 (identifier, sequence, payload)，不是 Echo Reply 時回傳 None
+
+    IPv4 raw socket 收到的資料包含 IP 標頭，datagram socket 與 IPv6 則只有 ICMP 部分
+    """
+    if raw and family == socket.AF_INET:
+        if len(data) < 20:
+            return None
+        data = data[(data[0] & 0x0F) * 4:]
+    if len(data) < _ICMP_HEADER.size:
+        return None
+    icmp_type, code, _, identifier, sequence = _ICMP_HEADER.unpack_from(data)
+    expected = ICMP_ECHO_REPLY if family == socket.AF_INET else ICMPV6_ECHO_REPLY
+    if icmp_type != expected or code != 0:
+        return None
+    return identifier, sequence, data[_ICMP_HEADER.size:]
+
+
+def summarize(rtts, sent):
+    """依 RTT 串列（毫秒，依送出順序）計算 fping 風格的統計"""
+    received = len(rtts)
+    result = {
+        'sent': sent,
+        'received': received,
+        'loss': (sent - received) / sent * 100 if sent else 0.0,
+        'min': None, 'avg': None, 'max': None, 'mdev': None, 'jitter': None,
+        'rtts': rtts
+    }
+    if received:
+        avg = sum(rtts) / received
+        result['min'] = min(rtts)
+        result['avg'] = avg
+        result['max'] = max(rtts)
+        # 與 ping 相同：sqrt(E[x^2] - E[x]^2)
+        result['mdev'] = math.sqrt(max(sum(rtt * rtt for rtt in rtts) / received - avg * avg, 0.0))
+        # 相鄰兩次 RTT 差值的平均
+        result['jitter'] = (sum(abs(b - a) for a, b in zip(rtts, rtts[1:])) / (received - 1)
+                            if received > 1 else 0.0)
+    return result
+
+
+class _Target:
+    __slots__ = ('host', 'address', 'family', 'sent', 'replies', 'error')
+
+    def __init__(self, host):
+        self.host = host
+        self.address = None
+        self.family = None
+        self.sent = 0
+        # 送出順序 -> RTT（毫秒）
+        self.replies = {}
+        self.error = None
+
+
+class IcmpEngine:
+    """ICMP Echo 引擎
+
+    Linux 優先使用不需權限的 ICMP datagram socket（受 net.ipv4.ping_group_range 限制），
+    不可用時改用 raw socket（需要 root 或 CAP_NET_RAW）。每次 ping() 使用獨立的 socket，
+    可由多個執行緒同時呼叫；單一執行緒以 select 交錯送出與接收，
+    每個封包帶有唯一序號，接收時間優先使用核心時間戳記（SO_TIMESTAMPNS）
+    """
+
+    def __init__(self, payload_size=56, mode='auto', interface=None, source=None):
+        """mode: 'auto'、'dgram' 或 'raw'；interface / source 指定送出的介面與來源地址（見 net_utils.bind_socket）"""
+        self.payload_size = max(payload_size, _SEND_STAMP.size)
+        self.mode = mode
+        self.interface = interface
+        self.source = source
+
+    def _open(self, family):
+        """開啟 ICMP socket，回傳 (socket, 是否為 raw)"""
+        proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+        modes = ('dgram', 'raw') if self.mode == 'auto' else (self.mode,)
+        last_error = None
+        for mode in modes:
+            sock_type = socket.SOCK_DGRAM if mode == 'dgram' else socket.SOCK_RAW
+            try:
+                sock = socket.socket(family, sock_type, proto)
+            except OSError as e:
+                last_error = e
+                continue
+            try:
+                bind_socket(sock, self.interface, self.source)
+            except OSError:
+                sock.close()
+                raise
+            sock.setblocking(False)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+                if platform.system() == 'Linux':
+                    sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+            except OSError:
+                pass
+            return sock, mode == 'raw'
+        raise last_error or OSError(errno.EPROTONOSUPPORT, 'ICMP socket 不可用')
+
+    def is_available(self, family=socket.AF_INET):
+        """檢查目前權限下是否能開啟 ICMP socket"""
+        try:
+            sock, _ = self._open(family)
+            sock.close()
+            return True
+        except OSError:
+            return False
+
+    def ping(self, targets, count=1, interval=1.0, timeout=1.0, spacing=0.0):
+        """同時對多個目標送出 count 次 Echo
+
+        interval 為同一目標兩次送出的間隔，spacing 為任意兩個封包之間的最小間隔，
+        timeout 為最後一次送出後等待回應的秒數。
+        回傳 {目標: 統計}，統計包含 sent/received/loss(%)/min/avg/max/mdev/jitter（毫秒）與 rtts
+        """
+        entries = [_Target(host) for host in dict.fromkeys(targets)]
+        for entry in entries:
+            try:
+                info = socket.getaddrinfo(entry.host, None, 0, socket.SOCK_RAW)[0]
+                entry.family, entry.address = info[0], info[4][0]
+            except (socket.gaierror, IndexError) as e:
+                entry.error = str(e)
+
+        sockets = {}
+        try:
+            for family in {entry.family for entry in entries if entry.family is not None}:
+                sockets[family] = self._open(family)
+            self._run([entry for entry in entries if entry.family is not None],
+                      sockets, count, interval, timeout, spacing)
+        finally:
+            for sock, _ in sockets.values():
+                sock.close()
+
+        results = {}
+        for entry in entries:
+            rtts = [entry.replies[index] for index in sorted(entry.replies)]
+            result = summarize(rtts, entry.sent)
+            result['address'] = entry.address
+            if entry.error:
+                result['error'] = entry.error
+            results[entry.host] = result
+        return results
+
+    def ping_one(self, host, timeout=1.0):
+        """送出一次 Echo，回傳 RTT（毫秒），逾時或無法到達時回傳 None"""
+        return self.ping([host], count=1, timeout=timeout)[host]['avg']
+
+    def _next_sequences(self, count):
+        global _seq_counter
+        with _seq_lock:
+            start = _seq_counter
+            _seq_counter = (_seq_counter + count) & 0xFFFF
+        return start
+
+    def _run(self, entries, sockets, count, interval, timeout, spacing):
+        if not entries:
+            return
+        # raw socket 會收到所有 ICMP 封包，以隨機識別碼區分；datagram socket 由核心改寫識別碼並分流
+        identifier = random.randrange(1, 0x10000)
+        total = len(entries) * count
+        first_seq = self._next_sequences(total)
+        pending = {}
+        padding = os.urandom(self.payload_size - _SEND_STAMP.size)
+
+        # 送出排程：第 r 輪第 i 個目標於 start + r * interval + i * spacing 送出
+        start = time.monotonic()
+        schedule = [(round_index * interval + index * spacing, round_index, entry)
+                    for round_index in range(count) for index, entry in enumerate(entries)]
+        schedule.sort(key=lambda item: item[0])
+        next_send = 0
+        last_send = start
+        fds = {sock.fileno(): (family, sock, raw) for family, (sock, raw) in sockets.items()}
+        ancillary_size = socket.CMSG_SPACE(_TIMESPEC.size) if hasattr(socket, 'CMSG_SPACE') else 0
+
+        while True:
+            now = time.monotonic()
+            while next_send < len(schedule) and start + schedule[next_send][0] <= now:
+                _, round_index, entry = schedule[next_send]
+                sequence = (first_seq + next_send) & 0xFFFF
+                sock, _ = sockets[entry.family]
+                sent_ns = time.time_ns()
+                packet = build_echo_request(entry.family, identifier, sequence,
+                                            _SEND_STAMP.pack(sent_ns) + padding)
+                try:
+                    sock.sendto(packet, (entry.address, 0))
+                    pending[sequence] = (entry, round_index, sent_ns)
+                except OSError as e:
+                    # 無路由等錯誤視為遺失
+                    entry.error = str(e)
+                entry.sent += 1
+                next_send += 1
+                last_send = time.monotonic()
+                now = last_send
+
+            if next_send >= len(schedule):
+                if not pending:
+                    return
+                wait = last_send + timeout - now
+                if wait <= 0:
+                    return
+            else:
+                wait = start + schedule[next_send][0] - now
+                if wait <= 0:
+                    continue
+
+            readable, _, _ = select.select(list(fds), [], [], wait)
+            for fd in readable:
+                family, sock, raw = fds[fd]
+                self._drain(sock, family, raw, identifier, pending, ancillary_size)
+
+    def _drain(self, sock, family, raw, identifier, pending, ancillary_size):
+        """讀取所有已到達的回應"""
+        while True:
+            try:
+                if ancillary_size:
+                    data, ancdata, _, address = sock.recvmsg(2048, ancillary_size)
+                else:
+                    data, address = sock.recvfrom(2048)
+                    ancdata = ()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            received_ns = None
+            for level, kind, value in ancdata:
+                if (level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS
+                        and len(value) >= _TIMESPEC.size):
+                    seconds, nanoseconds = _TIMESPEC.unpack_from(value)
+                    received_ns = seconds * 1000000000 + nanoseconds
+            if received_ns is None:
+                received_ns = time.time_ns()
+
+            reply = parse_echo_reply(family, data, raw)
+            if reply is None:
+                continue
+            reply_id, sequence, _ = reply
+            if raw and reply_id != identifier:
+                continue
+            match = pending.get(sequence)
+            if match is None:
+                # 重複或逾時後才到達的回應
+                continue
+            entry, round_index, sent_ns = match
+            if address[0].split('%', 1)[0] != entry.address.split('%', 1)[0]:
+                continue
+            del pending[sequence]
+            entry.replies[round_index] = max(received_ns - sent_ns, 0) / 1e6
+
+
+if __name__ == "__main__":
+    # 測試代碼：python -m modules.icmp_engine [目標 ...]
+    import sys
+
+    hosts = sys.argv[1:] or ['127.0.0.1', '8.8.8.8', '1.1.1.1']
+    engine = IcmpEngine()
+    if not engine.is_available():
+        print("無法開啟 ICMP socket（需 ping_group_range 允許或 root 權限）")
+        sys.exit(1)
+
+    stats = engine.ping(hosts, count=5, interval=0.2, timeout=1.0)
+    for host, result in stats.items():
+        if result['received']:
+            print(f"{host:20s}: xmt/rcv/%loss = "
+                  f"{result['sent']}/{result['received']}/{result['loss']:.0f}%, "
+                  f"min/avg/max/mdev = {result['min']:.3f}/{result['avg']:.3f}/{result['max']:.3f}/"
+                  f"{result['mdev']:.3f} ms, jitter {result['jitter']:.3f} ms")
+        else:
+            print(f"{host:20s}: xmt/rcv/%loss = {result['sent']}/0/100% {result.get('error', '')}")
@@ -4,20 +4,35 @@
 功能：檢測外網連線狀態並測試網路速度
 """
 
+import math
 import socket
 import time
 import subprocess
 import platform
-import requests
-import speedtest
 import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from contextlib import nullcontext
 from urllib.parse import urlparse
 
+from modules.bufferbloat import BufferbloatTest
+from modules.dns_benchmark import DNSBenchmark
+from modules.http_probe import HttpProbe
+from modules.icmp_engine import IcmpEngine, summarize
+from modules.latency_histogram import LatencyRecorder
+from modules.net_utils import bind_socket, address_family
+from modules.peer_test import PeerClient, DEFAULT_PORT as PEER_PORT
+from modules.pmtu_probe import PmtuProber
+from modules.public_ip import PublicIPResolver
+from modules.speedtest_cache import SpeedtestCache
+from modules.throughput_engine import ThroughputEngine
+from modules.traceroute import Traceroute
+from modules.uplink_test import MultiUplinkTest
+
 
 class InternetTest:
     """外網連線及網速測試器"""
     
-    def __init__(self):
+    def __init__(self, latency_recorder=None):
         self.system = platform.system()
         self.test_hosts = [
             ('8.8.8.8', 53),      # Google DNS
@@ -31,9 +46,106 @@ class InternetTest:
             'http://www.microsoft.com',
             'http://www.cloudflare.com'
         ]
+        # 設定為 ProtocolStatsMonitor 時，會標記每次測試的執行時段
+        self.protocol_monitor = None
+        self.icmp_engine = IcmpEngine()
+        # {地址族: 是否能開啟 ICMP socket}，第一次 Ping 該地址族的主機時確認
+        self._icmp_available = {}
+        # speedtest.net 設定與伺服器排名的磁碟快取
+        self.speedtest_cache = SpeedtestCache()
+        # 替代網速測試：下載 URL 需支援 Range 才能分段並行；上傳 URL 需接受 POST（未設定則不測上傳）
+        self.throughput_download_url = 'http://speedtest.ftp.otenet.gr/files/test100Mb.db'
+        self.throughput_upload_url = None
+        self.throughput_streams = 4
+        self.throughput_duration = 10.0
+        # HTTP 探測共用的 keep-alive 連線池
+        self.http_probe = HttpProbe()
+        # 公網IP查詢（結果快取，可由 public_ip.watch(network_info) 在網路變更時失效）
+        self.public_ip = PublicIPResolver()
+        # 進行中的路徑追蹤（持續模式可由 tracer.stop() 結束）
+        self.tracer = None
+        # 各項測試依目標記錄延遲分布（'ping 8.8.8.8'、'tcp google.com:80'、'dns google.com'、'http URL'）
+        self.latency = latency_recorder or LatencyRecorder()
+        
+    def _track(self, label):
+        """標記測試時段，供協定計數（重傳、UDP錯誤）對應到測試"""
+        if self.protocol_monitor is None:
+            return nullcontext()
+        return self.protocol_monitor.track(label)
         
     def ping_host(self, host, timeout=3):
-        """Ping指定主機"""
+        """Ping指定主機，回傳延遲（毫秒），失敗時回傳 None
+
+        優先使用程序內的 ICMP 引擎，該地址族無法開啟 ICMP socket（權限不足、非 Linux）時
+        改用系統 ping 指令；個別主機的錯誤只讓該次 Ping 失敗
+        """
+        if self._icmp_usable(host):
+            try:
+                result = self.icmp_engine.ping_one(host, timeout)
+            except OSError as e:
+                print(f"Ping {host} 錯誤: {e}")
+                return None
+            if result is not None:
+                self.latency.record(f'ping {host}', result)
+            return result
+        result = self._ping_with_command(host, timeout)
+        if result is not None:
+            self.latency.record(f'ping {host}', result)
+        return result
+        
+    def ping_hosts(self, hosts, count=4, interval=1.0, timeout=1.0):
+        """同時 Ping 多個主機，回傳 {主機: 統計}（sent/received/loss/min/avg/max/mdev/jitter）
+
+        地址族無法開啟 ICMP socket 的主機逐一呼叫 ping 指令，只提供 min/avg/max
+        """
+        hosts = list(dict.fromkeys(hosts))
+        icmp_hosts = [host for host in hosts if self._icmp_usable(host)]
+        results = {}
+        if icmp_hosts:
+            try:
+                results = self.icmp_engine.ping(icmp_hosts, count=count, interval=interval,
+                                                timeout=timeout)
+            except OSError as e:
+                print(f"ICMP Ping 錯誤: {e}")
+                results = {host: dict(summarize([], 0), error=str(e)) for host in icmp_hosts}
+            for host, result in results.items():
+                for rtt in result['rtts']:
+                    self.latency.record(f'ping {host}', rtt)
+                
+        for host in hosts:
+            if host in results:
+                continue
+            rtts = []
+            for _ in range(count):
+                rtt = self._ping_with_command(host, max(1, int(math.ceil(timeout))))
+                if rtt is not None:
+                    rtts.append(rtt)
+                    self.latency.record(f'ping {host}', rtt)
+            results[host] = summarize(rtts, count)
+        return {host: results[host] for host in hosts}
+        
+    def _icmp_usable(self, host):
+        """ICMP 引擎能否 Ping host：依 host 的地址族確認一次是否能開啟 ICMP socket
+
+        無法解析的主機交給 ICMP 引擎回報錯誤
+        """
+        family = address_family(host)
+        if family is None:
+            try:
+                family = socket.getaddrinfo(host, None, 0, socket.SOCK_RAW)[0][0]
+            except (socket.gaierror, IndexError):
+                return True
+        available = self._icmp_available.get(family)
+        if available is None:
+            available = self.icmp_engine.is_available(family)
+            self._icmp_available[family] = available
+            if not available:
+                version = 'IPv6' if family == socket.AF_INET6 else 'IPv4'
+                print(f"{version} ICMP socket 無法使用，改用 ping 指令")
+        return available
+        
+    def _ping_with_command(self, host, timeout=3):
+        """以系統 ping 指令測試（ICMP socket 無法使用時的備援）"""
         try:
             if self.system == "Windows":
                 cmd = ['ping', '-n', '1', '-w', str(timeout * 1000), host]
@@ -69,11 +181,13 @@ class InternetTest:
             print(f"Ping {host} 錯誤: {e}")
             return None
             
-    def test_socket_connection(self, host, port, timeout=3):
-        """測試Socket連線"""
+    def test_socket_connection(self, host, port, timeout=3, interface=None, source=None):
+        """測試Socket連線；interface / source 指定經由的介面與來源地址（延遲分開記錄）"""
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            family = address_family(source) if source else socket.AF_INET
+            sock = socket.socket(family, socket.SOCK_STREAM)
             sock.settimeout(timeout)
+            bind_socket(sock, interface, source)
             
             start_time = time.time()
             result = sock.connect_ex((host, port))
@@ -82,7 +196,11 @@ class InternetTest:
             sock.close()
             
             if result == 0:
-                return (end_time - start_time) * 1000  # 轉換為毫秒
+                elapsed = (end_time - start_time) * 1000  # 轉換為毫秒
+                via = interface or source
+                name = f'tcp {host}:{port} via {via}' if via else f'tcp {host}:{port}'
+                self.latency.record(name, elapsed)
+                return elapsed
             else:
                 return None
                 
@@ -90,39 +208,51 @@ class InternetTest:
             print(f"Socket連線 {host}:{port} 錯誤: {e}")
             return None
             
-    def test_http_connection(self, url, timeout=5):
-        """測試HTTP連線"""
+    def test_path_mtu(self, targets=None, method='auto', network_info=None, **options):
+        """同時探測多個目的地的路徑 MTU（DF 封包二分搜尋），並與 NetworkInfo 回報的介面 MTU 比較
+
+        targets 預設為測試主機中的 IP 地址；回傳 {'success', 'targets': {目標: 結果}, 'mismatches',
+        'black_holes', 'blocked'}，後三項為路徑 MTU 小於介面 MTU、PMTU 黑洞與不回應探測的目標。
+        其他參數（timeout、retries、port）傳給 PmtuProber
+        """
+        if targets is None:
+            targets = [host for host, _ in self.test_hosts if address_family(host)]
         try:
-            start_time = time.time()
-            response = requests.get(url, timeout=timeout, allow_redirects=True)
-            end_time = time.time()
-            
-            if response.status_code == 200:
-                return {
-                    'success': True,
-                    'response_time': (end_time - start_time) * 1000,
-                    'status_code': response.status_code,
-                    'content_length': len(response.content)
-                }
-            else:
-                return {
-                    'success': False,
-                    'status_code': response.status_code,
-                    'error': f'HTTP {response.status_code}'
-                }
-                
-        except requests.exceptions.RequestException as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
-            
+            prober = PmtuProber(method, network_info=network_info, **options)
+            with self._track('pmtu'):
+                results = prober.probe(targets)
+        except Exception as e:
+            print(f"路徑 MTU 探測錯誤: {e}")
+            return {'success': False, 'error': str(e)}
+        return {
+            'success': any(result['success'] for result in results.values()),
+            'targets': results,
+            'mismatches': [target for target, result in results.items()
+                           if result.get('mismatch')],
+            'black_holes': [target for target, result in results.items()
+                            if result.get('black_hole')],
+            'blocked': [target for target, result in results.items()
+                        if result.get('icmp_blocked')]
+        }
+        
+    def test_http_connection(self, url, timeout=5):
+        """測試HTTP連線
+
+        以 HEAD（或 1 位元組 Range GET）只讀取回應標頭，不下載頁面內容；重用 keep-alive 連線，
+        另回報 dns/connect/tls/ttfb 各階段時間（毫秒，重用連線時前三項為 None）
+        """
+        result = self.http_probe.probe(url, timeout=timeout)
+        if result['success']:
+            self.latency.record(f'http {url}', result['response_time'])
+        return result
+        
     def test_dns_resolution(self, hostname):
         """測試DNS解析"""
         try:
             start_time = time.time()
             socket.gethostbyname(hostname)
             end_time = time.time()
+            self.latency.record(f'dns {hostname}', (end_time - start_time) * 1000)
             
             return {
                 'success': True,
@@ -135,118 +265,170 @@ class InternetTest:
                 'error': str(e)
             }
             
-    def test_connectivity(self):
-        """綜合連線測試"""
+    def benchmark_dns(self, servers=None, queries=200, protocols=('udp', 'tcp'), timeout=2.0,
+                      concurrency=20):
+        """直接對DNS伺服器測試延遲百分位數、逾時率與回答一致性
+
+        servers 預設為 NetworkInfo.get_dns_servers() 回報的本機設定伺服器
+        """
+        try:
+            if servers is None:
+                from modules.network_info import NetworkInfo
+                servers = NetworkInfo().get_dns_servers()
+            if not servers:
+                return {'success': False, 'error': '沒有可測試的DNS伺服器'}
+            benchmark = DNSBenchmark(timeout=timeout, concurrency=concurrency)
+            with self._track('dns_benchmark'):
+                workload = benchmark.build_workload(queries=queries)
+                report = benchmark.run(servers, workload, protocols)
+            report['success'] = True
+            return report
+        except Exception as e:
+            print(f"DNS效能測試錯誤: {e}")
+            return {'success': False, 'error': str(e)}
+            
+    def test_connectivity(self, deadline=8.0, on_result=None, short_circuit=False):
+        """綜合連線測試
+
+        所有測試同時執行，整體不超過 deadline 秒；on_result(detail) 會在每項測試完成時呼叫。
+        short_circuit 為 True 時，第一項連線測試成功即回傳，未完成的項目標示為 Skipped
+        """
+        with self._track('connectivity'):
+            return self._run_connectivity_tests(deadline, on_result, short_circuit)
+            
+    def _connectivity_probes(self, timeout):
+        """建立測試項目串列：(名稱, 類型, 函數)，函數回傳 detail 字典"""
+        probes = []
+        
+        def timed(name, measure, error):
+            value = measure()
+            if value is not None:
+                return {'test': name, 'success': True, 'time': value}
+            return {'test': name, 'success': False, 'error': error}
+            
+        for host, port in self.test_hosts:
+            if isinstance(host, str) and '.' in host and host.replace('.', '').isdigit():
+                # IP地址，使用ping
+                name = f'Ping {host}'
+                probes.append((name, 'ping', lambda name=name, host=host: timed(
+                    name, lambda: self.ping_host(host, max(1, int(timeout))),
+                    'Timeout or unreachable')))
+            else:
+                # 主機名，測試Socket連線
+                name = f'Socket {host}:{port}'
+                probes.append((name, 'socket', lambda name=name, host=host, port=port: timed(
+                    name, lambda: self.test_socket_connection(host, port, timeout),
+                    'Connection failed')))
+                
+        def dns_probe():
+            dns_result = self.test_dns_resolution('google.com')
+            if dns_result['success']:
+                return {'test': 'DNS Resolution', 'success': True,
+                        'time': dns_result['response_time']}
+            return {'test': 'DNS Resolution', 'success': False, 'error': dns_result['error']}
+            
+        probes.append(('DNS Resolution', 'dns', dns_probe))
+        
+        for url in self.test_urls:
+            def http_probe(url=url):
+                http_result = self.test_http_connection(url, timeout)
+                if http_result['success']:
+                    detail = {'test': f'HTTP {url}', 'success': True,
+                              'time': http_result['response_time']}
+                    detail.update({phase: http_result[phase] for phase in ('connect', 'tls', 'ttfb')
+                                   if http_result.get(phase) is not None})
+                    return detail
+                return {'test': f'HTTP {url}', 'success': False, 'error': http_result['error']}
+                
+            probes.append((f'HTTP {url}', 'http', http_probe))
+            
+        return probes
+        
+    def _run_connectivity_tests(self, deadline, on_result, short_circuit):
+        print("測試外網連線（Ping、Socket、DNS、HTTP 同時進行）...")
+        start_time = time.monotonic()
+        probes = self._connectivity_probes(min(5, deadline))
+        
         results = {
             'connected': False,
             'ping': None,
             'dns': False,
             'http': False,
-            'details': []
+            'details': [None] * len(probes),
+            'elapsed': None
         }
-        
-        successful_tests = 0
-        total_tests = 0
         ping_times = []
+        stopped_early = False
         
-        # 測試Ping連線
-        print("測試Ping連線...")
-        for host, port in self.test_hosts:
-            if isinstance(host, str) and '.' in host and host.replace('.', '').isdigit():
-                # IP地址，使用ping
-                ping_time = self.ping_host(host)
-                total_tests += 1
-                
-                if ping_time is not None:
-                    successful_tests += 1
-                    ping_times.append(ping_time)
-                    results['details'].append({
-                        'test': f'Ping {host}',
-                        'success': True,
-                        'time': ping_time
-                    })
-                else:
-                    results['details'].append({
-                        'test': f'Ping {host}',
-                        'success': False,
-                        'error': 'Timeout or unreachable'
-                    })
-            else:
-                # 主機名，測試Socket連線
-                conn_time = self.test_socket_connection(host, port)
-                total_tests += 1
+        executor = ThreadPoolExecutor(max_workers=len(probes), thread_name_prefix='connectivity')
+        futures = {executor.submit(func): index for index, (_, _, func) in enumerate(probes)}
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                index = futures[future]
+                name, kind, _ = probes[index]
+                try:
+                    detail = future.result()
+                except Exception as e:
+                    detail = {'test': name, 'success': False, 'error': str(e)}
+                results['details'][index] = detail
                 
-                if conn_time is not None:
-                    successful_tests += 1
-                    ping_times.append(conn_time)
-                    results['details'].append({
-                        'test': f'Socket {host}:{port}',
-                        'success': True,
-                        'time': conn_time
-                    })
-                else:
-                    results['details'].append({
-                        'test': f'Socket {host}:{port}',
-                        'success': False,
-                        'error': 'Connection failed'
-                    })
+                if detail['success']:
+                    if kind == 'dns':
+                        results['dns'] = True
+                    else:
+                        # DNS 解析成功不代表能連到外網，不列入整體判斷
+                        results['connected'] = True
+                        if kind == 'http':
+                            results['http'] = True
+                        else:
+                            ping_times.append(detail['time'])
+                            
+                if on_result is not None:
+                    on_result(detail)
                     
-        # 測試DNS解析
-        print("測試DNS解析...")
-        dns_result = self.test_dns_resolution('google.com')
-        if dns_result['success']:
-            results['dns'] = True
-            results['details'].append({
-                'test': 'DNS Resolution',
-                'success': True,
-                'time': dns_result['response_time']
-            })
-        else:
-            results['details'].append({
-                'test': 'DNS Resolution',
-                'success': False,
-                'error': dns_result['error']
-            })
+                if short_circuit and results['connected']:
+                    stopped_early = True
+                    break
+        except FuturesTimeoutError:
+            print(f"連線測試超過總時限 {deadline} 秒，未完成的項目視為失敗")
+        finally:
+            # 不等待逾時的測試，背景執行緒結束後自行回收；尚未開始的測試直接取消
+            # （Python 3.8 的 shutdown 沒有 cancel_futures 參數）
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
             
-        # 測試HTTP連線
-        print("測試HTTP連線...")
-        for url in self.test_urls:
-            http_result = self.test_http_connection(url)
-            total_tests += 1
-            
-            if http_result['success']:
-                successful_tests += 1
-                results['http'] = True
-                results['details'].append({
-                    'test': f'HTTP {url}',
-                    'success': True,
-                    'time': http_result['response_time']
-                })
-            else:
-                results['details'].append({
-                    'test': f'HTTP {url}',
+        for index, detail in enumerate(results['details']):
+            if detail is None:
+                name, kind, _ = probes[index]
+                results['details'][index] = {
+                    'test': name,
                     'success': False,
-                    'error': http_result['error']
-                })
-                
+                    'error': 'Skipped' if stopped_early else 'Deadline exceeded'
+                }
+                if stopped_early and kind == 'dns':
+                    # 提前結束時 DNS 結果未知
+                    results['dns'] = None
+                    
         # 計算平均延遲
         if ping_times:
             results['ping'] = sum(ping_times) / len(ping_times)
             
-        # 判斷整體連線狀態
-        if successful_tests > 0:
-            results['connected'] = True
-            
+        results['elapsed'] = time.monotonic() - start_time
+        # 各目標累計的延遲分布（p50/p90/p99/p99.9），不同測試類型不混合平均
+        results['latency'] = self.latency.summary()
         return results
         
     def test_speed(self):
         """網路速度測試"""
+        with self._track('speed'):
+            return self._run_speed_test()
+            
+    def _run_speed_test(self):
         try:
             print("初始化速度測試...")
-            st = speedtest.Speedtest()
-            
-            print("獲取最佳伺服器...")
-            st.get_best_server()
+            # 設定、伺服器清單與延遲排名取自磁碟快取，過期時於背景更新
+            st, cached = self.speedtest_cache.create_speedtest()
             
             print("測試下載速度...")
             download_speed = st.download()
@@ -256,6 +438,7 @@ class InternetTest:
             
             # 獲取伺服器資訊
             server_info = st.results.server
+            self.speedtest_cache.record_result(server_info['id'], st.results.ping, download_speed)
             
             return {
                 'success': True,
@@ -264,6 +447,7 @@ class InternetTest:
                 'ping': st.results.ping,
                 'server': f"{server_info['sponsor']} - {server_info['name']}, {server_info['country']}",
                 'server_id': server_info['id'],
+                'cached_server': cached,
                 'timestamp': time.time()
             }
             
@@ -275,60 +459,37 @@ class InternetTest:
             
     def test_speed_alternative(self):
         """替代的速度測試方法（使用HTTP下載）"""
-        test_files = [
-            {
-                'url': 'http://speedtest.ftp.otenet.gr/files/test1Mb.db',
-                'size': 1 * 1024 * 1024,  # 1MB
-                'name': '1MB Test File'
-            },
-            {
-                'url': 'http://speedtest.ftp.otenet.gr/files/test10Mb.db',
-                'size': 10 * 1024 * 1024,  # 10MB
-                'name': '10MB Test File'
-            }
-        ]
-        
+        with self._track('speed_alternative'):
+            return self._run_speed_test_alternative()
+            
+    def _run_speed_test_alternative(self):
+        engine = ThroughputEngine(streams=self.throughput_streams,
+                                  duration=self.throughput_duration)
         results = []
         
-        for test_file in test_files:
+        for direction, url in (('download', self.throughput_download_url),
+                               ('upload', self.throughput_upload_url)):
+            if not url:
+                continue
             try:
-                print(f"下載測試檔案: {test_file['name']}")
-                
-                start_time = time.time()
-                response = requests.get(test_file['url'], timeout=30, stream=True)
-                
-                if response.status_code == 200:
-                    downloaded = 0
-                    for chunk in response.iter_content(chunk_size=8192):
-                        downloaded += len(chunk)
-                        
-                    end_time = time.time()
-                    duration = end_time - start_time
-                    
-                    if duration > 0:
-                        speed_bps = downloaded / duration
-                        speed_mbps = speed_bps / 1_000_000
-                        
-                        results.append({
-                            'file': test_file['name'],
-                            'size': downloaded,
-                            'duration': duration,
-                            'speed_mbps': speed_mbps
-                        })
-                        
+                print(f"{direction} 測試: {url}（{engine.streams} 條串流）")
+                result = engine.download(url) if direction == 'download' else engine.upload(url)
+                if result['success']:
+                    results.append(result)
+                else:
+                    print(f"{direction} 測試失敗: {result['error']}")
             except Exception as e:
-                print(f"下載測試失敗 {test_file['name']}: {e}")
-                continue
+                print(f"{direction} 測試失敗 {url}: {e}")
                 
-        if results:
-            avg_speed = sum(r['speed_mbps'] for r in results) / len(results)
+        speeds = {result['direction']: result['mbps'] for result in results}
+        if 'download' in speeds:
             return {
                 'success': True,
-                'download': avg_speed,
-                'upload': 0,  # 此方法無法測試上傳
+                'download': speeds['download'],
+                'upload': speeds.get('upload', 0),  # 未設定上傳 URL 時為 0
                 'ping': 0,
                 'details': results,
-                'method': 'HTTP Download Test'
+                'method': 'HTTP Multi-Stream Test'
             }
         else:
             return {
@@ -336,28 +497,68 @@ class InternetTest:
                 'error': 'All download tests failed'
             }
             
-    def get_public_ip(self):
-        """獲取公網IP地址"""
-        services = [
-            'https://api.ipify.org',
-            'https://ipinfo.io/ip',
-            'https://icanhazip.com',
-            'https://ident.me'
-        ]
-        
-        for service in services:
-            try:
-                response = requests.get(service, timeout=5)
-                if response.status_code == 200:
-                    ip = response.text.strip()
-                    # 簡單驗證IP格式
-                    parts = ip.split('.')
-                    if len(parts) == 4 and all(part.isdigit() and 0 <= int(part) <= 255 for part in parts):
-                        return ip
-            except:
-                continue
-                
-        return None
+    def test_bufferbloat(self, target=None, download_url=None, upload_url=None, **options):
+        """負載延遲測試：比較閒置與下載/上傳滿載時的延遲百分位數並給出等級
+
+        其他參數（probe_interval、idle_duration、load_duration、streams…）傳給 BufferbloatTest
+        """
+        try:
+            return BufferbloatTest(self, target=target, **options).run(download_url, upload_url)
+        except Exception as e:
+            print(f"負載延遲測試錯誤: {e}")
+            return {'success': False, 'error': str(e)}
+            
+    def test_lan_peer(self, host, port=PEER_PORT, protocol='tcp', reverse=False, **options):
+        """對區網內執行 PeerServer 的主機測試吞吐量（protocol 為 'tcp' 或 'udp'）
+
+        reverse=True 時由對方送出；其他參數（streams、rate、duration、on_interval…）直接傳給 PeerClient
+        """
+        client = PeerClient(host, port)
+        with self._track(f'peer_{protocol}'):
+            if protocol == 'udp':
+                return client.udp(reverse=reverse, **options)
+            return client.tcp(reverse=reverse, **options)
+            
+    def trace_path(self, host=None, protocol='icmp', rounds=1, interval=1.0, on_round=None,
+                   resolve=False, **options):
+        """追蹤到 host（預設為第一個測試主機）的路徑，找出連線中斷的位置
+
+        所有 TTL 的探測同時送出；rounds > 1 或 None（持續到 self.tracer.stop()）時如 mtr 統計每一跳。
+        其他參數（max_hops、timeout、port、interface、source…）傳給 Traceroute
+        """
+        host = host or self.test_hosts[0][0]
+        try:
+            self.tracer = Traceroute(protocol, **options)
+            with self._track(f'traceroute_{protocol}'):
+                return self.tracer.trace(host, rounds=rounds, interval=interval,
+                                         on_round=on_round, resolve=resolve)
+        except Exception as e:
+            print(f"路徑追蹤錯誤: {e}")
+            return {'success': False, 'host': host, 'error': str(e)}
+            
+    def test_uplinks(self, uplinks=None, throughput=False, **options):
+        """同時測試所有上行線路，回傳各線路並排的健康狀態（見 MultiUplinkTest.run）
+
+        uplinks 為介面名稱、來源地址或 Uplink 串列，預設由預設路由找出；
+        throughput 為 True 時另以 throughput_download_url 測試各線路下載速度
+        """
+        try:
+            url = self.throughput_download_url if throughput else None
+            return MultiUplinkTest(self, uplinks, throughput_url=url, **options).run()
+        except Exception as e:
+            print(f"多線路測試錯誤: {e}")
+            return {'success': False, 'error': str(e)}
+            
+    def get_public_ip(self, version=4, refresh=False):
+        """獲取公網IP地址（version 為 4 或 6），無法取得時回傳 None
+
+        所有服務同時查詢並快取結果，重複呼叫直接取自快取
+        """
+        return self.public_ip.get(version, refresh)['address']
+
+    def get_public_ips(self, refresh=False):
+        """同時獲取 IPv4 與 IPv6 公網地址，回傳 {'ipv4': 地址或 None, 'ipv6': 地址或 None}"""
+        return {key: result['address'] for key, result in self.public_ip.get_all(refresh).items()}
 
 
 if __name__ == "__main__":
@@ -369,6 +570,12 @@ if __name__ == "__main__":
     print(f"連線狀態: {'正常' if connectivity['connected'] else '異常'}")
     if connectivity['ping']:
         print(f"平均延遲: {connectivity['ping']:.2f} ms")
+    if not connectivity['connected']:
+        trace = internet_test.trace_path()
+        if trace['success']:
+            last = trace['last_hop']
+            print(f"路徑追蹤: 最後回應節點 {last['address'] if last else '無'}"
+                  f"（第 {last['ttl'] if last else 0} 跳）")
         
     print("\n測試網路速度...")
     speed_result = internet_test.test_speed()
@@ -379,8 +586,9 @@ if __name__ == "__main__":
         print(f"速度測試失敗: {speed_result['error']}")
         
     print("\n獲取公網IP...")
-    public_ip = internet_test.get_public_ip()
-    if public_ip:
-        print(f"公網IP: {public_ip}")
-    else:
-        print("無法獲取公網IP")
+    public_ips = internet_test.get_public_ips()
+    for key, address in public_ips.items():
+        if address:
+            print(f"公網IP（{key}）: {address}")
+        else:
+            print(f"無法獲取公網IP（{key}）")
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+延遲直方圖模組
+功能：以對數分桶的固定大小陣列記錄延遲（HDR Histogram 做法），可合併並計算百分位數
+"""
+
+import threading
+
+
+DEFAULT_PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+_NO_MIN = float('inf')
+
+
+class LatencyHistogram:
+    """對數-線性分桶延遲直方圖
+
+    數值以微秒整數記錄。小於 sub_bucket_count 的數值各自一桶（精確），
+    更大的數值每個 2 的次方區間再均分為 sub_bucket_count / 2 桶，
+    相對誤差不超過 2 / sub_bucket_count（預設 256 桶，誤差 < 0.8%）。
+    計數存放在建立時配置的固定長度串列（比 array('Q') 的遞增快約三倍），
+    記憶體大小與記錄筆數無關；單一實例非執行緒安全，跨執行緒請使用 merge 或 LatencyRecorder
+    """
+
+    __slots__ = ('highest_us', '_sub_bits', '_sub_count', '_half', '_length',
+                 'counts', 'total', 'sum_us', 'min_us', 'max_us')
+
+    def __init__(self, highest_ms=3600000.0, sub_bucket_bits=8):
+        self.highest_us = int(highest_ms * 1000)
+        self._sub_bits = sub_bucket_bits
+        self._sub_count = 1 << sub_bucket_bits
+        self._half = self._sub_count >> 1
+        shifts = max(self.highest_us.bit_length() - sub_bucket_bits, 0)
+        self._length = self._sub_count + shifts * self._half
+        self.counts = [0] * self._length
+        self.total = 0
+        self.sum_us = 0
+        # 沒有資料時 min_us 為無限大
+        self.min_us = _NO_MIN
+        self.max_us = 0
+
+    def __len__(self):
+        return self.total
+
+    def _index(self, value):
+        if value < self._sub_count:
+            return value
+        # 等同 sub_count + (shift - 1) * half + (value >> shift) - half
+        shift = value.bit_length() - self._sub_bits
+        index = (shift << (self._sub_bits - 1)) + (value >> shift)
+        # 超過上限的數值計入最後一桶（max 仍保留實際值）
+        return index if index < self._length else self._length - 1
+
+    def _highest_equivalent(self, index):
+        """該桶涵蓋的最大數值（微秒）"""
+        if index < self._sub_count:
+            return index
+        offset = index - self._sub_count
+        shift = offset // self._half + 1
+        sub = offset % self._half + self._half
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value_ms):
+        """記錄一筆延遲（毫秒）"""
+        value = int(value_ms * 1000)
+        if value < self._sub_count:
+            if value < 0:
+                value = 0
+            index = value
+        else:
+            shift = value.bit_length() - self._sub_bits
+            index = (shift << (self._sub_bits - 1)) + (value >> shift)
+            if index >= self._length:
+                index = self._length - 1
+        self.counts[index] += 1
+        self.total += 1
+        self.sum_us += value
+        if value < self.min_us:
+            self.min_us = value
+        if value > self.max_us:
+            self.max_us = value
+
+    def record_many(self, values_ms):
+        """批次記錄多筆延遲（毫秒），以區域變數減少屬性存取"""
+        counts = self.counts
+        sub_count = self._sub_count
+        sub_bits = self._sub_bits
+        half_bits = sub_bits - 1
+        last = self._length - 1
+        total = 0
+        sum_us = 0
+        low = self.min_us
+        high = self.max_us
+        for value_ms in values_ms:
+            value = int(value_ms * 1000)
+            if value < sub_count:
+                if value < 0:
+                    value = 0
+                index = value
+            else:
+                shift = value.bit_length() - sub_bits
+                index = (shift << half_bits) + (value >> shift)
+                if index > last:
+                    index = last
+            counts[index] += 1
+            total += 1
+            sum_us += value
+            if value < low:
+                low = value
+            if value > high:
+                high = value
+        self.total += total
+        self.sum_us += sum_us
+        self.min_us = low
+        self.max_us = high
+
+    def merge(self, other):
+        """合併另一個相同設定的直方圖"""
+        if other._length != self._length or other._sub_bits != self._sub_bits:
+            raise ValueError("直方圖設定不同，無法合併")
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.min_us = min(self.min_us, other.min_us)
+        self.max_us = max(self.max_us, other.max_us)
+        return self
+
+    def copy(self):
+        result = LatencyHistogram.__new__(LatencyHistogram)
+        for name in LatencyHistogram.__slots__:
+            setattr(result, name, getattr(self, name))
+        result.counts = list(self.counts)
+        return result
+
+    def reset(self):
+        self.counts = [0] * self._length
+        self.total = 0
+        self.sum_us = 0
+        self.min_us = _NO_MIN
+        self.max_us = 0
+
+    def percentiles(self, percentiles=DEFAULT_PERCENTILES):
+        """一次走訪計算多個百分位數，回傳 {百分位: 毫秒}；沒有資料時數值為 None"""
+        if not self.total:
+            return {percentile: None for percentile in percentiles}
+
+        targets = sorted((max(1, -(-self.total * percentile // 100)), percentile)
+                         for percentile in percentiles)
+        result = {}
+        position = 0
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            cumulative += count
+            while position < len(targets) and cumulative >= targets[position][0]:
+                # 回報桶的上界，並限制在實際最小/最大值之間
+                value = min(max(self._highest_equivalent(index), self.min_us), self.max_us)
+                result[targets[position][1]] = value / 1000
+                position += 1
+            if position == len(targets):
+                break
+        return {percentile: result.get(percentile, self.max_us / 1000)
+                for percentile in percentiles}
+
+    def percentile(self, percentile):
+        return self.percentiles((percentile,))[percentile]
+
+    def summary(self, percentiles=DEFAULT_PERCENTILES):
+        """回傳 {'count', 'sum', 'min', 'mean', 'max', 'p50', 'p90', 'p99', 'p99.9'}（毫秒）"""
+        result = {
+            'count': self.total,
+            'sum': self.sum_us / 1000,
+            'min': self.min_us / 1000 if self.total else None,
+            'mean': self.sum_us / self.total / 1000 if self.total else None,
+            'max': self.max_us / 1000 if self.total else None
+        }
+        for percentile, value in self.percentiles(percentiles).items():
+            result[f'p{percentile:g}'] = value
+        return result
+
+
+class LatencyRecorder:
+    """依目標分開記錄延遲的共用元件（執行緒安全）
+
+    目標名稱建議為「類型 目標」，例如 'ping 8.8.8.8'、'tcp google.com:80'、'GET example.com/api'
+    """
+
+    def __init__(self, highest_ms=3600000.0, sub_bucket_bits=8):
+        self.highest_ms = highest_ms
+        self.sub_bucket_bits = sub_bucket_bits
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def _new_histogram(self):
+        return LatencyHistogram(self.highest_ms, self.sub_bucket_bits)
+
+    def record(self, target, value_ms):
+        """記錄一筆延遲（毫秒）"""
+        with self._lock:
+            histogram = self._histograms.get(target)
+            if histogram is None:
+                histogram = self._histograms[target] = self._new_histogram()
+            histogram.record(value_ms)
+
+    def merge(self, other):
+        """合併另一個記錄器（例如各執行緒各自記錄後彙總）"""
+        with other._lock:
+            items = [(target, histogram.copy()) for target, histogram in other._histograms.items()]
+        with self._lock:
+            for target, histogram in items:
+                existing = self._histograms.get(target)
+                if existing is None:
+                    self._histograms[target] = histogram
+                else:
+                    existing.merge(histogram)
+        return self
+
+    def targets(self):
+        with self._lock:
+            return list(self._histograms)
+
+    def histogram(self, target):
+        """回傳目標直方圖的複本，沒有資料時回傳 None"""
+        with self._lock:
+            histogram = self._histograms.get(target)
+            return histogram.copy() if histogram is not None else None
+
+    def summary(self, prefix=None, percentiles=DEFAULT_PERCENTILES):
+        """回傳 {目標: 統計}；prefix 可只取特定類型，例如 'ping '"""
+        with self._lock:
+            items = [(target, histogram.copy()) for target, histogram in self._histograms.items()
+                     if prefix is None or target.startswith(prefix)]
+        return {target: histogram.summary(percentiles) for target, histogram in items}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+if __name__ == "__main__":
+    # 測試代碼：記錄一百萬筆模擬延遲並顯示百分位數與每筆耗時
+    import time
+    import random
+
+    rng = random.Random(1)
+    values = [rng.lognormvariate(3, 0.5) for _ in range(1000000)]
+    histogram = LatencyHistogram()
+
+    start = time.perf_counter()
+    for value in values:
+        histogram.record(value)
+    elapsed = time.perf_counter() - start
+    print(f"record: {elapsed / len(values) * 1e9:.0f} ns/筆，{len(histogram.counts)} 個分桶")
+
+    batch = LatencyHistogram()
+    start = time.perf_counter()
+    batch.record_many(values)
+    elapsed = time.perf_counter() - start
+    print(f"record_many: {elapsed / len(values) * 1e9:.0f} ns/筆")
+    for key, value in histogram.summary().items():
+        print(f"  {key}: {value:.3f}" if isinstance(value, float) else f"  {key}: {value}")
+
+    values.sort()
+    print(f"  實際 p99: {values[int(len(values) * 0.99) - 1]:.3f}")
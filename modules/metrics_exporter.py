@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+監控指標匯出模組
+功能：以 Prometheus / OpenMetrics 文字格式在 HTTP /metrics 提供介面計數、DHCP掃描與外網連線結果
+"""
+
+import math
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+METRIC_PREFIX = 'dhcp_finder'
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# (指標名稱, COUNTER_FIELDS 欄位, 說明)
+INTERFACE_COUNTERS = (
+    ('interface_receive_bytes', 'bytes_recv', 'Bytes received on the interface'),
+    ('interface_transmit_bytes', 'bytes_sent', 'Bytes transmitted on the interface'),
+    ('interface_receive_packets', 'packets_recv', 'Packets received on the interface'),
+    ('interface_transmit_packets', 'packets_sent', 'Packets transmitted on the interface'),
+    ('interface_receive_errors', 'errin', 'Receive errors on the interface'),
+    ('interface_transmit_errors', 'errout', 'Transmit errors on the interface'),
+    ('interface_receive_drops', 'dropin', 'Inbound packets dropped on the interface'),
+    ('interface_transmit_drops', 'dropout', 'Outbound packets dropped on the interface'),
+)
+
+# LatencyRecorder 百分位數對應的 quantile 標籤；固定字串避免浮點運算產生 0.9990000000000001
+QUANTILE_LABELS = {'p50': '0.5', 'p90': '0.9', 'p99': '0.99', 'p99.9': '0.999'}
+
+
+def escape_label_value(value):
+    """依文字格式規定跳脫標籤值中的反斜線、雙引號與換行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    """數值轉為文字格式（布林轉 0/1，支援 NaN 與正負無限大）"""
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+class MetricFamily:
+    """同名指標的集合
+
+    name 不含前綴；counter 類型的樣本名稱會自動加上 _total，
+    summary 的 _sum / _count 樣本以 add() 的 suffix 指定
+    """
+
+    __slots__ = ('name', 'metric_type', 'help_text', 'samples')
+
+    def __init__(self, name, metric_type, help_text):
+        self.name = f"{METRIC_PREFIX}_{name}"
+        self.metric_type = metric_type
+        self.help_text = help_text
+        self.samples = []
+
+    def add(self, value, labels=None, suffix=''):
+        """加入一個樣本；value 為 None 時略過（未知數值不輸出）"""
+        if value is None:
+            return
+        if labels:
+            label_text = ','.join(f'{key}="{escape_label_value(label)}"'
+                                  for key, label in labels.items())
+            label_text = '{' + label_text + '}'
+        else:
+            label_text = ''
+        self.samples.append((suffix, label_text, format_value(value)))
+
+    def render(self, openmetrics=False):
+        """輸出文字格式；沒有樣本的指標不輸出"""
+        if not self.samples:
+            return ''
+        sample_name = self.name + '_total' if self.metric_type == 'counter' else self.name
+        # OpenMetrics 的 counter 家族名稱不含 _total，Prometheus 0.0.4 則與樣本同名
+        family_name = self.name if openmetrics else sample_name
+        lines = [f"# HELP {family_name} {self.help_text}",
+                 f"# TYPE {family_name} {self.metric_type}"]
+        lines.extend(f"{sample_name}{suffix}{labels} {value}"
+                     for suffix, labels, value in self.samples)
+        return '\n'.join(lines) + '\n'
+
+
+def render_families(families, openmetrics=False):
+    """將多個 MetricFamily 輸出為單一文字區塊"""
+    return ''.join(family.render(openmetrics) for family in families)
+
+
+class ScheduledCollector:
+    """依固定週期在背景執行的收集器
+
+    每次執行後立即將結果預先轉為兩種文字格式並快取，
+    抓取端只讀取快取，不會觸發任何掃描
+    """
+
+    def __init__(self, name, collect, interval):
+        self.name = name
+        self.collect = collect
+        self.interval = interval
+        self.blocks = {False: b'', True: b''}
+        self.runs = 0
+        self.failures = 0
+        self.last_success = None
+        self.last_duration = None
+        self.last_error = None
+
+    def run_once(self):
+        """執行一次收集，成功回傳 True"""
+        start = time.perf_counter()
+        self.runs += 1
+        try:
+            families = self.collect()
+            self.blocks = {
+                False: render_families(families, False).encode('utf-8'),
+                True: render_families(families, True).encode('utf-8')
+            }
+            self.last_success = time.time()
+            self.last_error = None
+            return True
+        except Exception as e:
+            # 失敗時保留上一次的結果，由 collector_up 指標反映狀態
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"收集 {self.name} 指標錯誤: {e}")
+            return False
+        finally:
+            self.last_duration = time.perf_counter() - start
+
+
+class MetricsExporter:
+    """Prometheus / OpenMetrics 匯出器
+
+    介面計數成本低，預設每 5 秒收集；DHCP掃描與外網連線測試成本高，
+    各自以較長週期在獨立執行緒執行。每個收集器完成後重新組合整份回應並快取，
+    /metrics 只回傳快取的位元組，抓取耗時與序列數量無關
+    """
+
+    def __init__(self, network_info=None, dhcp_scanner=None, internet_test=None,
+                 interface_interval=5.0, dhcp_interval=300.0, connectivity_interval=60.0):
+        self.network_info = network_info
+        self.dhcp_scanner = dhcp_scanner
+        self.internet_test = internet_test
+        self.collectors = []
+        self._lock = threading.Lock()
+        self._payload = {False: b'', True: b'# EOF\n'}
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._server = None
+        self._server_thread = None
+
+        if network_info is not None and interface_interval:
+            self.add_collector('interfaces', self.collect_interfaces, interface_interval)
+        if dhcp_scanner is not None and dhcp_interval:
+            self.add_collector('dhcp', self.collect_dhcp, dhcp_interval)
+        if internet_test is not None and connectivity_interval:
+            self.add_collector('connectivity', self.collect_connectivity, connectivity_interval)
+
+    def add_collector(self, name, collect, interval):
+        """加入自訂收集器；collect 需回傳 MetricFamily 串列"""
+        collector = ScheduledCollector(name, collect, interval)
+        self.collectors.append(collector)
+        return collector
+
+    # 收集器
+
+    def collect_interfaces(self):
+        """介面狀態與累計計數"""
+        snapshot = self.network_info.get_interface_snapshots()
+
+        up = MetricFamily('interface_up', 'gauge', 'Whether the interface is up (1) or down (0)')
+        mtu = MetricFamily('interface_mtu_bytes', 'gauge', 'Interface MTU')
+        speed = MetricFamily('interface_speed_bits_per_second', 'gauge', 'Negotiated link speed')
+        counters = [MetricFamily(name, 'counter', help_text)
+                    for name, _, help_text in INTERFACE_COUNTERS]
+
+        for interface in snapshot:
+            labels = {'interface': interface.name}
+            up.add(interface.is_up, labels)
+            mtu.add(interface.mtu, labels)
+            if interface.speed:
+                speed.add(interface.speed * 1000000, labels)
+            if interface.counters is not None:
+                for family, (_, field, _) in zip(counters, INTERFACE_COUNTERS):
+                    family.add(getattr(interface.counters, field), labels)
+
+        return [up, mtu, speed] + counters
+
+    def collect_dhcp(self):
+        """DHCP伺服器數量與回應延遲"""
+        start = time.perf_counter()
+        servers = self.dhcp_scanner.scan_dhcp_servers()
+        duration = time.perf_counter() - start
+
+        count = MetricFamily('dhcp_servers', 'gauge',
+                             'Number of DHCP servers found by the last scan')
+        info = MetricFamily('dhcp_server_info', 'gauge', 'DHCP server found by the last scan')
+        latency = MetricFamily('dhcp_server_response_seconds', 'gauge', 'DHCP OFFER response time')
+        scan_duration = MetricFamily('dhcp_scan_duration_seconds', 'gauge',
+                                     'Duration of the last DHCP scan')
+
+        count.add(len(servers))
+        scan_duration.add(duration)
+        for server in servers:
+            info.add(1, {
+                'ip': server['ip'],
+                'mac': server.get('mac', 'Unknown'),
+                'vendor': server.get('vendor', 'Unknown'),
+                'interface': server.get('interface', '')
+            })
+            if server.get('response_time') is not None:
+                latency.add(server['response_time'] / 1000, {
+                    'ip': server['ip'],
+                    'interface': server.get('interface', '')
+                })
+
+        return [count, info, latency, scan_duration]
+
+    def collect_connectivity(self):
+        """外網連線狀態與各項測試延遲"""
+        results = self.internet_test.test_connectivity()
+
+        connected = MetricFamily('internet_connected', 'gauge',
+                                 'Whether any connectivity test succeeded')
+        dns = MetricFamily('internet_dns_ok', 'gauge', 'Whether DNS resolution succeeded')
+        http = MetricFamily('internet_http_ok', 'gauge', 'Whether any HTTP test succeeded')
+        latency = MetricFamily('internet_latency_seconds', 'gauge',
+                               'Average ping / connect latency')
+        success = MetricFamily('probe_success', 'gauge', 'Result of each connectivity probe')
+        duration = MetricFamily('probe_duration_seconds', 'gauge',
+                                'Duration of each successful probe')
+
+        connected.add(results['connected'])
+        dns.add(results['dns'])
+        http.add(results['http'])
+        if results.get('ping') is not None:
+            latency.add(results['ping'] / 1000)
+        for detail in results.get('details', []):
+            labels = {'test': detail['test']}
+            success.add(detail['success'], labels)
+            if detail.get('time') is not None:
+                duration.add(detail['time'] / 1000, labels)
+
+        # 各目標累計的延遲分布（InternetTest.latency）
+        quantiles = MetricFamily('probe_latency_seconds', 'summary',
+                                 'Latency distribution per probe target')
+        recorder = getattr(self.internet_test, 'latency', None)
+        if recorder is not None:
+            for target, stats in recorder.summary().items():
+                for quantile, label in QUANTILE_LABELS.items():
+                    quantiles.add(stats[quantile] / 1000 if stats[quantile] is not None else None,
+                                  {'target': target, 'quantile': label})
+                quantiles.add(stats['sum'] / 1000, {'target': target}, '_sum')
+                quantiles.add(stats['count'], {'target': target}, '_count')
+
+        return [connected, dns, http, latency, success, duration, quantiles]
+
+    # 快取
+
+    def _status_families(self):
+        collector_up = MetricFamily('collector_up', 'gauge',
+                                    'Whether the last run of the collector succeeded')
+        last_success = MetricFamily('collector_last_success_timestamp_seconds', 'gauge',
+                                    'Unix time of the last successful collector run')
+        duration = MetricFamily('collector_duration_seconds', 'gauge',
+                                'Duration of the last collector run')
+        failures = MetricFamily('collector_failures', 'counter', 'Failed collector runs')
+
+        for collector in self.collectors:
+            if collector.runs == 0:
+                continue
+            labels = {'collector': collector.name}
+            collector_up.add(collector.last_error is None, labels)
+            last_success.add(collector.last_success, labels)
+            duration.add(collector.last_duration, labels)
+            failures.add(collector.failures, labels)
+
+        return [collector_up, last_success, duration, failures]
+
+    def _rebuild_payload(self):
+        with self._lock:
+            status = self._status_families()
+            payload = {}
+            for openmetrics in (False, True):
+                parts = [collector.blocks[openmetrics] for collector in self.collectors]
+                parts.append(render_families(status, openmetrics).encode('utf-8'))
+                if openmetrics:
+                    parts.append(b'# EOF\n')
+                payload[openmetrics] = b''.join(parts)
+            self._payload = payload
+
+    def run_collector(self, collector):
+        """執行單一收集器並更新快取"""
+        result = collector.run_once()
+        self._rebuild_payload()
+        return result
+
+    def collect_all(self):
+        """同步執行所有收集器一次（測試或無排程時使用）"""
+        for collector in self.collectors:
+            self.run_collector(collector)
+
+    def render(self, openmetrics=False):
+        """回傳快取的回應內容（bytes），不會執行任何收集"""
+        return self._payload[openmetrics]
+
+    # 排程
+
+    def start(self, host='127.0.0.1', port=9808, serve=True):
+        """啟動所有收集器的背景排程，serve 為 True 時同時啟動 HTTP 伺服器"""
+        self._stop_event.clear()
+        for collector in self.collectors:
+            thread = threading.Thread(target=self._run, args=(collector,), daemon=True,
+                                      name=f"metrics-{collector.name}")
+            thread.start()
+            self._threads.append(thread)
+        if serve:
+            self.serve(host, port)
+
+    def stop(self):
+        """停止排程與 HTTP 伺服器"""
+        self._stop_event.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._server_thread is not None:
+            self._server_thread.join(timeout=5)
+            self._server_thread = None
+        # 收集器可能正在執行耗時掃描，不等待其結束（daemon 執行緒）
+        self._threads = []
+
+    def _run(self, collector):
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            self.run_collector(collector)
+            next_time += collector.interval
+            delay = next_time - time.monotonic()
+            if delay < 0:
+                next_time = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+
+    # HTTP
+
+    def serve(self, host='127.0.0.1', port=9808):
+        """在背景執行緒啟動 HTTP 伺服器，回傳實際綁定的 (host, port)"""
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/metrics':
+                    openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+                    body = exporter.render(openmetrics)
+                    if openmetrics:
+                        content_type = OPENMETRICS_CONTENT_TYPE
+                    else:
+                        content_type = PROMETHEUS_CONTENT_TYPE
+                    self._send(200, content_type, body)
+                elif path == '/':
+                    self._send(200, 'text/html; charset=utf-8',
+                               b'<html><body><a href="/metrics">Metrics</a></body></html>')
+                else:
+                    self._send(404, 'text/plain; charset=utf-8', b'Not Found\n')
+
+            def _send(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        self._server_thread = threading.Thread(target=self._server.serve_forever, daemon=True,
+                                               name='metrics-http')
+        self._server_thread.start()
+        return self._server.server_address[:2]
+
+    @property
+    def server_address(self):
+        return self._server.server_address[:2] if self._server is not None else None
+
+
+if __name__ == "__main__":
+    # 測試代碼（無GUI模式）：python -m modules.metrics_exporter [port]
+    import sys
+    from modules.network_info import NetworkInfo
+    from modules.dhcp_scanner import DHCPScanner
+    from modules.internet_test import InternetTest
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9808
+    exporter = MetricsExporter(NetworkInfo(), DHCPScanner(), InternetTest())
+    exporter.start(host='0.0.0.0', port=port)
+    print(f"指標服務已啟動: http://0.0.0.0:{port}/metrics")
+
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        exporter.stop()
+        print("\n指標服務已停止")
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Socket 綁定工具模組
+功能：將 socket 綁定到指定網路介面（SO_BINDTODEVICE）或來源地址，讓探測流量走指定的上行線路
+"""
+
+import socket
+import platform
+
+
+# Linux 的 SO_BINDTODEVICE（部分 Python 版本的 socket 模組未提供此常數）
+SO_BINDTODEVICE = getattr(socket, 'SO_BINDTODEVICE', 25)
+
+
+def bind_socket(sock, interface=None, source=None):
+    """將 socket 綁定到介面及/或來源地址
+
+    interface 只在 Linux 有效（SO_BINDTODEVICE：封包一律由該介面送出，不受預設路由影響；
+    Linux 5.7 以前需要 CAP_NET_RAW）；其他系統只綁定來源地址，實際出口仍由路由表決定。
+    source 與 socket 地址族不同時略過
+    """
+    if interface:
+        if platform.system() == 'Linux':
+            sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, interface.encode() + b'\0')
+        elif not source:
+            raise OSError(f'此系統不支援綁定介面 {interface}，請改用來源地址')
+    if source and address_family(source) == sock.family:
+        sock.bind((source, 0))
+
+
+def address_family(address):
+    """回傳 IP 地址的地址族，無法解析時回傳 None"""
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, address)
+            return family
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def create_connection(address, timeout=None, interface=None, source=None):
+    """與 socket.create_connection 相同，但先綁定介面與來源地址
+
+    指定 source 時只嘗試與來源地址相同地址族的目標地址
+    """
+    host, port = address
+    family = address_family(source) if source else 0
+    last_error = None
+    addresses = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+    for af, sock_type, proto, _, target in addresses:
+        sock = socket.socket(af, sock_type, proto)
+        try:
+            sock.settimeout(timeout)
+            bind_socket(sock, interface, source)
+            sock.connect(target)
+            return sock
+        except OSError as e:
+            sock.close()
+            last_error = e
+    raise last_error or OSError(f'無法解析 {host}')
+
+
+if __name__ == "__main__":
+    # 測試代碼：python -m modules.net_utils 介面 [主機] [埠]
+    import sys
+    import time
+
+    arguments = sys.argv[1:]
+    interface = arguments[0] if arguments else 'lo'
+    host = arguments[1] if len(arguments) > 1 else '127.0.0.1'
+    port = int(arguments[2]) if len(arguments) > 2 else 22
+    start = time.perf_counter()
+    try:
+        with create_connection((host, port), timeout=3, interface=interface) as sock:
+            print(f"經由 {interface} 連線 {host}:{port} 成功，"
+                  f"來源 {sock.getsockname()[0]}，{(time.perf_counter() - start) * 1000:.2f} ms")
+    except OSError as e:
+        print(f"經由 {interface} 連線 {host}:{port} 錯誤: {e}")
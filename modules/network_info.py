@@ -9,24 +9,45 @@ import netifaces
 import socket
 import subprocess
 import platform
-import re
+import ipaddress
+import struct
+
+from modules import rtnetlink
+from modules.route_lookup import RouteTable
+from modules.dns_config import DNSConfigProvider
+from modules.nic_stats import NicStatsCollector
+from modules import network_view
+from modules.network_model import (InterfaceAddress, InterfaceCounters, InterfaceSnapshot,
+                                   NetworkSnapshot)
 
 
 class NetworkInfo:
     """網路資訊獲取器"""
     
-    def __init__(self):
+    def __init__(self, provider='auto'):
+        """provider: 'auto'、'rtnetlink' 或 'psutil'；auto 在 Linux 上優先使用 rtnetlink"""
         self.system = platform.system()
+        self.provider = None
+        if provider == 'rtnetlink' or (provider == 'auto' and self.system == 'Linux'
+                                       and rtnetlink.is_supported()):
+            self.provider = rtnetlink.RtnetlinkProvider()
+        self._monitor = None
+        self.dns_config = DNSConfigProvider()
+        self._nic_stats = None
+        self._last_driver_stats = None
         
-    def get_interface_status(self, interface_name):
-        """獲取網路介面狀態"""
+    def get_interface_status(self, interface_name, if_stats=None):
+        """獲取網路介面狀態
+
+        if_stats 可傳入已擷取的 psutil.net_if_stats() 結果，避免重複讀取系統表
+        """
         try:
-            stats = psutil.net_if_stats()
+            stats = if_stats if if_stats is not None else psutil.net_if_stats()
             if interface_name in stats:
                 stat = stats[interface_name]
                 return {
                     'is_up': stat.isup,
-                    'speed': stat.speed if stat.speed > 0 else 'Unknown',
+                    'speed': stat.speed if stat.speed > 0 else None,
                     'mtu': stat.mtu,
                     'duplex': self._get_duplex_name(stat.duplex)
                 }
@@ -35,8 +56,8 @@ class NetworkInfo:
             
         return {
             'is_up': False,
-            'speed': 'Unknown',
-            'mtu': 'Unknown',
+            'speed': None,
+            'mtu': None,
             'duplex': 'Unknown'
         }
         
@@ -80,52 +101,31 @@ class NetworkInfo:
         return gateways
         
     def get_dns_servers(self):
-        """獲取DNS伺服器資訊"""
-        dns_servers = []
-        
+        """獲取DNS伺服器資訊
+
+        由 DNSConfigProvider 讀取本機設定（不送出任何查詢），設定檔未變更時直接使用快取
+        """
         try:
-            if self.system == "Windows":
-                # Windows系統使用nslookup獲取DNS
-                result = subprocess.run(['nslookup', 'google.com'], 
-                                      capture_output=True, text=True, timeout=10)
-                if result.returncode == 0:
-                    lines = result.stdout.split('\n')
-                    for line in lines:
-                        if 'Server:' in line:
-                            dns_ip = line.split(':')[-1].strip()
-                            if dns_ip and dns_ip != '127.0.0.1':
-                                dns_servers.append(dns_ip)
-                                
-                # 也嘗試從ipconfig獲取
-                result = subprocess.run(['ipconfig', '/all'], 
-                                      capture_output=True, text=True, timeout=10)
-                if result.returncode == 0:
-                    dns_pattern = r'DNS Servers.*?:\s*([0-9.]+)'
-                    matches = re.findall(dns_pattern, result.stdout)
-                    for match in matches:
-                        if match not in dns_servers:
-                            dns_servers.append(match)
-                            
-            else:
-                # Linux/Unix系統讀取/etc/resolv.conf
-                try:
-                    with open('/etc/resolv.conf', 'r') as f:
-                        for line in f:
-                            if line.startswith('nameserver'):
-                                dns_ip = line.split()[1]
-                                dns_servers.append(dns_ip)
-                except:
-                    pass
-                    
+            return self.dns_config.get_servers()
         except Exception as e:
             print(f"獲取DNS伺服器錯誤: {e}")
+            return []
             
-        return list(set(dns_servers))  # 去除重複
+    def get_dns_config(self):
+        """獲取完整DNS設定，包含搜尋網域與各介面（systemd-resolved）設定"""
+        try:
+            return self.dns_config.get_config()
+        except Exception as e:
+            print(f"獲取DNS設定錯誤: {e}")
+            return {'servers': [], 'search': [], 'links': {}}
         
-    def get_network_statistics(self, interface_name):
-        """獲取網路介面統計資訊"""
+    def get_network_statistics(self, interface_name, io_counters=None):
+        """獲取網路介面統計資訊
+
+        io_counters 可傳入已擷取的 psutil.net_io_counters(pernic=True) 結果
+        """
         try:
-            stats = psutil.net_io_counters(pernic=True)
+            stats = io_counters if io_counters is not None else psutil.net_io_counters(pernic=True)
             if interface_name in stats:
                 stat = stats[interface_name]
                 return {
@@ -143,110 +143,190 @@ class NetworkInfo:
             
         return None
         
+    def get_io_counters(self):
+        """一次取得所有介面的累計流量計數（原始數值），失敗時回傳空字典"""
+        if self.provider is not None:
+            try:
+                return self.provider.io_counters()
+            except Exception as e:
+                print(f"rtnetlink 擷取失敗，改用 psutil: {e}")
+                
+        try:
+            return psutil.net_io_counters(pernic=True)
+        except Exception as e:
+            print(f"獲取網路統計錯誤: {e}")
+            return {}
+            
+    def get_driver_statistics(self, interfaces=None):
+        """獲取網卡驅動層統計
+
+        包含完整介面計數（與 /sys/class/net/*/statistics 相同欄位）、ethtool 驅動計數、
+        環形緩衝區大小與各佇列計數。回傳 NicStatsSnapshot，失敗時回傳 None；
+        兩次快照的差值請使用 current.delta(previous)
+        """
+        try:
+            if self._nic_stats is None:
+                client = self.provider.client if self.provider is not None else None
+                self._nic_stats = NicStatsCollector(client)
+            return self._nic_stats.snapshot(interfaces)
+        except Exception as e:
+            print(f"獲取驅動統計錯誤: {e}")
+            return None
+            
+    def get_driver_statistics_delta(self, interfaces=None):
+        """回傳與上一次呼叫之間的驅動統計差值（含每秒速率與遺失/錯誤計數），第一次呼叫時回傳 None"""
+        current = self.get_driver_statistics(interfaces)
+        if current is None:
+            return None
+        previous, self._last_driver_stats = self._last_driver_stats, current
+        if previous is None:
+            return None
+        return current.delta(previous)
+        
     def format_bytes(self, bytes_value):
-        """格式化位元組數值"""
-        if bytes_value == 0:
-            return "0 B"
+        """格式化位元組數值（保留相容性，請改用 network_view.format_bytes）"""
+        return network_view.format_bytes(bytes_value)
+        
+    def collect_snapshot(self):
+        """擷取一次性的網路狀態快照
+
+        每種系統資料（介面狀態、流量計數、地址、閘道、DNS）每次呼叫只讀取一次，
+        之後在記憶體中依介面名稱合併，介面數量再多也只需 O(N) 的處理
+        """
+        snapshot = {
+            'if_stats': {},
+            'io_counters': {},
+            'if_addrs': {},
+            'gateways': {},
+            'dns_servers': [],
+            'dns_links': {}
+        }
+        
+        if self.provider is not None:
+            try:
+                snapshot.update(self.provider.collect())
+                snapshot['dns_servers'] = self.get_dns_servers()
+                snapshot['dns_links'] = self.get_dns_config()['links']
+                return snapshot
+            except Exception as e:
+                print(f"rtnetlink 擷取失敗，改用 psutil: {e}")
+                
+        try:
+            snapshot['if_stats'] = psutil.net_if_stats()
+        except Exception as e:
+            print(f"獲取介面狀態錯誤: {e}")
             
-        units = ['B', 'KB', 'MB', 'GB', 'TB']
-        unit_index = 0
+        try:
+            snapshot['io_counters'] = psutil.net_io_counters(pernic=True)
+        except Exception as e:
+            print(f"獲取網路統計錯誤: {e}")
+            
+        try:
+            snapshot['if_addrs'] = psutil.net_if_addrs()
+        except Exception as e:
+            print(f"獲取介面地址錯誤: {e}")
+            
+        snapshot['gateways'] = self.get_gateway_info()
+        snapshot['dns_servers'] = self.get_dns_servers()
+        snapshot['dns_links'] = self.get_dns_config()['links']
+        
+        return snapshot
         
-        while bytes_value >= 1024 and unit_index < len(units) - 1:
-            bytes_value /= 1024
-            unit_index += 1
+    def _resolve_gateway_owners(self, gateways, if_addrs):
+        """將閘道表的介面名稱對應到快照中的介面名稱
+
+        Windows 上 netifaces 以 GUID 命名介面，而 psutil 使用顯示名稱；
+        名稱無法直接對應時，改以閘道IP所在的IPv4子網路判斷所屬介面
+        """
+        subnets = []
+        for name, addrs in if_addrs.items():
+            for addr in addrs:
+                if addr.family == socket.AF_INET and addr.netmask:
+                    try:
+                        network = ipaddress.IPv4Network(f"{addr.address}/{addr.netmask}",
+                                                        strict=False)
+                        subnets.append((network, name))
+                    except ValueError:
+                        continue
+                        
+        def owner(interface, gw_ip):
+            if interface in if_addrs:
+                return interface
+            try:
+                ip = ipaddress.ip_address(gw_ip)
+            except ValueError:
+                return interface
+            for network, name in subnets:
+                if ip.version == 4 and ip in network:
+                    return name
+            return interface
             
-        return f"{bytes_value:.2f} {units[unit_index]}"
+        resolved = {}
+        for key, value in gateways.items():
+            if key == 'default':
+                resolved['default'] = dict(value, interface=owner(value['interface'], value['ip']))
+            else:
+                for gw in value:
+                    resolved.setdefault(owner(key, gw['ip']), []).append(gw)
+        return resolved
         
-    def get_network_interfaces(self):
-        """獲取所有網路介面資訊"""
+    def get_interface_snapshots(self):
+        """獲取所有網路介面的快照（NetworkSnapshot），所有數值保持原始型別"""
         interfaces = []
         
         try:
-            # 獲取閘道資訊
-            gateways = self.get_gateway_info()
-            
-            # 獲取DNS伺服器
-            dns_servers = self.get_dns_servers()
+            snapshot = self.collect_snapshot()
+            if_stats = snapshot['if_stats']
+            io_counters = snapshot['io_counters']
+            if_addrs = snapshot['if_addrs']
+            gateways = self._resolve_gateway_owners(snapshot['gateways'], if_addrs)
+            dns_servers = snapshot['dns_servers']
+            dns_links = snapshot['dns_links']
             
             # 遍歷所有網路介面
-            for interface_name in netifaces.interfaces():
+            for interface_name, addrs in if_addrs.items():
                 try:
                     # 跳過Loopback介面
                     if 'Loopback' in interface_name or interface_name.startswith('lo'):
                         continue
                         
-                    interface_info = {
-                        'name': interface_name,
-                        'display_name': interface_name,
-                        'status': 'Unknown',
-                        'type': 'Unknown',
-                        'addresses': []
-                    }
+                    interface = InterfaceSnapshot(interface_name)
                     
                     # 獲取介面狀態
-                    status_info = self.get_interface_status(interface_name)
-                    interface_info['status'] = 'Up' if status_info['is_up'] else 'Down'
-                    interface_info['speed'] = status_info['speed']
-                    interface_info['mtu'] = status_info['mtu']
-                    interface_info['duplex'] = status_info['duplex']
-                    
-                    # 獲取地址資訊
-                    addrs = netifaces.ifaddresses(interface_name)
+                    status_info = self.get_interface_status(interface_name, if_stats)
+                    interface.is_up = status_info['is_up']
+                    interface.speed = status_info['speed']
+                    interface.mtu = status_info['mtu']
+                    interface.duplex = status_info['duplex']
                     
-                    # IPv4地址
-                    if netifaces.AF_INET in addrs:
-                        for addr_info in addrs[netifaces.AF_INET]:
-                            interface_info['ip'] = addr_info.get('addr', 'N/A')
-                            interface_info['netmask'] = addr_info.get('netmask', 'N/A')
-                            interface_info['broadcast'] = addr_info.get('broadcast', 'N/A')
-                            
-                            interface_info['addresses'].append({
-                                'family': 'IPv4',
-                                'address': addr_info.get('addr', 'N/A'),
-                                'netmask': addr_info.get('netmask', 'N/A'),
-                                'broadcast': addr_info.get('broadcast', 'N/A')
-                            })
+                    for addr in addrs:
+                        if addr.family == socket.AF_INET:
+                            interface.addresses.append(InterfaceAddress(
+                                'IPv4', addr.address, addr.netmask, addr.broadcast))
+                        elif addr.family == socket.AF_INET6:
+                            interface.addresses.append(InterfaceAddress(
+                                'IPv6', addr.address, addr.netmask))
+                        elif addr.family == psutil.AF_LINK and interface.mac is None:
+                            interface.mac = addr.address
                             
-                    # IPv6地址
-                    if netifaces.AF_INET6 in addrs:
-                        for addr_info in addrs[netifaces.AF_INET6]:
-                            interface_info['addresses'].append({
-                                'family': 'IPv6',
-                                'address': addr_info.get('addr', 'N/A'),
-                                'netmask': addr_info.get('netmask', 'N/A')
-                            })
-                            
-                    # MAC地址
-                    if netifaces.AF_LINK in addrs:
-                        mac_info = addrs[netifaces.AF_LINK][0]
-                        interface_info['mac'] = mac_info.get('addr', 'N/A')
-                        
                     # 閘道資訊
                     if interface_name in gateways:
-                        interface_info['gateways'] = gateways[interface_name]
+                        interface.gateways = gateways[interface_name]
                     elif 'default' in gateways and gateways['default']['interface'] == interface_name:
-                        interface_info['gateway'] = gateways['default']['ip']
-                        interface_info['is_default'] = True
+                        interface.default_gateway = gateways['default']['ip']
                         
                     # 網路統計
-                    stats = self.get_network_statistics(interface_name)
-                    if stats:
-                        interface_info['statistics'] = {
-                            'bytes_sent': self.format_bytes(stats['bytes_sent']),
-                            'bytes_recv': self.format_bytes(stats['bytes_recv']),
-                            'packets_sent': stats['packets_sent'],
-                            'packets_recv': stats['packets_recv'],
-                            'errors_in': stats['errin'],
-                            'errors_out': stats['errout'],
-                            'drops_in': stats['dropin'],
-                            'drops_out': stats['dropout']
-                        }
+                    if interface_name in io_counters:
+                        interface.counters = InterfaceCounters.from_counters(
+                            io_counters[interface_name])
                         
-                    # DNS伺服器（只在主要介面顯示）
-                    if interface_info.get('is_default', False):
-                        interface_info['dns_servers'] = dns_servers
+                    # DNS伺服器（主要介面顯示全域設定，其他介面顯示各自的設定）
+                    if interface.default_gateway is not None:
+                        interface.dns_servers = dns_servers
+                    elif interface_name in dns_links and dns_links[interface_name]['servers']:
+                        interface.dns_servers = dns_links[interface_name]['servers']
                         
-                    interfaces.append(interface_info)
+                    interfaces.append(interface)
                     
                 except Exception as e:
                     print(f"處理介面 {interface_name} 時發生錯誤: {e}")
@@ -255,10 +335,48 @@ class NetworkInfo:
         except Exception as e:
             print(f"獲取網路介面錯誤: {e}")
             
-        return interfaces
+        return NetworkSnapshot(interfaces)
+        
+    def get_network_interfaces(self):
+        """獲取所有網路介面資訊
+
+        數值（速度、MTU、流量計數）維持原始整數，顯示格式請使用 network_view
+        """
+        return self.get_interface_snapshots().to_dicts()
         
+    def subscribe(self, callback):
+        """訂閱網路變更事件（介面、地址、路由、鄰居）
+
+        callback(event) 會收到 rtnetlink.NetworkEvent；第一次訂閱時啟動監聽執行緒。
+        回傳監聽器（其 snapshot() 為即時更新的網路模型），不支援時回傳 None
+        """
+        if self.system != 'Linux' or not rtnetlink.is_supported():
+            print("網路變更訂閱僅支援 Linux rtnetlink")
+            return None
+            
+        try:
+            if self._monitor is None:
+                self._monitor = rtnetlink.RtnetlinkMonitor()
+            self._monitor.add_callback(callback)
+            self._monitor.start()
+            return self._monitor
+        except Exception as e:
+            print(f"啟動網路變更監聽錯誤: {e}")
+            return None
+            
+    def unsubscribe(self, callback):
+        """取消訂閱；沒有任何訂閱者時停止監聽執行緒"""
+        if self._monitor is None:
+            return
+        self._monitor.remove_callback(callback)
+        if self._monitor.callback_count == 0:
+            self._monitor.stop()
+            
     def get_routing_table(self):
-        """獲取路由表資訊"""
+        """獲取路由表資訊
+
+        Windows 解析 route print；Linux 使用 rtnetlink 或讀取 /proc/net/route 與 /proc/net/ipv6_route
+        """
         routes = []
         
         try:
@@ -286,13 +404,139 @@ class NetworkInfo:
                                     'netmask': parts[1],
                                     'gateway': parts[2],
                                     'interface': parts[3],
-                                    'metric': parts[4]
+                                    'metric': parts[4],
+                                    'family': 'IPv4',
+                                    'prefix_len': self._netmask_to_prefix(parts[1])
                                 })
                                 
+            elif self.provider is not None:
+                try:
+                    routes = self._get_rtnetlink_routes()
+                except Exception as e:
+                    print(f"rtnetlink 擷取失敗，改用 /proc: {e}")
+                    routes = self._get_proc_routes()
+                    
+            elif self.system == "Linux":
+                routes = self._get_proc_routes()
+                
         except Exception as e:
             print(f"獲取路由表錯誤: {e}")
             
         return routes
+        
+    def _netmask_to_prefix(self, netmask):
+        """將IPv4遮罩轉為前綴長度，無法解析時回傳 None"""
+        try:
+            return ipaddress.IPv4Network(f"0.0.0.0/{netmask}").prefixlen
+        except ValueError:
+            return None
+            
+    def _route_entry(self, family, destination, prefix_len, gateway, interface, metric):
+        bits = 32 if family == socket.AF_INET else 128
+        mask = ((1 << bits) - 1) ^ ((1 << (bits - prefix_len)) - 1)
+        return {
+            'destination': destination,
+            'netmask': socket.inet_ntop(family, mask.to_bytes(bits // 8, 'big')),
+            'gateway': gateway,
+            'interface': interface,
+            'metric': str(metric),
+            'family': 'IPv4' if family == socket.AF_INET else 'IPv6',
+            'prefix_len': prefix_len
+        }
+        
+    def _get_rtnetlink_routes(self):
+        """由 rtnetlink 取得主路由表（與 ip route / ip -6 route 相同）"""
+        client = self.provider.client
+        names = {link.index: link.name for link in client.dump_links()}
+        routes = []
+        for route in client.dump_routes():
+            if route.table != rtnetlink.RT_TABLE_MAIN:
+                continue
+            unspecified = '0.0.0.0' if route.family == socket.AF_INET else '::'
+            routes.append(self._route_entry(
+                route.family,
+                route.dst or unspecified,
+                route.dst_len,
+                route.gateway or unspecified,
+                names.get(route.oif, str(route.oif)),
+                route.priority
+            ))
+        return routes
+        
+    def _get_proc_routes(self):
+        """讀取 /proc/net/route（IPv4 主路由表）與 /proc/net/ipv6_route"""
+        routes = []
+        
+        try:
+            with open('/proc/net/route', 'r') as f:
+                next(f, None)  # 標題列
+                for line in f:
+                    parts = line.split()
+                    if len(parts) < 8 or not int(parts[3], 16) & 0x1:  # RTF_UP
+                        continue
+                    destination = socket.inet_ntoa(struct.pack('<I', int(parts[1], 16)))
+                    gateway = socket.inet_ntoa(struct.pack('<I', int(parts[2], 16)))
+                    prefix_len = bin(int(parts[7], 16)).count('1')
+                    routes.append(self._route_entry(socket.AF_INET, destination, prefix_len,
+                                                    gateway, parts[0], int(parts[6])))
+        except OSError as e:
+            print(f"讀取 /proc/net/route 錯誤: {e}")
+            
+        try:
+            with open('/proc/net/ipv6_route', 'r') as f:
+                for line in f:
+                    parts = line.split()
+                    flags = int(parts[8], 16) if len(parts) >= 10 else 0
+                    # 只保留 RTF_UP，略過本機地址路由（RTF_LOCAL，屬於 local 表）
+                    if not flags & 0x1 or flags & 0x80000000:
+                        continue
+                    destination = socket.inet_ntop(socket.AF_INET6, bytes.fromhex(parts[0]))
+                    gateway = socket.inet_ntop(socket.AF_INET6, bytes.fromhex(parts[4]))
+                    routes.append(self._route_entry(socket.AF_INET6, destination, int(parts[1], 16),
+                                                    gateway, parts[9], int(parts[5], 16)))
+        except OSError as e:
+            print(f"讀取 /proc/net/ipv6_route 錯誤: {e}")
+            
+        return routes
+        
+    def build_route_index(self, routes=None):
+        """以路由表建立最長前綴比對索引（RouteTable）"""
+        if routes is None:
+            routes = self.get_routing_table()
+            
+        table = RouteTable()
+        for route in routes:
+            if route.get('prefix_len') is None:
+                continue
+            try:
+                metric = int(route.get('metric', 0))
+            except ValueError:
+                metric = 0
+            try:
+                table.add(f"{route['destination']}/{route['prefix_len']}", route, metric)
+            except ValueError:
+                continue
+        return table
+        
+    def lookup_route(self, destination, route_index=None):
+        """查詢送往 destination 的流量會使用哪條路由
+
+        回傳路由資訊並加上 next_hop（直連網段時為目的地址本身），無路由時回傳 None
+        """
+        if route_index is None:
+            route_index = self.build_route_index()
+            
+        route = route_index.lookup(destination)
+        if route is None:
+            return None
+            
+        result = dict(route)
+        gateway = route.get('gateway', '')
+        if gateway in ('0.0.0.0', '::', 'On-link', ''):
+            result['next_hop'] = destination
+        else:
+            result['next_hop'] = gateway
+        return result
 
 
 if __name__ == "__main__":
@@ -304,7 +548,7 @@ if __name__ == "__main__":
     for interface in interfaces:
         print(f"\n介面名稱: {interface['name']}")
         print(f"狀態: {interface['status']}")
-        print(f"IP地址: {interface.get('ip', 'N/A')}")
-        print(f"MAC地址: {interface.get('mac', 'N/A')}")
-        print(f"速度: {interface.get('speed', 'N/A')}")
+        print(f"IP地址: {network_view.display_value(interface.get('ip'))}")
+        print(f"MAC地址: {network_view.display_value(interface.get('mac'))}")
+        print(f"速度: {network_view.format_speed(interface.get('speed'))}")
         print("-" * 40)
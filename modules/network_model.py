@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+網路狀態資料模型
+功能：以原始數值保存介面快照，格式化交由 network_view 處理
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+# 計數欄位順序（與 psutil.net_io_counters 相同）
+COUNTER_FIELDS = (
+    'bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+    'errin', 'errout', 'dropin', 'dropout'
+)
+
+
+class InterfaceCounters:
+    """介面累計計數（原始整數）"""
+
+    __slots__ = COUNTER_FIELDS
+
+    def __init__(self, bytes_sent: int = 0, bytes_recv: int = 0, packets_sent: int = 0,
+                 packets_recv: int = 0, errin: int = 0, errout: int = 0,
+                 dropin: int = 0, dropout: int = 0):
+        self.bytes_sent = bytes_sent
+        self.bytes_recv = bytes_recv
+        self.packets_sent = packets_sent
+        self.packets_recv = packets_recv
+        self.errin = errin
+        self.errout = errout
+        self.dropin = dropin
+        self.dropout = dropout
+
+    @classmethod
+    def from_counters(cls, counters) -> 'InterfaceCounters':
+        """由 psutil / rtnetlink 的計數記錄建立"""
+        return cls(*counters[:len(COUNTER_FIELDS)])
+
+    def as_tuple(self) -> Tuple[int, ...]:
+        return tuple(getattr(self, field) for field in COUNTER_FIELDS)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            'bytes_sent': self.bytes_sent,
+            'bytes_recv': self.bytes_recv,
+            'packets_sent': self.packets_sent,
+            'packets_recv': self.packets_recv,
+            'errors_in': self.errin,
+            'errors_out': self.errout,
+            'drops_in': self.dropin,
+            'drops_out': self.dropout
+        }
+
+
+class InterfaceAddress:
+    """介面地址"""
+
+    __slots__ = ('family', 'address', 'netmask', 'broadcast')
+
+    def __init__(self, family: str, address: str, netmask: Optional[str] = None,
+                 broadcast: Optional[str] = None):
+        self.family = family
+        self.address = address
+        self.netmask = netmask
+        self.broadcast = broadcast
+
+    def to_dict(self) -> Dict[str, Optional[str]]:
+        result = {
+            'family': self.family,
+            'address': self.address,
+            'netmask': self.netmask
+        }
+        if self.family == 'IPv4':
+            result['broadcast'] = self.broadcast
+        return result
+
+
+class InterfaceSnapshot:
+    """單一介面在某一時間點的狀態
+
+    speed 單位為 Mbps，未知時為 None；mtu 未知時為 None
+    """
+
+    __slots__ = ('name', 'is_up', 'speed', 'mtu', 'duplex', 'mac', 'addresses',
+                 'gateways', 'default_gateway', 'dns_servers', 'counters')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.is_up = False
+        self.speed: Optional[int] = None
+        self.mtu: Optional[int] = None
+        self.duplex = 'Unknown'
+        self.mac: Optional[str] = None
+        self.addresses: List[InterfaceAddress] = []
+        self.gateways: List[Dict[str, object]] = []
+        self.default_gateway: Optional[str] = None
+        self.dns_servers: List[str] = []
+        self.counters: Optional[InterfaceCounters] = None
+
+    @property
+    def ipv4(self) -> Optional[InterfaceAddress]:
+        """最後一個IPv4地址（與舊版 ip 欄位相同）"""
+        for address in reversed(self.addresses):
+            if address.family == 'IPv4':
+                return address
+        return None
+
+    def to_dict(self) -> Dict[str, object]:
+        """轉為與 get_network_interfaces 相同結構的字典，數值維持原始型別"""
+        result = {
+            'name': self.name,
+            'display_name': self.name,
+            'status': 'Up' if self.is_up else 'Down',
+            'type': 'Unknown',
+            'addresses': [address.to_dict() for address in self.addresses],
+            'speed': self.speed,
+            'mtu': self.mtu,
+            'duplex': self.duplex
+        }
+        ipv4 = self.ipv4
+        if ipv4 is not None:
+            result['ip'] = ipv4.address
+            result['netmask'] = ipv4.netmask
+            result['broadcast'] = ipv4.broadcast
+        if self.mac is not None:
+            result['mac'] = self.mac
+        if self.gateways:
+            result['gateways'] = self.gateways
+        if self.default_gateway is not None:
+            result['gateway'] = self.default_gateway
+            result['is_default'] = True
+        if self.counters is not None:
+            result['statistics'] = self.counters.to_dict()
+        if self.dns_servers:
+            result['dns_servers'] = self.dns_servers
+        return result
+
+
+class NetworkSnapshot:
+    """一次收集得到的所有介面狀態"""
+
+    __slots__ = ('timestamp', 'interfaces')
+
+    def __init__(self, interfaces: List[InterfaceSnapshot], timestamp: Optional[float] = None):
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.interfaces = interfaces
+
+    def __iter__(self):
+        return iter(self.interfaces)
+
+    def __len__(self):
+        return len(self.interfaces)
+
+    def get(self, name: str) -> Optional[InterfaceSnapshot]:
+        for interface in self.interfaces:
+            if interface.name == name:
+                return interface
+        return None
+
+    def counters(self) -> Dict[str, Tuple[int, ...]]:
+        """{介面: 計數tuple}，可直接交給 ThroughputMonitor.sample / CounterStore.record"""
+        return {interface.name: interface.counters.as_tuple()
+                for interface in self.interfaces if interface.counters is not None}
+
+    def to_dicts(self) -> List[Dict[str, object]]:
+        return [interface.to_dict() for interface in self.interfaces]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+網路資訊顯示模組
+功能：將 NetworkInfo 回傳的原始數值轉為顯示用文字（GUI、終端機共用）
+"""
+
+
+def format_bytes(bytes_value):
+    """格式化位元組數值"""
+    if not bytes_value:
+        return "0 B"
+
+    units = ['B', 'KB', 'MB', 'GB', 'TB']
+    unit_index = 0
+
+    while bytes_value >= 1024 and unit_index < len(units) - 1:
+        bytes_value /= 1024
+        unit_index += 1
+
+    return f"{bytes_value:.2f} {units[unit_index]}"
+
+
+def format_rate(bytes_per_second):
+    """格式化每秒位元組數"""
+    return f"{format_bytes(bytes_per_second)}/s"
+
+
+def format_speed(speed_mbps):
+    """格式化連線速度（Mbps），未知時回傳 'Unknown'"""
+    if not speed_mbps:
+        return 'Unknown'
+    if speed_mbps >= 1000 and speed_mbps % 1000 == 0:
+        return f"{speed_mbps // 1000} Gbps"
+    return f"{speed_mbps} Mbps"
+
+
+def display_value(value, default='N/A'):
+    """None 或空值顯示為預設文字"""
+    if value is None or value == '':
+        return default
+    return str(value)
+
+
+def interface_lines(interface):
+    """將 get_network_interfaces 的單一介面資訊轉為顯示文字行"""
+    lines = [
+        f"介面名稱: {interface['name']}",
+        f"狀態: {interface['status']}",
+        f"IP地址: {display_value(interface.get('ip'))}",
+        f"子網路遮罩: {display_value(interface.get('netmask'))}",
+        f"MAC地址: {display_value(interface.get('mac'))}"
+    ]
+
+    if interface.get('speed'):
+        lines.append(f"速度: {format_speed(interface['speed'])}")
+    if interface.get('mtu'):
+        lines.append(f"MTU: {interface['mtu']}")
+    if interface.get('gateway'):
+        lines.append(f"預設閘道: {interface['gateway']}")
+
+    stats = interface.get('statistics')
+    if stats:
+        lines.append(f"已傳送: {format_bytes(stats['bytes_sent'])} ({stats['packets_sent']} 封包)")
+        lines.append(f"已接收: {format_bytes(stats['bytes_recv'])} ({stats['packets_recv']} 封包)")
+        if stats['errors_in'] > 0 or stats['errors_out'] > 0:
+            lines.append(f"錯誤: 輸入 {stats['errors_in']}, 輸出 {stats['errors_out']}")
+
+    return lines
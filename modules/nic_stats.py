@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+網卡驅動統計模組
+功能：批次讀取介面完整統計、ethtool 驅動計數、環形緩衝區大小與各佇列計數，並計算快照間差值
+"""
+
+import os
+import re
+import time
+import errno
+import ctypes
+import socket
+import struct
+import threading
+
+import psutil
+
+from modules import rtnetlink
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 沒有 ethtool，只提供介面計數
+    fcntl = None
+
+
+SYS_CLASS_NET = '/sys/class/net'
+
+# ethtool ioctl 常數（linux/ethtool.h、linux/sockios.h）
+SIOCETHTOOL = 0x8946
+ETHTOOL_GDRVINFO = 0x03
+ETHTOOL_GRINGPARAM = 0x10
+ETHTOOL_GSTRINGS = 0x1b
+ETHTOOL_GSTATS = 0x1d
+ETHTOOL_GSSET_INFO = 0x37
+ETHTOOL_GCHANNELS = 0x3c
+ETH_SS_STATS = 1
+ETH_GSTRING_LEN = 32
+
+_IFREQ_SIZE = 40
+_DRVINFO = struct.Struct('=I32s32s32s32s32s12sIIIII')
+_SSET_INFO = struct.Struct('=IIQI')
+_GSTRINGS_HEADER = struct.Struct('=III')
+_GSTATS_HEADER = struct.Struct('=II')
+_RINGPARAM = struct.Struct('=9I')
+_CHANNELS = struct.Struct('=9I')
+
+# 不支援 ethtool 的介面（迴路、虛擬介面等）回傳的錯誤
+_UNSUPPORTED_ERRORS = (errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENODEV, errno.EINVAL, errno.EPERM)
+
+# 佇列計數的名稱開頭；mlx5 的 rx_64_bytes_phy、rx_65_to_127_bytes_phy 等封包大小分布計數
+# 也是 rx_ + 數字開頭，需以已知名稱區分並排除 _phy 與 _to_ 區間
+_QUEUE_STATS = (r'(?:packets|bytes|drop|csum|cache|xdp|xsk|lro|gro|gso|tso|tls|wqe|cqe|mpwqe'
+                r'|xmit|stopped|wake|nop|buff|page|congst|recover|arfs|ecn|cnt|restart|alloc|bad'
+                r'|poll|napi|[umb]cast|multicast|broadcast|err|dim|timeout|missed|busy|full'
+                r'|linearize|vlan|encap|rsc|hw|kicks)')
+
+# 各驅動的佇列計數命名：virtio/ixgbe/ice 為 rx_queue_0_packets，mlx5 為 rx0_packets，
+# i40e 為 rx-0.packets，ena 為 queue_0_rx_cnt，bnxt 為 [0]: rx_ucast_packets
+_QUEUE_PATTERNS = (
+    re.compile(r'^(?P<dir>rx|tx)[_-]?(?:queue[_-]?)?(?P<queue>\d+)[_.]'
+               r'(?!to_)(?!.*_phy$)(?P<stat>' + _QUEUE_STATS + r'.*)$'),
+    re.compile(r'^queue[_-]?(?P<queue>\d+)[_-](?P<dir>rx|tx)[_-](?P<stat>.+)$'),
+    re.compile(r'^\[(?P<queue>\d+)\]:\s*(?P<dir>rx|tx)[_-](?P<stat>.+)$'),
+)
+
+# 代表封包遺失或資源不足的計數名稱，差值非零時列為警示
+PROBLEM_PATTERN = re.compile(
+    r'miss|fifo|drop|discard|over|err|no_?buf|nohandler|starv|alloc_fail|timeout|busy|full'
+)
+
+
+def split_queue_stats(stats):
+    """將 ethtool 計數拆為 (全域計數, {'rx': {佇列: {計數}}, 'tx': {...}})"""
+    totals = {}
+    queues = {'rx': {}, 'tx': {}}
+    for name, value in stats.items():
+        for pattern in _QUEUE_PATTERNS:
+            match = pattern.match(name)
+            if match:
+                queue = queues[match.group('dir')].setdefault(int(match.group('queue')), {})
+                queue[match.group('stat')] = value
+                break
+        else:
+            totals[name] = value
+    return totals, queues
+
+
+def _counter_delta(current, previous):
+    """計數差值；驅動重設計數（數值變小）時以目前值為差值"""
+    delta = current - previous
+    return delta if delta >= 0 else current
+
+
+def _dict_delta(current, previous):
+    return {name: _counter_delta(value, previous[name])
+            for name, value in current.items() if name in previous}
+
+
+class EthtoolClient:
+    """以 SIOCETHTOOL ioctl 讀取驅動資訊與統計
+
+    計數名稱表（GSTRINGS）每個介面只讀取一次並快取，
+    之後每次取樣只需一次 GSTATS ioctl
+    """
+
+    def __init__(self):
+        self._sock = None
+        self._lock = threading.Lock()
+        # 介面 -> 計數名稱 tuple；不支援的介面為空 tuple
+        self._names = {}
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+    def invalidate(self, name=None):
+        """清除計數名稱快取（驅動重新載入後使用）"""
+        with self._lock:
+            if name is None:
+                self._names.clear()
+            else:
+                self._names.pop(name, None)
+
+    def _ioctl(self, name, buffer):
+        if fcntl is None:
+            raise OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP))
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        ifreq = bytearray(_IFREQ_SIZE)
+        struct.pack_into('16sP', ifreq, 0, name.encode()[:15], ctypes.addressof(buffer))
+        fcntl.ioctl(self._sock.fileno(), SIOCETHTOOL, ifreq)
+
+    def _command(self, name, layout, cmd, extra_size=0):
+        """送出固定結構的 ethtool 命令，不支援時回傳 None"""
+        buffer = ctypes.create_string_buffer(layout.size + extra_size)
+        struct.pack_into('=I', buffer, 0, cmd)
+        try:
+            self._ioctl(name, buffer)
+        except OSError as e:
+            if e.errno in _UNSUPPORTED_ERRORS:
+                return None
+            raise
+        return buffer
+
+    def driver_info(self, name):
+        """回傳 {'driver', 'version', 'firmware', 'bus_info', 'n_stats'}，不支援時回傳 None"""
+        with self._lock:
+            buffer = self._command(name, _DRVINFO, ETHTOOL_GDRVINFO)
+        if buffer is None:
+            return None
+        fields = _DRVINFO.unpack_from(buffer)
+
+        def text(raw):
+            return raw.split(b'\0', 1)[0].decode('utf-8', 'replace')
+
+        return {
+            'driver': text(fields[1]),
+            'version': text(fields[2]),
+            'firmware': text(fields[3]),
+            'bus_info': text(fields[4]),
+            'n_stats': fields[8]
+        }
+
+    def _stat_count(self, name):
+        buffer = ctypes.create_string_buffer(_SSET_INFO.size)
+        _SSET_INFO.pack_into(buffer, 0, ETHTOOL_GSSET_INFO, 0, 1 << ETH_SS_STATS, 0)
+        try:
+            self._ioctl(name, buffer)
+            _, _, mask, count = _SSET_INFO.unpack_from(buffer)
+            return count if mask & (1 << ETH_SS_STATS) else 0
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRORS:
+                raise
+        # 舊驅動不支援 GSSET_INFO，改由驅動資訊取得數量
+        buffer = self._command(name, _DRVINFO, ETHTOOL_GDRVINFO)
+        return _DRVINFO.unpack_from(buffer)[8] if buffer is not None else 0
+
+    def _stat_names(self, name):
+        names = self._names.get(name)
+        if names is not None:
+            return names
+
+        count = self._stat_count(name)
+        names = ()
+        if count:
+            buffer = ctypes.create_string_buffer(_GSTRINGS_HEADER.size + count * ETH_GSTRING_LEN)
+            _GSTRINGS_HEADER.pack_into(buffer, 0, ETHTOOL_GSTRINGS, ETH_SS_STATS, count)
+            try:
+                self._ioctl(name, buffer)
+                count = _GSTRINGS_HEADER.unpack_from(buffer)[2]
+                start = _GSTRINGS_HEADER.size
+                raw = buffer.raw[start:start + count * ETH_GSTRING_LEN]
+                names = tuple(
+                    raw[i:i + ETH_GSTRING_LEN].split(b'\0', 1)[0].decode('utf-8', 'replace').strip()
+                    for i in range(0, len(raw), ETH_GSTRING_LEN))
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRORS:
+                    raise
+        self._names[name] = names
+        return names
+
+    def stats(self, name):
+        """回傳 {計數名稱: 數值}，不支援的介面回傳空字典"""
+        with self._lock:
+            names = self._stat_names(name)
+            if not names:
+                return {}
+            buffer = ctypes.create_string_buffer(_GSTATS_HEADER.size + len(names) * 8)
+            _GSTATS_HEADER.pack_into(buffer, 0, ETHTOOL_GSTATS, len(names))
+            try:
+                self._ioctl(name, buffer)
+            except OSError as e:
+                if e.errno in _UNSUPPORTED_ERRORS:
+                    return {}
+                raise
+            count = _GSTATS_HEADER.unpack_from(buffer)[1]
+            if count != len(names):
+                # 計數數量改變（例如調整佇列數），下次重新讀取名稱表
+                self._names.pop(name, None)
+                return {}
+            values = struct.unpack_from(f'={count}Q', buffer, _GSTATS_HEADER.size)
+        return dict(zip(names, values))
+
+    def ring_params(self, name):
+        """回傳環形緩衝區大小 {'rx', 'rx_max', 'tx', 'tx_max', ...}，不支援時回傳 None"""
+        with self._lock:
+            buffer = self._command(name, _RINGPARAM, ETHTOOL_GRINGPARAM)
+        if buffer is None:
+            return None
+        (_, rx_max, rx_mini_max, rx_jumbo_max, tx_max,
+         rx, rx_mini, rx_jumbo, tx) = _RINGPARAM.unpack_from(buffer)
+        return {
+            'rx': rx, 'rx_max': rx_max,
+            'rx_mini': rx_mini, 'rx_mini_max': rx_mini_max,
+            'rx_jumbo': rx_jumbo, 'rx_jumbo_max': rx_jumbo_max,
+            'tx': tx, 'tx_max': tx_max
+        }
+
+    def channels(self, name):
+        """回傳佇列（channel）數量 {'rx', 'tx', 'other', 'combined', 及各 _max}，不支援時回傳 None"""
+        with self._lock:
+            buffer = self._command(name, _CHANNELS, ETHTOOL_GCHANNELS)
+        if buffer is None:
+            return None
+        (_, max_rx, max_tx, max_other, max_combined,
+         rx, tx, other, combined) = _CHANNELS.unpack_from(buffer)
+        return {
+            'rx': rx, 'rx_max': max_rx,
+            'tx': tx, 'tx_max': max_tx,
+            'other': other, 'other_max': max_other,
+            'combined': combined, 'combined_max': max_combined
+        }
+
+
+def read_sysfs_statistics(name):
+    """讀取 /sys/class/net/<介面>/statistics（rtnetlink 無法使用時的備援）"""
+    stats = {}
+    directory = os.path.join(SYS_CLASS_NET, name, 'statistics')
+    try:
+        entries = os.listdir(directory)
+    except OSError:
+        return stats
+    for entry in entries:
+        try:
+            with open(os.path.join(directory, entry), 'r') as f:
+                stats[entry] = int(f.read())
+        except (OSError, ValueError):
+            continue
+    return stats
+
+
+class NicStatsSnapshot:
+    """某一時間點所有介面的驅動統計
+
+    interfaces: {介面: {'counters': {...}, 'ethtool': {...}, 'queues': {'rx': {...}, 'tx': {...}},
+                        'ring': {...} 或 None, 'channels': {...} 或 None, 'driver': str 或 None}}
+    """
+
+    __slots__ = ('timestamp', 'interfaces')
+
+    def __init__(self, interfaces, timestamp=None):
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self.interfaces = interfaces
+
+    def delta(self, previous):
+        """計算與較早快照的差值及每秒速率
+
+        回傳 {'interval': 秒,
+              'interfaces': {介面: {'counters', 'ethtool', 'queues', 'rates', 'problems'}}}，
+        problems 為遺失/錯誤類計數（含各佇列計數，名稱為 rx_queue_<佇列>_<計數>）中差值非零者，
+        依差值由大到小排列
+        """
+        interval = self.timestamp - previous.timestamp
+        result = {'interval': interval, 'interfaces': {}}
+        for name, current in self.interfaces.items():
+            before = previous.interfaces.get(name)
+            if before is None:
+                continue
+
+            counters = _dict_delta(current['counters'], before['counters'])
+            ethtool = _dict_delta(current['ethtool'], before['ethtool'])
+            queues = {}
+            for direction in ('rx', 'tx'):
+                queues[direction] = {
+                    queue: _dict_delta(stats, before['queues'][direction][queue])
+                    for queue, stats in current['queues'][direction].items()
+                    if queue in before['queues'][direction]
+                }
+
+            problems = {}
+            for source in (counters, ethtool):
+                for counter, value in source.items():
+                    if value and PROBLEM_PATTERN.search(counter):
+                        problems[counter] = value
+            # 單一佇列的遺失（例如 RSS 不平均造成某個佇列的環形緩衝區滿載）
+            for direction, direction_queues in queues.items():
+                for queue, stats in direction_queues.items():
+                    for stat, value in stats.items():
+                        if value and PROBLEM_PATTERN.search(stat):
+                            problems[f'{direction}_queue_{queue}_{stat}'] = value
+
+            result['interfaces'][name] = {
+                'counters': counters,
+                'ethtool': ethtool,
+                'queues': queues,
+                'rates': ({counter: value / interval for counter, value in counters.items()}
+                          if interval > 0 else {}),
+                'problems': dict(sorted(problems.items(), key=lambda item: item[1], reverse=True))
+            }
+        return result
+
+
+class NicStatsCollector:
+    """網卡驅動統計收集器
+
+    介面統計以一次 rtnetlink dump 取得所有介面的完整 rtnl_link_stats64
+    （與 /sys/class/net/*/statistics 相同欄位），每個介面再各以一次 GSTATS ioctl
+    取得驅動計數；環形緩衝區與佇列數量設定只在 include_config 時讀取
+    """
+
+    def __init__(self, client=None, ethtool=None):
+        self.client = client
+        if self.client is None and rtnetlink.is_supported():
+            self.client = rtnetlink.RtnetlinkClient()
+        self.ethtool = ethtool or EthtoolClient()
+
+    def _link_stats(self):
+        if self.client is not None:
+            try:
+                return self.client.dump_link_stats()
+            except OSError as e:
+                print(f"rtnetlink 讀取介面統計錯誤: {e}")
+        try:
+            names = os.listdir(SYS_CLASS_NET)
+        except OSError:
+            # 非 Linux 系統：以 psutil 計數對應到相同欄位名稱
+            return {name: {
+                'rx_packets': counters.packets_recv, 'tx_packets': counters.packets_sent,
+                'rx_bytes': counters.bytes_recv, 'tx_bytes': counters.bytes_sent,
+                'rx_errors': counters.errin, 'tx_errors': counters.errout,
+                'rx_dropped': counters.dropin, 'tx_dropped': counters.dropout
+            } for name, counters in psutil.net_io_counters(pernic=True).items()}
+        return {name: read_sysfs_statistics(name) for name in names}
+
+    def snapshot(self, interfaces=None, include_config=True):
+        """收集快照；interfaces 為要收集的介面名稱，None 表示全部"""
+        link_stats = self._link_stats()
+        timestamp = time.monotonic()
+        if interfaces is None:
+            names = link_stats.keys()
+        else:
+            names = [name for name in interfaces if name in link_stats]
+
+        result = {}
+        for name in names:
+            try:
+                ethtool = self.ethtool.stats(name)
+            except OSError as e:
+                print(f"讀取 {name} ethtool 統計錯誤: {e}")
+                ethtool = {}
+            totals, queues = split_queue_stats(ethtool)
+            entry = {
+                'counters': link_stats[name],
+                'ethtool': totals,
+                'queues': queues,
+                'ring': None,
+                'channels': None,
+                'driver': None
+            }
+            if include_config and ethtool:
+                try:
+                    entry['ring'] = self.ethtool.ring_params(name)
+                    entry['channels'] = self.ethtool.channels(name)
+                    info = self.ethtool.driver_info(name)
+                    entry['driver'] = info['driver'] if info else None
+                except OSError as e:
+                    print(f"讀取 {name} 驅動設定錯誤: {e}")
+            result[name] = entry
+        return NicStatsSnapshot(result, timestamp)
+
+
+if __name__ == "__main__":
+    # 測試代碼：顯示各介面驅動統計與兩次取樣間的遺失/錯誤計數
+    collector = NicStatsCollector()
+    first = collector.snapshot()
+    for name, entry in first.interfaces.items():
+        print(f"{name}: 驅動 {entry['driver'] or 'N/A'}，ethtool 計數 {len(entry['ethtool'])} 個，"
+              f"RX 佇列 {len(entry['queues']['rx'])}，TX 佇列 {len(entry['queues']['tx'])}")
+        if entry['ring']:
+            print(f"  環形緩衝區: RX {entry['ring']['rx']}/{entry['ring']['rx_max']}，"
+                  f"TX {entry['ring']['tx']}/{entry['ring']['tx_max']}")
+
+    time.sleep(1)
+    delta = collector.snapshot().delta(first)
+    for name, entry in delta['interfaces'].items():
+        rates = entry['rates']
+        print(f"{name}: RX {rates.get('rx_packets', 0):.0f} pps，"
+              f"TX {rates.get('tx_packets', 0):.0f} pps")
+        for counter, value in entry['problems'].items():
+            print(f"  ⚠ {counter}: +{value}")
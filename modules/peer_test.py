@@ -0,0 +1,621 @@
+# -*- coding: utf-8 -*-
+"""
+區網對測模組
+功能：類似 iperf 的伺服器/用戶端模式，在兩台主機之間測試多串流 TCP 吞吐量，
+以及 UDP 吞吐量、遺失率、抖動與亂序（帶序號與時間戳記的資料包），並提供每秒報告
+"""
+
+import os
+import json
+import time
+import errno
+import socket
+import struct
+import threading
+
+
+DEFAULT_PORT = 5201
+
+# 每條連線開頭的 4 位元組標記：控制連線或資料連線
+_CONTROL_MAGIC = b'DFPC'
+_DATA_MAGIC = b'DFPD'
+_COOKIE_SIZE = 16
+_STREAM_INDEX = struct.Struct('!H')
+
+# UDP 資料包標頭：序號、送出時間（奈秒）
+_UDP_HEADER = struct.Struct('!QQ')
+
+# TCP 收送緩衝區（預先配置，send/recv_into 重複使用）
+TCP_BUFFER_SIZE = 1 << 20
+DEFAULT_UDP_PACKET_SIZE = 1400
+# 單次補送的封包上限，避免排程落後時瞬間爆量
+_MAX_BURST = 64
+
+
+def _send_message(sock, message):
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def _read_message(reader):
+    line = reader.readline()
+    if not line:
+        raise ConnectionError('控制連線已關閉')
+    return json.loads(line)
+
+
+def _recv_exact(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('連線已關閉')
+        data += chunk
+    return data
+
+
+def _intervals(samples):
+    """由 (時間, 累計位元組) 樣本計算每個區間的吞吐量"""
+    intervals = []
+    for (start, before), (end, after) in zip(samples, samples[1:]):
+        if end > start:
+            intervals.append({'start': start, 'end': end, 'bytes': after - before,
+                              'mbps': (after - before) * 8 / (end - start) / 1_000_000})
+    return intervals
+
+
+# TCP
+
+def send_tcp(sockets, duration):
+    """各 socket 以獨立執行緒送出資料 duration 秒後關閉寫入端"""
+    payload = memoryview(os.urandom(TCP_BUFFER_SIZE))
+    deadline = time.perf_counter() + duration
+
+    def sender(sock):
+        try:
+            while time.perf_counter() < deadline:
+                sock.send(payload)
+        except OSError:
+            pass
+        try:
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    threads = [threading.Thread(target=sender, args=(sock,), daemon=True) for sock in sockets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def receive_tcp(sockets, duration, interval=1.0, on_interval=None, grace=2.0):
+    """接收各 socket 的資料直到對方關閉（或超過 duration + grace 秒），回傳吞吐量統計"""
+    counters = [0] * len(sockets)
+
+    def receiver(index, sock):
+        view = memoryview(bytearray(TCP_BUFFER_SIZE))
+        try:
+            while True:
+                count = sock.recv_into(view)
+                if not count:
+                    return
+                counters[index] += count
+        except OSError:
+            return
+
+    threads = [threading.Thread(target=receiver, args=(index, sock), daemon=True)
+               for index, sock in enumerate(sockets)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    samples = [(0.0, 0)]
+    next_time = start
+    limit = start + duration + grace
+    while True:
+        next_time = min(next_time + interval, limit)
+        alive = [thread for thread in threads if thread.is_alive()]
+        # 等待區間結束；所有資料流提早結束時立即醒來
+        while alive and time.perf_counter() < next_time:
+            alive[0].join(max(next_time - time.perf_counter(), 0))
+            alive = [thread for thread in alive if thread.is_alive()]
+        now = time.perf_counter()
+        samples.append((now - start, sum(counters)))
+        if on_interval:
+            on_interval(_intervals(samples[-2:])[0])
+        if not alive:
+            break
+        if now >= limit:
+            for sock in sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            break
+
+    total = sum(counters)
+    elapsed = samples[-1][0]
+    return {
+        'mode': 'tcp',
+        'streams': len(sockets),
+        'bytes': total,
+        'duration': elapsed,
+        'mbps': total * 8 / elapsed / 1_000_000 if elapsed > 0 else 0.0,
+        'intervals': _intervals(samples),
+        'per_stream': list(counters)
+    }
+
+
+# UDP
+
+def send_udp(sock, address, rate, duration, packet_size=DEFAULT_UDP_PACKET_SIZE):
+    """以 rate（bit/s，0 表示不限速）送出帶序號與時間戳記的資料包，回傳送出數量"""
+    buffer = bytearray(os.urandom(max(packet_size, _UDP_HEADER.size)))
+    pack_into = _UDP_HEADER.pack_into
+    gap = len(buffer) * 8 / rate if rate else 0.0
+    # address 為 None 時使用已 connect 的 socket
+    send = sock.send if address is None else (lambda data: sock.sendto(data, address))
+    start = time.perf_counter()
+    end = start + duration
+    sequence = 0
+    while True:
+        now = time.perf_counter()
+        if now >= end:
+            break
+        due = int((now - start) / gap) + 1 if gap else sequence + _MAX_BURST
+        burst = min(due, sequence + _MAX_BURST)
+        while sequence < burst:
+            pack_into(buffer, 0, sequence, time.time_ns())
+            try:
+                send(buffer)
+            except OSError as e:
+                if e.errno not in (errno.ENOBUFS, errno.EAGAIN, errno.ECONNREFUSED):
+                    raise
+                # 傳送佇列已滿：稍後重送同一序號
+                time.sleep(0.0002)
+                break
+            sequence += 1
+        if gap:
+            wait = start + sequence * gap - time.perf_counter()
+            if wait > 0.001:
+                time.sleep(wait - 0.0005)
+    return sequence
+
+
+class UdpReceiver:
+    """UDP 接收統計：吞吐量、遺失、亂序與 RFC 3550 抖動
+
+    遺失以「最大序號 + 1 - 收到數量」計算，晚到的封包計為亂序並自遺失扣除（與 iperf3 相同）
+    """
+
+    def __init__(self, sock, interval=1.0, on_interval=None):
+        self.sock = sock
+        self.interval = interval
+        self.on_interval = on_interval
+        self.done = threading.Event()
+        # 對方送出的總數（由控制連線通知）
+        self.sent = None
+        self.peer = None
+
+    def run(self, timeout, grace=0.3):
+        """接收直到 done 事件設定後再等待 grace 秒，或 timeout 秒內沒有任何資料"""
+        sock = self.sock
+        sock.settimeout(0.1)
+        buffer = bytearray(65536)
+        unpack_from = _UDP_HEADER.unpack_from
+        perf_counter = time.perf_counter
+        time_ns = time.time_ns
+
+        packets = received_bytes = out_of_order = 0
+        highest = -1
+        jitter = 0.0
+        last_transit = None
+        start = None
+        intervals = []
+        mark = None
+        mark_state = (0, 0, -1)
+        done_at = None
+        last_activity = perf_counter()
+
+        while True:
+            try:
+                count, address = sock.recvfrom_into(buffer)
+            except socket.timeout:
+                count = 0
+            except OSError:
+                break
+            now = perf_counter()
+            if count >= _UDP_HEADER.size:
+                arrival = time_ns()
+                sequence, sent_ns = unpack_from(buffer)
+                if start is None:
+                    start = mark = now
+                    self.peer = address
+                packets += 1
+                received_bytes += count
+                if sequence > highest:
+                    highest = sequence
+                else:
+                    out_of_order += 1
+                transit = (arrival - sent_ns) / 1e6
+                if last_transit is not None:
+                    jitter += (abs(transit - last_transit) - jitter) / 16
+                last_transit = transit
+                last_activity = now
+            elif now - last_activity > timeout:
+                break
+
+            if count >= _UDP_HEADER.size and now - mark >= self.interval:
+                intervals.append(self._interval(start, mark, now, mark_state,
+                                                (packets, received_bytes, highest), jitter))
+                mark, mark_state = now, (packets, received_bytes, highest)
+            if self.done.is_set():
+                if done_at is None:
+                    done_at = now
+                elif now - done_at >= grace:
+                    break
+
+        end = last_activity
+        if mark is not None and end > mark:
+            intervals.append(self._interval(start, mark, end, mark_state,
+                                            (packets, received_bytes, highest), jitter))
+        expected = self.sent if self.sent is not None else highest + 1
+        lost = max(expected - packets, 0)
+        elapsed = end - start if start is not None else 0.0
+        return {
+            'mode': 'udp',
+            'bytes': received_bytes,
+            'packets': packets,
+            'sent': expected,
+            'lost': lost,
+            'loss': lost / expected * 100 if expected else 0.0,
+            'out_of_order': out_of_order,
+            'jitter': jitter,
+            'duration': elapsed,
+            'mbps': received_bytes * 8 / elapsed / 1_000_000 if elapsed > 0 else 0.0,
+            'intervals': intervals
+        }
+
+    def _interval(self, start, mark, now, before, after, jitter):
+        packets, received_bytes, highest = (a - b for a, b in zip(after, before))
+        report = {
+            'start': mark - start,
+            'end': now - start,
+            'bytes': received_bytes,
+            'mbps': received_bytes * 8 / (now - mark) / 1_000_000,
+            'packets': packets,
+            'lost': max(highest - packets, 0),
+            'jitter': jitter
+        }
+        if self.on_interval:
+            self.on_interval(report)
+        return report
+
+
+# 伺服器
+
+class _Session:
+    def __init__(self, streams):
+        self.streams = streams
+        self.sockets = [None] * streams
+        self.ready = threading.Condition()
+
+    def attach(self, index, sock):
+        with self.ready:
+            if 0 <= index < self.streams and self.sockets[index] is None:
+                self.sockets[index] = sock
+                self.ready.notify_all()
+                return True
+        return False
+
+    def wait(self, timeout):
+        with self.ready:
+            return self.ready.wait_for(lambda: all(self.sockets), timeout)
+
+
+class PeerServer:
+    """對測伺服器
+
+    每個用戶端先以控制連線送出測試參數（JSON），TCP 測試再開啟 N 條資料連線；
+    伺服器為接收端時，每秒報告與最終結果經由控制連線回傳給用戶端
+    """
+
+    def __init__(self, host='0.0.0.0', port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self._listener = None
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def address(self):
+        return self._listener.getsockname()[:2] if self._listener else None
+
+    def start(self):
+        """在背景執行緒開始接受連線，回傳 (host, port)"""
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((self.host, self.port))
+        self._listener.listen(64)
+        self._listener.settimeout(0.2)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        return self.address
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while not self._stop_event.wait(1):
+                pass
+        finally:
+            self.stop()
+
+    def _accept_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                conn, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            conn.settimeout(10)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            magic = _recv_exact(conn, 4)
+            if magic == _DATA_MAGIC:
+                cookie = _recv_exact(conn, _COOKIE_SIZE).hex()
+                index = _STREAM_INDEX.unpack(_recv_exact(conn, _STREAM_INDEX.size))[0]
+                with self._lock:
+                    session = self._sessions.get(cookie)
+                if session is None or not session.attach(index, conn):
+                    conn.close()
+                return
+            if magic != _CONTROL_MAGIC:
+                conn.close()
+                return
+            with conn:
+                self._control(conn)
+        except (OSError, ValueError) as e:
+            print(f"對測連線錯誤: {e}")
+            conn.close()
+
+    def _control(self, conn):
+        reader = conn.makefile('rb')
+        request = _read_message(reader)
+        cookie = request['cookie']
+        mode = request.get('mode', 'tcp')
+        duration = float(request.get('duration', 10))
+        interval = float(request.get('interval', 1.0))
+        reverse = bool(request.get('reverse'))
+
+        def report(entry):
+            _send_message(conn, {'interval': entry})
+
+        if mode == 'tcp':
+            session = _Session(int(request.get('streams', 1)))
+            with self._lock:
+                self._sessions[cookie] = session
+            try:
+                _send_message(conn, {'ok': True})
+                if not session.wait(10):
+                    _send_message(conn, {'error': '資料連線逾時'})
+                    return
+                for sock in session.sockets:
+                    sock.settimeout(duration + 10)
+                if reverse:
+                    send_tcp(session.sockets, duration)
+                    _send_message(conn, {'done': True})
+                else:
+                    result = receive_tcp(session.sockets, duration, interval, report)
+                    _send_message(conn, {'result': result})
+            finally:
+                with self._lock:
+                    self._sessions.pop(cookie, None)
+                for sock in session.sockets:
+                    if sock is not None:
+                        sock.close()
+            return
+
+        family = conn.family
+        with socket.socket(family, socket.SOCK_DGRAM) as udp:
+            udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+            udp.bind((conn.getsockname()[0], 0))
+            _send_message(conn, {'ok': True, 'udp_port': udp.getsockname()[1]})
+            if reverse:
+                # 等待用戶端的 hello 資料包以取得其地址（可穿越 NAT）
+                udp.settimeout(10)
+                while True:
+                    data, address = udp.recvfrom(64)
+                    if data == _DATA_MAGIC + bytes.fromhex(cookie):
+                        break
+                sent = send_udp(udp, address, float(request.get('rate', 0)), duration,
+                                int(request.get('packet_size', DEFAULT_UDP_PACKET_SIZE)))
+                _send_message(conn, {'done': True, 'sent': sent})
+            else:
+                receiver = UdpReceiver(udp, interval, report)
+                threading.Thread(target=_await_done, args=(reader, receiver), daemon=True).start()
+                result = receiver.run(timeout=duration + 10)
+                _send_message(conn, {'result': result})
+
+
+def _await_done(reader, receiver):
+    """讀取控制連線上的 done 訊息，通知 UDP 接收端對方送出的總數"""
+    try:
+        while True:
+            message = _read_message(reader)
+            if 'done' in message:
+                receiver.sent = message.get('sent')
+                break
+    except (OSError, ValueError):
+        pass
+    receiver.done.set()
+
+
+# 用戶端
+
+class PeerClient:
+    """對測用戶端
+
+    reverse=False 時由用戶端送出、伺服器接收（上傳方向），反之由伺服器送出；
+    on_interval(report) 會收到每個區間的報告（無論接收端在哪一邊）
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _connect(self, magic):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(magic)
+        return sock
+
+    def tcp(self, streams=4, duration=10.0, reverse=False, interval=1.0, on_interval=None):
+        """多串流 TCP 吞吐量測試"""
+        try:
+            cookie = os.urandom(_COOKIE_SIZE)
+            with self._connect(_CONTROL_MAGIC) as control:
+                reader = control.makefile('rb')
+                _send_message(control, {'cookie': cookie.hex(), 'mode': 'tcp', 'streams': streams,
+                                        'duration': duration, 'reverse': reverse,
+                                        'interval': interval})
+                reply = _read_message(reader)
+                if not reply.get('ok'):
+                    return {'success': False, 'error': reply.get('error', '伺服器拒絕')}
+                sockets = []
+                try:
+                    for index in range(streams):
+                        sock = self._connect(_DATA_MAGIC + cookie + _STREAM_INDEX.pack(index))
+                        sock.settimeout(duration + self.timeout)
+                        sockets.append(sock)
+                    if reverse:
+                        result = receive_tcp(sockets, duration, interval, on_interval)
+                    else:
+                        sender = threading.Thread(target=send_tcp, args=(sockets, duration),
+                                                  daemon=True)
+                        sender.start()
+                        control.settimeout(duration + self.timeout)
+                        result = self._await_result(reader, on_interval)
+                        sender.join()
+                finally:
+                    for sock in sockets:
+                        sock.close()
+            result['success'] = result.get('bytes', 0) > 0
+            result['direction'] = 'download' if reverse else 'upload'
+            return result
+        except (OSError, ValueError) as e:
+            return {'success': False, 'error': str(e)}
+
+    def udp(self, rate=100_000_000, duration=10.0, packet_size=DEFAULT_UDP_PACKET_SIZE,
+            reverse=False, interval=1.0, on_interval=None):
+        """UDP 測試：rate 為目標速率（bit/s，0 表示不限速），回報遺失、抖動與亂序"""
+        try:
+            cookie = os.urandom(_COOKIE_SIZE)
+            with self._connect(_CONTROL_MAGIC) as control:
+                reader = control.makefile('rb')
+                _send_message(control, {'cookie': cookie.hex(), 'mode': 'udp', 'rate': rate,
+                                        'duration': duration, 'packet_size': packet_size,
+                                        'reverse': reverse, 'interval': interval})
+                reply = _read_message(reader)
+                if not reply.get('ok'):
+                    return {'success': False, 'error': reply.get('error', '伺服器拒絕')}
+                address = (self.host, reply['udp_port'])
+                control.settimeout(duration + self.timeout)
+                with socket.socket(control.family, socket.SOCK_DGRAM) as udp:
+                    udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+                    if reverse:
+                        result = self._receive_udp(udp, address, cookie, reader, duration,
+                                                   interval, on_interval)
+                    else:
+                        udp.connect(address)
+                        sent = send_udp(udp, None, rate, duration, packet_size)
+                        _send_message(control, {'done': True, 'sent': sent})
+                        result = self._await_result(reader, on_interval)
+            result['success'] = result.get('packets', 0) > 0
+            result['direction'] = 'download' if reverse else 'upload'
+            return result
+        except (OSError, ValueError) as e:
+            return {'success': False, 'error': str(e)}
+
+    def _receive_udp(self, udp, address, cookie, reader, duration, interval, on_interval):
+        receiver = UdpReceiver(udp, interval, on_interval)
+        hello = _DATA_MAGIC + cookie
+
+        def greet():
+            # 在收到第一個資料包前持續送出 hello（可能遺失）
+            while receiver.peer is None and not receiver.done.is_set():
+                try:
+                    udp.sendto(hello, address)
+                except OSError:
+                    pass
+                time.sleep(0.1)
+
+        threading.Thread(target=greet, daemon=True).start()
+        threading.Thread(target=_await_done, args=(reader, receiver), daemon=True).start()
+        return receiver.run(timeout=duration + self.timeout)
+
+    @staticmethod
+    def _await_result(reader, on_interval):
+        while True:
+            message = _read_message(reader)
+            if 'interval' in message:
+                if on_interval:
+                    on_interval(message['interval'])
+            elif 'result' in message:
+                return message['result']
+            elif 'error' in message:
+                raise ConnectionError(message['error'])
+
+
+if __name__ == "__main__":
+    # 測試代碼：
+    #   python -m modules.peer_test server [埠]
+    #   python -m modules.peer_test tcp|udp 主機 [埠] [-R]（-R：由伺服器送出）
+    import sys
+
+    def show(report):
+        line = f"  {report['start']:5.1f}-{report['end']:5.1f} s  {report['mbps']:10.1f} Mbps"
+        if 'packets' in report:
+            line += (f"  遺失 {report['lost']}/{report['packets'] + report['lost']}  "
+                     f"抖動 {report['jitter']:.3f} ms")
+        print(line)
+
+    if len(sys.argv) < 2 or sys.argv[1] == 'server':
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT
+        print(f"對測伺服器監聽於埠 {port}")
+        try:
+            PeerServer(port=port).serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        arguments = [argument for argument in sys.argv[2:] if argument != '-R']
+        client = PeerClient(arguments[0] if arguments else '127.0.0.1',
+                            int(arguments[1]) if len(arguments) > 1 else DEFAULT_PORT)
+        reverse = '-R' in sys.argv
+        if sys.argv[1] == 'udp':
+            result = client.udp(rate=1_000_000_000, duration=5, reverse=reverse, on_interval=show)
+        else:
+            result = client.tcp(streams=4, duration=5, reverse=reverse, on_interval=show)
+        if result['success']:
+            print(f"{result['mode'].upper()} {result['direction']}: {result['mbps']:.1f} Mbps")
+            if result['mode'] == 'udp':
+                print(f"遺失 {result['lost']}/{result['sent']}（{result['loss']:.2f}%），"
+                      f"亂序 {result['out_of_order']}，抖動 {result['jitter']:.3f} ms")
+        else:
+            print(f"測試失敗: {result['error']}")
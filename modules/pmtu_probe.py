@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+路徑 MTU 探測模組
+功能：以設定 DF 的探測封包二分搜尋每個目的地的路徑 MTU，同時探測多個目標，
+與 NetworkInfo 回報的介面 MTU 比較，找出 MTU 不一致與 ICMP 被阻擋造成的 PMTU 黑洞
+"""
+
+import time
+import errno
+import random
+import ipaddress
+import select
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.icmp_engine import build_echo_request
+from modules.traceroute import DEFAULT_UDP_PORT, IP_RECVERR, IPV6_RECVERR, MSG_ERRQUEUE, \
+    parse_icmp, parse_extended_error
+
+
+# Linux 的 MTU 探索選項（部分 Python 版本的 socket 模組未提供）
+IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)
+IP_MTU = getattr(socket, 'IP_MTU', 14)
+IPV6_MTU_DISCOVER = getattr(socket, 'IPV6_MTU_DISCOVER', 23)
+IPV6_MTU = getattr(socket, 'IPV6_MTU', 24)
+IPV6_DONTFRAG = getattr(socket, 'IPV6_DONTFRAG', 62)
+# 設定 DF 但不受核心快取的路徑 MTU 限制，才能送出大於目前 PMTU 的探測封包
+PMTUDISC_PROBE = 3
+
+# IP 標頭加 ICMP/UDP 標頭的大小：探測大小為整個 IP 封包的長度
+HEADER_SIZES = {socket.AF_INET: 28, socket.AF_INET6: 48}
+# 最小探測大小（IPv4 的最小 MTU 為 68，IPv6 為 1280）與 IP 封包上限
+MIN_SIZES = {socket.AF_INET: 68, socket.AF_INET6: 1280}
+MAX_PACKET_SIZE = 65535
+# TCP MSS = MTU - IP 標頭 - TCP 標頭
+MSS_OVERHEAD = {socket.AF_INET: 40, socket.AF_INET6: 60}
+
+
+def route_info(family, address):
+    """回傳核心為送往 address 選擇的 (來源地址, 路由 MTU)；不會送出封包"""
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    try:
+        sock.connect((address, DEFAULT_UDP_PORT))
+        source = sock.getsockname()[0]
+        try:
+            if family == socket.AF_INET:
+                mtu = sock.getsockopt(socket.IPPROTO_IP, IP_MTU)
+            else:
+                mtu = sock.getsockopt(socket.IPPROTO_IPV6, IPV6_MTU)
+        except OSError:
+            mtu = None
+        return source, mtu
+    finally:
+        sock.close()
+
+
+class _Session:
+    """單一目標的探測 socket 與序號"""
+
+    __slots__ = ('family', 'address', 'sock', 'raw', 'identifier', 'sequence')
+
+    def __init__(self, family, address, sock, raw):
+        self.family = family
+        self.address = address
+        self.sock = sock
+        self.raw = raw
+        self.identifier = random.randrange(1, 0x10000)
+        self.sequence = random.randrange(0x10000)
+
+
+class PmtuProber:
+    """路徑 MTU 探測器
+
+    method 'icmp'（需要 root 或 CAP_NET_RAW）送出 DF 的 Echo Request，以 Echo Reply 確認封包通過；
+    'udp' 不需權限，送出 DF 的 UDP 封包，以目的地回報的 port unreachable 確認（IP_RECVERR 錯誤佇列）；
+    'auto' 可開啟 raw socket 時使用 icmp。每個目標先以最小封包確認目的地會回應，再從路由 MTU 開始二分搜尋；
+    收到 Fragmentation Needed / Packet Too Big 時直接改試回報的 MTU。大於結果的探測都沒有收到 ICMP
+    而被靜默丟棄時判定為 PMTU 黑洞
+    """
+
+    def __init__(self, method='auto', timeout=1.0, retries=1, port=DEFAULT_UDP_PORT,
+                 network_info=None, max_workers=16):
+        self.method = method
+        self.timeout = timeout
+        self.retries = retries
+        self.port = port
+        self.network_info = network_info
+        self.max_workers = max_workers
+
+    def probe(self, targets):
+        """同時探測多個目標，回傳 {目標: 結果}（見 probe_one）"""
+        targets = list(dict.fromkeys(targets))
+        if not targets:
+            return {}
+        interfaces = self._interface_mtus()
+        with ThreadPoolExecutor(max_workers=min(len(targets), self.max_workers),
+                                thread_name_prefix='pmtu') as executor:
+            results = executor.map(lambda target: self.probe_one(target, interfaces), targets)
+            return dict(zip(targets, results))
+
+    def probe_one(self, target, interfaces=None):
+        """探測單一目標
+
+        回傳 {'success', 'target', 'address', 'method', 'pmtu', 'mss', 'interface',
+        'interface_mtu', 'route_mtu', 'reported_mtu', 'silent_drops', 'probes', 'mismatch',
+        'black_hole', 'warnings', 'elapsed'}；
+        目的地不回應最小探測時 success 為 False 且 icmp_blocked 為 True
+        """
+        start = time.monotonic()
+        try:
+            info = socket.getaddrinfo(target, None, 0, socket.SOCK_DGRAM)[0]
+        except (socket.gaierror, IndexError) as e:
+            return {'success': False, 'target': target, 'error': str(e)}
+        family, address = info[0], info[4][0]
+        if interfaces is None:
+            interfaces = self._interface_mtus()
+
+        result = {'success': False, 'target': target, 'address': address}
+        try:
+            source, route_mtu = route_info(family, address)
+            interface, interface_mtu = self._interface_for(source, address, interfaces)
+            session = self._open(family, address)
+        except OSError as e:
+            result['error'] = str(e)
+            return result
+        result.update({'method': 'icmp' if session.raw else 'udp', 'interface': interface,
+                       'interface_mtu': interface_mtu})
+
+        try:
+            search = self._search(session, min(route_mtu or interface_mtu or 1500, MAX_PACKET_SIZE))
+        finally:
+            session.sock.close()
+        result.update(search)
+        result['elapsed'] = (time.monotonic() - start) * 1000
+        if search['pmtu'] is None:
+            result['icmp_blocked'] = True
+            result['error'] = '目的地不回應最小的探測封包（ICMP 可能被阻擋），無法判斷路徑 MTU'
+            return result
+
+        pmtu = search['pmtu']
+        result['success'] = True
+        result['mss'] = pmtu - MSS_OVERHEAD[family]
+        # 探測後核心快取的路徑 MTU（收到 Fragmentation Needed 時會更新）
+        result['route_mtu'] = route_info(family, address)[1]
+        result['mismatch'] = (interface_mtu is not None
+                              and pmtu < min(interface_mtu, MAX_PACKET_SIZE))
+        result['black_hole'] = bool(search['silent_drops']) and search['reported_mtu'] is None
+        warnings = []
+        if result['mismatch']:
+            warnings.append(f'路徑 MTU {pmtu} 小於介面 {interface} 的 MTU {interface_mtu}'
+                            f'（TCP MSS 應不大於 {result["mss"]}）')
+        if result['black_hole']:
+            warnings.append(f'超過 {pmtu} 位元組的 DF 封包被丟棄且沒有回報 ICMP（PMTU 黑洞，ICMP 被阻擋）')
+        result['warnings'] = warnings
+        return result
+
+    # 介面 MTU
+
+    def _interface_mtus(self):
+        """回傳 [(介面名稱, MTU, 地址集合)]"""
+        network_info = self.network_info
+        if network_info is None:
+            from modules.network_info import NetworkInfo
+            network_info = self.network_info = NetworkInfo()
+        interfaces = []
+        for interface in network_info.get_network_interfaces():
+            addresses = {address['address'].split('%', 1)[0]
+                         for address in interface.get('addresses', [])}
+            interfaces.append((interface['name'], interface.get('mtu'), addresses))
+        return interfaces
+
+    def _interface_for(self, source, address, interfaces):
+        """依核心選擇的來源地址找出送出介面；找不到時改查 NetworkInfo 路由表
+
+        NetworkInfo 不列出 loopback 介面，送往本機的流量回傳 (None, None)
+        """
+        for name, mtu, addresses in interfaces:
+            if source in addresses:
+                return name, mtu
+        if ipaddress.ip_address(source).is_loopback:
+            return None, None
+        route = self.network_info.lookup_route(address) if self.network_info is not None else None
+        if route is not None:
+            for name, mtu, _ in interfaces:
+                if name == route['interface']:
+                    return name, mtu
+        return None, None
+
+    # 探測
+
+    def _open(self, family, address):
+        sock = None
+        if self.method in ('auto', 'icmp'):
+            proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+            try:
+                sock = socket.socket(family, socket.SOCK_RAW, proto)
+            except OSError:
+                if self.method == 'icmp':
+                    raise
+        raw = sock is not None
+        if not raw:
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            if family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, PMTUDISC_PROBE)
+                if not raw:
+                    sock.setsockopt(socket.IPPROTO_IP, IP_RECVERR, 1)
+            else:
+                sock.setsockopt(socket.IPPROTO_IPV6, IPV6_MTU_DISCOVER, PMTUDISC_PROBE)
+                sock.setsockopt(socket.IPPROTO_IPV6, IPV6_DONTFRAG, 1)
+                if not raw:
+                    sock.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVERR, 1)
+            if not raw:
+                # raw socket 不可 connect：connect 後只會收到目的地送來的封包，收不到中途路由器的 ICMP
+                sock.connect((address, self.port))
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        return _Session(family, address, sock, raw)
+
+    def _search(self, session, ceiling):
+        """二分搜尋可通過的最大封包大小"""
+        floor = MIN_SIZES[session.family]
+        search = {'pmtu': None, 'probes': 0, 'reported_mtu': None, 'silent_drops': []}
+        kind, _ = self._attempt(session, floor, search)
+        if kind != 'ok':
+            return search
+
+        low, high = floor, max(ceiling, floor)
+        candidate = high
+        while low < high:
+            kind, value = self._attempt(session, candidate, search)
+            if kind == 'ok':
+                low = candidate
+            else:
+                high = candidate - 1
+                if kind == 'too_big' and value:
+                    search['reported_mtu'] = min(value, search['reported_mtu'] or value)
+                if kind in ('too_big', 'local') and value:
+                    high = max(min(high, value), low)
+                elif kind == 'timeout':
+                    search['silent_drops'].append(candidate)
+            if kind in ('too_big', 'local') and value and low < value <= high:
+                # 直接驗證回報的 MTU，通常一次即可確定
+                candidate = value
+            else:
+                candidate = (low + high + 1) // 2
+        search['pmtu'] = low
+        return search
+
+    def _attempt(self, session, size, search):
+        """送出 size 位元組的探測，逾時重試 retries 次；回傳 (結果, 值)"""
+        for _ in range(self.retries + 1):
+            search['probes'] += 1
+            kind, value = self._send_probe(session, size)
+            if kind != 'timeout':
+                return kind, value
+        return 'timeout', None
+
+    def _send_probe(self, session, size):
+        """回傳 ('ok', RTT)、('too_big', 回報的 MTU)、('local', 本機 MTU)、('unreachable', 代碼)
+        或 ('timeout', None)"""
+        self._drain(session)
+        payload = bytes(size - HEADER_SIZES[session.family])
+        key = None
+        start = time.perf_counter()
+        try:
+            if session.raw:
+                session.sequence = (session.sequence + 1) & 0xFFFF
+                key = ('icmp', session.identifier, session.sequence)
+                packet = build_echo_request(session.family, session.identifier, session.sequence,
+                                            payload)
+                session.sock.sendto(packet, (session.address, 0))
+            else:
+                session.sock.send(payload)
+        except OSError as e:
+            if e.errno == errno.EMSGSIZE:
+                # 超過送出介面或核心已知的 MTU
+                return 'local', self._socket_mtu(session)
+            if e.errno == errno.ENOBUFS:
+                # 本機鏈路丟棄（IP_RECVERR 回報）：與途中靜默丟棄相同，沒有 ICMP
+                return 'timeout', None
+            return 'unreachable', str(e)
+
+        deadline = start + self.timeout
+        while True:
+            wait = deadline - time.perf_counter()
+            if wait <= 0:
+                return 'timeout', None
+            readable, _, _ = select.select([session.sock], [], [], wait)
+            if not readable:
+                continue
+            outcome = self._read_raw(session, key) if session.raw else self._read_udp(session)
+            if outcome is not None:
+                if outcome[0] == 'ok':
+                    return 'ok', (time.perf_counter() - start) * 1000
+                return outcome
+
+    def _read_raw(self, session, key):
+        try:
+            data, sender = session.sock.recvfrom(MAX_PACKET_SIZE + 1)
+        except OSError:
+            return None
+        parsed = parse_icmp(session.family, data)
+        if parsed is None:
+            return None
+        kind, detail, reply_key, destination = parsed
+        if reply_key != key:
+            return None
+        if kind == 'echo':
+            return ('ok', None) if sender[0].split('%', 1)[0] == session.address else None
+        if destination != session.address or kind == 'time_exceeded':
+            return None
+        return kind, detail
+
+    def _read_udp(self, session):
+        try:
+            _, ancdata, _, _ = session.sock.recvmsg(MAX_PACKET_SIZE, 512, MSG_ERRQUEUE)
+        except (BlockingIOError, InterruptedError):
+            # 目的地以 UDP 回應
+            try:
+                session.sock.recv(MAX_PACKET_SIZE)
+                return 'ok', None
+            except OSError:
+                return None
+        except OSError:
+            return None
+        error = parse_extended_error(session.family, ancdata)
+        if error is None:
+            return None
+        kind, detail, reporter = error
+        if kind == 'unreachable' and reporter == session.address:
+            # 目的地回報 port unreachable：封包已完整到達
+            return 'ok', None
+        if kind == 'time_exceeded':
+            return None
+        return kind, detail
+
+    def _drain(self, session, limit=64):
+        """丟棄上一個探測逾時後才到達的回應"""
+        for _ in range(limit):
+            try:
+                if session.raw:
+                    session.sock.recv(MAX_PACKET_SIZE + 1)
+                else:
+                    try:
+                        session.sock.recvmsg(MAX_PACKET_SIZE, 512, MSG_ERRQUEUE)
+                    except (BlockingIOError, InterruptedError):
+                        session.sock.recv(MAX_PACKET_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # 錯誤佇列以外的 socket 錯誤（例如 ECONNREFUSED）讀取後即清除
+                continue
+
+    def _socket_mtu(self, session):
+        if session.raw:
+            return route_info(session.family, session.address)[1]
+        try:
+            if session.family == socket.AF_INET:
+                return session.sock.getsockopt(socket.IPPROTO_IP, IP_MTU)
+            return session.sock.getsockopt(socket.IPPROTO_IPV6, IPV6_MTU)
+        except OSError:
+            return None
+
+
+if __name__ == "__main__":
+    # 測試代碼：python -m modules.pmtu_probe [目標 ...]
+    import sys
+
+    targets = sys.argv[1:] or ['8.8.8.8', '1.1.1.1']
+    for target, result in PmtuProber().probe(targets).items():
+        if not result['success']:
+            print(f"{target}: 失敗 - {result['error']}")
+            continue
+        print(f"{target}: 路徑 MTU {result['pmtu']}（MSS {result['mss']}），介面 {result['interface']} "
+              f"MTU {result['interface_mtu']}，{result['method']}，{result['probes']} 個探測，"
+              f"{result['elapsed']:.0f} ms")
+        for warning in result['warnings']:
+            print(f"  ⚠ {warning}")
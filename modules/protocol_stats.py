@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+協定計數監測模組
+功能：定期讀取 /proc/net/snmp、netstat、sockstat，計算重傳、逾時、佇列溢位與UDP緩衝區錯誤速率
+及 socket 記憶體壓力，並與外網連線/網速測試的執行時段對應
+"""
+
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+PROC_SNMP = '/proc/net/snmp'
+PROC_NETSTAT = '/proc/net/netstat'
+PROC_SNMP6 = '/proc/net/snmp6'
+PROC_SOCKSTAT = '/proc/net/sockstat'
+PROC_SOCKSTAT6 = '/proc/net/sockstat6'
+PROC_TCP_MEM = '/proc/sys/net/ipv4/tcp_mem'
+PROC_UDP_MEM = '/proc/sys/net/ipv4/udp_mem'
+
+# 追蹤的累計計數（區段.名稱 -> 說明）；核心版本不同時部分欄位可能不存在
+TRACKED_COUNTERS = {
+    'Tcp.OutSegs': 'TCP送出區段',
+    'Tcp.RetransSegs': 'TCP重傳區段',
+    'Tcp.InErrs': 'TCP接收錯誤',
+    'Tcp.EstabResets': 'TCP連線被重設',
+    'Tcp.AttemptFails': 'TCP連線失敗',
+    'TcpExt.TCPTimeouts': 'TCP RTO逾時',
+    'TcpExt.TCPSynRetrans': 'SYN重傳',
+    'TcpExt.TCPLostRetransmit': '重傳封包再次遺失',
+    'TcpExt.ListenOverflows': 'Listen佇列溢位',
+    'TcpExt.ListenDrops': 'Listen丟棄',
+    'TcpExt.TCPMemoryPressures': 'TCP記憶體壓力',
+    'TcpExt.TCPAbortOnMemory': '記憶體不足中止連線',
+    'TcpExt.PruneCalled': '接收佇列修剪',
+    'TcpExt.TCPRcvQDrop': '接收佇列丟棄',
+    'Udp.InDatagrams': 'UDP接收資料包',
+    'Udp.InErrors': 'UDP接收錯誤',
+    'Udp.NoPorts': 'UDP無對應埠',
+    'Udp.RcvbufErrors': 'UDP接收緩衝區不足',
+    'Udp.SndbufErrors': 'UDP傳送緩衝區不足',
+    'Udp6.Udp6InErrors': 'UDPv6接收錯誤',
+    'Udp6.Udp6RcvbufErrors': 'UDPv6接收緩衝區不足',
+    'Udp6.Udp6SndbufErrors': 'UDPv6傳送緩衝區不足',
+}
+
+# 計量基準（不是問題指標，不列入尖峰偵測）
+BASELINE_COUNTERS = frozenset(['Tcp.OutSegs', 'Udp.InDatagrams'])
+
+_SNMP6_SECTIONS = ('UdpLite6', 'Icmp6', 'Udp6', 'Ip6')
+_MEMORY_KEYS = ('tcp_mem', 'udp_mem')
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except OSError:
+        return ''
+
+
+def parse_proc_table(text):
+    """解析 /proc/net/snmp、/proc/net/netstat 的「標題行/數值行」成對格式
+
+    回傳 {區段: {名稱: 數值}}
+    """
+    result = {}
+    lines = text.splitlines()
+    for header, values in zip(lines[::2], lines[1::2]):
+        section, _, names = header.partition(':')
+        value_section, _, numbers = values.partition(':')
+        if section != value_section:
+            continue
+        try:
+            result[section] = dict(zip(names.split(), (int(number) for number in numbers.split())))
+        except ValueError:
+            continue
+    return result
+
+
+def parse_snmp6(text):
+    """解析 /proc/net/snmp6 的「名稱 數值」格式，依前綴分成 Ip6/Icmp6/Udp6/UdpLite6 區段"""
+    result = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) != 2:
+            continue
+        name, value = parts
+        for section in _SNMP6_SECTIONS:
+            if name.startswith(section):
+                try:
+                    result.setdefault(section, {})[name] = int(value)
+                except ValueError:
+                    pass
+                break
+    return result
+
+
+def parse_sockstat(text):
+    """解析 sockstat，回傳 {'TCP': {'inuse': ..., 'mem': ...}, ...}（mem 單位為記憶體頁）"""
+    result = {}
+    for line in text.splitlines():
+        section, _, rest = line.partition(':')
+        fields = rest.split()
+        try:
+            result[section.strip()] = {fields[i]: int(fields[i + 1])
+                                       for i in range(0, len(fields) - 1, 2)}
+        except ValueError:
+            continue
+    return result
+
+
+def read_counters():
+    """讀取所有協定累計計數，回傳 {'區段.名稱': 數值}"""
+    counters = {}
+    sections = parse_proc_table(_read_text(PROC_SNMP))
+    sections.update(parse_proc_table(_read_text(PROC_NETSTAT)))
+    sections.update(parse_snmp6(_read_text(PROC_SNMP6)))
+    for section, values in sections.items():
+        for name, value in values.items():
+            counters[f'{section}.{name}'] = value
+    return counters
+
+
+def read_socket_memory():
+    """讀取 socket 使用量與記憶體壓力
+
+    回傳 {'sockets': {...}, 'tcp_mem': {'pages', 'pressure', 'max', 'ratio'}, 'udp_mem': {...}}；
+    ratio 為目前用量相對於壓力門檻的比例，超過 1 表示核心已進入記憶體壓力模式
+    """
+    sockets = parse_sockstat(_read_text(PROC_SOCKSTAT))
+    sockets.update(parse_sockstat(_read_text(PROC_SOCKSTAT6)))
+    result = {'sockets': sockets}
+    for key, section, path in (('tcp_mem', 'TCP', PROC_TCP_MEM), ('udp_mem', 'UDP', PROC_UDP_MEM)):
+        limits = _read_text(path).split()
+        pages = sockets.get(section, {}).get('mem')
+        if len(limits) != 3 or pages is None:
+            continue
+        low, pressure, maximum = (int(limit) for limit in limits)
+        result[key] = {
+            'pages': pages,
+            'low': low,
+            'pressure': pressure,
+            'max': maximum,
+            'ratio': pages / pressure if pressure else 0.0
+        }
+    return result
+
+
+class ProtocolStatsMonitor:
+    """協定計數監測器
+
+    背景執行緒每 interval 秒讀取一次計數與 TCP/UDP socket 記憶體用量，保留最近 capacity 筆樣本；
+    track() 標記測試執行時段，correlate() 回傳各時段內的計數變化、記憶體壓力與重疊的尖峰
+    """
+
+    def __init__(self, interval=1.0, capacity=3600, reader=None, memory_reader=None):
+        self.interval = interval
+        self.capacity = capacity
+        # reader 回傳 {'區段.名稱': 數值}，預設讀取 /proc
+        self.reader = reader or read_counters
+        # memory_reader 回傳 read_socket_memory() 格式的資料
+        self.memory_reader = memory_reader or read_socket_memory
+        self.samples = deque(maxlen=capacity)
+        self.runs = deque(maxlen=100)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def sample(self, timestamp=None, counters=None, memory=None):
+        """取樣一次並回傳 (時間, 計數, 記憶體)；counters / memory 可傳入外部資料（測試用）
+
+        記憶體為 {'tcp_mem': {'pages', 'ratio'}, 'udp_mem': {...}}，屬於量表而非累計計數
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if counters is None:
+            counters = self.reader()
+        if memory is None:
+            memory = self.memory_reader()
+        values = {key: counters[key] for key in TRACKED_COUNTERS if key in counters}
+        gauges = {key: {'pages': memory[key]['pages'], 'ratio': memory[key]['ratio']}
+                  for key in _MEMORY_KEYS if key in memory}
+        entry = (timestamp, values, gauges)
+        with self._lock:
+            self.samples.append(entry)
+        return entry
+
+    def _since(self, window):
+        """回傳 (最新樣本, window 秒前最接近的樣本)"""
+        with self._lock:
+            if len(self.samples) < 2:
+                return None, None
+            latest = self.samples[-1]
+            if window is None:
+                return latest, self.samples[0]
+            for entry in self.samples:
+                if entry[0] >= latest[0] - window:
+                    return latest, entry
+            return latest, self.samples[0]
+
+    def _between(self, first, last):
+        """回傳 first、last 兩筆樣本及其間的所有樣本"""
+        with self._lock:
+            inner = [entry for entry in self.samples if first[0] < entry[0] < last[0]]
+        return [first] + inner + [last]
+
+    def rates(self, window=10.0):
+        """最近 window 秒內各計數的每秒速率，並附 TCP 重傳率與 socket 記憶體量表；
+        樣本不足時回傳 None"""
+        latest, earlier = self._since(window)
+        if latest is None or latest[0] <= earlier[0]:
+            return None
+        elapsed = latest[0] - earlier[0]
+        deltas = _deltas(earlier[1], latest[1])
+        result = {'interval': elapsed,
+                  'rates': {key: value / elapsed for key, value in deltas.items()}}
+        result['retransmit_ratio'] = _retransmit_ratio(deltas)
+        result['memory'] = _memory_gauges(self._between(earlier, latest))
+        return result
+
+    def spikes(self, factor=4.0, min_rate=1.0):
+        """找出速率尖峰
+
+        對每個問題計數計算所有相鄰樣本間的速率，以中位數為基準；
+        速率同時超過 min_rate 與基準 * factor 的區間視為尖峰
+        """
+        with self._lock:
+            samples = list(self.samples)
+
+        intervals = []
+        for (start, before, _), (end, after, _) in zip(samples, samples[1:]):
+            if end > start:
+                intervals.append((start, end, {key: value / (end - start)
+                                               for key, value in _deltas(before, after).items()}))
+
+        result = []
+        for key in TRACKED_COUNTERS:
+            if key in BASELINE_COUNTERS:
+                continue
+            series = sorted(rates.get(key, 0.0) for _, _, rates in intervals)
+            if not series:
+                continue
+            baseline = series[len(series) // 2]
+            threshold = max(min_rate, baseline * factor)
+            for start, end, rates in intervals:
+                rate = rates.get(key, 0.0)
+                if rate > threshold:
+                    result.append({'counter': key, 'description': TRACKED_COUNTERS[key],
+                                   'start': start, 'end': end, 'rate': rate, 'baseline': baseline})
+        result.sort(key=lambda spike: spike['start'])
+        return result
+
+    @contextmanager
+    def track(self, label):
+        """標記一次測試執行時段；開始與結束各取樣一次，確保時段內的差值精確
+
+        with monitor.track('connectivity'):
+            internet_test.test_connectivity()
+        """
+        start = self.sample()
+        run = {'label': label, 'started_at': time.time(), 'start': start, 'end': None}
+        try:
+            yield run
+        finally:
+            run['end'] = self.sample()
+            with self._lock:
+                self.runs.append(run)
+
+    def correlate(self, factor=4.0, min_rate=1.0):
+        """回傳每次測試執行期間的計數變化、socket 記憶體量表，以及與該時段重疊的速率尖峰"""
+        spikes = self.spikes(factor, min_rate)
+        with self._lock:
+            runs = list(self.runs)
+
+        result = []
+        for run in runs:
+            (start, before, _), (end, after, _) = run['start'], run['end']
+            deltas = _deltas(before, after)
+            result.append({
+                'label': run['label'],
+                'started_at': run['started_at'],
+                'duration': end - start,
+                'deltas': {key: value for key, value in deltas.items() if value},
+                'retransmit_ratio': _retransmit_ratio(deltas),
+                'memory': _memory_gauges(self._between(run['start'], run['end'])),
+                'spikes': [spike for spike in spikes
+                           if spike['start'] < end and spike['end'] > start]
+            })
+        return result
+
+    def start(self):
+        """啟動背景取樣執行緒"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止背景取樣"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+        self._thread = None
+
+    def _run(self):
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"協定計數取樣錯誤: {e}")
+            next_time += self.interval
+            delay = next_time - time.monotonic()
+            if delay < 0:
+                next_time = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+
+
+def _deltas(before, after):
+    # 計數器歸零（網路命名空間重建）時以 0 計算
+    return {key: max(value - before[key], 0) for key, value in after.items() if key in before}
+
+
+def _retransmit_ratio(deltas):
+    sent = deltas.get('Tcp.OutSegs', 0)
+    return deltas.get('Tcp.RetransSegs', 0) / sent if sent else 0.0
+
+
+def _memory_gauges(entries):
+    """整理時段內的 socket 記憶體量表
+
+    回傳 {'tcp_mem': {'pages', 'ratio', 'delta', 'peak_pages', 'peak_ratio'}, ...}：
+    pages / ratio 為時段結束時的值，delta 為頁數變化，peak_* 為時段內的最大值
+    """
+    first, last = entries[0][2], entries[-1][2]
+    result = {}
+    for key in _MEMORY_KEYS:
+        values = [entry[2][key] for entry in entries if key in entry[2]]
+        if key not in last:
+            continue
+        result[key] = {
+            'pages': last[key]['pages'],
+            'ratio': last[key]['ratio'],
+            'delta': last[key]['pages'] - first[key]['pages'] if key in first else 0,
+            'peak_pages': max(value['pages'] for value in values),
+            'peak_ratio': max(value['ratio'] for value in values)
+        }
+    return result
+
+
+if __name__ == "__main__":
+    # 測試代碼：每秒取樣，顯示最近 10 秒的問題計數速率
+    monitor = ProtocolStatsMonitor()
+    monitor.start()
+
+    try:
+        while True:
+            time.sleep(10)
+            rates = monitor.rates(10)
+            if rates is None:
+                continue
+            print(f"TCP重傳率: {rates['retransmit_ratio']:.2%}")
+            for key, rate in rates['rates'].items():
+                if rate and key not in BASELINE_COUNTERS:
+                    print(f"  {TRACKED_COUNTERS[key]}: {rate:.2f}/s")
+            memory = rates['memory']
+            if 'tcp_mem' in memory:
+                print(f"TCP記憶體: {memory['tcp_mem']['pages']} 頁"
+                      f"（壓力門檻 {memory['tcp_mem']['ratio']:.0%}，"
+                      f"尖峰 {memory['tcp_mem']['peak_ratio']:.0%}）")
+    except KeyboardInterrupt:
+        monitor.stop()
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+公網IP查詢模組
+功能：同時向多個服務查詢 IPv4 / IPv6 公網地址，取第一個達成一致的答案並中止其餘請求，
+結果快取至有效期限到期，或 NetworkInfo 回報預設路由/地址變更為止
+"""
+
+import ssl
+import time
+import socket
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+
+from modules.http_probe import split_url, parse_head
+
+
+# 只回傳純文字地址的服務；各服務以指定的地址族連線，確保回傳的是該地址族的公網地址
+IPV4_SERVICES = (
+    'https://api.ipify.org',
+    'https://ipv4.icanhazip.com',
+    'https://v4.ident.me',
+    'https://ipinfo.io/ip',
+)
+IPV6_SERVICES = (
+    'https://api6.ipify.org',
+    'https://ipv6.icanhazip.com',
+    'https://v6.ident.me',
+)
+
+MAX_RESPONSE_BYTES = 4096
+
+
+def parse_address(text, version):
+    """驗證服務回傳的地址：必須是指定版本的全域單播地址"""
+    try:
+        address = ipaddress.ip_address(text.strip())
+    except ValueError:
+        return None
+    if address.version != version or not address.is_global or address.is_multicast:
+        return None
+    return str(address)
+
+
+class PublicIPResolver:
+    """公網IP查詢器（執行緒安全）
+
+    每個地址族的所有服務同時查詢，agreement 個服務回傳相同地址即採用，
+    其餘仍在進行的連線直接關閉；所有服務完成仍未達成一致時，採用票數最多的地址。
+    結果快取 ttl 秒，watch(network_info) 後預設路由或全域地址變更時立即失效
+    """
+
+    def __init__(self, ipv4_services=IPV4_SERVICES, ipv6_services=IPV6_SERVICES, ttl=300.0,
+                 timeout=5.0, agreement=2, verify=True):
+        self.services = {4: tuple(ipv4_services), 6: tuple(ipv6_services)}
+        self.ttl = ttl
+        self.timeout = timeout
+        self.agreement = agreement
+        self._context = ssl.create_default_context()
+        if not verify:
+            self._context.check_hostname = False
+            self._context.verify_mode = ssl.CERT_NONE
+        # {版本: (結果, 到期時間)}
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._watched = None
+
+    def get(self, version=4, refresh=False):
+        """回傳 {'address', 'version', 'sources', 'agreed', 'cached', 'elapsed'}，
+        查詢失敗時 address 為 None"""
+        if not refresh:
+            with self._lock:
+                entry = self._cache.get(version)
+            if entry is not None and entry[1] > time.monotonic():
+                return dict(entry[0], cached=True)
+
+        result = self._query(version)
+        if result['address'] is not None:
+            with self._lock:
+                self._cache[version] = (result, time.monotonic() + self.ttl)
+        return dict(result, cached=False)
+
+    def get_all(self, refresh=False):
+        """同時查詢 IPv4 與 IPv6，回傳 {'ipv4': 結果, 'ipv6': 結果}"""
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = {key: executor.submit(self.get, version, refresh)
+                       for key, version in (('ipv4', 4), ('ipv6', 6))}
+            return {key: future.result() for key, future in futures.items()}
+
+    def invalidate(self, version=None):
+        with self._lock:
+            if version is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(version, None)
+
+    # 網路變更
+
+    def watch(self, network_info):
+        """訂閱 NetworkInfo 的網路變更事件，回傳是否訂閱成功"""
+        if network_info.subscribe(self._on_network_event) is None:
+            return False
+        self._watched = network_info
+        return True
+
+    def unwatch(self):
+        if self._watched is not None:
+            self._watched.unsubscribe(self._on_network_event)
+            self._watched = None
+
+    def _on_network_event(self, event):
+        record = event.record
+        if event.kind == 'route' and record.dst_len == 0 and record.type == 1:
+            # 預設路由（RTN_UNICAST）新增、移除或變更
+            self.invalidate(6 if record.family == socket.AF_INET6 else 4)
+        elif event.kind == 'address' and record.scope == 0:
+            # 全域範圍地址變更
+            self.invalidate(6 if record.family == socket.AF_INET6 else 4)
+
+    # 查詢
+
+    def _query(self, version):
+        family = socket.AF_INET6 if version == 6 else socket.AF_INET
+        services = self.services[version]
+        start = time.perf_counter()
+        votes = {}
+        sources = {}
+        errors = {}
+        connections = {}
+        lock = threading.Lock()
+        finished = threading.Event()
+        chosen = None
+
+        executor = ThreadPoolExecutor(max_workers=max(len(services), 1))
+        futures = {
+            executor.submit(self._fetch, url, family, version, connections, lock, finished): url
+            for url in services
+        }
+        try:
+            for future in as_completed(futures, timeout=self.timeout + 1):
+                url = futures[future]
+                try:
+                    address = future.result()
+                except Exception as e:
+                    errors[url] = str(e) or e.__class__.__name__
+                    continue
+                if address is None:
+                    errors[url] = '無效的回應'
+                    continue
+                votes[address] = votes.get(address, 0) + 1
+                sources.setdefault(address, []).append(url)
+                if votes[address] >= min(self.agreement, len(services)):
+                    chosen = address
+                    break
+        except FuturesTimeoutError:
+            pass
+        finally:
+            # 已取得一致答案（或逾時）：關閉仍在進行的連線
+            finished.set()
+            with lock:
+                for sock in connections.values():
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+            # Python 3.8 的 shutdown 沒有 cancel_futures 參數，尚未開始的請求逐一取消
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+        agreed = chosen is not None
+        if chosen is None and votes:
+            chosen = max(votes, key=votes.get)
+        return {
+            'address': chosen,
+            'version': version,
+            'sources': sources.get(chosen, []),
+            'agreed': agreed,
+            'errors': errors,
+            'elapsed': (time.perf_counter() - start) * 1000
+        }
+
+    def _fetch(self, url, family, version, connections, lock, finished):
+        """以指定地址族向服務送出 GET，回傳驗證後的地址"""
+        scheme, host, port, path, host_header = split_url(url)
+        info = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)[0]
+        sock = socket.socket(info[0], info[1], info[2])
+        with lock:
+            if finished.is_set():
+                sock.close()
+                return None
+            connections[url] = sock
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(info[4])
+            if scheme == 'https':
+                sock = self._context.wrap_socket(sock, server_hostname=host)
+                with lock:
+                    connections[url] = sock
+            # HTTP/1.0 + Connection: close：回應不會是 chunked，讀到連線關閉即為完整本文
+            sock.sendall((f'GET {path} HTTP/1.0\r\nHost: {host_header}\r\nUser-Agent: curl/8.0\r\n'
+                          f'Accept: text/plain\r\nConnection: close\r\n\r\n').encode('ascii'))
+            data = b''
+            while len(data) < MAX_RESPONSE_BYTES:
+                chunk = sock.recv(MAX_RESPONSE_BYTES - len(data))
+                if not chunk:
+                    break
+                data += chunk
+        finally:
+            with lock:
+                connections.pop(url, None)
+            sock.close()
+
+        head, separator, body = data.partition(b'\r\n\r\n')
+        if not separator:
+            raise ConnectionError('回應不完整')
+        status, _ = parse_head(head)
+        if status != 200:
+            raise ConnectionError(f'HTTP {status}')
+        return parse_address(body.decode('ascii', 'replace'), version)
+
+
+if __name__ == "__main__":
+    # 測試代碼：查詢 IPv4 與 IPv6 公網地址，第二次查詢應直接取自快取
+    resolver = PublicIPResolver()
+    for attempt in range(2):
+        for key, result in resolver.get_all().items():
+            if result['address']:
+                print(f"{key}: {result['address']}（{'快取' if result['cached'] else '查詢'}，"
+                      f"{result['elapsed']:.0f} ms，來源 {len(result['sources'])} 個）")
+            else:
+                print(f"{key}: 無法取得 {result['errors']}")
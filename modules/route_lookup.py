@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+路由查詢模組
+功能：建立最長前綴比對索引，查詢目的地址會經由哪條路由、閘道與介面送出
+"""
+
+import socket
+import ipaddress
+
+
+class RouteTable:
+    """最長前綴比對（LPM）路由索引
+
+    以「前綴長度 -> {網路位址整數: 路由}」的分層雜湊表實作。
+    每一層等同於前綴樹在該深度的節點集合，查詢時由最長的前綴長度
+    往短的方向比對，最多比對「實際存在的前綴長度數」次；
+    在 Python 中比逐位元走訪的節點樹快得多，也不需為每個節點配置物件，
+    九十萬筆以上的完整 BGP 表也能維持微秒級查詢
+    """
+
+    def __init__(self):
+        # family -> {prefix_len: {network_int >> (bits - prefix_len): route}}
+        self._tables = {4: {}, 6: {}}
+        # family -> 由長到短排序的已使用前綴長度
+        self._lengths = {4: [], 6: []}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, prefix, route, metric=0):
+        """加入一筆路由；同一前綴有多筆時保留 metric 最小者
+
+        prefix 可為 '10.0.0.0/8' 字串或 ipaddress 網路物件
+        """
+        network = prefix if isinstance(prefix, (ipaddress.IPv4Network, ipaddress.IPv6Network)) \
+            else ipaddress.ip_network(prefix, strict=False)
+        self.add_int(network.version, int(network.network_address), network.prefixlen, route,
+                     metric)
+
+    def add_int(self, version, network_int, prefix_len, route, metric=0):
+        """以整數形式加入路由（大量建立索引時避免建立 ipaddress 物件）"""
+        bits = 32 if version == 4 else 128
+        tables = self._tables[version]
+        table = tables.get(prefix_len)
+        if table is None:
+            table = tables[prefix_len] = {}
+            self._lengths[version] = sorted(tables, reverse=True)
+
+        key = network_int >> (bits - prefix_len)
+        existing = table.get(key)
+        if existing is None:
+            self._count += 1
+        elif existing[0] <= metric:
+            return
+        table[key] = (metric, route)
+
+    def lookup_int(self, version, address_int):
+        """以整數地址查詢，回傳 (前綴長度, 路由)，無符合路由時回傳 None"""
+        bits = 32 if version == 4 else 128
+        tables = self._tables[version]
+        for prefix_len in self._lengths[version]:
+            entry = tables[prefix_len].get(address_int >> (bits - prefix_len))
+            if entry is not None:
+                return prefix_len, entry[1]
+        return None
+
+    def lookup(self, address):
+        """查詢目的地址（字串或 ipaddress 物件），回傳最長前綴比對的路由或 None"""
+        if isinstance(address, str):
+            address = address.split('%', 1)[0]
+            try:
+                family = socket.AF_INET6 if ':' in address else socket.AF_INET
+                packed = socket.inet_pton(family, address)
+            except OSError:
+                return None
+            version = 6 if family == socket.AF_INET6 else 4
+            address_int = int.from_bytes(packed, 'big')
+        else:
+            version = address.version
+            address_int = int(address)
+
+        result = self.lookup_int(version, address_int)
+        return result[1] if result is not None else None
+
+
+if __name__ == "__main__":
+    # 測試代碼
+    table = RouteTable()
+    table.add('0.0.0.0/0', {'gateway': '192.168.1.1', 'interface': 'eth0'})
+    table.add('10.0.0.0/8', {'gateway': '10.0.0.1', 'interface': 'tun0'})
+    table.add('10.1.0.0/16', {'gateway': '0.0.0.0', 'interface': 'eth1'})
+
+    for destination in ['8.8.8.8', '10.2.3.4', '10.1.2.3']:
+        print(f"{destination} -> {table.lookup(destination)}")
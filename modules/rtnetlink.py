@@ -0,0 +1,713 @@
+# -*- coding: utf-8 -*-
+"""
+rtnetlink 網路狀態模組
+功能：透過 Linux rtnetlink 以批次 dump 請求取得介面、地址、路由與鄰居表
+"""
+
+import os
+import errno
+import select
+import socket
+import struct
+import threading
+from collections import namedtuple
+
+
+# Netlink 協定常數
+NETLINK_ROUTE = 0
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+RTM_NEWNEIGH = 28
+RTM_DELNEIGH = 29
+RTM_GETNEIGH = 30
+
+IFF_UP = 0x1
+IFF_RUNNING = 0x40
+
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_OPERSTATE = 16
+IFLA_LINKINFO = 18
+IFLA_STATS64 = 23
+IFLA_INFO_KIND = 1
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+IFA_BROADCAST = 4
+
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_PREFSRC = 7
+RTA_TABLE = 15
+
+NDA_DST = 1
+NDA_LLADDR = 2
+
+# 多播群組
+RTMGRP_LINK = 0x1
+RTMGRP_NEIGH = 0x4
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+
+RT_TABLE_MAIN = 254
+RTN_UNICAST = 1
+
+# 二進位結構
+_NLMSGHDR = struct.Struct('=IHHII')
+_IFINFOMSG = struct.Struct('=BxHiII')
+_IFADDRMSG = struct.Struct('=BBBBI')
+_RTMSG = struct.Struct('=BBBBBBBBI')
+_NDMSG = struct.Struct('=BxxxiHBB')
+_RTATTR = struct.Struct('=HH')
+_U32 = struct.Struct('=I')
+_I32 = struct.Struct('=i')
+_STATS64 = struct.Struct('=8Q')
+
+OPERSTATE_NAMES = {
+    0: 'unknown',
+    1: 'notpresent',
+    2: 'down',
+    3: 'lowerlayerdown',
+    4: 'testing',
+    5: 'dormant',
+    6: 'up'
+}
+
+# 精簡的記錄型別
+LinkRecord = namedtuple('LinkRecord', [
+    'index', 'name', 'flags', 'mtu', 'mac', 'operstate', 'kind', 'stats'
+])
+AddrRecord = namedtuple('AddrRecord', [
+    'index', 'family', 'prefixlen', 'address', 'broadcast', 'label', 'scope'
+])
+RouteRecord = namedtuple('RouteRecord', [
+    'family', 'dst', 'dst_len', 'gateway', 'oif', 'prefsrc', 'priority',
+    'table', 'protocol', 'scope', 'type'
+])
+NeighRecord = namedtuple('NeighRecord', [
+    'index', 'family', 'dst', 'lladdr', 'state'
+])
+
+# 網路變更事件：kind 為 link/address/route/neighbor，action 為 add/update/remove
+NetworkEvent = namedtuple('NetworkEvent', ['kind', 'action', 'record', 'previous'])
+
+# 與 psutil 回傳欄位相容的記錄，讓 NetworkInfo 可直接替換資料來源
+IfStats = namedtuple('IfStats', ['isup', 'duplex', 'speed', 'mtu'])
+IoCounters = namedtuple('IoCounters', [
+    'bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+    'errin', 'errout', 'dropin', 'dropout'
+])
+IfAddr = namedtuple('IfAddr', ['family', 'address', 'netmask', 'broadcast', 'ptp'])
+
+# struct rtnl_link_stats64 的欄位順序，名稱與 /sys/class/net/*/statistics 相同；
+# 較舊的核心回傳的欄位較少，解析時依實際長度截斷
+LINK_STATS64_FIELDS = (
+    'rx_packets', 'tx_packets', 'rx_bytes', 'tx_bytes', 'rx_errors', 'tx_errors',
+    'rx_dropped', 'tx_dropped', 'multicast', 'collisions', 'rx_length_errors',
+    'rx_over_errors', 'rx_crc_errors', 'rx_frame_errors', 'rx_fifo_errors',
+    'rx_missed_errors', 'tx_aborted_errors', 'tx_carrier_errors', 'tx_fifo_errors',
+    'tx_heartbeat_errors', 'tx_window_errors', 'rx_compressed', 'tx_compressed',
+    'rx_nohandler', 'rx_otherhost_dropped'
+)
+
+_EMPTY_STATS = (0,) * 8
+_LINK_ATTRS = frozenset([IFLA_ADDRESS, IFLA_IFNAME, IFLA_MTU, IFLA_OPERSTATE, IFLA_LINKINFO,
+                         IFLA_STATS64])
+_LINK_STATS_ATTRS = frozenset([IFLA_IFNAME, IFLA_STATS64])
+
+
+def is_supported():
+    """檢查目前系統是否支援 rtnetlink"""
+    if not hasattr(socket, 'AF_NETLINK'):
+        return False
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        sock.close()
+        return True
+    except OSError:
+        return False
+
+
+def parse_attrs(data, offset, end, wanted=None):
+    """解析 rtattr 串列，回傳 {屬性類型: 內容} 字典
+
+    wanted 為需要的屬性類型集合；介面訊息通常帶有數十個屬性，
+    只切出需要的部分可大幅減少解析成本
+    """
+    attrs = {}
+    unpack_from = _RTATTR.unpack_from
+    while offset + 4 <= end:
+        rta_len, rta_type = unpack_from(data, offset)
+        if rta_len < 4:
+            break
+        rta_type &= 0x7FFF
+        if wanted is None or rta_type in wanted:
+            attrs[rta_type] = data[offset + 4:offset + rta_len]
+        offset += (rta_len + 3) & ~3
+    return attrs
+
+
+def _format_mac(raw):
+    return raw.hex(':')
+
+
+def _format_ip(family, raw):
+    return socket.inet_ntop(family, bytes(raw))
+
+
+def _c_string(raw):
+    return bytes(raw).split(b'\0', 1)[0].decode('utf-8', 'replace')
+
+
+def parse_link(data, start, end):
+    """解析 RTM_NEWLINK 訊息"""
+    _, _, index, flags, _ = _IFINFOMSG.unpack_from(data, start)
+    attrs = parse_attrs(data, start + _IFINFOMSG.size, end, _LINK_ATTRS)
+
+    kind = None
+    if IFLA_LINKINFO in attrs:
+        info = attrs[IFLA_LINKINFO]
+        kind_raw = parse_attrs(info, 0, len(info)).get(IFLA_INFO_KIND)
+        if kind_raw is not None:
+            kind = _c_string(kind_raw)
+
+    stats = attrs.get(IFLA_STATS64)
+    return LinkRecord(
+        index=index,
+        name=_c_string(attrs[IFLA_IFNAME]) if IFLA_IFNAME in attrs else str(index),
+        flags=flags,
+        mtu=_U32.unpack(attrs[IFLA_MTU])[0] if IFLA_MTU in attrs else 0,
+        mac=_format_mac(attrs[IFLA_ADDRESS]) if IFLA_ADDRESS in attrs else None,
+        operstate=attrs[IFLA_OPERSTATE][0] if IFLA_OPERSTATE in attrs else 0,
+        kind=kind,
+        # rx_packets, tx_packets, rx_bytes, tx_bytes, rx_errors, tx_errors, rx_dropped, tx_dropped
+        stats=(_STATS64.unpack_from(stats) if stats is not None and len(stats) >= _STATS64.size
+               else _EMPTY_STATS)
+    )
+
+
+def parse_link_stats(data, start, end):
+    """解析 RTM_NEWLINK 訊息中完整的 rtnl_link_stats64，回傳 (介面名稱, {欄位: 數值})"""
+    index = _IFINFOMSG.unpack_from(data, start)[2]
+    attrs = parse_attrs(data, start + _IFINFOMSG.size, end, _LINK_STATS_ATTRS)
+    name = _c_string(attrs[IFLA_IFNAME]) if IFLA_IFNAME in attrs else str(index)
+    raw = attrs.get(IFLA_STATS64)
+    if raw is None:
+        return name, {}
+    count = min(len(raw) // 8, len(LINK_STATS64_FIELDS))
+    return name, dict(zip(LINK_STATS64_FIELDS, struct.unpack_from(f'={count}Q', raw)))
+
+
+def parse_addr(data, start, end):
+    """解析 RTM_NEWADDR 訊息"""
+    family, prefixlen, _, scope, index = _IFADDRMSG.unpack_from(data, start)
+    attrs = parse_attrs(data, start + _IFADDRMSG.size, end)
+
+    # IPv4 點對點介面的 IFA_ADDRESS 是對端地址，本機地址在 IFA_LOCAL
+    raw = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+    return AddrRecord(
+        index=index,
+        family=family,
+        prefixlen=prefixlen,
+        address=_format_ip(family, raw) if raw is not None else None,
+        broadcast=_format_ip(family, attrs[IFA_BROADCAST]) if IFA_BROADCAST in attrs else None,
+        label=_c_string(attrs[IFA_LABEL]) if IFA_LABEL in attrs else None,
+        scope=scope
+    )
+
+
+def parse_route(data, start, end):
+    """解析 RTM_NEWROUTE 訊息"""
+    family, dst_len, _, _, table, protocol, scope, rtype, _ = _RTMSG.unpack_from(data, start)
+    attrs = parse_attrs(data, start + _RTMSG.size, end)
+
+    if RTA_TABLE in attrs:
+        table = _U32.unpack(attrs[RTA_TABLE])[0]
+    return RouteRecord(
+        family=family,
+        dst=_format_ip(family, attrs[RTA_DST]) if RTA_DST in attrs else None,
+        dst_len=dst_len,
+        gateway=_format_ip(family, attrs[RTA_GATEWAY]) if RTA_GATEWAY in attrs else None,
+        oif=_I32.unpack(attrs[RTA_OIF])[0] if RTA_OIF in attrs else 0,
+        prefsrc=_format_ip(family, attrs[RTA_PREFSRC]) if RTA_PREFSRC in attrs else None,
+        priority=_U32.unpack(attrs[RTA_PRIORITY])[0] if RTA_PRIORITY in attrs else 0,
+        table=table,
+        protocol=protocol,
+        scope=scope,
+        type=rtype
+    )
+
+
+def parse_neigh(data, start, end):
+    """解析 RTM_NEWNEIGH 訊息"""
+    family, index, state, _, _ = _NDMSG.unpack_from(data, start)
+    attrs = parse_attrs(data, start + _NDMSG.size, end)
+    return NeighRecord(
+        index=index,
+        family=family,
+        dst=_format_ip(family, attrs[NDA_DST]) if NDA_DST in attrs else None,
+        lladdr=_format_mac(attrs[NDA_LLADDR]) if NDA_LLADDR in attrs else None,
+        state=state
+    )
+
+
+def prefix_to_netmask(family, prefixlen):
+    """將前綴長度轉為遮罩字串（與 psutil 格式相同）"""
+    bits = 32 if family == socket.AF_INET else 128
+    mask = ((1 << bits) - 1) ^ ((1 << (bits - prefixlen)) - 1)
+    return socket.inet_ntop(family, mask.to_bytes(bits // 8, 'big'))
+
+
+class RtnetlinkClient:
+    """rtnetlink 批次查詢客戶端"""
+
+    def __init__(self, buffer_size=1 << 18):
+        self.buffer_size = buffer_size
+        self._buffer = bytearray(buffer_size)
+        self._seq = 0
+        # 接收緩衝區共用，同一時間只允許一個 dump
+        self._lock = threading.RLock()
+
+    def _open(self):
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        sock.bind((0, 0))
+        return sock
+
+    def _dump(self, sock, msg_type, payload, parser):
+        """送出一個 dump 請求並解析所有回應訊息"""
+        self._seq += 1
+        seq = self._seq
+        header = _NLMSGHDR.pack(_NLMSGHDR.size + len(payload), msg_type,
+                                NLM_F_REQUEST | NLM_F_DUMP, seq, 0)
+        sock.send(header + payload)
+
+        records = []
+        view = memoryview(self._buffer)
+        while True:
+            received = sock.recv_into(self._buffer)
+            data = view[:received]
+            offset = 0
+            while offset + _NLMSGHDR.size <= received:
+                length, mtype, _, mseq, _ = _NLMSGHDR.unpack_from(data, offset)
+                if length < _NLMSGHDR.size:
+                    break
+                if mseq == seq:
+                    if mtype == NLMSG_DONE:
+                        return records
+                    if mtype == NLMSG_ERROR:
+                        error = -_I32.unpack_from(data, offset + _NLMSGHDR.size)[0]
+                        if error:
+                            raise OSError(error, os.strerror(error))
+                        return records
+                    records.append(parser(data, offset + _NLMSGHDR.size, offset + length))
+                offset += (length + 3) & ~3
+
+    def dump_links(self, sock=None):
+        """取得所有網路介面"""
+        return self._run(sock, RTM_GETLINK, _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0),
+                         parse_link)
+
+    def dump_link_stats(self, sock=None):
+        """以單一 dump 取得所有介面的完整統計，回傳 {介面名稱: {欄位: 數值}}"""
+        return dict(self._run(sock, RTM_GETLINK, _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0),
+                              parse_link_stats))
+
+    def dump_addresses(self, sock=None):
+        """取得所有IPv4/IPv6地址"""
+        return self._run(sock, RTM_GETADDR, _IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0),
+                         parse_addr)
+
+    def dump_routes(self, sock=None):
+        """取得所有路由"""
+        return self._run(sock, RTM_GETROUTE, _RTMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0, 0, 0, 0, 0),
+                         parse_route)
+
+    def dump_neighbors(self, sock=None):
+        """取得鄰居表（ARP/NDP）"""
+        return self._run(sock, RTM_GETNEIGH, _NDMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0), parse_neigh)
+
+    def _run(self, sock, msg_type, payload, parser):
+        with self._lock:
+            if sock is not None:
+                return self._dump(sock, msg_type, payload, parser)
+            with self._open() as own_sock:
+                return self._dump(own_sock, msg_type, payload, parser)
+
+    def dump_all(self):
+        """以同一個 socket 依序取得介面、地址、路由與鄰居表"""
+        with self._lock, self._open() as sock:
+            return {
+                'links': self.dump_links(sock),
+                'addresses': self.dump_addresses(sock),
+                'routes': self.dump_routes(sock),
+                'neighbors': self.dump_neighbors(sock)
+            }
+
+
+def _read_sysfs_int(path):
+    try:
+        with open(path, 'r') as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+
+def _read_sysfs_duplex(path):
+    try:
+        with open(path, 'r') as f:
+            value = f.read().strip()
+    except OSError:
+        return 0
+    return {'half': 1, 'full': 2}.get(value, 0)
+
+
+def _link_io_counters(link):
+    (rx_packets, tx_packets, rx_bytes, tx_bytes,
+     rx_errors, tx_errors, rx_dropped, tx_dropped) = link.stats
+    return IoCounters(
+        tx_bytes, rx_bytes, tx_packets, rx_packets,
+        rx_errors, tx_errors, rx_dropped, tx_dropped
+    )
+
+
+class RtnetlinkProvider:
+    """以 rtnetlink 產生與 psutil/netifaces 相同形狀的網路快照"""
+
+    def __init__(self, client=None):
+        self.client = client or RtnetlinkClient()
+
+    def collect(self):
+        """回傳 if_stats / io_counters / if_addrs / gateways / neighbors 資料表"""
+        dump = self.client.dump_all()
+        names = {link.index: link.name for link in dump['links']}
+
+        if_stats = {}
+        io_counters = {}
+        if_addrs = {}
+        for link in dump['links']:
+            is_up = bool(link.flags & IFF_UP)
+            speed = 0
+            duplex = 0
+            # 速度與雙工只存在於 ethtool；僅讀取實體網卡（沒有 link kind）且已啟用者
+            if is_up and link.kind is None and link.flags & IFF_RUNNING and link.mac:
+                base = f'/sys/class/net/{link.name}/'
+                speed = max(_read_sysfs_int(base + 'speed'), 0)
+                duplex = _read_sysfs_duplex(base + 'duplex')
+            if_stats[link.name] = IfStats(is_up, duplex, speed, link.mtu)
+
+            io_counters[link.name] = _link_io_counters(link)
+
+            addrs = if_addrs.setdefault(link.name, [])
+            if link.mac:
+                addrs.append(IfAddr(socket.AF_PACKET, link.mac, None, 'ff:ff:ff:ff:ff:ff', None))
+
+        for addr in dump['addresses']:
+            name = names.get(addr.index)
+            if name is None or addr.address is None:
+                continue
+            address = addr.address
+            if addr.family == socket.AF_INET6 and address.startswith('fe80'):
+                address = f'{address}%{name}'
+            if_addrs.setdefault(name, []).append(IfAddr(
+                addr.family, address, prefix_to_netmask(addr.family, addr.prefixlen),
+                addr.broadcast, None
+            ))
+
+        return {
+            'if_stats': if_stats,
+            'io_counters': io_counters,
+            'if_addrs': if_addrs,
+            'gateways': self._build_gateways(dump['routes'], names),
+            'routes': dump['routes'],
+            'neighbors': dump['neighbors'],
+            'links': dump['links']
+        }
+
+    def io_counters(self):
+        """只取得介面流量計數（單一 RTM_GETLINK dump），供高頻取樣使用"""
+        return {link.name: _link_io_counters(link) for link in self.client.dump_links()}
+
+    def _build_gateways(self, routes, names):
+        """由預設路由建立與 NetworkInfo.get_gateway_info 相同格式的閘道表"""
+        gateways = {}
+        best_default = None
+        for route in routes:
+            if route.dst_len != 0 or route.gateway is None or route.table != RT_TABLE_MAIN:
+                continue
+            interface = names.get(route.oif, str(route.oif))
+            gateways.setdefault(interface, []).append({
+                'ip': route.gateway,
+                'is_default': True
+            })
+            if route.family == socket.AF_INET:
+                if best_default is None or route.priority < best_default.priority:
+                    best_default = route
+
+        if best_default is not None:
+            gateways['default'] = {
+                'ip': best_default.gateway,
+                'interface': names.get(best_default.oif, str(best_default.oif))
+            }
+        return gateways
+
+
+def _link_key(record):
+    return record.index
+
+
+def _addr_key(record):
+    return (record.index, record.family, record.address, record.prefixlen)
+
+
+def _route_key(record):
+    return (record.family, record.table, record.dst, record.dst_len, record.priority, record.oif)
+
+
+def _neigh_key(record):
+    return (record.index, record.family, record.dst)
+
+
+def _same_link(a, b):
+    # 介面統計值每次都不同，比較時忽略
+    return a._replace(stats=None) == b._replace(stats=None)
+
+
+# 訊息類型 -> (種類, 是否為刪除, 解析函式)
+_EVENT_TYPES = {
+    RTM_NEWLINK: ('link', False, parse_link),
+    RTM_DELLINK: ('link', True, parse_link),
+    RTM_NEWADDR: ('address', False, parse_addr),
+    RTM_DELADDR: ('address', True, parse_addr),
+    RTM_NEWROUTE: ('route', False, parse_route),
+    RTM_DELROUTE: ('route', True, parse_route),
+    RTM_NEWNEIGH: ('neighbor', False, parse_neigh),
+    RTM_DELNEIGH: ('neighbor', True, parse_neigh),
+}
+
+_KEY_FUNCS = {
+    'link': _link_key,
+    'address': _addr_key,
+    'route': _route_key,
+    'neighbor': _neigh_key,
+}
+
+
+class RtnetlinkMonitor:
+    """訂閱 rtnetlink 多播群組，以事件增量更新記憶體中的網路模型
+
+    網路沒有變化時執行緒阻塞在 select 上，不消耗 CPU；
+    核心送出通知後立即更新模型並呼叫回呼函式
+    """
+
+    DEFAULT_GROUPS = (RTMGRP_LINK | RTMGRP_NEIGH | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR |
+                      RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_ROUTE)
+
+    def __init__(self, groups=DEFAULT_GROUPS, buffer_size=1 << 18):
+        self.groups = groups
+        self.buffer_size = buffer_size
+        self.model = {kind: {} for kind in _KEY_FUNCS}
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._sock = None
+        self._wake_r = None
+        self._wake_w = None
+        self._thread = None
+
+    def add_callback(self, callback):
+        """註冊回呼函式，callback(event) 會在監聽執行緒中被呼叫"""
+        with self._lock:
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        """移除回呼函式"""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @property
+    def callback_count(self):
+        with self._lock:
+            return len(self._callbacks)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """開始監聽；先加入多播群組再做完整 dump，避免遺漏期間的變更"""
+        if self.running:
+            return
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 21)
+        self._sock.bind((0, self.groups))
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._resync(notify=False)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止監聽並釋放 socket"""
+        if self._wake_w is not None:
+            try:
+                self._wake_w.send(b'\0')
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        for sock in (self._sock, self._wake_r, self._wake_w):
+            if sock is not None:
+                sock.close()
+        self._sock = self._wake_r = self._wake_w = self._thread = None
+
+    def snapshot(self):
+        """回傳目前模型的複本"""
+        with self._lock:
+            return {kind: dict(table) for kind, table in self.model.items()}
+
+    def _resync(self, notify=True):
+        """重新 dump 全部狀態並與模型比對，用於初始化或接收緩衝區溢位後"""
+        dump = RtnetlinkClient(self.buffer_size).dump_all()
+        fresh = {
+            'link': dump['links'],
+            'address': dump['addresses'],
+            'route': dump['routes'],
+            'neighbor': dump['neighbors'],
+        }
+        events = []
+        with self._lock:
+            for kind, records in fresh.items():
+                key_func = _KEY_FUNCS[kind]
+                old_table = self.model[kind]
+                new_table = {key_func(record): record for record in records}
+                for key, record in new_table.items():
+                    previous = old_table.get(key)
+                    if previous is None:
+                        events.append(NetworkEvent(kind, 'add', record, None))
+                    elif previous != record:
+                        if kind == 'link' and _same_link(previous, record):
+                            continue
+                        events.append(NetworkEvent(kind, 'update', record, previous))
+                for key, record in old_table.items():
+                    if key not in new_table:
+                        events.append(NetworkEvent(kind, 'remove', record, record))
+                self.model[kind] = new_table
+        if notify:
+            self._dispatch(events)
+
+    def _apply(self, msg_type, data, start, end):
+        """套用一則通知到模型，回傳產生的事件串列"""
+        kind, removed, parser = _EVENT_TYPES[msg_type]
+        record = parser(data, start, end)
+        key = _KEY_FUNCS[kind](record)
+        with self._lock:
+            table = self.model[kind]
+            previous = table.get(key)
+            if removed:
+                if previous is None:
+                    return []
+                del table[key]
+                events = [NetworkEvent(kind, 'remove', record, previous)]
+                if kind == 'link':
+                    # 核心刪除介面時不一定會逐筆通知其 IPv4 路由/地址被移除
+                    events.extend(self._purge_interface(record.index))
+                return events
+            table[key] = record
+        if previous is None:
+            return [NetworkEvent(kind, 'add', record, None)]
+        if previous == record or (kind == 'link' and _same_link(previous, record)):
+            return []
+        return [NetworkEvent(kind, 'update', record, previous)]
+
+    def _purge_interface(self, index):
+        """移除屬於指定介面的地址、路由與鄰居（呼叫者需持有鎖）"""
+        events = []
+        for kind, field in (('address', 'index'), ('route', 'oif'), ('neighbor', 'index')):
+            table = self.model[kind]
+            for key in [k for k, r in table.items() if getattr(r, field) == index]:
+                record = table.pop(key)
+                events.append(NetworkEvent(kind, 'remove', record, record))
+        return events
+
+    def _dispatch(self, events):
+        if not events:
+            return
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for event in events:
+            for callback in callbacks:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"網路變更回呼錯誤: {e}")
+
+    def _run(self):
+        buffer = bytearray(self.buffer_size)
+        view = memoryview(buffer)
+        while True:
+            try:
+                readable, _, _ = select.select([self._sock, self._wake_r], [], [])
+                if self._wake_r in readable:
+                    return
+                received = self._sock.recv_into(buffer)
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    # 事件太多導致緩衝區溢位，改以完整 dump 重新同步
+                    try:
+                        self._resync()
+                    except OSError as resync_error:
+                        print(f"rtnetlink 重新同步錯誤: {resync_error}")
+                    continue
+                if self._sock is None or self._sock.fileno() < 0:
+                    return
+                print(f"rtnetlink 監聽錯誤: {e}")
+                return
+
+            data = view[:received]
+            events = []
+            offset = 0
+            while offset + _NLMSGHDR.size <= received:
+                length, mtype, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+                if length < _NLMSGHDR.size:
+                    break
+                if mtype in _EVENT_TYPES:
+                    try:
+                        events.extend(self._apply(mtype, data, offset + _NLMSGHDR.size,
+                                                  offset + length))
+                    except (struct.error, ValueError, KeyError) as e:
+                        print(f"rtnetlink 訊息解析錯誤: {e}")
+                offset += (length + 3) & ~3
+            self._dispatch(events)
+
+
+if __name__ == "__main__":
+    # 測試代碼
+    client = RtnetlinkClient()
+    dump = client.dump_all()
+
+    print(f"介面: {len(dump['links'])}, 地址: {len(dump['addresses'])}, "
+          f"路由: {len(dump['routes'])}, 鄰居: {len(dump['neighbors'])}")
+    for link in dump['links']:
+        print(f"{link.index:4d} {link.name:16s} mtu={link.mtu} "
+              f"state={OPERSTATE_NAMES.get(link.operstate, link.operstate)} mac={link.mac}")
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+接收分流診斷模組
+功能：讀取 softnet_stat、中斷計數、RPS/XPS 遮罩與 IRQ 親和性，計算各 CPU 封包處理速率並標示分配不均
+"""
+
+import os
+import re
+import time
+from collections import namedtuple
+
+
+PROC_SOFTNET_STAT = '/proc/net/softnet_stat'
+PROC_INTERRUPTS = '/proc/interrupts'
+PROC_SOFTIRQS = '/proc/softirqs'
+PROC_IRQ_DIR = '/proc/irq'
+SYS_CLASS_NET = '/sys/class/net'
+
+# 單一 CPU 的封包/中斷占比超過 max(此值, 平均占比 * 1.5)（上限 IMBALANCE_MAX_SHARE）時視為不均；
+# 設上限是因為 CPU 少時平均占比乘上倍數會達到 100%，2 個 CPU 時全部集中在一個也不會被判定
+IMBALANCE_SHARE = 0.5
+IMBALANCE_MAX_SHARE = 0.9
+# 每秒處理封包數低於此值時不判斷負載不均（閒置介面的比例沒有意義）
+MIN_PACKET_RATE = 1000
+
+# 每個 CPU 的 softnet 計數（/proc/net/softnet_stat 第 1、2、3、9、10、11 欄）
+SoftnetStat = namedtuple('SoftnetStat', [
+    'processed', 'dropped', 'time_squeeze', 'cpu_collision', 'received_rps', 'flow_limit_count'
+])
+
+# 非資料佇列的中斷（設定變更、連結狀態、管理用途）
+_CONTROL_IRQ_PATTERN = re.compile(r'config|async|ctrl|control|misc|lsc|mbox|admin', re.IGNORECASE)
+
+
+def parse_softnet_stat(text):
+    """解析 softnet_stat，回傳 {CPU編號: SoftnetStat}
+
+    每行對應一個上線的 CPU；5.10 以後的核心第 13 欄為 CPU 編號，
+    較舊核心只能以行號推算（CPU 離線時會有偏差）
+    """
+    result = {}
+    for line_number, line in enumerate(text.splitlines()):
+        fields = [int(value, 16) for value in line.split()]
+        if len(fields) < 3:
+            continue
+        padded = fields + [0] * (11 - len(fields))
+        cpu = fields[12] if len(fields) >= 13 else line_number
+        result[cpu] = SoftnetStat(padded[0], padded[1], padded[2], padded[8], padded[9], padded[10])
+    return result
+
+
+def parse_interrupts(text):
+    """解析 /proc/interrupts 或 /proc/softirqs
+
+    回傳 (CPU編號串列, {名稱: (各CPU計數 tuple, 說明)})；
+    名稱為 IRQ 編號（int）或 NET_RX 之類的文字
+    """
+    lines = text.splitlines()
+    if not lines:
+        return [], {}
+    cpus = [int(column[3:]) for column in lines[0].split() if column.startswith('CPU')]
+    count = len(cpus)
+
+    result = {}
+    for line in lines[1:]:
+        name, sep, rest = line.partition(':')
+        if not sep:
+            continue
+        name = name.strip()
+        fields = rest.split()
+        values = []
+        for field in fields[:count]:
+            if not field.isdigit():
+                break
+            values.append(int(field))
+        if len(values) < count and name.isdigit():
+            continue
+        description = ' '.join(fields[len(values):])
+        result[int(name) if name.isdigit() else name] = (tuple(values), description)
+    return cpus, result
+
+
+def parse_cpu_mask(text):
+    """解析十六進位 CPU 遮罩（可含逗號分組，例如 00000000,0000000f），回傳 CPU 編號集合"""
+    text = text.strip().replace(',', '')
+    if not text:
+        return frozenset()
+    mask = int(text, 16)
+    return frozenset(bit for bit in range(mask.bit_length()) if mask >> bit & 1)
+
+
+def parse_cpu_list(text):
+    """解析 CPU 串列（例如 0-3,8），回傳 CPU 編號集合"""
+    cpus = set()
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        cpus.update(range(int(start), int(end or start) + 1))
+    return frozenset(cpus)
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def format_cpus(cpus):
+    """CPU 集合轉為 0-3,8 形式"""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def read_irq_affinity(irq):
+    """回傳 IRQ 實際生效的 CPU 集合（effective_affinity 優先），無法讀取時回傳 None"""
+    for entry in ('effective_affinity_list', 'smp_affinity_list'):
+        text = _read_text(os.path.join(PROC_IRQ_DIR, str(irq), entry))
+        if text is not None and text.strip():
+            return parse_cpu_list(text)
+    return None
+
+
+def read_queue_masks(name):
+    """讀取介面各佇列的 RPS/XPS 設定，回傳 {'rx': {佇列: CPU集合}, 'tx': {佇列: CPU集合 或 None}}"""
+    result = {'rx': {}, 'tx': {}}
+    directory = os.path.join(SYS_CLASS_NET, name, 'queues')
+    try:
+        entries = os.listdir(directory)
+    except OSError:
+        return result
+    for entry in entries:
+        kind, _, number = entry.partition('-')
+        if kind not in result or not number.isdigit():
+            continue
+        filename = 'rps_cpus' if kind == 'rx' else 'xps_cpus'
+        text = _read_text(os.path.join(directory, entry, filename))
+        # 未啟用 CONFIG_XPS 或單佇列裝置可能沒有 xps_cpus
+        result[kind][int(number)] = parse_cpu_mask(text) if text is not None else None
+    return result
+
+
+def interface_irqs(name, interrupts):
+    """找出介面使用的資料佇列 IRQ，回傳 {IRQ: 說明}
+
+    依據裝置的 msi_irqs 目錄與 /proc/interrupts 說明欄中的介面/裝置名稱比對
+    """
+    device = os.path.join(SYS_CLASS_NET, name, 'device')
+    tokens = {name}
+    irqs = set()
+    if os.path.exists(device):
+        tokens.add(os.path.basename(os.path.realpath(device)))
+        # virtio 等匯流排裝置的 MSI 中斷記錄在上層 PCI 裝置
+        for directory in (os.path.join(device, 'msi_irqs'), os.path.join(device, '..', 'msi_irqs')):
+            try:
+                irqs.update(int(entry) for entry in os.listdir(directory) if entry.isdigit())
+                break
+            except OSError:
+                continue
+
+    alternatives = '|'.join(re.escape(token) for token in tokens)
+    pattern = re.compile(r'(^|[\s@])(' + alternatives + r')($|[-_.@:\s])')
+    result = {}
+    for irq, (_, description) in interrupts.items():
+        if not isinstance(irq, int):
+            continue
+        if irq in irqs or pattern.search(description):
+            if not _CONTROL_IRQ_PATTERN.search(description):
+                result[irq] = description
+    return result
+
+
+def imbalance_threshold(cpu_count):
+    """回傳 cpu_count 個 CPU 時判定負載不均的單一 CPU 占比（一定小於 1）"""
+    return min(max(IMBALANCE_SHARE, 1.5 / cpu_count), IMBALANCE_MAX_SHARE)
+
+
+class RxScalingSnapshot:
+    """某一時間點的接收分流狀態"""
+
+    __slots__ = ('timestamp', 'cpus', 'softnet', 'interrupts', 'softirqs', 'interfaces')
+
+    def __init__(self, timestamp, cpus, softnet, interrupts, softirqs, interfaces):
+        self.timestamp = timestamp
+        # 上線的 CPU 編號串列
+        self.cpus = cpus
+        # {CPU: SoftnetStat}
+        self.softnet = softnet
+        # {IRQ: (各CPU計數, 說明)}
+        self.interrupts = interrupts
+        # {'NET_RX': {CPU: 計數}, 'NET_TX': {...}}
+        self.softirqs = softirqs
+        # {介面: {'irqs': {IRQ: {'description', 'affinity'}}, 'rps': {...}, 'xps': {...}}}
+        self.interfaces = interfaces
+
+    def delta(self, previous):
+        """計算與較早快照之間各 CPU 的速率與計數差值
+
+        回傳 {'interval', 'cpus': {CPU: {...}}, 'interfaces': {介面: {IRQ: {CPU: 每秒中斷數}}}}
+        """
+        interval = self.timestamp - previous.timestamp
+        if interval <= 0:
+            interval = 1e-9
+
+        cpus = {}
+        for cpu, current in self.softnet.items():
+            before = previous.softnet.get(cpu)
+            if before is None:
+                continue
+            cpus[cpu] = {
+                'processed_per_sec': (current.processed - before.processed) / interval,
+                'dropped': current.dropped - before.dropped,
+                'time_squeeze': current.time_squeeze - before.time_squeeze,
+                'received_rps': current.received_rps - before.received_rps,
+                'flow_limit_count': current.flow_limit_count - before.flow_limit_count
+            }
+        for kind in ('NET_RX', 'NET_TX'):
+            key = kind.lower() + '_per_sec'
+            for cpu, value in self.softirqs.get(kind, {}).items():
+                before = previous.softirqs.get(kind, {}).get(cpu)
+                if cpu in cpus and before is not None:
+                    cpus[cpu][key] = (value - before) / interval
+
+        interfaces = {}
+        for name, info in self.interfaces.items():
+            rates = {}
+            for irq in info['irqs']:
+                current = self.interrupts.get(irq)
+                before = previous.interrupts.get(irq)
+                if current is None or before is None:
+                    continue
+                rates[irq] = {cpu: (now - then) / interval
+                              for cpu, now, then in zip(self.cpus, current[0], before[0])}
+            interfaces[name] = rates
+
+        return {'interval': interval, 'cpus': cpus, 'interfaces': interfaces}
+
+
+class RxScalingDiagnostics:
+    """接收分流診斷器
+
+    snapshot() 讀取一次所有來源；diagnose() 依據設定（佇列對應 CPU 的方式）
+    與兩次快照間的差值（封包處理、丟棄、time_squeeze）產生警示
+    """
+
+    def __init__(self, interfaces=None):
+        # 要檢查的介面，None 表示所有非迴路介面
+        self.interfaces = interfaces
+
+    def _interface_names(self):
+        if self.interfaces is not None:
+            return list(self.interfaces)
+        try:
+            return [name for name in os.listdir(SYS_CLASS_NET) if name != 'lo']
+        except OSError:
+            return []
+
+    def snapshot(self):
+        """讀取目前狀態，回傳 RxScalingSnapshot"""
+        softnet = parse_softnet_stat(_read_text(PROC_SOFTNET_STAT) or '')
+        cpus, interrupts = parse_interrupts(_read_text(PROC_INTERRUPTS) or '')
+        softirq_cpus, softirq_rows = parse_interrupts(_read_text(PROC_SOFTIRQS) or '')
+        timestamp = time.monotonic()
+
+        softirqs = {}
+        for kind in ('NET_RX', 'NET_TX'):
+            if kind in softirq_rows:
+                softirqs[kind] = dict(zip(softirq_cpus, softirq_rows[kind][0]))
+
+        interfaces = {}
+        for name in self._interface_names():
+            masks = read_queue_masks(name)
+            irqs = {irq: {'description': description, 'affinity': read_irq_affinity(irq)}
+                    for irq, description in interface_irqs(name, interrupts).items()}
+            interfaces[name] = {'irqs': irqs, 'rps': masks['rx'], 'xps': masks['tx']}
+
+        return RxScalingSnapshot(timestamp, cpus or sorted(softnet), softnet, interrupts, softirqs,
+                                 interfaces)
+
+    def diagnose(self, current, previous=None):
+        """回傳發現的問題串列，每項為 {'level': 'warning'/'info', 'interface', 'message'}"""
+        findings = []
+        cpu_count = len(current.cpus)
+
+        def add(level, interface, message):
+            findings.append({'level': level, 'interface': interface, 'message': message})
+
+        # 設定檢查：佇列與 CPU 的對應
+        for name, info in current.interfaces.items():
+            rx_queues = len(info['rps'])
+            affinities = [irq['affinity'] for irq in info['irqs'].values() if irq['affinity']]
+
+            if len(affinities) > 1 and cpu_count > 1:
+                used = frozenset().union(*affinities)
+                if len(used) == 1:
+                    add('warning', name, f"{len(affinities)} 個佇列中斷全部由 CPU {format_cpus(used)} 處理")
+                elif len(used) < min(len(affinities), cpu_count):
+                    add('info', name, f"{len(affinities)} 個佇列中斷只分配到 {len(used)} 個 CPU"
+                                      f"（{format_cpus(used)}），共 {cpu_count} 個 CPU")
+
+            rps_enabled = any(mask for mask in info['rps'].values())
+            if rx_queues == 1 and cpu_count > 1 and not rps_enabled:
+                add('warning', name, "只有一個接收佇列且未啟用 RPS，所有接收處理集中在單一 CPU")
+
+            xps = [mask for mask in info['xps'].values() if mask is not None]
+            if len(xps) > 1 and not any(xps):
+                add('info', name, f"{len(xps)} 個傳送佇列未設定 XPS")
+
+        if previous is None:
+            return findings
+
+        # 執行期檢查：兩次快照間的處理量與丟棄
+        delta = current.delta(previous)
+        cpus = delta['cpus']
+        for cpu, stats in sorted(cpus.items()):
+            if stats['dropped'] > 0:
+                add('warning', None, f"CPU {cpu} backlog 佇列已滿丟棄 {stats['dropped']} 個封包"
+                                     "（可調高 net.core.netdev_max_backlog）")
+            if stats['time_squeeze'] > 0:
+                add('warning', None, f"CPU {cpu} softirq 預算用盡 {stats['time_squeeze']} 次"
+                                     "（可調高 net.core.netdev_budget / netdev_budget_usecs）")
+            if stats['flow_limit_count'] > 0:
+                add('info', None, f"CPU {cpu} flow limit 觸發 {stats['flow_limit_count']} 次")
+
+        total = sum(stats['processed_per_sec'] for stats in cpus.values())
+        if len(cpus) > 1 and total >= MIN_PACKET_RATE:
+            threshold = imbalance_threshold(len(cpus))
+            for cpu, stats in sorted(cpus.items()):
+                share = stats['processed_per_sec'] / total
+                if share > threshold:
+                    add('warning', None, f"CPU {cpu} 處理 {share:.0%} 的封包"
+                                         f"（{stats['processed_per_sec']:.0f} pps），softirq 負載不均")
+
+        for name, rates in delta['interfaces'].items():
+            per_cpu = {}
+            for irq_rates in rates.values():
+                for cpu, rate in irq_rates.items():
+                    per_cpu[cpu] = per_cpu.get(cpu, 0.0) + rate
+            total = sum(per_cpu.values())
+            if len(per_cpu) > 1 and total >= MIN_PACKET_RATE / 10:
+                cpu, rate = max(per_cpu.items(), key=lambda item: item[1])
+                if rate / total > imbalance_threshold(len(per_cpu)):
+                    add('warning', name, f"CPU {cpu} 承擔 {rate / total:.0%} 的網卡中斷（{rate:.0f} 次/秒）")
+
+        return findings
+
+
+if __name__ == "__main__":
+    # 測試代碼：取樣一秒並顯示各 CPU 處理速率與診斷結果
+    diagnostics = RxScalingDiagnostics()
+    first = diagnostics.snapshot()
+    time.sleep(1)
+    second = diagnostics.snapshot()
+
+    delta = second.delta(first)
+    for cpu, stats in sorted(delta['cpus'].items()):
+        print(f"CPU {cpu}: {stats['processed_per_sec']:.0f} pps，丟棄 {stats['dropped']}，"
+              f"time_squeeze {stats['time_squeeze']}，NET_RX {stats.get('net_rx_per_sec', 0):.0f}/s")
+    for name, info in second.interfaces.items():
+        print(f"{name}: {len(info['irqs'])} 個佇列中斷，{len(info['rps'])} 個接收佇列")
+        for irq, irq_info in sorted(info['irqs'].items()):
+            affinity = format_cpus(irq_info['affinity']) if irq_info['affinity'] else 'N/A'
+            print(f"  IRQ {irq} ({irq_info['description']}) -> CPU {affinity}")
+
+    findings = diagnostics.diagnose(second, first)
+    for finding in findings:
+        mark = '⚠' if finding['level'] == 'warning' else 'ℹ'
+        print(f"{mark} {finding['interface'] or '系統'}: {finding['message']}")
+    if not findings:
+        print("未發現接收分流問題")
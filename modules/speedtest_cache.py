@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Speedtest 伺服器快取模組
+功能：將 speedtest.net 設定、鄰近伺服器清單與延遲排名保存在磁碟並設定有效期限，
+過期時先使用舊資料並在背景更新，所選伺服器效能明顯下降時才重新排名
+"""
+
+import os
+import copy
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import speedtest
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.dhcp_finder', 'speedtest_cache.json')
+
+_VERSION = 1
+# 伺服器可用的延遲上限（毫秒）：speedtest 的 get_best_server 以 3 個請求的秒數總和 / 6 * 1000 計算延遲，
+# 失敗的請求以 3600 秒計入，因此只要有一個請求失敗延遲就至少為 600 000 ms
+_FAILED_LATENCY_CUTOFF_MS = 3600 / 6 * 1000
+
+
+class _CachedSpeedtest(speedtest.Speedtest):
+    """有快取設定時不重新下載 speedtest.net 設定的 Speedtest"""
+
+    def __init__(self, cached=None, **kwargs):
+        self._cached = cached
+        super().__init__(**kwargs)
+
+    def get_config(self):
+        if self._cached is None:
+            return super().get_config()
+        config, lat_lon = self._cached
+        self.config.update(copy.deepcopy(config))
+        self.lat_lon = tuple(lat_lon)
+        return self.config
+
+
+class SpeedtestCache:
+    """speedtest.net 設定與伺服器排名快取
+
+    config_ttl / servers_ttl / ranking_ttl 為各部分的有效秒數；資料過期但仍存在時
+    create_speedtest() 直接使用並在背景重新驗證，完全沒有快取時才同步下載。
+    record_result() 以指數移動平均記錄各伺服器的延遲與下載速度基準，
+    延遲超過基準 degrade_factor 倍或下載低於基準 min_download_ratio 時標記排名失效並背景更新，
+    該伺服器的基準捨棄，由下一次結果重新建立
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, config_ttl=24 * 3600, servers_ttl=24 * 3600,
+                 ranking_ttl=6 * 3600, candidates=5, degrade_factor=2.0, min_download_ratio=0.5,
+                 timeout=10):
+        self.path = path
+        self.config_ttl = config_ttl
+        self.servers_ttl = servers_ttl
+        self.ranking_ttl = ranking_ttl
+        self.candidates = candidates
+        self.degrade_factor = degrade_factor
+        self.min_download_ratio = min_download_ratio
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self.data = self.load()
+
+    # 磁碟存取
+
+    def load(self):
+        """讀取快取檔案，不存在或格式不符時回傳空快取"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == _VERSION:
+                return data
+        except (OSError, ValueError):
+            pass
+        return {'version': _VERSION}
+
+    def save(self):
+        """寫入暫存檔後改名，避免中斷時留下不完整的檔案"""
+        with self._lock:
+            content = json.dumps(self.data, ensure_ascii=False)
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            print(f"寫入 speedtest 快取錯誤: {e}")
+
+    def _age(self, key, now=None):
+        stamp = self.data.get(f'{key}_time')
+        return float('inf') if stamp is None else (now or time.time()) - stamp
+
+    def is_fresh(self, now=None):
+        """設定、伺服器清單與排名是否都在有效期限內"""
+        return (self._age('config', now) < self.config_ttl
+                and self._age('servers', now) < self.servers_ttl
+                and self._age('ranking', now) < self.ranking_ttl)
+
+    # 取得 Speedtest
+
+    def create_speedtest(self):
+        """回傳已選定伺服器的 Speedtest，以及是否使用快取
+
+        有快取排名時只對第一名伺服器量測一次延遲（3 個請求）；該伺服器無法連線時改用下一名，
+        全部失敗才重新排名
+        """
+        with self._lock:
+            ranking = list(self.data.get('ranking', []))
+        if 'config' not in self.data or not ranking:
+            self.refresh()
+            with self._lock:
+                ranking = list(self.data.get('ranking', []))
+            cached = False
+        else:
+            cached = True
+            if not self.is_fresh():
+                self.refresh_async()
+
+        st = self._new_speedtest()
+        for entry in ranking:
+            best = st.get_best_server([copy.deepcopy(entry['server'])])
+            if best['latency'] < _FAILED_LATENCY_CUTOFF_MS:
+                return st, cached
+        # 快取的伺服器都無法連線：同步重新排名
+        self.invalidate('ranking')
+        self.refresh()
+        st = self._new_speedtest()
+        st.get_best_server([copy.deepcopy(entry['server'])
+                            for entry in self.data.get('ranking', [])[:1]])
+        return st, False
+
+    def _new_speedtest(self):
+        with self._lock:
+            cached = (self.data['config'], self.data['lat_lon']) if 'config' in self.data else None
+        return _CachedSpeedtest(cached=cached, timeout=self.timeout)
+
+    # 更新
+
+    def refresh(self):
+        """依有效期限更新過期的部分：設定 → 伺服器清單 → 延遲排名"""
+        now = time.time()
+        if self._age('config', now) >= self.config_ttl:
+            st = _CachedSpeedtest(timeout=self.timeout)
+            with self._lock:
+                self.data['config'] = st.config
+                self.data['lat_lon'] = list(st.lat_lon)
+                self.data['config_time'] = now
+        if self._age('servers', now) >= self.servers_ttl:
+            st = self._new_speedtest()
+            servers = st.get_closest_servers(limit=self.candidates)
+            with self._lock:
+                self.data['servers'] = servers
+                self.data['servers_time'] = now
+        if self._age('ranking', now) >= self.ranking_ttl:
+            self.rank()
+        self.save()
+
+    def rank(self):
+        """同時量測候選伺服器的延遲並依延遲排序（無法連線者排除）"""
+        with self._lock:
+            servers = list(self.data.get('servers', []))
+
+        def measure(server):
+            try:
+                best = self._new_speedtest().get_best_server([copy.deepcopy(server)])
+                return best['latency']
+            except Exception:
+                return _FAILED_LATENCY_CUTOFF_MS
+
+        with ThreadPoolExecutor(max_workers=max(len(servers), 1)) as executor:
+            latencies = list(executor.map(measure, servers))
+        reachable = [{'server': server, 'latency': latency}
+                     for server, latency in zip(servers, latencies)
+                     if latency < _FAILED_LATENCY_CUTOFF_MS]
+        ranking = sorted(reachable, key=lambda entry: entry['latency'])
+        with self._lock:
+            self.data['ranking'] = ranking
+            self.data['ranking_time'] = time.time()
+        return ranking
+
+    def refresh_async(self):
+        """在背景更新快取（已有更新執行中時不重複啟動）"""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return self._refresh_thread
+            self._refresh_thread = threading.Thread(target=self._refresh_quietly, daemon=True)
+            self._refresh_thread.start()
+            return self._refresh_thread
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"背景更新 speedtest 快取錯誤: {e}")
+
+    def invalidate(self, key='ranking'):
+        """使 'config'、'servers' 或 'ranking' 失效，下次使用時更新"""
+        with self._lock:
+            self.data.pop(f'{key}_time', None)
+
+    # 效能下降偵測
+
+    def record_result(self, server_id, ping, download, alpha=0.3):
+        """記錄一次測試結果，回傳是否判定為效能下降（已觸發背景重新排名）"""
+        server_id = str(server_id)
+        with self._lock:
+            baselines = self.data.setdefault('baselines', {})
+            baseline = baselines.get(server_id)
+            degraded = False
+            if baseline is None:
+                baselines[server_id] = {'ping': ping, 'download': download, 'samples': 1}
+            else:
+                degraded = (ping > baseline['ping'] * self.degrade_factor
+                            or download < baseline['download'] * self.min_download_ratio)
+                if degraded:
+                    # 重新排名後以新的結果重建基準：線路速度永久下降時不會每次測試都重新排名
+                    del baselines[server_id]
+                else:
+                    # 只以正常結果更新基準，避免下降期間基準被拉低
+                    baseline['ping'] += alpha * (ping - baseline['ping'])
+                    baseline['download'] += alpha * (download - baseline['download'])
+                    baseline['samples'] += 1
+        if degraded:
+            print(f"speedtest 伺服器 {server_id} 效能下降，重新排名")
+            self.invalidate('ranking')
+            self.refresh_async()
+        else:
+            self.save()
+        return degraded
+
+
+if __name__ == "__main__":
+    # 測試代碼：建立或更新快取並顯示排名
+    cache = SpeedtestCache()
+    start = time.time()
+    try:
+        st, cached = cache.create_speedtest()
+        server = st.results.server
+        print(f"{'使用快取' if cached else '重新下載'}，耗時 {time.time() - start:.2f} 秒")
+        print(f"伺服器: {server['sponsor']} - {server['name']}，延遲 {server['latency']:.1f} ms")
+        for entry in cache.data.get('ranking', []):
+            print(f"  {entry['server']['id']:>6} {entry['latency']:8.1f} ms  "
+                  f"{entry['server']['sponsor']}")
+    except Exception as e:
+        print(f"speedtest 快取錯誤: {e}")
@@ -0,0 +1,487 @@
+# -*- coding: utf-8 -*-
+"""
+多串流吞吐量測試模組
+功能：以 N 條並行 HTTP 串流測試下載（依 Range 分段）與上傳速度，
+區分暖機與穩定階段並回報每個取樣區間的吞吐量；內含本機測試用的 HTTP 來源/接收伺服器
+"""
+
+import os
+import ssl
+import time
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from modules.http_probe import split_url, parse_head
+from modules.net_utils import create_connection
+
+
+USER_AGENT = 'dhcp-finder-throughput/1.0'
+
+# 每條串流的接收緩衝區（預先配置，以 recv_into 重複使用）
+DEFAULT_BUFFER_SIZE = 256 * 1024
+# 每次上傳請求的本文大小，送完後在同一連線送出下一個請求
+DEFAULT_UPLOAD_SIZE = 64 * 1024 * 1024
+
+MAX_HEADER_BYTES = 65536
+
+
+class _Stream:
+    """單一串流的狀態；bytes 只由該串流的執行緒寫入，取樣執行緒只讀取"""
+
+    __slots__ = ('index', 'byte_range', 'bytes', 'requests', 'error', 'sock')
+
+    def __init__(self, index, byte_range):
+        self.index = index
+        self.byte_range = byte_range
+        self.bytes = 0
+        self.requests = 0
+        self.error = None
+        self.sock = None
+
+
+class ThroughputEngine:
+    """多串流吞吐量測試引擎
+
+    每條串流使用獨立的執行緒與 keep-alive 連線：下載時各自重複請求檔案中分配到的區段，
+    上傳時重複送出 upload_size 大小的請求，直到 duration 秒結束。
+    取樣執行緒每 interval 秒加總各串流的位元組數；前 ramp_up 秒（TCP 慢啟動）為暖機階段，
+    之後為穩定階段，回報的速度以穩定階段計算
+    """
+
+    def __init__(self, streams=4, duration=10.0, ramp_up=2.0, interval=0.5,
+                 buffer_size=DEFAULT_BUFFER_SIZE, upload_size=DEFAULT_UPLOAD_SIZE, timeout=10.0,
+                 verify=True, interface=None, source=None):
+        """interface / source 指定各串流使用的介面與來源地址（見 net_utils.bind_socket）"""
+        self.streams = streams
+        self.duration = duration
+        self.ramp_up = min(ramp_up, duration / 2)
+        self.interval = interval
+        self.buffer_size = buffer_size
+        self.upload_size = upload_size
+        self.timeout = timeout
+        self.interface = interface
+        self.source = source
+        self._context = ssl.create_default_context()
+        if not verify:
+            self._context.check_hostname = False
+            self._context.verify_mode = ssl.CERT_NONE
+
+    def download(self, url, size=None):
+        """下載測試；size 為檔案大小，未提供時以 1 位元組 Range 請求查詢。
+        伺服器不支援 Range 時每條串流各自下載完整檔案"""
+        target = split_url(url)
+        if size is None:
+            size = self._discover_size(target)
+        if size and size >= self.streams:
+            step = size // self.streams
+            ranges = [(index * step,
+                       size - 1 if index == self.streams - 1 else (index + 1) * step - 1)
+                      for index in range(self.streams)]
+        else:
+            ranges = [None] * self.streams
+        result = self._run('download', target, ranges, self._download_stream)
+        result['size'] = size
+        return result
+
+    def upload(self, url):
+        """上傳測試：以 POST 送出預先配置緩衝區中的資料"""
+        return self._run('upload', split_url(url), [None] * self.streams, self._upload_stream)
+
+    # 執行與取樣
+
+    def _run(self, direction, target, ranges, worker):
+        streams = [_Stream(index, byte_range) for index, byte_range in enumerate(ranges)]
+        stop = threading.Event()
+        threads = [threading.Thread(target=worker, args=(target, stream, stop), daemon=True)
+                   for stream in streams]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        samples = [(0.0, 0)]
+        next_time = start
+        end = start + self.duration
+        while True:
+            next_time = min(next_time + self.interval, end)
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                stop.wait(delay)
+            now = time.perf_counter()
+            samples.append((now - start, sum(stream.bytes for stream in streams)))
+            if now >= end or all(not thread.is_alive() for thread in threads):
+                break
+
+        stop.set()
+        # 關閉 socket 讓阻塞中的 recv/send 立即返回
+        for stream in streams:
+            sock = stream.sock
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        for thread in threads:
+            thread.join(timeout=self.timeout)
+
+        return self._summarize(direction, samples, streams)
+
+    def _summarize(self, direction, samples, streams):
+        intervals = []
+        for (start, before), (end, after) in zip(samples, samples[1:]):
+            if end <= start:
+                continue
+            intervals.append({
+                'start': start,
+                'end': end,
+                'bytes': after - before,
+                'mbps': (after - before) * 8 / (end - start) / 1_000_000,
+                'phase': 'ramp' if (start + end) / 2 < self.ramp_up else 'steady'
+            })
+
+        total = samples[-1][1]
+        elapsed = samples[-1][0]
+        steady = [interval for interval in intervals if interval['phase'] == 'steady']
+        steady_time = sum(interval['end'] - interval['start'] for interval in steady)
+        steady_bytes = sum(interval['bytes'] for interval in steady)
+        errors = [stream.error for stream in streams if stream.error]
+        return {
+            'success': total > 0,
+            'direction': direction,
+            'streams': len(streams),
+            'bytes': total,
+            'duration': elapsed,
+            # 穩定階段的平均速度；測試過短沒有穩定階段時以整體平均計算
+            'mbps': (steady_bytes * 8 / steady_time / 1_000_000 if steady_time > 0
+                     else total * 8 / elapsed / 1_000_000 if elapsed > 0 else 0.0),
+            'peak_mbps': max((interval['mbps'] for interval in intervals), default=0.0),
+            'intervals': intervals,
+            'per_stream': [
+                {'bytes': stream.bytes, 'requests': stream.requests, 'error': stream.error}
+                for stream in streams
+            ],
+            'errors': errors,
+            'error': errors[0] if total == 0 and errors else None
+        }
+
+    # 串流
+
+    def _open(self, target):
+        scheme, host, port, _, _ = target
+        sock = create_connection((host, port), timeout=self.timeout, interface=self.interface,
+                                 source=self.source)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if scheme == 'https':
+            sock = self._context.wrap_socket(sock, server_hostname=host)
+        return sock
+
+    def _read_head(self, sock):
+        """讀取回應標頭，回傳 (狀態碼, 標頭, 已讀入的本文 bytes)"""
+        buffer = bytearray()
+        while True:
+            chunk = sock.recv(16384)
+            if not chunk:
+                raise ConnectionError('連線在回應標頭前關閉')
+            buffer += chunk
+            end = buffer.find(b'\r\n\r\n')
+            if end >= 0:
+                status, headers = parse_head(bytes(buffer[:end]))
+                return status, headers, bytes(buffer[end + 4:])
+            if len(buffer) > MAX_HEADER_BYTES:
+                raise ValueError('回應標頭過大')
+
+    def _read_chunked(self, sock, pending, view, stream=None):
+        """讀取 Transfer-Encoding: chunked 本文到最後一個 chunk 與 trailer 為止；
+        指定 stream 時本文位元組即時計入 stream.bytes"""
+        pending = bytearray(pending)
+
+        def read_line():
+            while True:
+                end = pending.find(b'\r\n')
+                if end >= 0:
+                    line = bytes(pending[:end])
+                    del pending[:end + 2]
+                    return line
+                if len(pending) > MAX_HEADER_BYTES:
+                    raise ValueError('chunk 標頭過大')
+                chunk = sock.recv(16384)
+                if not chunk:
+                    raise ConnectionError('連線在 chunked 本文結束前關閉')
+                pending.extend(chunk)
+
+        while True:
+            size = int(read_line().split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                while read_line():
+                    pass
+                return
+            buffered = min(size, len(pending))
+            del pending[:buffered]
+            remaining = size - buffered
+            if stream is not None:
+                stream.bytes += buffered
+            while remaining > 0:
+                count = sock.recv_into(view, min(remaining, len(view)))
+                if not count:
+                    raise ConnectionError('連線在 chunked 本文結束前關閉')
+                remaining -= count
+                if stream is not None:
+                    stream.bytes += count
+            if read_line():
+                raise ValueError('chunk 格式錯誤')
+
+    def _request_head(self, target, method, extra=''):
+        _, _, _, path, host_header = target
+        head = (f'{method} {path} HTTP/1.1\r\nHost: {host_header}\r\nUser-Agent: {USER_AGENT}\r\n'
+                f'Accept-Encoding: identity\r\nConnection: keep-alive\r\n{extra}\r\n')
+        return head.encode('ascii')
+
+    def _discover_size(self, target):
+        try:
+            sock = self._open(target)
+        except OSError:
+            return None
+        with sock:
+            try:
+                sock.sendall(self._request_head(target, 'GET', 'Range: bytes=0-0\r\n'))
+                status, headers, _ = self._read_head(sock)
+            except (OSError, ValueError):
+                return None
+        if status == 206 and '/' in headers.get('content-range', ''):
+            total = headers['content-range'].rsplit('/', 1)[1]
+            return int(total) if total.isdigit() else None
+        return None
+
+    def _download_stream(self, target, stream, stop):
+        buffer = bytearray(self.buffer_size)
+        view = memoryview(buffer)
+        extra = ''
+        if stream.byte_range is not None:
+            extra = f'Range: bytes={stream.byte_range[0]}-{stream.byte_range[1]}\r\n'
+        request = self._request_head(target, 'GET', extra)
+        try:
+            while not stop.is_set():
+                if stream.sock is None:
+                    stream.sock = self._open(target)
+                sock = stream.sock
+                sock.sendall(request)
+                status, headers, body = self._read_head(sock)
+                if status not in (200, 206):
+                    raise ConnectionError(f'HTTP {status}')
+                length = headers.get('content-length')
+                if 'chunked' in headers.get('transfer-encoding', '').lower():
+                    self._read_chunked(sock, body, view, stream)
+                    remaining = 0
+                else:
+                    stream.bytes += len(body)
+                    remaining = int(length) - len(body) if length is not None else None
+                    while remaining is None or remaining > 0:
+                        count = sock.recv_into(view, self.buffer_size if remaining is None
+                                               else min(remaining, self.buffer_size))
+                        if not count:
+                            break
+                        stream.bytes += count
+                        if remaining is not None:
+                            remaining -= count
+                stream.requests += 1
+                closing = headers.get('connection', '').lower() == 'close'
+                if remaining is None or remaining > 0 or closing:
+                    # 未知長度或伺服器要求關閉：下一輪重新連線
+                    sock.close()
+                    stream.sock = None
+        except (OSError, ValueError) as e:
+            if not stop.is_set():
+                stream.error = str(e)
+        finally:
+            if stream.sock is not None:
+                stream.sock.close()
+
+    def _upload_stream(self, target, stream, stop):
+        payload = memoryview(os.urandom(min(self.buffer_size, self.upload_size)))
+        request = self._request_head(target, 'POST', f'Content-Type: application/octet-stream\r\n'
+                                                     f'Content-Length: {self.upload_size}\r\n')
+        try:
+            while not stop.is_set():
+                if stream.sock is None:
+                    stream.sock = self._open(target)
+                sock = stream.sock
+                sock.sendall(request)
+                remaining = self.upload_size
+                while remaining > 0:
+                    count = sock.send(payload[:remaining] if remaining < len(payload) else payload)
+                    stream.bytes += count
+                    remaining -= count
+                status, headers, body = self._read_head(sock)
+                if not 200 <= status < 300:
+                    raise ConnectionError(f'HTTP {status}')
+                if 'chunked' in headers.get('transfer-encoding', '').lower():
+                    self._read_chunked(sock, body, memoryview(bytearray(16384)))
+                else:
+                    length = int(headers.get('content-length', 0))
+                    received = len(body)
+                    while received < length:
+                        chunk = sock.recv(length - received)
+                        if not chunk:
+                            break
+                        received += len(chunk)
+                stream.requests += 1
+                if headers.get('connection', '').lower() == 'close':
+                    sock.close()
+                    stream.sock = None
+        except (OSError, ValueError) as e:
+            if not stop.is_set():
+                stream.error = str(e)
+        finally:
+            if stream.sock is not None:
+                stream.sock.close()
+
+
+class _ThroughputHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _source_range(self):
+        """解析 ?size= 與 Range 標頭，回傳 (狀態碼, 開始, 結束, 總大小)"""
+        query = parse_qs(urlsplit(self.path).query)
+        size = int(query.get('size', [self.server.source_size])[0])
+        header = self.headers.get('Range', '')
+        if header.startswith('bytes=') and ',' not in header:
+            first, _, last = header[6:].partition('-')
+            try:
+                if first:
+                    start = int(first)
+                    end = min(int(last), size - 1) if last else size - 1
+                else:
+                    start, end = max(size - int(last), 0), size - 1
+            except ValueError:
+                return 200, 0, size - 1, size
+            if start <= end < size:
+                return 206, start, end, size
+            return 416, 0, -1, size
+        return 200, 0, size - 1, size
+
+    def _send_source_headers(self):
+        status, start, end, size = self._source_range()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        elif status == 416:
+            self.send_header('Content-Range', f'bytes */{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        return end - start + 1
+
+    def do_HEAD(self):
+        self._send_source_headers()
+
+    def do_GET(self):
+        remaining = self._send_source_headers()
+        block = self.server.block
+        try:
+            while remaining > 0:
+                count = min(remaining, len(block))
+                self.wfile.write(block[:count])
+                remaining -= count
+        except OSError:
+            self.close_connection = True
+
+    def do_POST(self):
+        try:
+            remaining = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            remaining = 0
+        buffer = memoryview(bytearray(DEFAULT_BUFFER_SIZE))
+        received = 0
+        try:
+            while remaining > 0:
+                count = self.rfile.readinto(buffer[:min(remaining, len(buffer))])
+                if not count:
+                    break
+                received += count
+                remaining -= count
+        except OSError:
+            self.close_connection = True
+            return
+        body = f'{{"received": {received}}}'.encode('ascii')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalThroughputServer(ThreadingHTTPServer):
+    """本機吞吐量測試伺服器
+
+    GET/HEAD 任何路徑回傳 source_size 位元組（可用 ?size= 指定，支援單一 Range），
+    POST 讀取並丟棄請求本文；資料來源為啟動時產生的 1 MiB 隨機區塊
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, source_size=1 << 30):
+        super().__init__((host, port), _ThroughputHandler)
+        self.source_size = source_size
+        self.block = memoryview(os.urandom(1 << 20))
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # 測試結束時用戶端直接關閉連線，不需輸出錯誤
+        pass
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+if __name__ == "__main__":
+    # 測試代碼：python -m modules.throughput_engine [下載URL [上傳URL]]，未指定時使用本機伺服器
+    import sys
+
+    engine = ThroughputEngine(streams=4, duration=6.0, ramp_up=2.0)
+    server = None
+    if len(sys.argv) > 1:
+        download_url = sys.argv[1]
+        upload_url = sys.argv[2] if len(sys.argv) > 2 else None
+    else:
+        server = LocalThroughputServer().start()
+        download_url = upload_url = server.url
+
+    try:
+        for direction, url in (('download', download_url), ('upload', upload_url)):
+            if not url:
+                continue
+            result = engine.download(url) if direction == 'download' else engine.upload(url)
+            if not result['success']:
+                print(f"{direction}: 失敗 {result['error']}")
+                continue
+            print(f"{direction}: {result['mbps']:.1f} Mbps（穩定階段），尖峰 {result['peak_mbps']:.1f} Mbps，"
+                  f"{result['streams']} 條串流，共 {result['bytes'] / 1e6:.1f} MB")
+            for interval in result['intervals']:
+                print(f"  {interval['start']:5.2f}-{interval['end']:5.2f} s  "
+                      f"{interval['mbps']:10.1f} Mbps  {interval['phase']}")
+    finally:
+        if server is not None:
+            server.stop()
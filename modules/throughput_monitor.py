@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+即時流量監測模組
+功能：定期取樣所有介面的累計計數，存入固定大小的環形緩衝區並計算速率
+"""
+
+import time
+import threading
+from array import array
+
+from modules.network_info import NetworkInfo
+from modules.network_model import COUNTER_FIELDS
+from modules.network_view import format_rate
+
+
+_FIELD_COUNT = len(COUNTER_FIELDS)
+
+
+class CounterRing:
+    """單一介面的環形緩衝區
+
+    時間戳記存放在 array('d')，八個計數交錯存放在 array('Q')，
+    容量固定，寫入不會配置新記憶體
+    """
+
+    __slots__ = ('capacity', 'timestamps', 'values', 'head', 'count')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = array('Q', bytes(8 * capacity * _FIELD_COUNT))
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, counters):
+        """寫入一筆樣本，counters 為依 COUNTER_FIELDS 排列的序列"""
+        slot = self.head
+        self.timestamps[slot] = timestamp
+        base = slot * _FIELD_COUNT
+        values = self.values
+        for i in range(_FIELD_COUNT):
+            values[base + i] = counters[i]
+        self.head = (slot + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _slot(self, age):
+        """第 age 新的樣本位置（0 為最新）"""
+        return (self.head - 1 - age) % self.capacity
+
+    def latest(self):
+        """回傳 (時間戳記, 計數tuple)，沒有樣本時回傳 None"""
+        if self.count == 0:
+            return None
+        return self.sample(0)
+
+    def sample(self, age):
+        slot = self._slot(age)
+        base = slot * _FIELD_COUNT
+        return self.timestamps[slot], tuple(self.values[base:base + _FIELD_COUNT])
+
+    def find_since(self, timestamp):
+        """找出時間戳記不晚於 timestamp 的最新樣本的 age；不足時回傳最舊樣本
+
+        時間戳記隨 age 遞減，以二分搜尋查找
+        """
+        low, high = 1, self.count - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamps[self._slot(middle)] <= timestamp:
+                high = middle
+            else:
+                low = middle + 1
+        return high
+
+
+class ThroughputMonitor:
+    """每個介面的即時速率監測器
+
+    以固定間隔讀取一次所有介面計數（rtnetlink 或 psutil 單次呼叫），
+    依滑動視窗計算 bytes/s、packets/s、錯誤與丟包速率
+    """
+
+    def __init__(self, network_info=None, interval=1.0, capacity=600, store=None):
+        """store: 可選的 CounterStore，每次取樣同時寫入長期紀錄"""
+        self.network_info = network_info or NetworkInfo()
+        self.store = store
+        self.interval = interval
+        self.capacity = capacity
+        self.rings = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def sample(self, timestamp=None, counters=None):
+        """取樣一次；counters 可傳入 {介面: 計數} 以便測試或外部資料來源"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if counters is None:
+            counters = self.network_info.get_io_counters()
+
+        with self._lock:
+            # 消失的介面不再保留緩衝區，記憶體只與目前介面數量相關
+            for name in [n for n in self.rings if n not in counters]:
+                del self.rings[name]
+            for name, counter in counters.items():
+                ring = self.rings.get(name)
+                if ring is None:
+                    ring = self.rings[name] = CounterRing(self.capacity)
+                ring.append(timestamp, counter)
+
+        if self.store is not None:
+            self.store.record(counters)
+
+    def rates(self, interface_name, window=10.0):
+        """計算指定介面在最近 window 秒內的平均速率，樣本不足時回傳 None"""
+        with self._lock:
+            ring = self.rings.get(interface_name)
+            if ring is None or ring.count < 2:
+                return None
+            now, current = ring.latest()
+            then, previous = ring.sample(ring.find_since(now - window))
+
+        elapsed = now - then
+        if elapsed <= 0:
+            return None
+
+        result = {'interval': elapsed}
+        for field, new, old in zip(COUNTER_FIELDS, current, previous):
+            # 計數器歸零（介面重建或溢位）時以 0 計算
+            delta = new - old if new >= old else 0
+            result[f'{field}_per_sec'] = delta / elapsed
+        return result
+
+    def all_rates(self, window=10.0):
+        """回傳 {介面: 速率字典}"""
+        with self._lock:
+            names = list(self.rings)
+        rates = {}
+        for name in names:
+            result = self.rates(name, window)
+            if result is not None:
+                rates[name] = result
+        return rates
+
+    def start(self):
+        """啟動背景取樣執行緒"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止背景取樣"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+        self._thread = None
+
+    def _run(self):
+        # 以絕對時間排程，避免取樣耗時累積成漂移
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"流量取樣錯誤: {e}")
+            next_time += self.interval
+            delay = next_time - time.monotonic()
+            if delay < 0:
+                # 取樣落後時直接對齊下一個週期，不補跑
+                next_time = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+
+
+if __name__ == "__main__":
+    # 測試代碼（無GUI模式）：每秒顯示各介面速率
+    network_info = NetworkInfo()
+    monitor = ThroughputMonitor(network_info, interval=1.0)
+    monitor.start()
+
+    try:
+        while True:
+            time.sleep(5)
+            print(f"\n{'介面':16s} {'接收':>14s} {'傳送':>14s} {'封包收/秒':>10s} {'錯誤/秒':>8s} {'丟包/秒':>8s}")
+            for name, rate in sorted(monitor.all_rates(window=5).items()):
+                print(f"{name:16s} "
+                      f"{format_rate(rate['bytes_recv_per_sec']):>14s} "
+                      f"{format_rate(rate['bytes_sent_per_sec']):>14s} "
+                      f"{rate['packets_recv_per_sec']:10.1f} "
+                      f"{rate['errin_per_sec'] + rate['errout_per_sec']:8.1f} "
+                      f"{rate['dropin_per_sec'] + rate['dropout_per_sec']:8.1f}")
+    except KeyboardInterrupt:
+        monitor.stop()
@@ -0,0 +1,609 @@
+# -*- coding: utf-8 -*-
+"""
+平行 TTL 路徑追蹤模組
+功能：同時送出每個 TTL 的探測封包（ICMP、UDP 或 TCP SYN），依 ICMP 錯誤中夾帶的原始標頭對應回應，
+一個 RTT 內取得完整路徑，並可如 mtr 持續多輪統計每一跳的遺失率與延遲
+"""
+
+import time
+import errno
+import random
+import select
+import socket
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.icmp_engine import SO_TIMESTAMPNS, build_echo_request, summarize
+from modules.net_utils import bind_socket
+
+
+PROTOCOLS = ('icmp', 'udp', 'tcp')
+
+# 傳統 traceroute 的 UDP 目的埠
+DEFAULT_UDP_PORT = 33434
+DEFAULT_TCP_PORT = 80
+
+ICMP_ECHO_REPLY = 0
+ICMP_DEST_UNREACH = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+ICMPV6_DEST_UNREACH = 1
+ICMPV6_PACKET_TOO_BIG = 2
+ICMPV6_TIME_EXCEEDED = 3
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+# 目的地無法到達的代碼名稱；目的地本身回報的 port 視為已到達
+UNREACHABLE_V4 = {0: 'network', 1: 'host', 2: 'protocol', 3: 'port',
+                  9: 'prohibited', 10: 'prohibited', 13: 'prohibited'}
+# IPv4 Destination Unreachable 的 Fragmentation Needed 代碼（DF 封包超過下一跳 MTU）
+ICMP_FRAG_NEEDED = 4
+UNREACHABLE_V6 = {0: 'network', 1: 'prohibited', 3: 'host', 4: 'port'}
+
+# Linux 的 IP_RECVERR / IPV6_RECVERR / MSG_ERRQUEUE（部分 Python 版本的 socket 模組未提供）
+IP_RECVERR = getattr(socket, 'IP_RECVERR', 11)
+IPV6_RECVERR = getattr(socket, 'IPV6_RECVERR', 25)
+MSG_ERRQUEUE = getattr(socket, 'MSG_ERRQUEUE', 0x2000)
+# struct sock_extended_err：ee_errno, ee_origin, ee_type, ee_code, ee_pad, ee_info, ee_data
+_EXTENDED_ERR = struct.Struct('=IBBBBII')
+SO_EE_ORIGIN_ICMP = 2
+SO_EE_ORIGIN_ICMP6 = 3
+
+_TIMESPEC = struct.Struct('@ll')
+_ICMP_HEADER = struct.Struct('!BBHHH')
+_PORTS = struct.Struct('!HH')
+
+
+def _classify(family, icmp_type, code, mtu=None):
+    """將 ICMP 錯誤分類為 ('time_exceeded', None)、('unreachable', 代碼名稱) 或 ('too_big', 下一跳 MTU)，
+    其他回傳 None"""
+    if family == socket.AF_INET:
+        if icmp_type == ICMP_TIME_EXCEEDED:
+            return 'time_exceeded', None
+        if icmp_type == ICMP_DEST_UNREACH and code == ICMP_FRAG_NEEDED:
+            return 'too_big', mtu
+        if icmp_type == ICMP_DEST_UNREACH:
+            return 'unreachable', UNREACHABLE_V4.get(code, f'code {code}')
+    else:
+        if icmp_type == ICMPV6_TIME_EXCEEDED:
+            return 'time_exceeded', None
+        if icmp_type == ICMPV6_PACKET_TOO_BIG:
+            return 'too_big', mtu
+        if icmp_type == ICMPV6_DEST_UNREACH:
+            return 'unreachable', UNREACHABLE_V6.get(code, f'code {code}')
+    return None
+
+
+def parse_icmp(family, data):
+    """解析 raw socket 收到的 ICMP 封包（IPv4 含 IP 標頭）
+
+    回傳 (kind, detail, key, inner_destination)：
+    kind 為 'echo'、'time_exceeded'、'unreachable' 或 'too_big'，
+    detail 為無法到達的代碼名稱或回報的下一跳 MTU；
+    key 為 ('icmp', 識別碼, 序號)、('udp', 來源埠) 或 ('tcp', 來源埠)，由錯誤中夾帶的原始標頭取得；
+    inner_destination 為原始封包的目的地址（Echo Reply 為 None）。
+    無法辨識時回傳 None
+    """
+    if family == socket.AF_INET:
+        if len(data) < 20:
+            return None
+        data = data[(data[0] & 0x0F) * 4:]
+    if len(data) < _ICMP_HEADER.size:
+        return None
+    icmp_type, code, _, identifier, sequence = _ICMP_HEADER.unpack_from(data)
+    if icmp_type == (ICMP_ECHO_REPLY if family == socket.AF_INET else ICMPV6_ECHO_REPLY):
+        return 'echo', None, ('icmp', identifier, sequence), None
+    # Fragmentation Needed 的 MTU 在第 6-7 位元組，ICMPv6 Packet Too Big 在第 4-7 位元組
+    if family == socket.AF_INET:
+        mtu = struct.unpack_from('!H', data, 6)[0]
+    else:
+        mtu = struct.unpack_from('!I', data, 4)[0]
+    classified = _classify(family, icmp_type, code, mtu)
+    if classified is None:
+        return None
+
+    # 夾帶的原始封包：IP 標頭 + 至少 8 位元組的上層標頭
+    quoted = data[8:]
+    if family == socket.AF_INET:
+        if len(quoted) < 20:
+            return None
+        header_length = (quoted[0] & 0x0F) * 4
+        protocol = quoted[9]
+        destination = socket.inet_ntop(socket.AF_INET, quoted[16:20])
+    else:
+        header_length = 40
+        if len(quoted) < header_length:
+            return None
+        protocol = quoted[6]
+        destination = socket.inet_ntop(socket.AF_INET6, quoted[24:40])
+    upper = quoted[header_length:]
+    if len(upper) < 8:
+        return None
+
+    if protocol in (socket.IPPROTO_ICMP, socket.IPPROTO_ICMPV6):
+        inner_type, _, _, identifier, sequence = _ICMP_HEADER.unpack_from(upper)
+        if inner_type not in (ICMP_ECHO_REQUEST, ICMPV6_ECHO_REQUEST):
+            return None
+        key = ('icmp', identifier, sequence)
+    elif protocol in (socket.IPPROTO_UDP, socket.IPPROTO_TCP):
+        source_port, _ = _PORTS.unpack_from(upper)
+        key = ('udp' if protocol == socket.IPPROTO_UDP else 'tcp', source_port)
+    else:
+        return None
+    return classified[0], classified[1], key, destination
+
+
+def parse_extended_error(family, ancdata):
+    """解析 MSG_ERRQUEUE 的 sock_extended_err，回傳 (kind, detail, 回報地址)，不是 ICMP 錯誤時回傳 None
+
+    too_big 的 detail 為 ee_info 中的下一跳 MTU
+    """
+    for level, kind, value in ancdata:
+        if (level, kind) not in ((socket.IPPROTO_IP, IP_RECVERR),
+                                 (socket.IPPROTO_IPV6, IPV6_RECVERR)):
+            continue
+        if len(value) < _EXTENDED_ERR.size:
+            continue
+        _, origin, icmp_type, code, _, info, _ = _EXTENDED_ERR.unpack_from(value)
+        if origin not in (SO_EE_ORIGIN_ICMP, SO_EE_ORIGIN_ICMP6):
+            continue
+        classified = _classify(family, icmp_type, code, info)
+        if classified is None:
+            continue
+        # 緊接在後的是回報錯誤的節點地址（sockaddr_in / sockaddr_in6）
+        offender = value[_EXTENDED_ERR.size:]
+        if family == socket.AF_INET and len(offender) >= 8:
+            address = socket.inet_ntop(socket.AF_INET, offender[4:8])
+        elif family == socket.AF_INET6 and len(offender) >= 24:
+            address = socket.inet_ntop(socket.AF_INET6, offender[8:24])
+        else:
+            continue
+        return classified[0], classified[1], address
+    return None
+
+
+class _Probe:
+    __slots__ = ('ttl', 'sent_ns', 'sock', 'key')
+
+    def __init__(self, ttl, sent_ns, sock=None, key=None):
+        self.ttl = ttl
+        self.sent_ns = sent_ns
+        self.sock = sock
+        self.key = key
+
+
+class Traceroute:
+    """平行 TTL 路徑追蹤器
+
+    每一輪同時送出 first_hop..max_hops（已知目的地後只到目的地那一跳）的探測封包，
+    收到目的地回應且較近的每一跳都已回應、或逾時即結束該輪；rounds > 1 時如 mtr 持續多輪。
+    mode 'raw'（需要 root 或 CAP_NET_RAW）以 raw ICMP socket 接收所有回應，依夾帶的原始標頭
+    （ICMP 識別碼/序號、UDP/TCP 來源埠）對應探測；'recverr' 不需權限，每個探測使用獨立 socket，
+    以 IP_RECVERR 錯誤佇列取得回報節點，只支援 UDP 與 ICMP datagram socket（Linux）
+    """
+
+    def __init__(self, protocol='icmp', max_hops=30, first_hop=1, timeout=2.0, port=None,
+                 spacing=0.0, payload_size=32, mode='auto', interface=None, source=None):
+        if protocol not in PROTOCOLS:
+            raise ValueError(f'不支援的協定: {protocol}')
+        self.protocol = protocol
+        self.max_hops = max_hops
+        self.first_hop = first_hop
+        self.timeout = timeout
+        self.port = port or (DEFAULT_UDP_PORT if protocol == 'udp' else DEFAULT_TCP_PORT)
+        self.spacing = spacing
+        self.payload = bytes(max(payload_size, 8))
+        self.mode = mode
+        self.interface = interface
+        self.source = source
+        self._stop = threading.Event()
+
+    def stop(self):
+        """停止進行中的 trace()（目前這一輪結束後回傳）"""
+        self._stop.set()
+
+    def trace(self, host, rounds=1, interval=1.0, on_round=None, resolve=False):
+        """追蹤到 host 的路徑
+
+        rounds 為 None 時持續到 stop()；on_round(report) 在每輪結束時呼叫。
+        回傳 {'success', 'host', 'address', 'protocol', 'method', 'reached', 'hops', 'last_hop',
+        'rounds', 'first_round', 'elapsed'}；hops 每一跳包含 ttl、address、addresses、
+        sent/received/loss/last/min/avg/max/mdev/jitter（毫秒）與 unreachable
+        """
+        try:
+            info = socket.getaddrinfo(host, None, 0, socket.SOCK_RAW)[0]
+        except (socket.gaierror, IndexError) as e:
+            return {'success': False, 'host': host, 'error': str(e)}
+        family, address = info[0], info[4][0]
+
+        self._stop.clear()
+        try:
+            receiver, mode = self._open_receiver(family)
+        except OSError as e:
+            return {'success': False, 'host': host, 'address': address, 'error': str(e)}
+
+        state = {
+            'host': host, 'address': address, 'family': family, 'mode': mode,
+            'identifier': random.randrange(1, 0x10000), 'sequence': random.randrange(0x10000),
+            'hops': {}, 'destination': None, 'end': None, 'rounds': 0, 'first_round': None,
+            'sent': 0, 'start': time.monotonic()
+        }
+        try:
+            while rounds is None or state['rounds'] < rounds:
+                round_start = time.monotonic()
+                self._round(state, receiver)
+                state['rounds'] += 1
+                if not state['sent']:
+                    # 第一輪沒有任何探測能送出（權限不足、無路由）
+                    return {'success': False, 'host': host, 'address': address,
+                            'error': state.get('error')}
+                if state['first_round'] is None:
+                    state['first_round'] = (time.monotonic() - round_start) * 1000
+                if on_round is not None:
+                    on_round(self._report(state))
+                if rounds is not None and state['rounds'] >= rounds:
+                    break
+                if self._stop.wait(max(round_start + interval - time.monotonic(), 0)):
+                    break
+        finally:
+            if receiver is not None:
+                receiver.close()
+
+        report = self._report(state)
+        if resolve:
+            self._resolve(report['hops'])
+        return report
+
+    # socket
+
+    def _open_receiver(self, family):
+        """回傳 (raw ICMP socket 或 None, 模式)"""
+        if self.mode in ('auto', 'raw'):
+            proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+            try:
+                sock = socket.socket(family, socket.SOCK_RAW, proto)
+            except OSError:
+                if self.mode == 'raw':
+                    raise
+            else:
+                sock.setblocking(False)
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+                    sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+                except OSError:
+                    pass
+                if self.protocol == 'icmp':
+                    # raw socket 同時用於送出 Echo Request
+                    try:
+                        bind_socket(sock, self.interface, self.source)
+                    except OSError:
+                        sock.close()
+                        raise
+                return sock, 'raw'
+        if self.protocol == 'tcp':
+            raise OSError(errno.EPERM, 'TCP 路徑追蹤需要 raw socket（root 或 CAP_NET_RAW）')
+        return None, 'recverr'
+
+    def _set_ttl(self, sock, family, ttl):
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+        else:
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS, ttl)
+
+    def _probe_socket(self, family, ttl, mode):
+        """建立單一探測用的 socket（UDP、TCP 或 ICMP datagram）"""
+        if self.protocol == 'tcp':
+            sock = socket.socket(family, socket.SOCK_STREAM)
+        elif self.protocol == 'udp':
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+        else:
+            proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+            sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+        try:
+            sock.setblocking(False)
+            bind_socket(sock, self.interface, self.source)
+            self._set_ttl(sock, family, ttl)
+            if mode == 'recverr':
+                if family == socket.AF_INET:
+                    sock.setsockopt(socket.IPPROTO_IP, IP_RECVERR, 1)
+                else:
+                    sock.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVERR, 1)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    # 每一輪
+
+    def _round(self, state, receiver):
+        family, address, mode = state['family'], state['address'], state['mode']
+        hops = state['hops']
+        known = [ttl for ttl in (state['destination'], state['end']) if ttl is not None]
+        limit = min(known) if known else self.max_hops
+        # key -> _Probe（raw 模式依夾帶標頭對應）；fd -> _Probe（各自獨立的探測 socket）
+        pending = {}
+        sockets = {}
+        answered = set()
+
+        try:
+            for ttl in range(self.first_hop, limit + 1):
+                if self.spacing and ttl > self.first_hop:
+                    time.sleep(self.spacing)
+                hop = hops.setdefault(ttl, {'sent': 0, 'rtts': [], 'addresses': {}, 'last': None,
+                                            'unreachable': None})
+                hop['sent'] += 1
+                try:
+                    probe = self._send(state, receiver, ttl, answered)
+                except OSError as e:
+                    # 無路由等錯誤視為遺失
+                    state['error'] = str(e)
+                    continue
+                if probe.key is not None:
+                    pending[probe.key] = probe
+                if probe.sock is not None:
+                    sockets[probe.sock.fileno()] = probe
+                state['sent'] += 1
+            if not pending and not sockets:
+                return
+
+            deadline = time.monotonic() + self.timeout
+            while True:
+                known = [ttl for ttl in (state['destination'], state['end']) if ttl is not None]
+                if known and all(ttl in answered for ttl in range(self.first_hop, min(known) + 1)):
+                    break
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    break
+                readers = ([receiver] if receiver is not None else []) + [
+                    probe.sock for probe in sockets.values() if self.protocol != 'tcp']
+                writers = [probe.sock for probe in sockets.values() if self.protocol == 'tcp']
+                readable, writable, _ = select.select(readers, writers, [], wait)
+                for sock in readable:
+                    if sock is receiver:
+                        self._drain_raw(state, receiver, pending, answered)
+                    else:
+                        self._read_probe(state, sockets, sock, answered)
+                for sock in writable:
+                    self._finish_connect(state, sockets, sock, answered)
+        finally:
+            for probe in sockets.values():
+                probe.sock.close()
+
+    def _send(self, state, receiver, ttl, answered):
+        family, address = state['family'], state['address']
+        if self.protocol == 'icmp':
+            state['sequence'] = sequence = (state['sequence'] + 1) & 0xFFFF
+            packet = build_echo_request(family, state['identifier'], sequence, self.payload)
+            if receiver is not None:
+                self._set_ttl(receiver, family, ttl)
+                sent_ns = time.time_ns()
+                receiver.sendto(packet, (address, 0))
+                return _Probe(ttl, sent_ns, key=('icmp', state['identifier'], sequence))
+            sock = self._probe_socket(family, ttl, state['mode'])
+            sent_ns = time.time_ns()
+            try:
+                sock.sendto(packet, (address, 0))
+            except OSError:
+                sock.close()
+                raise
+            return _Probe(ttl, sent_ns, sock=sock)
+
+        sock = self._probe_socket(family, ttl, state['mode'])
+        try:
+            if self.protocol == 'udp':
+                sock.connect((address, self.port))
+                sent_ns = time.time_ns()
+                sock.send(self.payload)
+                result = None
+            else:
+                sent_ns = time.time_ns()
+                result = sock.connect_ex((address, self.port))
+        except OSError:
+            sock.close()
+            raise
+        probe = _Probe(ttl, sent_ns, sock=sock, key=(self.protocol, sock.getsockname()[1]))
+        if result in (0, errno.ECONNREFUSED):
+            # TCP 連線立即完成或被拒
+            self._record(state, ttl, address, sent_ns, time.time_ns(), 'destination', None,
+                         answered)
+        return probe
+
+    # 接收
+
+    def _drain_raw(self, state, receiver, pending, answered):
+        """讀取 raw socket 上所有已到達的 ICMP 封包"""
+        family = state['family']
+        ancillary_size = socket.CMSG_SPACE(_TIMESPEC.size) if hasattr(socket, 'CMSG_SPACE') else 0
+        while True:
+            try:
+                data, ancdata, _, sender = receiver.recvmsg(2048, ancillary_size)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            received_ns = None
+            for level, kind, value in ancdata:
+                if (level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS
+                        and len(value) >= _TIMESPEC.size):
+                    seconds, nanoseconds = _TIMESPEC.unpack_from(value)
+                    received_ns = seconds * 1000000000 + nanoseconds
+            if received_ns is None:
+                received_ns = time.time_ns()
+
+            parsed = parse_icmp(family, data)
+            if parsed is None:
+                continue
+            kind, detail, key, destination = parsed
+            probe = pending.get(key)
+            if probe is None:
+                continue
+            hop_address = sender[0].split('%', 1)[0]
+            if kind == 'echo':
+                if hop_address != state['address']:
+                    continue
+                kind = 'destination'
+            elif destination != state['address']:
+                continue
+            self._record(state, probe.ttl, hop_address, probe.sent_ns, received_ns, kind, detail,
+                         answered)
+
+    def _read_probe(self, state, sockets, sock, answered):
+        """探測 socket 可讀：錯誤佇列中的 ICMP 錯誤，或目的地的回應"""
+        probe = sockets.get(sock.fileno())
+        if probe is None:
+            return
+        family = state['family']
+        if state['mode'] == 'recverr':
+            try:
+                _, ancdata, _, _ = sock.recvmsg(2048, 512, MSG_ERRQUEUE)
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                return
+            else:
+                error = parse_extended_error(family, ancdata)
+                if error is not None:
+                    kind, detail, hop_address = error
+                    self._record(state, probe.ttl, hop_address, probe.sent_ns, time.time_ns(), kind,
+                                 detail, answered)
+                return
+        try:
+            sock.recv(2048)
+        except ConnectionRefusedError:
+            # raw 模式：目的地回報 port unreachable
+            pass
+        except OSError:
+            return
+        self._record(state, probe.ttl, state['address'], probe.sent_ns, time.time_ns(),
+                     'destination', None, answered)
+
+    def _finish_connect(self, state, sockets, sock, answered):
+        """TCP 連線完成或被拒即到達目的地；其他錯誤（ICMP 無法到達）由 raw socket 記錄"""
+        probe = sockets.pop(sock.fileno(), None)
+        if probe is None:
+            return
+        result = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if result in (0, errno.ECONNREFUSED):
+            self._record(state, probe.ttl, state['address'], probe.sent_ns, time.time_ns(),
+                         'destination', None, answered)
+        sock.close()
+
+    def _record(self, state, ttl, hop_address, sent_ns, received_ns, kind, detail, answered):
+        if ttl in answered:
+            # 重複的回應（例如 TCP SYN 重送）
+            return
+        answered.add(ttl)
+        hop = state['hops'][ttl]
+        rtt = max(received_ns - sent_ns, 0) / 1e6
+        hop['rtts'].append(rtt)
+        hop['last'] = rtt
+        hop['addresses'][hop_address] = hop['addresses'].get(hop_address, 0) + 1
+        if kind == 'destination' or hop_address == state['address']:
+            if state['destination'] is None or ttl < state['destination']:
+                state['destination'] = ttl
+        elif kind == 'unreachable':
+            # 中途節點回報無法到達：路徑在此中斷
+            hop['unreachable'] = detail
+            if state['end'] is None or ttl < state['end']:
+                state['end'] = ttl
+
+    # 結果
+
+    def _report(self, state):
+        hops = state['hops']
+        known = [ttl for ttl in (state['destination'], state['end']) if ttl is not None]
+        if known:
+            final = min(known)
+        else:
+            final = max((ttl for ttl, hop in hops.items() if hop['rtts']),
+                        default=self.first_hop - 1)
+            # 未到達目的地：多列出最後回應節點的下一跳（路徑中斷處）
+            final = min(final + 1, max(hops, default=self.first_hop))
+
+        rows = []
+        for ttl in range(self.first_hop, final + 1):
+            hop = hops.get(ttl, {'sent': 0, 'rtts': [], 'addresses': {}, 'last': None,
+                                 'unreachable': None})
+            row = summarize(list(hop['rtts']), hop['sent'])
+            addresses = sorted(hop['addresses'], key=hop['addresses'].get, reverse=True)
+            row.update({
+                'ttl': ttl,
+                'address': addresses[0] if addresses else None,
+                'addresses': addresses,
+                'last': hop['last'],
+                'unreachable': hop['unreachable']
+            })
+            rows.append(row)
+
+        responding = [row for row in rows if row['received']]
+        report = {
+            'success': True,
+            'host': state['host'],
+            'address': state['address'],
+            'protocol': self.protocol,
+            'method': state['mode'],
+            'reached': state['destination'] is not None,
+            'hops': rows,
+            'last_hop': ({'ttl': responding[-1]['ttl'], 'address': responding[-1]['address']}
+                         if responding else None),
+            'rounds': state['rounds'],
+            'first_round': state['first_round'],
+            'elapsed': time.monotonic() - state['start']
+        }
+        if 'error' in state:
+            report['error'] = state['error']
+        return report
+
+    def _resolve(self, hops):
+        """反查每一跳的主機名稱（同時進行）"""
+        def lookup(address):
+            try:
+                return socket.gethostbyaddr(address)[0]
+            except (OSError, UnicodeError):
+                return None
+
+        addresses = [row['address'] for row in hops if row['address']]
+        with ThreadPoolExecutor(max_workers=max(min(len(addresses), 16), 1)) as executor:
+            names = dict(zip(addresses, executor.map(lookup, addresses)))
+        for row in hops:
+            row['hostname'] = names.get(row['address'])
+
+
+def format_report(report):
+    """將 trace() 的結果排成 mtr 風格的文字表格"""
+    lines = [f"{'':>3}  {'Host':40s} {'Loss%':>6} {'Snt':>4} {'Last':>8} {'Avg':>8} "
+             f"{'Best':>8} {'Wrst':>8} {'StDev':>8}"]
+    for row in report['hops']:
+        name = row.get('hostname') or row['address'] or '???'
+        if row['unreachable']:
+            name += f" !{row['unreachable']}"
+        if row['received']:
+            lines.append(f"{row['ttl']:>3}. {name:40s} {row['loss']:6.1f} {row['sent']:4d} "
+                         f"{row['last']:8.2f} {row['avg']:8.2f} {row['min']:8.2f} "
+                         f"{row['max']:8.2f} {row['mdev']:8.2f}")
+        else:
+            lines.append(f"{row['ttl']:>3}. {name:40s} {row['loss']:6.1f} {row['sent']:4d}")
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    # 測試代碼：python -m modules.traceroute [目標] [icmp|udp|tcp] [輪數]
+    import sys
+
+    arguments = sys.argv[1:]
+    target = arguments[0] if arguments else '8.8.8.8'
+    protocol = arguments[1] if len(arguments) > 1 else 'icmp'
+    count = int(arguments[2]) if len(arguments) > 2 else 3
+    tracer = Traceroute(protocol)
+    result = tracer.trace(target, rounds=count, interval=0.5, resolve=True)
+    if not result['success']:
+        print(f"路徑追蹤失敗: {result['error']}")
+        sys.exit(1)
+
+    print(f"{result['host']} ({result['address']})，{result['protocol']}/{result['method']}，"
+          f"第一輪 {result['first_round']:.1f} ms，共 {result['rounds']} 輪")
+    print(format_report(result))
+    if not result['reached']:
+        last = result['last_hop']
+        print(f"未到達目的地；最後回應節點: {last['address'] if last else '無'}")
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+多上行線路測試模組
+功能：由預設路由找出所有上行線路，將 Ping、TCP、HTTP 與吞吐量探測綁定到各線路的介面或來源地址，
+所有線路同時測試並輸出並排的健康狀態表
+"""
+
+import sys
+import time
+import unicodedata
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.http_probe import HttpProbe
+from modules.icmp_engine import IcmpEngine
+from modules.net_utils import address_family
+from modules.throughput_engine import ThroughputEngine
+
+
+# interface 為 SO_BINDTODEVICE 綁定的介面名稱，source 為來源地址（任一可為 None）
+Uplink = namedtuple('Uplink', ['name', 'interface', 'source', 'gateway'])
+
+# 健康狀態表的列：(標題, 欄位, 格式)
+TABLE_ROWS = (
+    ('狀態', 'status', '{}'),
+    ('介面', 'interface', '{}'),
+    ('來源地址', 'source', '{}'),
+    ('閘道延遲', 'gateway_ping', '{:.1f} ms'),
+    ('Ping', 'ping', '{:.1f} ms'),
+    ('遺失', 'loss', '{:.1f}%'),
+    ('TCP 連線', 'tcp', '{:.1f} ms'),
+    ('HTTP', 'http', '{:.1f} ms'),
+    ('成功項目', 'passed', '{}'),
+    ('下載', 'mbps', '{:.1f} Mbps'),
+)
+
+
+def as_uplink(value):
+    """將介面名稱或來源地址字串轉為 Uplink，已是 Uplink 時原樣回傳"""
+    if isinstance(value, Uplink):
+        return value
+    if address_family(value):
+        return Uplink(value, None, value, None)
+    return Uplink(value, value, None, None)
+
+
+def discover_uplinks(network_info=None, family='IPv4'):
+    """由預設路由找出上行線路（同一介面只取一次），來源地址取該介面第一個非鏈路本地地址
+
+    Windows 路由表的介面欄位為介面地址，此時只綁定來源地址
+    """
+    if network_info is None:
+        from modules.network_info import NetworkInfo
+        network_info = NetworkInfo()
+    interfaces = {interface['name']: interface
+                  for interface in network_info.get_network_interfaces()}
+    unspecified = ('0.0.0.0', '::')
+
+    uplinks = []
+    seen = set()
+    for route in network_info.get_routing_table():
+        if route.get('prefix_len') != 0 or route.get('family') != family:
+            continue
+        if route['interface'] in seen:
+            continue
+        name = route['interface']
+        seen.add(name)
+        gateway = route['gateway'] if route['gateway'] not in unspecified else None
+        if address_family(name):
+            uplinks.append(Uplink(name, None, name, gateway))
+            continue
+        source = None
+        for address in interfaces.get(name, {}).get('addresses', []):
+            if address['family'] == family and not address['address'].lower().startswith('fe80'):
+                source = address['address'].split('%')[0]
+                break
+        uplinks.append(Uplink(name, name, source, gateway))
+    return uplinks
+
+
+def _display_width(text):
+    return sum(2 if unicodedata.east_asian_width(char) in 'WF' else 1 for char in text)
+
+
+def format_table(result):
+    """將 run() 的結果排成各線路並排的文字表格"""
+    rows = result.get('uplinks', [])
+    cells = []
+    for title, key, template in TABLE_ROWS:
+        cells.append([title] + [template.format(row[key]) if row.get(key) is not None else '-'
+                                for row in rows])
+    header = ['線路'] + [row['name'] for row in rows]
+    widths = [max(_display_width(line[column]) for line in [header] + cells)
+              for column in range(len(header))]
+
+    def render(line):
+        padded = (text + ' ' * (width - _display_width(text)) for text, width in zip(line, widths))
+        return '  '.join(padded).rstrip()
+
+    lines = [render(header), render(['-' * width for width in widths])]
+    lines.extend(render(line) for line in cells)
+    return '\n'.join(lines)
+
+
+class MultiUplinkTest:
+    """多上行線路測試
+
+    每條線路使用各自綁定介面/來源地址的 ICMP 引擎、HTTP 探測與吞吐量引擎，
+    線路之間與線路內的各項探測都同時進行；目標沿用 InternetTest 的 test_hosts 與 test_urls。
+    指定 throughput_url 時，延遲探測完成後各線路同時進行下載測試
+    """
+
+    def __init__(self, internet_test, uplinks=None, timeout=3.0, count=3, interval=0.2,
+                 throughput_url=None, throughput_duration=5.0, streams=2):
+        self.internet_test = internet_test
+        self.uplinks = None if uplinks is None else [as_uplink(uplink) for uplink in uplinks]
+        self.timeout = timeout
+        self.count = count
+        self.interval = interval
+        self.throughput_url = throughput_url
+        self.throughput_duration = throughput_duration
+        self.streams = streams
+
+    def run(self):
+        """回傳 {'success', 'uplinks': [各線路結果], 'healthy', 'best', 'elapsed'}
+
+        各線路結果包含 status（up/degraded/down）、gateway_ping、ping、loss、tcp、http（毫秒）、
+        passed（成功/總項目）、mbps 與 errors；best 為可用線路中延遲最低者
+        """
+        start = time.monotonic()
+        uplinks = self.uplinks if self.uplinks is not None else discover_uplinks()
+        if not uplinks:
+            return {'success': False, 'error': '找不到上行線路（預設路由）'}
+
+        with self.internet_test._track('uplinks'):
+            with ThreadPoolExecutor(max_workers=len(uplinks),
+                                    thread_name_prefix='uplink') as executor:
+                rows = list(executor.map(self._test_uplink, uplinks))
+
+        usable = [row for row in rows if row['status'] != 'down']
+
+        def rank_key(row):
+            latency = row['ping'] if row['ping'] is not None else row['tcp'] or 0
+            return row['status'] != 'up', latency
+
+        ranked = sorted(usable, key=rank_key)
+        return {
+            'success': True,
+            'uplinks': rows,
+            'healthy': sum(1 for row in rows if row['status'] == 'up'),
+            'best': ranked[0]['name'] if ranked else None,
+            'elapsed': time.monotonic() - start
+        }
+
+    def _test_uplink(self, uplink):
+        row = {
+            'name': uplink.name, 'interface': uplink.interface, 'source': uplink.source,
+            'gateway': uplink.gateway, 'status': 'down', 'gateway_ping': None, 'ping': None,
+            'loss': None, 'tcp': None, 'http': None, 'passed': None, 'mbps': None, 'errors': []
+        }
+        ping_hosts = [host for host, _ in self.internet_test.test_hosts if address_family(host)]
+        probe = HttpProbe(max_idle=0, interface=uplink.interface, source=uplink.source)
+
+        def ping():
+            engine = IcmpEngine(interface=uplink.interface, source=uplink.source)
+            targets = ping_hosts + ([uplink.gateway] if uplink.gateway else [])
+            return engine.ping(targets, count=self.count, interval=self.interval,
+                               timeout=self.timeout)
+
+        def tcp(host, port):
+            return self.internet_test.test_socket_connection(
+                host, port, self.timeout, interface=uplink.interface, source=uplink.source)
+
+        test_hosts = self.internet_test.test_hosts
+        test_urls = self.internet_test.test_urls
+        try:
+            with ThreadPoolExecutor(max_workers=2 + len(test_hosts) + len(test_urls)) as executor:
+                ping_future = executor.submit(ping) if ping_hosts or uplink.gateway else None
+                tcp_futures = [executor.submit(tcp, host, port) for host, port in test_hosts]
+                http_futures = [executor.submit(probe.probe, url, self.timeout)
+                                for url in test_urls]
+                try:
+                    pings = ping_future.result() if ping_future else {}
+                except OSError as e:
+                    row['errors'].append(f'ICMP: {e}')
+                    pings = {}
+                connects = [future.result() for future in tcp_futures]
+                https = [future.result() for future in http_futures]
+        finally:
+            probe.close()
+
+        self._summarize(row, uplink, ping_hosts, pings, connects, https)
+        if self.throughput_url and row['status'] != 'down':
+            engine = ThroughputEngine(streams=self.streams, duration=self.throughput_duration,
+                                      ramp_up=min(2.0, self.throughput_duration / 4),
+                                      timeout=self.timeout, interface=uplink.interface,
+                                      source=uplink.source)
+            throughput = engine.download(self.throughput_url)
+            if throughput['success']:
+                row['mbps'] = throughput['mbps']
+            else:
+                row['errors'].append(f"吞吐量: {throughput.get('error')}")
+        return row
+
+    def _summarize(self, row, uplink, ping_hosts, pings, connects, https):
+        latency = self.internet_test.latency
+        passed = total = 0
+
+        if uplink.gateway in pings:
+            row['gateway_ping'] = pings[uplink.gateway]['avg']
+        reached = []
+        sent = received = 0
+        for host in ping_hosts:
+            stats = pings.get(host)
+            if stats is None:
+                continue
+            total += 1
+            sent += stats['sent']
+            received += stats['received']
+            for rtt in stats['rtts']:
+                latency.record(f'ping {host} via {uplink.name}', rtt)
+            if stats['received']:
+                passed += 1
+                reached.append(stats['avg'])
+        if reached:
+            row['ping'] = sum(reached) / len(reached)
+        if sent:
+            row['loss'] = (sent - received) / sent * 100
+
+        elapsed = [value for value in connects if value is not None]
+        total += len(connects)
+        passed += len(elapsed)
+        if elapsed:
+            row['tcp'] = sum(elapsed) / len(elapsed)
+
+        times = []
+        for url, result in zip(self.internet_test.test_urls, https):
+            total += 1
+            if result['success']:
+                passed += 1
+                times.append(result['response_time'])
+                latency.record(f'http {url} via {uplink.name}', result['response_time'])
+            else:
+                row['errors'].append(f"HTTP {url}: {result.get('error')}")
+        if times:
+            row['http'] = sum(times) / len(times)
+
+        row['passed'] = f'{passed}/{total}'
+        if passed == 0:
+            row['status'] = 'down'
+        elif passed < total or row['loss']:
+            row['status'] = 'degraded'
+        else:
+            row['status'] = 'up'
+
+
+if __name__ == "__main__":
+    # 測試代碼：python -m modules.uplink_test [介面或來源地址 ...]，未指定時使用所有預設路由
+    from modules.internet_test import InternetTest
+
+    internet_test = InternetTest()
+    result = MultiUplinkTest(internet_test, sys.argv[1:] or None).run()
+    if not result['success']:
+        print(f"測試失敗: {result['error']}")
+        sys.exit(1)
+    print(format_table(result))
+    print(f"\n可用線路 {result['healthy']}/{len(result['uplinks'])}，最佳: {result['best'] or '無'}，"
+          f"耗時 {result['elapsed']:.1f} 秒")
+    for row in result['uplinks']:
+        for error in row['errors']:
+            print(f"  {row['name']}: {error}")
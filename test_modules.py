@@ -28,6 +28,16 @@ def test_network_info():
             if 'mac' in interface:
                 print(f"     MAC: {interface['mac']}")
                 
+        # 數值維持原始型別，格式化只在顯示層進行
+        from modules import network_view
+        for interface in interfaces:
+            assert interface['speed'] is None or isinstance(interface['speed'], int)
+            if 'statistics' in interface:
+                assert isinstance(interface['statistics']['bytes_sent'], int)
+        assert network_view.format_bytes(1536) == "1.50 KB"
+        assert network_view.format_speed(None) == 'Unknown'
+        assert network_view.format_speed(10000) == "10 Gbps"
+        
         print("✓ 網路資訊模組測試通過")
         return True
         
@@ -37,6 +47,1463 @@ def test_network_info():
         return False
 
 
+def test_rtnetlink_provider():
+    """測試rtnetlink資料來源"""
+    print("=" * 50)
+    print("測試rtnetlink資料來源...")
+    try:
+        from modules import rtnetlink
+        import psutil
+        
+        if not rtnetlink.is_supported():
+            print("⚠ 此系統不支援rtnetlink，略過")
+            return True
+            
+        snapshot = rtnetlink.RtnetlinkProvider().collect()
+        print(f"介面: {len(snapshot['links'])}, 路由: {len(snapshot['routes'])}, "
+              f"鄰居: {len(snapshot['neighbors'])}")
+        
+        # 介面名稱應與psutil一致
+        assert set(snapshot['if_stats']) == set(psutil.net_if_stats())
+        for name, stat in snapshot['if_stats'].items():
+            assert stat.mtu == psutil.net_if_stats()[name].mtu
+            
+        # 訂閱網路變更：初始模型應包含所有介面
+        network_info = NetworkInfo()
+        events = []
+        monitor = network_info.subscribe(events.append)
+        assert monitor is not None and monitor.running
+        assert len(monitor.snapshot()['link']) == len(snapshot['links'])
+        network_info.unsubscribe(events.append)
+        assert not monitor.running
+        
+        print("✓ rtnetlink資料來源測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ rtnetlink資料來源測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_throughput_monitor():
+    """測試流量監測模組"""
+    print("=" * 50)
+    print("測試流量監測模組...")
+    try:
+        from modules.throughput_monitor import ThroughputMonitor
+        
+        monitor = ThroughputMonitor(capacity=5)
+        for second in range(10):
+            base = second * 1000
+            monitor.sample(timestamp=float(second), counters={
+                'eth0': (base, base * 2, second, second, 0, 0, 0, 0)
+            })
+            
+        # 緩衝區容量固定為5，視窗超出範圍時使用最舊樣本
+        rates = monitor.rates('eth0', window=60)
+        assert rates['interval'] == 4.0
+        assert rates['bytes_sent_per_sec'] == 1000.0
+        assert rates['bytes_recv_per_sec'] == 2000.0
+        assert monitor.rates('eth0', window=1)['interval'] == 1.0
+        
+        # 消失的介面會被移除
+        monitor.sample(timestamp=10.0, counters={})
+        assert monitor.rates('eth0') is None
+        
+        print("✓ 流量監測模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 流量監測模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_counter_store():
+    """測試長期計數保存模組"""
+    print("=" * 50)
+    print("測試長期計數保存模組...")
+    try:
+        import tempfile
+        from modules.counter_store import CounterStore
+        
+        with tempfile.TemporaryDirectory() as directory:
+            store = CounterStore(directory, tiers=((1, 60), (60, 60)))
+            # 每10秒一筆，共30分鐘
+            for i in range(180):
+                store.record({'eth0': (i * 100, i * 200, i, i, 0, 0, 0, 0)},
+                             timestamp=1000000.0 + i * 10)
+            end = 1000000.0 + 179 * 10
+            
+            # 1秒分層只保留最近60個槽位（60秒前的樣本已被覆寫），1分鐘分層每分鐘保留最後一筆
+            assert len(store.query('eth0', end - 60, end, tier=0)) == 6
+            minute_points = store.query('eth0', end - 3600, end, tier=1)
+            assert len(minute_points) == 31
+            rates = store.query_rates('eth0', end - 3600, end, tier=1)
+            assert all(abs(rate['bytes_sent_per_sec'] - 10.0) < 1e-9 for rate in rates)
+            store.close()
+            
+            # 重新開啟後資料仍在
+            store = CounterStore(directory, tiers=((1, 60), (60, 60)))
+            assert store.interfaces() == ['eth0']
+            assert len(store.query('eth0', end - 3600, end, tier=1)) == 31
+            store.close()
+            
+            # 暫時性介面：消失後關閉檔案，超出最長分層保留範圍（60 分鐘）後刪除檔案
+            store = CounterStore(directory, tiers=((1, 60), (60, 60)), idle_close=300)
+            counters = (0, 0, 0, 0, 0, 0, 0, 0)
+            store.record({'eth0': counters, 'veth0': counters}, timestamp=end + 10)
+            assert sorted(store._series) == ['eth0', 'veth0']
+            store.record({'eth0': counters}, timestamp=end + 400)
+            assert sorted(store._series) == ['eth0'] and 'veth0' in store.interfaces()
+            assert len(store.query('veth0', end, end + 20, tier=0)) == 1
+            store.record({'eth0': counters}, timestamp=end + 10 + 3601)
+            assert store.interfaces() == ['eth0'] and sorted(store._series) == ['eth0']
+            store.close()
+            
+        print("✓ 長期計數保存模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 長期計數保存模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_route_lookup():
+    """測試路由查詢模組"""
+    print("=" * 50)
+    print("測試路由查詢模組...")
+    try:
+        from modules.route_lookup import RouteTable
+        
+        table = RouteTable()
+        table.add('0.0.0.0/0', 'default')
+        table.add('10.0.0.0/8', 'ten', metric=100)
+        table.add('10.0.0.0/8', 'ten-better', metric=10)
+        table.add('10.1.0.0/16', 'ten-one')
+        table.add('2001:db8::/32', 'doc6')
+        
+        assert table.lookup('8.8.8.8') == 'default'
+        assert table.lookup('10.2.3.4') == 'ten-better'
+        assert table.lookup('10.1.255.1') == 'ten-one'
+        assert table.lookup('2001:db8::1') == 'doc6'
+        assert table.lookup('2001:db9::1') is None
+        
+        # 本機路由表
+        network_info = NetworkInfo()
+        routes = network_info.get_routing_table()
+        print(f"路由數量: {len(routes)}")
+        for route in routes:
+            if route['prefix_len'] == 0 and route['family'] == 'IPv4':
+                print(f"預設路由: {network_info.lookup_route('8.8.8.8')}")
+                
+        print("✓ 路由查詢模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 路由查詢模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_dns_config():
+    """測試DNS設定讀取模組"""
+    print("=" * 50)
+    print("測試DNS設定讀取模組...")
+    import tempfile
+    import os
+    import time
+    from modules import dns_config
+    
+    original = (dns_config.RESOLV_CONF, dns_config.SYSTEMD_RESOLV_CONF,
+                dns_config.SYSTEMD_RESOLVE_NETIF_DIR, dns_config.SYSTEMD_NETWORKD_LINKS_DIR)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            resolv = os.path.join(directory, 'resolv.conf')
+            upstream = os.path.join(directory, 'upstream.conf')
+            netif = os.path.join(directory, 'netif')
+            os.mkdir(netif)
+            with open(resolv, 'w') as f:
+                f.write("# stub\nnameserver 127.0.0.53\nsearch lan\n")
+            with open(upstream, 'w') as f:
+                f.write("nameserver 192.0.2.53\n")
+            with open(os.path.join(netif, '1'), 'w') as f:
+                f.write("SERVERS=198.51.100.1 198.51.100.2#dns.example\nDOMAINS=corp\n")
+                
+            dns_config.RESOLV_CONF = resolv
+            dns_config.SYSTEMD_RESOLV_CONF = upstream
+            dns_config.SYSTEMD_RESOLVE_NETIF_DIR = netif
+            dns_config.SYSTEMD_NETWORKD_LINKS_DIR = os.path.join(directory, 'missing')
+            
+            provider = dns_config.DNSConfigProvider(check_interval=0)
+            provider.system = 'Linux'
+            config = provider.get_config()
+            assert config['servers'] == ['192.0.2.53']
+            assert config['search'] == ['lan']
+            assert provider.get_servers() == ['192.0.2.53', '198.51.100.1', '198.51.100.2']
+            assert provider.get_config() is config  # 檔案未變更時使用快取
+            
+            # 修改設定後應重新讀取
+            time.sleep(0.01)
+            with open(resolv, 'w') as f:
+                f.write("nameserver 203.0.113.9\n")
+            assert provider.get_config()['servers'] == ['203.0.113.9']
+            
+        # Windows：登錄檔以介面 GUID 區分，需轉為 psutil 的介面名稱（以模擬的 winreg 測試）
+        import sys
+        import types
+        
+        guid = '{2b1c4f3e-0000-4000-8000-000000000001}'
+        tcpip = dns_config.WINDOWS_INTERFACES_KEYS[0]
+        registry = {
+            tcpip: {guid: {'DhcpNameServer': '192.0.2.1 192.0.2.2'},
+                    '{unknown}': {'NameServer': '192.0.2.9'}},
+            dns_config.WINDOWS_NETWORK_CLASS_KEY: {guid.upper(): {}},
+            dns_config.WINDOWS_NETWORK_CLASS_KEY + '\\' + guid.upper() + '\\Connection':
+                {'Name': '乙太網路'},
+        }
+        
+        class Key:
+            def __init__(self, path):
+                if path not in registry and path.rsplit('\\', 1)[0] not in registry:
+                    raise OSError(path)
+                self.path = path
+                
+            def __enter__(self):
+                return self
+                
+            def __exit__(self, *args):
+                return False
+                
+        def open_key(parent, path):
+            return Key(path if parent is None else f'{parent.path}\\{path}')
+            
+        def values(key):
+            if key.path in registry:
+                return registry[key.path]
+            parent, name = key.path.rsplit('\\', 1)
+            return registry[parent][name]
+            
+        def query_value(key, name):
+            value = values(key).get(name)
+            if not isinstance(value, str):
+                raise OSError(name)
+            return value, 1
+            
+        fake = types.SimpleNamespace(
+            HKEY_LOCAL_MACHINE=None, OpenKey=open_key,
+            QueryInfoKey=lambda key: (len(registry[key.path]), 0, 0),
+            EnumKey=lambda key, index: list(registry[key.path])[index], QueryValueEx=query_value)
+        saved = sys.modules.get('winreg')
+        sys.modules['winreg'] = fake
+        try:
+            provider = dns_config.DNSConfigProvider(check_interval=0)
+            provider.system = 'Windows'
+            links = provider._read_config()['links']
+        finally:
+            if saved is None:
+                sys.modules.pop('winreg')
+            else:
+                sys.modules['winreg'] = saved
+        assert links['乙太網路']['servers'] == ['192.0.2.1', '192.0.2.2']
+        assert links['{unknown}']['servers'] == ['192.0.2.9']
+        assert guid not in links
+            
+        print("✓ DNS設定讀取模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ DNS設定讀取模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        (dns_config.RESOLV_CONF, dns_config.SYSTEMD_RESOLV_CONF,
+         dns_config.SYSTEMD_RESOLVE_NETIF_DIR, dns_config.SYSTEMD_NETWORKD_LINKS_DIR) = original
+
+
+def test_nic_stats():
+    """測試網卡驅動統計模組"""
+    print("=" * 50)
+    print("測試網卡驅動統計模組...")
+    try:
+        from modules.nic_stats import NicStatsSnapshot, split_queue_stats
+        
+        # 各驅動的佇列計數命名
+        totals, queues = split_queue_stats({
+            'rx_queue_0_packets': 1, 'tx_queue_1_bytes': 2, 'rx3_cache_full': 3,
+            'rx-2.drops': 4, 'queue_5_rx_cnt': 5, 'rx_missed_errors': 6
+        })
+        assert totals == {'rx_missed_errors': 6}
+        assert queues['rx'] == {0: {'packets': 1}, 3: {'cache_full': 3}, 2: {'drops': 4},
+                                5: {'cnt': 5}}
+        assert queues['tx'] == {1: {'bytes': 2}}
+        
+        # mlx5：佇列計數與 _phy 封包大小分布計數並存，分布計數不是佇列
+        totals, queues = split_queue_stats({
+            'rx0_packets': 1, 'rx0_cache_full': 2, 'tx3_xmit_more': 3, 'rx12_xdp_drop': 4,
+            'rx_64_bytes_phy': 5, 'rx_65_to_127_bytes_phy': 6, 'rx_1024_to_1518_bytes_phy': 7,
+            'tx_1519_to_2047_bytes_phy': 8, 'rx_out_of_buffer': 9
+        })
+        assert totals == {'rx_64_bytes_phy': 5, 'rx_65_to_127_bytes_phy': 6,
+                          'rx_1024_to_1518_bytes_phy': 7, 'tx_1519_to_2047_bytes_phy': 8,
+                          'rx_out_of_buffer': 9}
+        assert queues['rx'] == {0: {'packets': 1, 'cache_full': 2}, 12: {'xdp_drop': 4}}
+        assert queues['tx'] == {3: {'xmit_more': 3}}
+        
+        def entry(rx_packets, missed, queue_packets):
+            return {'counters': {'rx_packets': rx_packets, 'rx_missed_errors': missed},
+                    'ethtool': {'rx_fifo_errors': missed},
+                    'queues': {'rx': {0: {'packets': queue_packets, 'drops': missed}}, 'tx': {}},
+                    'ring': None, 'channels': None, 'driver': None}
+            
+        first = NicStatsSnapshot({'eth0': entry(1000, 5, 900)}, timestamp=10.0)
+        second = NicStatsSnapshot({'eth0': entry(3000, 8, 100), 'eth1': entry(1, 0, 0)},
+                                  timestamp=12.0)
+        delta = second.delta(first)
+        eth0 = delta['interfaces']['eth0']
+        assert delta['interval'] == 2.0
+        assert 'eth1' not in delta['interfaces']
+        assert eth0['rates']['rx_packets'] == 1000.0
+        assert eth0['problems'] == {'rx_missed_errors': 3, 'rx_fifo_errors': 3,
+                                    'rx_queue_0_drops': 3}
+        # 計數重設時以目前值為差值
+        assert eth0['queues']['rx'][0]['packets'] == 100
+        
+        network_info = NetworkInfo()
+        snapshot = network_info.get_driver_statistics()
+        assert snapshot is not None and snapshot.interfaces
+        for name, stats in snapshot.interfaces.items():
+            print(f"{name}: {len(stats['counters'])} 個介面計數，驅動 {stats['driver'] or 'N/A'}")
+        assert network_info.get_driver_statistics_delta() is None
+        assert network_info.get_driver_statistics_delta()['interval'] > 0
+        
+        print("✓ 網卡驅動統計模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 網卡驅動統計模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_rx_scaling():
+    """測試接收分流診斷模組"""
+    print("=" * 50)
+    print("測試接收分流診斷模組...")
+    try:
+        from modules.rx_scaling import (RxScalingDiagnostics, RxScalingSnapshot, SoftnetStat,
+                                        parse_softnet_stat, parse_interrupts, parse_cpu_mask,
+                                        parse_cpu_list, format_cpus, imbalance_threshold)
+        
+        softnet = parse_softnet_stat(
+            "000003e8 00000002 00000001 00000000 00000000 00000000 00000000 "
+            "00000000 00000000 00000005 00000000 00000000 00000000\n"
+            "000001f4 00000000 00000000 00000000 00000000 00000000 00000000 "
+            "00000000 00000000 00000000 00000000 00000000 00000002\n"
+        )
+        assert softnet[0] == SoftnetStat(1000, 2, 1, 0, 5, 0)
+        # 第 13 欄為 CPU 編號（CPU 1 離線）
+        assert softnet[2].processed == 500
+        
+        cpus, interrupts = parse_interrupts(
+            "           CPU0       CPU1\n"
+            " 40:        100          0  PCI-MSIX-0000:00:04.0 1-edge  eth0-TxRx-0\n"
+            "NMI:          0          0  Non-maskable interrupts\n"
+            "ERR:          0\n"
+        )
+        assert cpus == [0, 1]
+        assert interrupts[40] == ((100, 0), 'PCI-MSIX-0000:00:04.0 1-edge eth0-TxRx-0')
+        assert interrupts['ERR'] == ((0,), '')
+        assert parse_cpu_mask('00000000,0000000f') == {0, 1, 2, 3}
+        assert parse_cpu_list('0-2,8') == {0, 1, 2, 8}
+        assert format_cpus({0, 1, 2, 8}) == '0-2,8'
+        
+        def snapshot(timestamp, processed, dropped, irq_counts):
+            return RxScalingSnapshot(
+                timestamp, [0, 1, 2, 3],
+                {cpu: SoftnetStat(processed[cpu], dropped[cpu], 0, 0, 0, 0) for cpu in range(4)},
+                {40: (irq_counts, 'eth0-TxRx-0'), 41: ((0, 0, 0, 0), 'eth0-TxRx-1')},
+                {},
+                {'eth0': {'irqs': {40: {'description': 'eth0-TxRx-0', 'affinity': frozenset([0])},
+                                   41: {'description': 'eth0-TxRx-1', 'affinity': frozenset([0])}},
+                          'rps': {0: frozenset(), 1: frozenset()},
+                          'xps': {0: frozenset(), 1: frozenset()}}}
+            )
+            
+        before = snapshot(0.0, [0, 0, 0, 0], [0, 0, 0, 0], (0, 0, 0, 0))
+        after = snapshot(1.0, [90000, 5000, 3000, 2000], [7, 0, 0, 0], (9000, 10, 0, 0))
+        delta = after.delta(before)
+        assert delta['cpus'][0]['processed_per_sec'] == 90000
+        assert delta['interfaces']['eth0'][40][0] == 9000
+        
+        messages = [finding['message'] for finding in
+                    RxScalingDiagnostics().diagnose(after, before)]
+        assert any('全部由 CPU 0' in message for message in messages)
+        assert any('XPS' in message for message in messages)
+        assert any('丟棄 7' in message for message in messages)
+        assert any('CPU 0 處理 90%' in message for message in messages)
+        assert any('網卡中斷' in message for message in messages)
+        
+        # 2 個 CPU：判定門檻必須小於 100%，全部集中在一個 CPU 時才會被判定
+        assert imbalance_threshold(2) < 1 and imbalance_threshold(64) == 0.5
+        
+        def two_cpu(timestamp, processed, irq_counts):
+            return RxScalingSnapshot(
+                timestamp, [0, 1],
+                {cpu: SoftnetStat(processed[cpu], 0, 0, 0, 0, 0) for cpu in range(2)},
+                {40: (irq_counts, 'eth0-TxRx-0')}, {},
+                {'eth0': {'irqs': {40: {'description': 'eth0-TxRx-0',
+                                        'affinity': frozenset([0, 1])}},
+                          'rps': {}, 'xps': {}}}
+            )
+            
+        before = two_cpu(0.0, [0, 0], (0, 0))
+        messages = [finding['message'] for finding in
+                    RxScalingDiagnostics().diagnose(two_cpu(1.0, [50000, 0], (5000, 0)), before)]
+        assert any('CPU 0 處理 100%' in message for message in messages)
+        assert any('CPU 0 承擔 100% 的網卡中斷' in message for message in messages)
+        balanced = two_cpu(1.0, [30000, 20000], (3000, 2000))
+        messages = [finding['message'] for finding in
+                    RxScalingDiagnostics().diagnose(balanced, before)]
+        assert not any('處理' in message or '網卡中斷' in message for message in messages)
+        
+        live = RxScalingDiagnostics()
+        assert live.snapshot().softnet
+        
+        print("✓ 接收分流診斷模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 接收分流診斷模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_protocol_stats():
+    """測試協定計數監測模組"""
+    print("=" * 50)
+    print("測試協定計數監測模組...")
+    try:
+        from modules.protocol_stats import (ProtocolStatsMonitor, parse_proc_table, parse_sockstat,
+                                            read_counters, read_socket_memory)
+        
+        table = parse_proc_table("Tcp: RtoMin OutSegs RetransSegs\nTcp: 200 1000 5\n"
+                                 "Udp: InErrors RcvbufErrors\nUdp: 3 2\n")
+        assert table == {'Tcp': {'RtoMin': 200, 'OutSegs': 1000, 'RetransSegs': 5},
+                         'Udp': {'InErrors': 3, 'RcvbufErrors': 2}}
+        assert parse_sockstat("TCP: inuse 4 orphan 0 tw 2 alloc 4 mem 7\n")['TCP']['mem'] == 7
+        
+        # 以固定資料模擬：第 5 秒起 UDP 接收緩衝區錯誤暴增
+        state = {'Tcp.OutSegs': 0, 'Tcp.RetransSegs': 0, 'Udp.RcvbufErrors': 0}
+        tcp_pages = [40]
+        
+        def memory_reader():
+            # 壓力門檻 100 頁
+            return {'sockets': {}, 'tcp_mem': {'pages': tcp_pages[0], 'low': 50, 'pressure': 100,
+                                               'max': 200, 'ratio': tcp_pages[0] / 100}}
+            
+        monitor = ProtocolStatsMonitor(reader=lambda: dict(state), memory_reader=memory_reader)
+        for second in range(10):
+            state['Tcp.OutSegs'] += 100
+            state['Tcp.RetransSegs'] += 1
+            if second in (5, 6):
+                state['Udp.RcvbufErrors'] += 50
+            monitor.sample(timestamp=float(second))
+            
+        rates = monitor.rates(window=4)
+        assert rates['interval'] == 4.0
+        assert rates['rates']['Tcp.OutSegs'] == 100.0
+        assert rates['retransmit_ratio'] == 0.01
+        assert rates['memory']['tcp_mem'] == {'pages': 40, 'ratio': 0.4, 'delta': 0,
+                                              'peak_pages': 40, 'peak_ratio': 0.4}
+        assert 'udp_mem' not in rates['memory']
+        
+        spikes = monitor.spikes()
+        assert [(spike['counter'], spike['start']) for spike in spikes] == \
+            [('Udp.RcvbufErrors', 4.0), ('Udp.RcvbufErrors', 5.0)]
+        
+        monitor.samples.clear()
+        monitor.sample(timestamp=0.0)
+        with monitor.track('speed'):
+            state['Tcp.OutSegs'] += 1000
+            state['Tcp.RetransSegs'] += 100
+            # 測試期間的背景取樣：TCP 記憶體超過壓力門檻，結束時已回落
+            tcp_pages[0] = 150
+            monitor.sample()
+            tcp_pages[0] = 60
+        runs = monitor.correlate()
+        assert runs[0]['label'] == 'speed'
+        assert runs[0]['deltas'] == {'Tcp.OutSegs': 1000, 'Tcp.RetransSegs': 100}
+        assert runs[0]['retransmit_ratio'] == 0.1
+        tcp_mem = runs[0]['memory']['tcp_mem']
+        assert tcp_mem['peak_ratio'] > 1 and tcp_mem['peak_pages'] == 150
+        assert tcp_mem['ratio'] == 0.6 and tcp_mem['delta'] == 20
+        
+        counters = read_counters()
+        assert 'Tcp.RetransSegs' in counters and 'Udp.RcvbufErrors' in counters
+        memory = read_socket_memory()
+        print(f"TCP socket 記憶體: {memory.get('tcp_mem')}")
+        
+        print("✓ 協定計數監測模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 協定計數監測模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_icmp_engine():
+    """測試ICMP引擎模組"""
+    print("=" * 50)
+    print("測試ICMP引擎模組...")
+    try:
+        import socket
+        from modules.icmp_engine import (IcmpEngine, build_echo_request, parse_echo_reply,
+                                         summarize, _checksum)
+        
+        # 校驗和正確時，整個封包的校驗和為 0
+        packet = build_echo_request(socket.AF_INET, 0x1234, 7, b'abc')
+        assert _checksum(packet) == 0
+        reply = b'\x00' + packet[1:]
+        assert parse_echo_reply(socket.AF_INET, reply, raw=False) == (0x1234, 7, b'abc')
+        ip_header = bytes([0x45]) + bytes(19)
+        assert parse_echo_reply(socket.AF_INET, ip_header + reply, raw=True) == (0x1234, 7, b'abc')
+        assert parse_echo_reply(socket.AF_INET, packet, raw=False) is None
+        
+        stats = summarize([1.0, 3.0, 2.0], sent=4)
+        assert stats['loss'] == 25.0
+        assert (stats['min'], stats['avg'], stats['max']) == (1.0, 2.0, 3.0)
+        assert abs(stats['mdev'] - 0.8165) < 1e-3
+        assert stats['jitter'] == 1.5
+        
+        engine = IcmpEngine()
+        if engine.is_available():
+            results = engine.ping(['127.0.0.1', '127.0.0.2'], count=3, interval=0.01, timeout=1.0)
+            for host, result in results.items():
+                assert result['received'] == 3, result
+                print(f"  {host}: avg {result['avg']:.3f} ms, mdev {result['mdev']:.3f} ms")
+            assert InternetTest().ping_host('127.0.0.1') is not None
+        else:
+            print("⚠ 無法開啟 ICMP socket，略過實際 Ping 測試")
+            
+        # ICMP 可用性依地址族判斷；單一主機的錯誤不會讓之後的 Ping 改用 ping 指令
+        class FakeEngine:
+            def __init__(self):
+                self.checked = []
+                
+            def is_available(self, family):
+                self.checked.append(family)
+                return family == socket.AF_INET
+                
+            def ping_one(self, host, timeout=1.0):
+                if host == '192.0.2.1':
+                    raise OSError('Network is unreachable')
+                return 1.0
+                
+            def ping(self, hosts, count=1, interval=1.0, timeout=1.0):
+                return {host: summarize([1.0] * count, count) for host in hosts}
+                
+        internet_test = InternetTest()
+        internet_test.icmp_engine = FakeEngine()
+        internet_test._ping_with_command = lambda host, timeout=3: 5.0
+        assert internet_test.ping_host('192.0.2.1') is None
+        assert internet_test.ping_host('192.0.2.2') == 1.0
+        assert internet_test.ping_host('2001:db8::1') == 5.0
+        assert internet_test.icmp_engine.checked == [socket.AF_INET, socket.AF_INET6]
+        results = internet_test.ping_hosts(['2001:db8::1', '192.0.2.2'], count=2)
+        assert list(results) == ['2001:db8::1', '192.0.2.2']
+        assert results['2001:db8::1']['rtts'] == [5.0, 5.0]
+        assert results['192.0.2.2']['rtts'] == [1.0, 1.0]
+        
+        print("✓ ICMP引擎模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ ICMP引擎模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_latency_histogram():
+    """測試延遲直方圖模組"""
+    print("=" * 50)
+    print("測試延遲直方圖模組...")
+    try:
+        import random
+        import threading
+        from modules.latency_histogram import LatencyHistogram, LatencyRecorder
+        
+        rng = random.Random(7)
+        values = [rng.lognormvariate(2, 1) for _ in range(100000)]
+        histogram = LatencyHistogram()
+        for value in values[:50000]:
+            histogram.record(value)
+        other = LatencyHistogram()
+        other.record_many(values[50000:])
+        histogram.merge(other)
+        
+        values.sort()
+        assert histogram.total == len(values)
+        for percentile, value in histogram.percentiles((50, 90, 99, 99.9)).items():
+            exact = values[int(len(values) * percentile / 100) - 1]
+            # 分桶上界誤差小於 1%（另加 1 µs 解析度）
+            assert abs(value - exact) <= exact * 0.01 + 0.001, (percentile, value, exact)
+        summary = histogram.summary()
+        assert summary['max'] == int(values[-1] * 1000) / 1000
+        assert summary['min'] == int(values[0] * 1000) / 1000
+        
+        # 超過上限的數值計入最後一桶，記憶體不增加
+        small = LatencyHistogram(highest_ms=1000)
+        length = len(small.counts)
+        small.record(5000)
+        assert len(small.counts) == length and small.summary()['p99'] == 5000
+        assert LatencyHistogram().summary()['p50'] is None
+        
+        recorder = LatencyRecorder()
+        
+        def worker():
+            for _ in range(1000):
+                recorder.record('ping 192.0.2.1', 10.0)
+                
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        partial = LatencyRecorder()
+        partial.record('ping 192.0.2.1', 20.0)
+        partial.record('tcp example.com:80', 30.0)
+        recorder.merge(partial)
+        stats = recorder.summary()
+        assert stats['ping 192.0.2.1']['count'] == 4001
+        assert abs(stats['ping 192.0.2.1']['p50'] - 10.0) < 0.1
+        assert stats['ping 192.0.2.1']['max'] == 20.0
+        assert list(recorder.summary(prefix='tcp ')) == ['tcp example.com:80']
+        
+        print("✓ 延遲直方圖模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 延遲直方圖模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+def test_dns_benchmark():
+    """測試DNS效能測試模組（使用本機DNS回應器）"""
+    print("=" * 50)
+    print("測試DNS效能測試模組...")
+    try:
+        from modules.dns_benchmark import (DNSBenchmark, LocalDNSResponder, build_query,
+                                           parse_response)
+        
+        packet, question = build_query(0x1234, 'example.com')
+        assert packet[:2] == b'\x12\x34' and packet.endswith(question)
+        
+        records = {'a.test': ['192.0.2.10', '192.0.2.11'], 'b.test': ['192.0.2.20']}
+        with LocalDNSResponder(records, drop_names=['lost.test']) as first, \
+                LocalDNSResponder({'a.test': ['192.0.2.10'], 'b.test': ['198.51.100.1']}) as second:
+            response = parse_response(first.answer(packet))
+            assert response['id'] == 0x1234 and response['rcode'] == 3 and response['answers'] == []
+            
+            benchmark = DNSBenchmark(timeout=0.5, concurrency=8, seed=1)
+            workload = benchmark.build_workload(('a.test', 'b.test', 'lost.test'), ('test',),
+                                                queries=60)
+            servers = [('127.0.0.1', first.port), ('127.0.0.1', second.port)]
+            report = benchmark.run(servers, workload)
+            
+        first_label, second_label = f'127.0.0.1:{first.port}', f'127.0.0.1:{second.port}'
+        lost = sum(1 for name, _ in workload if name == 'lost.test')
+        for protocol in ('udp', 'tcp'):
+            stats = report['results'][first_label][protocol]
+            print(f"{protocol.upper()}: p50 {stats['latency']['all']['p50']:.3f} ms，"
+                  f"逾時 {stats['timeouts']}")
+            assert stats['sent'] == 60 and stats['timeouts'] == lost
+            assert stats['answered'] == 60 - lost
+            assert stats['rcodes'].get('NXDOMAIN') == stats['latency']['uncached']['count']
+            assert report['results'][second_label][protocol]['answered'] == 60
+            
+        names = report['consistency']['names']
+        assert names['a.test']['answers'][first_label] == ['192.0.2.10', '192.0.2.11']
+        # a.test 的地址有交集仍算一致（輪替/CDN），b.test 不一致
+        assert names['a.test']['consistent'] and not names['b.test']['consistent']
+        assert report['consistency']['agreement'][first_label] == 0.5
+        
+        # 無人監聽的埠：UDP 全部逾時，TCP 連線被拒
+        benchmark = DNSBenchmark(timeout=0.2, seed=2)
+        report = benchmark.run([('127.0.0.1', first.port)], [('a.test', 'cached')], warmup=False)
+        stats = report['results'][first_label]
+        assert stats['udp']['timeout_rate'] == 1.0
+        assert stats['tcp']['errors'] == 1 and 'error' in stats['tcp']
+        
+        print("✓ DNS效能測試模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ DNS效能測試模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_http_probe():
+    """測試HTTP輕量探測模組"""
+    print("=" * 50)
+    print("測試HTTP輕量探測模組...")
+    try:
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from modules.http_probe import HttpProbe
+        
+        requests_seen = []
+        
+        class KeepAliveHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_HEAD(self):
+                requests_seen.append(('HEAD', self.path, None))
+                self.send_response(200)
+                self.send_header('Content-Length', '100000')
+                self.end_headers()
+                
+            def log_message(self, format, *args):
+                pass
+                
+        class GetOnlyHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_GET(self):
+                requests_seen.append(('GET', self.path, self.headers.get('Range')))
+                # 忽略 Range，回傳完整的大型內容
+                body = b'x' * 200000
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except OSError:
+                    pass
+                    
+            def log_message(self, format, *args):
+                pass
+                
+        servers = [ThreadingHTTPServer(('127.0.0.1', 0), handler)
+                   for handler in (KeepAliveHandler, GetOnlyHandler)]
+        for server in servers:
+            server.daemon_threads = True
+            # 探測端讀完標頭即關閉連線，伺服器端的連線重設屬預期情況
+            server.handle_error = lambda request, client_address: None
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            prober = HttpProbe()
+            head_url = f"http://127.0.0.1:{servers[0].server_address[1]}/status"
+            first = prober.probe(head_url)
+            second = prober.probe(head_url)
+            print(f"HEAD: connect {first['connect']:.3f} ms, ttfb {first['ttfb']:.3f} ms，"
+                  f"第二次重用: {second['reused']}")
+            assert first['success'] and first['method'] == 'HEAD' and not first['reused']
+            assert first['connect'] is not None and first['tls'] is None
+            assert second['reused'] and second['connect'] is None and second['ttfb'] is not None
+            
+            get_url = f"http://127.0.0.1:{servers[1].server_address[1]}/"
+            result = prober.probe(get_url)
+            assert result['success'] and result['method'] == 'GET' and result['status_code'] == 200
+            # HEAD 不支援（501）改用 Range GET；伺服器忽略 Range 時讀完標頭即關閉，不下載 200 KB 內容
+            assert requests_seen[-1] == ('GET', '/', 'bytes=0-0')
+            assert result['bytes_received'] < 65536
+            assert not prober.probe(get_url)['reused']
+            
+            failed = prober.probe('http://127.0.0.1:1/', timeout=1)
+            assert not failed['success'] and failed['error']
+            prober.close()
+        finally:
+            for server in servers:
+                server.shutdown()
+                server.server_close()
+                
+        print("✓ HTTP輕量探測模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ HTTP輕量探測模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_throughput_engine():
+    """測試多串流吞吐量測試模組（使用本機來源/接收伺服器）"""
+    print("=" * 50)
+    print("測試多串流吞吐量測試模組...")
+    try:
+        from modules.throughput_engine import ThroughputEngine, LocalThroughputServer
+        
+        with LocalThroughputServer(source_size=8 * 1024 * 1024) as server:
+            engine = ThroughputEngine(streams=3, duration=1.5, ramp_up=0.5, interval=0.25)
+            download = engine.download(server.url)
+            print(f"下載: {download['mbps']:.0f} Mbps，{download['bytes'] / 1e6:.0f} MB")
+            assert download['success'] and download['size'] == 8 * 1024 * 1024
+            assert all(stream['bytes'] > 0 and stream['error'] is None
+                       for stream in download['per_stream'])
+            # 每條串流只下載自己的 Range 區段，重複請求直到時間結束
+            assert all(stream['requests'] >= 1 for stream in download['per_stream'])
+            phases = [interval['phase'] for interval in download['intervals']]
+            assert phases[0] == 'ramp' and phases[-1] == 'steady'
+            assert sum(interval['bytes'] for interval in download['intervals']) == download['bytes']
+            assert 1.4 < download['duration'] < 2.5
+            
+            engine = ThroughputEngine(streams=2, duration=1.0, ramp_up=0.3,
+                                      upload_size=4 * 1024 * 1024)
+            upload = engine.upload(server.url)
+            print(f"上傳: {upload['mbps']:.0f} Mbps")
+            assert upload['success'] and upload['mbps'] > 0
+            
+            internet_test = InternetTest()
+            internet_test.throughput_download_url = server.url
+            internet_test.throughput_upload_url = server.url
+            internet_test.throughput_duration = 1.0
+            result = internet_test.test_speed_alternative()
+            assert result['success'] and result['download'] > 0 and result['upload'] > 0
+            
+        # 沒有 Content-Length（讀到連線關閉）與 chunked 回應
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def handle(self):
+                try:
+                    super().handle()
+                except OSError:
+                    # 測試結束時客戶端直接關閉連線
+                    pass
+                    
+            def do_GET(self):
+                self.send_response(200)
+                if self.path == '/chunked':
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for _ in range(4):
+                        self.wfile.write(b'4000;ext=1\r\n' + bytes(0x4000) + b'\r\n')
+                    self.wfile.write(b'0\r\nX-Trailer: 1\r\n\r\n')
+                else:
+                    self.end_headers()
+                    self.wfile.write(bytes(65536))
+                    self.close_connection = True
+                    
+            def log_message(self, *args):
+                pass
+                
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            base = f'http://127.0.0.1:{server.server_address[1]}'
+            for path in ('/close', '/chunked'):
+                engine = ThroughputEngine(streams=2, duration=0.5, ramp_up=0.1, timeout=2)
+                result = engine.download(base + path)
+                requests = [stream['requests'] for stream in result['per_stream']]
+                print(f"{path}: {result['bytes']} bytes，請求 {requests}")
+                assert result['success'] and result['errors'] == []
+                assert all(stream['requests'] > 1 for stream in result['per_stream'])
+        finally:
+            server.shutdown()
+            server.server_close()
+            
+        engine = ThroughputEngine(streams=1, duration=0.5, timeout=1)
+        failed = engine.download('http://127.0.0.1:1/')
+        assert not failed['success'] and failed['error']
+        
+        print("✓ 多串流吞吐量測試模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 多串流吞吐量測試模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_peer_test():
+    """測試區網對測模組（本機伺服器與用戶端）"""
+    print("=" * 50)
+    print("測試區網對測模組...")
+    try:
+        from modules.peer_test import PeerServer, PeerClient
+        
+        server = PeerServer('127.0.0.1', 0)
+        host, port = server.start()
+        try:
+            client = PeerClient(host, port)
+            for reverse in (False, True):
+                reports = []
+                result = client.tcp(streams=2, duration=1.0, reverse=reverse, interval=0.25,
+                                    on_interval=reports.append)
+                print(f"TCP {result['direction']}: {result['mbps']:.0f} Mbps")
+                assert result['success'] and len(result['per_stream']) == 2
+                assert all(count > 0 for count in result['per_stream'])
+                assert len(reports) >= 3
+                assert sum(report['bytes'] for report in reports) == result['bytes']
+                
+            internet_test = InternetTest()
+            for reverse in (False, True):
+                reports = []
+                result = internet_test.test_lan_peer(host, port, 'udp', reverse=reverse,
+                                                     rate=20_000_000, duration=1.0, interval=0.25,
+                                                     on_interval=reports.append)
+                print(f"UDP {result['direction']}: {result['mbps']:.1f} Mbps，"
+                      f"遺失 {result['loss']:.2f}%，抖動 {result['jitter']:.3f} ms")
+                assert result['success'] and result['sent'] == result['packets'] + result['lost']
+                # 本機迴路以 20 Mbps 傳送不應遺失或亂序，速率符合設定
+                assert result['lost'] == 0 and result['out_of_order'] == 0
+                assert 15 < result['mbps'] < 25 and len(reports) >= 3
+                
+            failed = PeerClient(host, 1, timeout=1).tcp(duration=0.5)
+            assert not failed['success'] and failed['error']
+        finally:
+            server.stop()
+            
+        print("✓ 區網對測模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 區網對測模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_bufferbloat():
+    """測試負載延遲模組（本機吞吐量伺服器產生負載）"""
+    print("=" * 50)
+    print("測試負載延遲模組...")
+    try:
+        import socket
+        from modules.bufferbloat import BufferbloatTest, grade_for
+        from modules.throughput_engine import LocalThroughputServer
+        
+        grades = [grade_for(value) for value in (1, 10, 45, 100, 300, 500)]
+        assert grades == ['A+', 'A', 'B', 'C', 'D', 'F']
+        
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(64)
+        try:
+            with LocalThroughputServer() as server:
+                internet_test = InternetTest()
+                test = BufferbloatTest(internet_test, target='127.0.0.1',
+                                       port=listener.getsockname()[1], probe_interval=0.05,
+                                       idle_duration=0.5, load_duration=1.0, ramp_up=0.3,
+                                       streams=2)
+                result = test.run(server.url, server.url)
+        finally:
+            listener.close()
+            
+        print(f"方法: {result['method']}，等級: {result['grade']}")
+        assert result['success'] and result['grade'] in ('A+', 'A', 'B', 'C', 'D', 'F')
+        assert result['idle']['sent'] == 10 and result['idle']['latency']['count'] > 0
+        for direction in ('download', 'upload'):
+            phase = result[direction]
+            print(f"  {direction}: p50 {phase['latency']['p50']:.3f} ms，{phase['mbps']:.0f} Mbps")
+            # 負載執行緒不應讓探測排程落後：每個時段都有送出
+            assert phase['sent'] == 20 and phase['mbps'] > 0 and phase['increase'] is not None
+        
+        # 負載來源無法連線：不應評等級，也不應回報成功
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(64)
+        try:
+            test = BufferbloatTest(internet_test, target='127.0.0.1',
+                                   port=listener.getsockname()[1], probe_interval=0.05,
+                                   idle_duration=0.2, load_duration=0.2, ramp_up=0.1)
+            result = test.run('http://127.0.0.1:1/', None)
+        finally:
+            listener.close()
+        print(f"負載失敗: {result.get('error')}")
+        assert not result['success'] and 'grade' not in result
+        assert result['download']['grade'] is None and result['download']['increase'] is None
+        assert result['download']['load_error']
+            
+        print("✓ 負載延遲模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 負載延遲模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_speedtest_cache():
+    """測試 speedtest 伺服器快取（本機模擬伺服器，不連線 speedtest.net）"""
+    print("=" * 50)
+    print("測試 speedtest 伺服器快取...")
+    try:
+        import os
+        import time
+        import tempfile
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from modules.speedtest_cache import SpeedtestCache
+        
+        latency_requests = []
+        
+        class LatencyHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                latency_requests.append(self.path)
+                body = b'test=test'
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                
+            def log_message(self, format, *args):
+                pass
+                
+        server = ThreadingHTTPServer(('127.0.0.1', 0), LatencyHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        
+        def fake_server(server_id, port):
+            return {'id': server_id, 'url': f'http://127.0.0.1:{port}/speedtest/upload.php',
+                    'sponsor': 'Local', 'name': f'Server {server_id}', 'country': 'Test',
+                    'lat': '0', 'lon': '0', 'd': 0.0}
+            
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'speedtest_cache.json')
+                cache = SpeedtestCache(path, timeout=2)
+                now = time.time()
+                cache.data.update({
+                    'config': {'client': {'ip': '192.0.2.2', 'lat': '0', 'lon': '0', 'isp': 'Test'},
+                               'ignore_servers': [],
+                               'sizes': {'upload': [32768], 'download': [350]},
+                               'counts': {'upload': 1, 'download': 1},
+                               'threads': {'upload': 1, 'download': 1},
+                               'length': {'upload': 1, 'download': 1}, 'upload_max': 1},
+                    'lat_lon': [0.0, 0.0], 'config_time': now,
+                    # 第一台無人監聽，排名時應被排除
+                    'servers': [fake_server('1', 1), fake_server('2', server.server_address[1])],
+                    'servers_time': now
+                })
+                
+                st, cached = cache.create_speedtest()
+                assert not cached and st.results.server['id'] == '2'
+                assert [entry['server']['id'] for entry in cache.data['ranking']] == ['2']
+                
+                # 第二次直接使用快取排名，只量測所選伺服器一次（3 個請求）
+                latency_requests.clear()
+                start = time.time()
+                st, cached = cache.create_speedtest()
+                print(f"使用快取選擇伺服器: {(time.time() - start) * 1000:.1f} ms")
+                assert cached and st.results.server['id'] == '2' and len(latency_requests) == 3
+                
+                # 快取寫入磁碟，新實例可直接使用
+                assert SpeedtestCache(path).data['ranking'][0]['server']['id'] == '2'
+                
+                # 效能正常時只更新基準；延遲大幅增加時觸發背景重新排名
+                assert not cache.record_result('2', 10.0, 100e6)
+                assert not cache.record_result('2', 12.0, 90e6)
+                assert cache.record_result('2', 50.0, 100e6)
+                cache._refresh_thread.join(5)
+                assert cache.is_fresh() and cache.data['ranking'][0]['server']['id'] == '2'
+                # 延遲永久增加：重新排名後以新結果為基準，之後不再每次重新排名
+                assert not cache.record_result('2', 50.0, 100e6)
+                assert not cache.record_result('2', 55.0, 95e6)
+                assert cache.data['baselines']['2']['samples'] == 2
+                
+                # 排名過期：仍立即使用舊排名，背景更新
+                cache.data['ranking_time'] = now - cache.ranking_ttl - 1
+                st, cached = cache.create_speedtest()
+                assert cached
+                cache._refresh_thread.join(5)
+                assert cache.is_fresh()
+        finally:
+            server.shutdown()
+            server.server_close()
+            
+        print("✓ speedtest 伺服器快取測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ speedtest 伺服器快取測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_public_ip():
+    """測試公網IP並行查詢與快取（本機模擬查詢服務）"""
+    print("=" * 50)
+    print("測試公網IP查詢...")
+    try:
+        import time
+        import socket
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from modules.public_ip import PublicIPResolver, parse_address
+        from modules.rtnetlink import NetworkEvent, RouteRecord
+        
+        assert parse_address('8.8.4.4\n', 4) == '8.8.4.4'
+        assert parse_address('192.168.1.1', 4) is None and parse_address('8.8.4.4', 6) is None
+        assert parse_address('<html>', 4) is None
+        
+        answers = {'/a': '8.8.4.4', '/b': '8.8.4.4', '/other': '1.1.1.1', '/bad': 'not an address',
+                   '/slow': '8.8.4.4', '/v6': '2001:4860:4860::8844'}
+        requests_seen = []
+        
+        class AddressHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests_seen.append(self.path)
+                if self.path == '/slow':
+                    time.sleep(3)
+                body = answers[self.path].encode('ascii')
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                
+            def log_message(self, format, *args):
+                pass
+                
+        class IPv6Server(ThreadingHTTPServer):
+            address_family = socket.AF_INET6
+            
+        servers = [ThreadingHTTPServer(('127.0.0.1', 0), AddressHandler),
+                   IPv6Server(('::1', 0), AddressHandler)]
+        for server in servers:
+            server.daemon_threads = True
+            server.handle_error = lambda request, client_address: None
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        v4 = f'http://127.0.0.1:{servers[0].server_address[1]}'
+        v6 = f'http://[::1]:{servers[1].server_address[1]}'
+        
+        try:
+            resolver = PublicIPResolver(
+                [f'{v4}/slow', f'{v4}/bad', f'{v4}/other', f'{v4}/a', f'{v4}/b'],
+                [f'{v6}/v6'], ttl=60, timeout=5)
+            
+            # 兩個來源一致即回傳，不等待慢速服務
+            result = resolver.get(4)
+            print(f"IPv4: {result['address']}，{result['elapsed']:.1f} ms，"
+                  f"來源 {len(result['sources'])} 個")
+            assert result['address'] == '8.8.4.4' and result['agreed'] and not result['cached']
+            assert result['elapsed'] < 2000 and len(result['sources']) == 2
+            
+            # IPv6 只有一個服務時直接採用
+            results = resolver.get_all()
+            assert results['ipv4']['cached']
+            assert results['ipv6']['address'] == '2001:4860:4860::8844'
+            
+            # 快取期間不再送出請求
+            requests_seen.clear()
+            start = time.perf_counter()
+            assert resolver.get(4)['cached'] and resolver.get(6)['cached']
+            assert not requests_seen and time.perf_counter() - start < 0.01
+            
+            # 預設路由變更只讓對應地址族的快取失效
+            route = RouteRecord(family=socket.AF_INET, dst=None, dst_len=0, gateway='192.0.2.254',
+                                oif=2, prefsrc=None, priority=0, table=254, protocol=4, scope=0,
+                                type=1)
+            resolver._on_network_event(NetworkEvent('route', 'update', route, None))
+            assert not resolver.get(4)['cached'] and resolver.get(6)['cached']
+            
+            # 沒有任何服務一致時採用票數最多的答案並標記未達成一致
+            resolver = PublicIPResolver([f'{v4}/a', f'{v4}/other', f'{v4}/bad'], [], timeout=5)
+            result = resolver.get(4)
+            assert result['address'] in ('8.8.4.4', '1.1.1.1') and not result['agreed']
+            assert f'{v4}/bad' in result['errors']
+            assert PublicIPResolver([], []).get(6)['address'] is None
+        finally:
+            for server in servers:
+                server.shutdown()
+                server.server_close()
+                
+        print("✓ 公網IP查詢測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 公網IP查詢測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_uplink_test():
+    """測試多上行線路測試（本機服務，綁定 lo 與其他介面比較）"""
+    print("=" * 50)
+    print("測試多上行線路...")
+    try:
+        import socket
+        from modules.net_utils import create_connection
+        from modules.throughput_engine import LocalThroughputServer
+        from modules.uplink_test import (MultiUplinkTest, Uplink, as_uplink, discover_uplinks,
+                                         format_table)
+        
+        assert as_uplink('127.0.0.1') == Uplink('127.0.0.1', None, '127.0.0.1', None)
+        assert as_uplink('lo') == Uplink('lo', 'lo', None, None)
+        
+        uplinks = discover_uplinks()
+        print(f"預設路由線路: {[uplink.name for uplink in uplinks]}")
+        
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(64)
+        port = listener.getsockname()[1]
+        try:
+            # 綁定來源地址與介面
+            with create_connection(('127.0.0.1', port), timeout=2, interface='lo',
+                                   source='127.0.0.1') as sock:
+                assert sock.getsockname()[0] == '127.0.0.1'
+                
+            with LocalThroughputServer() as server:
+                internet_test = InternetTest()
+                internet_test.test_hosts = [('127.0.0.1', port)]
+                internet_test.test_urls = [server.url]
+                # 綁定到非 loopback 介面時無法到達本機服務
+                others = [uplink for uplink in uplinks
+                          if uplink.interface and uplink.interface != 'lo'][:1]
+                test = MultiUplinkTest(internet_test, ['lo', '127.0.0.1'] + others, timeout=1.0,
+                                       count=2, interval=0.05, throughput_url=server.url,
+                                       throughput_duration=1.0)
+                result = test.run()
+        finally:
+            listener.close()
+            
+        print(format_table(result))
+        rows = {row['name']: row for row in result['uplinks']}
+        assert result['success'] and result['best'] in ('lo', '127.0.0.1')
+        for name in ('lo', '127.0.0.1'):
+            row = rows[name]
+            assert row['status'] != 'down' and row['tcp'] is not None and row['http'] is not None
+            assert row['mbps'] and row['mbps'] > 0
+        for uplink in others:
+            row = rows[uplink.name]
+            assert row['status'] == 'down' and row['tcp'] is None and row['mbps'] is None
+        assert any(key.endswith(' via lo') for key in internet_test.latency.summary())
+        
+        print("✓ 多上行線路測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 多上行線路測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_traceroute():
+    """測試平行 TTL 路徑追蹤（封包解析與本機路徑）"""
+    print("=" * 50)
+    print("測試路徑追蹤...")
+    try:
+        import socket
+        import struct
+        import threading
+        from modules.traceroute import Traceroute, parse_icmp, parse_extended_error, format_report
+        
+        # Time Exceeded：夾帶原始 IPv4 + UDP 標頭，依來源埠對應
+        inner = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 60, 1, 0, 1, 17, 0,
+                            socket.inet_aton('192.0.2.2'), socket.inet_aton('8.8.8.8'))
+        outer = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 96, 2, 0, 64, 1, 0,
+                            socket.inet_aton('192.0.2.1'), socket.inet_aton('192.0.2.2'))
+        packet = (outer + struct.pack('!BBHI', 11, 0, 0, 0) + inner
+                  + struct.pack('!HHHH', 40000, 33434, 8, 0))
+        assert parse_icmp(socket.AF_INET, packet) == ('time_exceeded', None, ('udp', 40000),
+                                                      '8.8.8.8')
+        # 夾帶 Echo Request 的 Network Unreachable，依識別碼與序號對應
+        inner = inner[:9] + b'\x01' + inner[10:]
+        packet = (outer + struct.pack('!BBHI', 3, 0, 0, 0) + inner
+                  + struct.pack('!BBHHH', 8, 0, 0, 1234, 7))
+        assert parse_icmp(socket.AF_INET, packet) == ('unreachable', 'network', ('icmp', 1234, 7),
+                                                      '8.8.8.8')
+        # IP_RECVERR 錯誤佇列：sock_extended_err + 回報節點地址
+        extended = struct.pack('=IBBBBII', 113, 2, 11, 0, 0, 0, 0)
+        offender = struct.pack('=HH4s8x', socket.AF_INET, 0, socket.inet_aton('192.0.2.1'))
+        ancdata = [(socket.IPPROTO_IP, 11, extended + offender)]
+        assert parse_extended_error(socket.AF_INET, ancdata) == ('time_exceeded', None, '192.0.2.1')
+        
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(64)
+        try:
+            methods = [('udp', 'recverr', None), ('tcp', 'auto', listener.getsockname()[1])]
+            if Traceroute('icmp')._open_receiver(socket.AF_INET)[1] == 'raw':
+                methods += [('icmp', 'raw', None), ('udp', 'raw', None)]
+            for protocol, mode, port in methods:
+                try:
+                    result = Traceroute(protocol, mode=mode, port=port, timeout=1.0).trace(
+                        '127.0.0.1', rounds=3, interval=0.05)
+                except OSError as e:
+                    print(f"  {protocol}/{mode}: 略過（{e}）")
+                    continue
+                if not result['success']:
+                    print(f"  {protocol}/{mode}: 略過（{result['error']}）")
+                    continue
+                print(f"  {protocol}/{result['method']}: 第一輪 {result['first_round']:.1f} ms")
+                # 目的地在第一跳：第一輪在一個 RTT 內完成，不等待逾時
+                assert result['reached'] and result['rounds'] == 3 and result['first_round'] < 500
+                assert [hop['address'] for hop in result['hops']] == ['127.0.0.1']
+                assert result['hops'][0]['sent'] == 3 and result['hops'][0]['received'] == 3
+                
+            # 持續模式：stop() 結束
+            tracer = Traceroute('udp', mode='recverr', timeout=1.0)
+            reports = []
+            timer = threading.Timer(0.3, tracer.stop)
+            timer.start()
+            result = tracer.trace('127.0.0.1', rounds=None, interval=0.05, on_round=reports.append)
+            timer.join()
+            assert result['rounds'] == len(reports) >= 2
+            print(format_report(result))
+        finally:
+            listener.close()
+            
+        print("✓ 路徑追蹤測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 路徑追蹤測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_pmtu_probe():
+    """測試路徑 MTU 探測（本機實際探測與模擬路徑）"""
+    print("=" * 50)
+    print("測試路徑 MTU 探測...")
+    try:
+        import socket
+        from modules.pmtu_probe import PmtuProber, route_info
+        
+        # 實際探測本機：loopback 不在 NetworkInfo 介面清單中，不做比較
+        result = PmtuProber(timeout=0.5).probe_one('127.0.0.1')
+        print(f"127.0.0.1: {result['pmtu']}（{result['method']}，{result['probes']} 個探測）")
+        assert result['success']
+        assert result['pmtu'] == min(route_info(socket.AF_INET, '127.0.0.1')[1], 65535)
+        assert result['probes'] == 2 and not result['mismatch'] and not result['black_hole']
+        
+        class SimulatedPath(PmtuProber):
+            """模擬 1400 位元組的路徑：回報 Fragmentation Needed，或 black_hole 時靜默丟棄"""
+            def __init__(self, black_hole):
+                super().__init__(timeout=0.1, retries=0)
+                self.black_hole = black_hole
+                self.sizes = []
+                
+            def _send_probe(self, session, size):
+                self.sizes.append(size)
+                if size <= 1400:
+                    return 'ok', 0.1
+                return ('timeout', None) if self.black_hole else ('too_big', 1400)
+                
+        interfaces = [('wan0', 1500, {'127.0.0.1'})]
+        
+        # 收到 Fragmentation Needed：直接改試回報的 MTU
+        prober = SimulatedPath(False)
+        result = prober.probe_one('127.0.0.1', interfaces)
+        print(f"回報 MTU: {result['pmtu']}，探測大小 {prober.sizes}")
+        assert result['pmtu'] == 1400 and result['reported_mtu'] == 1400
+        assert prober.sizes == [68, 65535, 1400]
+        assert result['interface'] == 'wan0' and result['mismatch'] and not result['black_hole']
+        assert result['mss'] == 1360 and len(result['warnings']) == 1
+        
+        # ICMP 被阻擋：二分搜尋仍找到 1400，並判定為 PMTU 黑洞
+        prober = SimulatedPath(True)
+        result = prober.probe_one('127.0.0.1', interfaces)
+        print(f"黑洞路徑: {result['pmtu']}，{len(prober.sizes)} 個探測")
+        assert result['pmtu'] == 1400 and result['black_hole'] and result['mismatch']
+        assert result['reported_mtu'] is None
+        assert all(size > 1400 for size in result['silent_drops'])
+        assert len(prober.sizes) <= 20 and len(result['warnings']) == 2
+        
+        # 同時探測多個目標
+        results = SimulatedPath(False).probe(['127.0.0.1', 'localhost', '127.0.0.1'])
+        assert list(results) == ['127.0.0.1', 'localhost']
+        assert all(r['pmtu'] == 1400 for r in results.values())
+        
+        print("✓ 路徑 MTU 探測測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 路徑 MTU 探測測試失敗: {e}")
+        traceback.print_exc()
+        return False
+
+
+def test_metrics_exporter():
+    """測試監控指標匯出模組"""
+    print("=" * 50)
+    print("測試監控指標匯出模組...")
+    import time
+    import urllib.request
+    from modules.metrics_exporter import MetricsExporter, MetricFamily
+    
+    class FixedScanner(DHCPScanner):
+        def scan_dhcp_servers(self):
+            return [{'ip': '192.0.2.1', 'mac': '52:54:00:00:00:01', 'vendor': 'QEMU/KVM',
+                     'interface': 'eth0', 'response_time': 12.5}]
+            
+    class FixedInternetTest(InternetTest):
+        def test_connectivity(self):
+            return {'connected': True, 'ping': 20.0, 'dns': True, 'http': False,
+                    'details': [{'test': 'Ping 8.8.8.8', 'success': True, 'time': 20.0},
+                                {'test': 'HTTP "quoted"', 'success': False, 'error': 'Timeout'}]}
+            
+    exporter = MetricsExporter(NetworkInfo(), FixedScanner(), FixedInternetTest())
+    try:
+        # 尚未收集前只回傳空內容，不會觸發掃描
+        assert exporter.render() == b''
+        exporter.internet_test.latency.record('ping 8.8.8.8', 20.0)
+        exporter.collect_all()
+        
+        text = exporter.render().decode()
+        assert '# TYPE dhcp_finder_interface_receive_bytes_total counter' in text
+        assert 'dhcp_finder_interface_up{interface=' in text
+        assert 'dhcp_finder_dhcp_servers 1' in text
+        assert ('dhcp_finder_dhcp_server_response_seconds{ip="192.0.2.1",interface="eth0"} 0.0125'
+                in text)
+        assert 'dhcp_finder_internet_latency_seconds 0.02' in text
+        assert 'dhcp_finder_probe_success{test="HTTP \\"quoted\\""} 0' in text
+        assert 'dhcp_finder_collector_up{collector="dhcp"} 1' in text
+        assert '# TYPE dhcp_finder_probe_latency_seconds summary' in text
+        for label in ('0.5', '0.9', '0.99', '0.999'):
+            assert (f'dhcp_finder_probe_latency_seconds{{target="ping 8.8.8.8",quantile="{label}"}}'
+                    ' 0.02' in text)
+        assert 'dhcp_finder_probe_latency_seconds_sum{target="ping 8.8.8.8"} 0.02' in text
+        assert 'dhcp_finder_probe_latency_seconds_count{target="ping 8.8.8.8"} 1' in text
+        assert '0.9990000000000001' not in text
+        
+        openmetrics = exporter.render(openmetrics=True).decode()
+        assert '# TYPE dhcp_finder_interface_receive_bytes counter' in openmetrics
+        assert openmetrics.endswith('# EOF\n')
+        
+        # 大量序列時抓取仍只是讀取快取
+        def many_series():
+            family = MetricFamily('synthetic', 'gauge', 'Synthetic series')
+            for i in range(5000):
+                family.add(i, {'index': i})
+            return [family]
+        exporter.run_collector(exporter.add_collector('synthetic', many_series, 60))
+        
+        host, port = exporter.serve('127.0.0.1', 0)
+        url = f"http://{host}:{port}/metrics"
+        start = time.perf_counter()
+        with urllib.request.urlopen(url, timeout=5) as response:
+            body = response.read().decode()
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        elapsed = (time.perf_counter() - start) * 1000
+        assert 'dhcp_finder_synthetic{index="4999"} 4999' in body
+        print(f"抓取 {body.count(chr(10))} 行耗時 {elapsed:.2f} ms")
+        
+        request = urllib.request.Request(url, headers={'Accept': 'application/openmetrics-text'})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('application/openmetrics-text')
+            assert response.read().endswith(b'# EOF\n')
+        
+        print("✓ 監控指標匯出模組測試通過")
+        return True
+        
+    except Exception as e:
+        print(f"✗ 監控指標匯出模組測試失敗: {e}")
+        traceback.print_exc()
+        return False
+    finally:
+        exporter.stop()
+
+
 def test_internet_connectivity():
     """測試外網連線模組"""
     print("=" * 50)
@@ -55,6 +1522,47 @@ def test_internet_connectivity():
         else:
             print("⚠ 外網連線異常")
             
+        # 以本機服務測試並行執行與總時限：慢速 HTTP 服務不應拖慢整體結果
+        import socket
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        class SlowHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(3)
+                self.send_response(200)
+                self.end_headers()
+                
+            def log_message(self, format, *args):
+                pass
+                
+        server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        try:
+            local_test = InternetTest()
+            local_test.test_hosts = [('localhost', listener.getsockname()[1])]
+            local_test.test_urls = [f"http://127.0.0.1:{server.server_address[1]}/"]
+            streamed = []
+            result = local_test.test_connectivity(deadline=1.0, on_result=streamed.append)
+            assert result['connected'] and result['elapsed'] < 2.0
+            assert result['details'][-1]['error'] == 'Deadline exceeded'
+            assert result['latency'][f"tcp localhost:{listener.getsockname()[1]}"]['count'] == 1
+            assert [detail['test'] for detail in streamed][0].startswith('Socket localhost')
+            
+            result = local_test.test_connectivity(deadline=5.0, short_circuit=True)
+            assert result['connected'] and result['elapsed'] < 2.0
+            assert result['details'][-1]['error'] == 'Skipped'
+            print(f"✓ 並行連線測試: {result['elapsed']:.3f} 秒")
+        finally:
+            listener.close()
+            server.shutdown()
+            server.server_close()
+            
         # 測試公網IP獲取
         print("測試公網IP獲取...")
         public_ip = internet_test.get_public_ip()
@@ -137,6 +1645,27 @@ def main():
     
     tests = [
         ("網路資訊", test_network_info),
+        ("rtnetlink", test_rtnetlink_provider),
+        ("流量監測", test_throughput_monitor),
+        ("計數保存", test_counter_store),
+        ("路由查詢", test_route_lookup),
+        ("DNS設定", test_dns_config),
+        ("驅動統計", test_nic_stats),
+        ("接收分流", test_rx_scaling),
+        ("協定計數", test_protocol_stats),
+        ("ICMP引擎", test_icmp_engine),
+        ("延遲直方圖", test_latency_histogram),
+        ("DNS效能", test_dns_benchmark),
+        ("HTTP探測", test_http_probe),
+        ("吞吐量測試", test_throughput_engine),
+        ("區網對測", test_peer_test),
+        ("負載延遲", test_bufferbloat),
+        ("speedtest快取", test_speedtest_cache),
+        ("公網IP", test_public_ip),
+        ("多上行線路", test_uplink_test),
+        ("路徑追蹤", test_traceroute),
+        ("路徑MTU", test_pmtu_probe),
+        ("指標匯出", test_metrics_exporter),
         ("外網連線", test_internet_connectivity),
         ("DHCP掃描", test_dhcp_scanner),
     ]